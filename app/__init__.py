@@ -37,6 +37,22 @@ def create_app(config_name='development'):
     jwt.init_app(app)
     cors.init_app(app)
     
+    # 初始化统计结果缓存、相同查询合并、查询线程池、分析计算进程池、后台任务线程池、最近读数缓存与告警规则索引
+    from app.utils.alert_index import init_alert_index
+    from app.utils.analytics_executor import init_analytics_executor
+    from app.utils.cache import init_stats_cache
+    from app.utils.job_runner import init_job_runner
+    from app.utils.query_pool import init_query_pool
+    from app.utils.reading_cache import init_reading_cache
+    from app.utils.single_flight import init_single_flight
+    init_stats_cache(app)
+    init_single_flight(app)
+    init_query_pool(app)
+    init_analytics_executor(app)
+    init_job_runner(app)
+    init_reading_cache(app)
+    init_alert_index(app)
+    
     # 创建API实例
     api = Api(
         app,
@@ -53,12 +69,16 @@ def create_app(config_name='development'):
     from app.api.auth import auth_ns
     from app.api.devices import devices_ns
     from app.api.statistics import statistics_ns
+    from app.api.cohorts import cohorts_ns
+    from app.api.alerts import alerts_ns
     
     api.add_namespace(glucose_ns, path='/glucose')
     api.add_namespace(users_ns, path='/users')
     api.add_namespace(auth_ns, path='/auth')
     api.add_namespace(devices_ns, path='/devices')
     api.add_namespace(statistics_ns, path='/statistics')
+    api.add_namespace(cohorts_ns, path='/cohorts')
+    api.add_namespace(alerts_ns, path='/alerts')
     
     # 注册错误处理器
     from app.utils.error_handlers import register_error_handlers
@@ -254,6 +274,19 @@ def create_app(config_name='development'):
                 'error': str(e)
             }, 500
     
+    # 统计调试响应头：各数据层级 (原始记录/日汇总/月汇总) 的读取量
+    @app.after_request
+    def add_stats_debug_headers(response):
+        """输出统计查询使用的数据层级"""
+        from flask import g
+        
+        stats_tiers = g.get('stats_tiers')
+        if stats_tiers and app.config.get('STATS_DEBUG_HEADERS'):
+            response.headers['X-Stats-Tiers'] = ','.join(
+                f'{tier}={count}' for tier, count in stats_tiers.items()
+            )
+        return response
+    
     # 注册CLI命令
     from app.utils.cli import register_cli_commands
     register_cli_commands(app)
@@ -0,0 +1,279 @@
+"""
+血糖告警API接口
+Glucose Alert API Endpoints
+"""
+
+from datetime import datetime
+
+from flask import request
+from flask_restx import Namespace, Resource, fields
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from marshmallow import ValidationError
+
+from app.models.alert import (
+    AlertResponseSchema,
+    AlertRuleResponseSchema,
+    AlertRuleSchema
+)
+from app.services.alert_service import AlertService
+from app.utils.decorators import validate_json
+from app.utils.responses import success_response, error_response
+from app.utils.time_utils import to_utc_naive
+
+# 创建命名空间
+alerts_ns = Namespace('alerts', description='血糖告警')
+
+# 定义API模型用于Swagger文档
+alert_rule_model = alerts_ns.model('AlertRule', {
+    'name': fields.String(required=True, description='规则名称'),
+    'rule_type': fields.String(required=True, description='规则类型 (threshold/rate/forecast)'),
+    'condition': fields.String(required=True, description='条件 (threshold: below/above，rate: falling/rising，forecast: below)'),
+    'value': fields.Float(required=True, description='阈值 (mmol/L，预测规则为预测值阈值) 或变化速率 (mmol/L/分钟)'),
+    'duration_minutes': fields.Integer(description='条件持续满足的分钟数 (默认0)'),
+    'severity': fields.String(description='严重程度 (urgent/warning/info，默认warning)'),
+    'device_id': fields.String(description='只评估该设备的读数 (可选)'),
+    'enabled': fields.Boolean(description='是否启用 (默认true)')
+})
+
+snooze_model = alerts_ns.model('AlertSnooze', {
+    'minutes': fields.Integer(required=True, description='暂停通知的分钟数 (1-1440)')
+})
+
+# 初始化服务和模式
+alert_service = AlertService()
+alert_rule_schema = AlertRuleSchema()
+alert_rule_response_schema = AlertRuleResponseSchema()
+alert_response_schema = AlertResponseSchema()
+
+
+@alerts_ns.route('')
+class AlertListResource(Resource):
+    """告警列表资源"""
+
+    @alerts_ns.doc('get_alerts', params={
+        'active': '只返回未解除的告警 (true/false，默认false)',
+        'since': '只返回该时间之后触发或通知的告警 (ISO时间，可选)',
+        'limit': '最大数量 (默认50，最多200)'
+    })
+    @jwt_required()
+    def get(self):
+        """获取当前用户的告警 (按触发时间倒序)"""
+        try:
+            active_only = request.args.get('active', 'false').lower() == 'true'
+            since = request.args.get('since')
+            if since:
+                since = to_utc_naive(datetime.fromisoformat(since.replace('Z', '+00:00')))
+            limit = int(request.args.get('limit', 50))
+            if not 1 <= limit <= 200:
+                raise ValueError("limit 应在 1-200 之间")
+
+            alerts = alert_service.get_alerts(get_jwt_identity(), active_only=active_only,
+                                              since=since or None, limit=limit)
+
+            return success_response(
+                data={'alerts': alert_response_schema.dump(alerts, many=True)},
+                message="查询成功"
+            )
+
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="查询告警失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@alerts_ns.route('/rules')
+class AlertRuleListResource(Resource):
+    """告警规则列表资源"""
+
+    @alerts_ns.doc('get_alert_rules')
+    @jwt_required()
+    def get(self):
+        """获取当前用户的告警规则"""
+        try:
+            rules = alert_service.get_rules(get_jwt_identity())
+
+            return success_response(
+                data={'rules': alert_rule_response_schema.dump(rules, many=True)},
+                message="查询成功"
+            )
+
+        except Exception as e:
+            return error_response(
+                message="查询告警规则失败",
+                details=str(e),
+                status_code=500
+            )
+
+    @alerts_ns.doc('create_alert_rule')
+    @alerts_ns.expect(alert_rule_model)
+    @jwt_required()
+    @validate_json
+    def post(self):
+        """
+        创建告警规则
+        写入血糖记录时评估，条件持续满足 duration_minutes 后触发告警
+        """
+        try:
+            rule_data = alert_rule_schema.load(request.json)
+            rule = alert_service.create_rule(get_jwt_identity(), rule_data)
+
+            return success_response(
+                data=alert_rule_response_schema.dump(rule),
+                message="告警规则创建成功",
+                status_code=201
+            )
+
+        except ValidationError as e:
+            return error_response(
+                message="输入数据验证失败",
+                details=e.messages,
+                status_code=400
+            )
+        except ValueError as e:
+            return error_response(
+                message="告警规则创建失败",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="告警规则创建失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@alerts_ns.route('/rules/<string:rule_id>')
+class AlertRuleResource(Resource):
+    """单个告警规则资源"""
+
+    @alerts_ns.doc('update_alert_rule')
+    @alerts_ns.expect(alert_rule_model)
+    @jwt_required()
+    @validate_json
+    def put(self, rule_id):
+        """修改告警规则 (整体替换)"""
+        try:
+            rule_data = alert_rule_schema.load(request.json)
+            rule = alert_service.update_rule(get_jwt_identity(), rule_id, rule_data)
+            if rule is None:
+                return error_response(
+                    message="告警规则不存在",
+                    status_code=404
+                )
+
+            return success_response(
+                data=alert_rule_response_schema.dump(rule),
+                message="告警规则修改成功"
+            )
+
+        except ValidationError as e:
+            return error_response(
+                message="输入数据验证失败",
+                details=e.messages,
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="告警规则修改失败",
+                details=str(e),
+                status_code=500
+            )
+
+    @alerts_ns.doc('delete_alert_rule')
+    @jwt_required()
+    def delete(self, rule_id):
+        """删除告警规则 (同时解除其未解除的告警)"""
+        try:
+            if not alert_service.delete_rule(get_jwt_identity(), rule_id):
+                return error_response(
+                    message="告警规则不存在",
+                    status_code=404
+                )
+
+            return success_response(message="告警规则删除成功")
+
+        except Exception as e:
+            return error_response(
+                message="告警规则删除失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@alerts_ns.route('/<string:alert_id>/acknowledge')
+class AlertAcknowledgeResource(Resource):
+    """告警确认资源"""
+
+    @alerts_ns.doc('acknowledge_alert')
+    @jwt_required()
+    def post(self, alert_id):
+        """确认告警 (条件解除前不再重复通知)"""
+        try:
+            alert = alert_service.acknowledge(get_jwt_identity(), alert_id)
+            if alert is None:
+                return error_response(
+                    message="告警不存在",
+                    status_code=404
+                )
+
+            return success_response(
+                data=alert_response_schema.dump(alert),
+                message="告警已确认"
+            )
+
+        except Exception as e:
+            return error_response(
+                message="确认告警失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@alerts_ns.route('/<string:alert_id>/snooze')
+class AlertSnoozeResource(Resource):
+    """告警暂停资源"""
+
+    @alerts_ns.doc('snooze_alert')
+    @alerts_ns.expect(snooze_model)
+    @jwt_required()
+    @validate_json
+    def post(self, alert_id):
+        """暂停告警及其规则的通知"""
+        try:
+            minutes = request.json.get('minutes')
+            if not isinstance(minutes, int) or isinstance(minutes, bool) or not 1 <= minutes <= 1440:
+                raise ValueError("minutes 应为 1-1440 之间的整数")
+
+            alert = alert_service.snooze(get_jwt_identity(), alert_id, minutes)
+            if alert is None:
+                return error_response(
+                    message="告警不存在",
+                    status_code=404
+                )
+
+            return success_response(
+                data=alert_response_schema.dump(alert),
+                message="告警已暂停"
+            )
+
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="暂停告警失败",
+                details=str(e),
+                status_code=500
+            )
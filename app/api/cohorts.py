@@ -0,0 +1,232 @@
+"""
+研究队列统计API接口
+Cohort Analytics API Endpoints
+"""
+
+from flask import current_app, request
+from flask_restx import Namespace, Resource, fields
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from app.models.user import ROLE_ADMIN, ROLE_CLINICIAN
+from app.services.cohort_service import CohortService, parse_cohort_definition
+from app.services.roster_service import RosterService, parse_risk_weights
+from app.utils.decorators import roles_required, validate_json
+from app.utils.query_pool import QueryDeadlineExceeded, QueryPoolBusy
+from app.utils.responses import success_response, error_response
+from app.utils.time_utils import parse_day_window
+
+# 创建命名空间
+cohorts_ns = Namespace('cohorts', description='研究队列统计')
+
+# 定义API模型用于Swagger文档
+cohort_definition_model = cohorts_ns.model('CohortDefinition', {
+    'user_ids': fields.List(fields.String, description='用户ID列表 (与属性条件二选一)'),
+    'age_min': fields.Integer(description='最小年龄 (含)'),
+    'age_max': fields.Integer(description='最大年龄 (含)'),
+    'gender': fields.String(description='性别 (male/female/other)')
+})
+
+cohort_request_model = cohorts_ns.model('CohortRequest', {
+    'cohort': fields.Nested(cohort_definition_model, required=True, description='队列定义'),
+    'end_date': fields.String(description='结束日期 (含，UTC，默认今天)'),
+    'days': fields.Integer(description='天数 (默认14)')
+})
+
+roster_request_model = cohorts_ns.model('RosterRequest', {
+    'user_ids': fields.List(fields.String, required=True, description='患者用户ID列表'),
+    'limit': fields.Integer(description='每页数量 (默认20)'),
+    'offset': fields.Integer(description='跳过的数量 (默认0)'),
+    'weights': fields.Raw(description='风险组成项权重 (tbr/tir/hypo_episodes/latest_reading/sync_gap，可选)')
+})
+
+# 初始化服务
+cohort_service = CohortService()
+roster_service = RosterService()
+
+
+@cohorts_ns.route('/statistics')
+class CohortStatisticsResource(Resource):
+    """研究队列统计资源 (同步计算)"""
+
+    @cohorts_ns.doc('get_cohort_statistics')
+    @cohorts_ns.expect(cohort_request_model)
+    @jwt_required()
+    @roles_required(ROLE_CLINICIAN, ROLE_ADMIN)
+    @validate_json
+    def post(self):
+        """
+        计算研究队列的群体统计 (仅限医生与管理员)
+        成员数超过 COHORT_SYNC_MAX_USERS 时请使用后台任务接口
+        """
+        try:
+            data = request.get_json()
+            definition = parse_cohort_definition(data.get('cohort'))
+            start_date, end_date = parse_day_window(data.get('end_date'), data.get('days'))
+
+            members = cohort_service.resolve_users(definition)
+            max_users = current_app.config.get('COHORT_SYNC_MAX_USERS', 500)
+            if len(members) > max_users:
+                return error_response(
+                    message=f"队列成员超过 {max_users} 个，请使用 POST /cohorts/jobs 创建后台任务",
+                    details={'user_count': len(members)},
+                    status_code=400
+                )
+
+            result = cohort_service.compute(members, start_date, end_date)
+
+            return success_response(
+                data=result,
+                message="队列统计成功"
+            )
+
+        except (TypeError, ValueError) as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="队列统计失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@cohorts_ns.route('/jobs')
+class CohortJobsResource(Resource):
+    """研究队列统计任务资源"""
+
+    @cohorts_ns.doc('create_cohort_job')
+    @cohorts_ns.expect(cohort_request_model)
+    @jwt_required()
+    @roles_required(ROLE_CLINICIAN, ROLE_ADMIN)
+    @validate_json
+    def post(self):
+        """
+        创建研究队列统计后台任务 (仅限医生与管理员)
+        返回任务ID，通过 GET /cohorts/jobs/<job_id> 查询进度与结果
+        """
+        try:
+            data = request.get_json()
+            definition = parse_cohort_definition(data.get('cohort'))
+            start_date, end_date = parse_day_window(data.get('end_date'), data.get('days'))
+
+            job_id = cohort_service.create_job(definition, start_date, end_date,
+                                               get_jwt_identity())
+
+            return success_response(
+                data={'job_id': job_id},
+                message="队列统计任务已创建",
+                status_code=202
+            )
+
+        except (TypeError, ValueError) as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="队列统计任务创建失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@cohorts_ns.route('/jobs/<string:job_id>')
+class CohortJobResource(Resource):
+    """单个研究队列统计任务资源"""
+
+    @cohorts_ns.doc('get_cohort_job')
+    @jwt_required()
+    @roles_required(ROLE_CLINICIAN, ROLE_ADMIN)
+    def get(self, job_id):
+        """
+        查询研究队列统计任务的状态、进度与结果 (仅限医生与管理员)
+        """
+        try:
+            job = cohort_service.get_job(job_id)
+            if not job:
+                return error_response(
+                    message="任务不存在",
+                    status_code=404
+                )
+
+            return success_response(
+                data=job,
+                message="任务查询成功"
+            )
+
+        except Exception as e:
+            return error_response(
+                message="任务查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@cohorts_ns.route('/roster')
+class RosterResource(Resource):
+    """患者名单风险排序资源"""
+
+    @cohorts_ns.doc('rank_roster')
+    @cohorts_ns.expect(roster_request_model)
+    @jwt_required()
+    @roles_required(ROLE_CLINICIAN, ROLE_ADMIN)
+    @validate_json
+    def post(self):
+        """
+        按风险评分对患者名单排序并分页返回 (仅限医生与管理员)
+        """
+        try:
+            data = request.get_json()
+            user_ids = data.get('user_ids')
+            max_users = current_app.config.get('ROSTER_MAX_USERS', 2000)
+            if (not isinstance(user_ids, list) or not user_ids
+                    or not all(isinstance(user_id, str) for user_id in user_ids)):
+                raise ValueError("user_ids 应为非空的用户ID列表")
+            if len(user_ids) > max_users:
+                raise ValueError(f"user_ids 最多 {max_users} 个")
+
+            limit = int(data.get('limit', 20))
+            offset = int(data.get('offset', 0))
+            max_page_size = current_app.config.get('ROSTER_MAX_PAGE_SIZE', 200)
+            if not 1 <= limit <= max_page_size:
+                raise ValueError(f"limit 应在 1-{max_page_size} 之间")
+            if offset < 0:
+                raise ValueError("offset 不能为负数")
+            weights = parse_risk_weights(data.get('weights'))
+
+            result = roster_service.rank(user_ids, limit, offset, weights)
+
+            return success_response(
+                data=result,
+                message="患者名单排序成功"
+            )
+
+        except (TypeError, ValueError) as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except QueryPoolBusy as e:
+            return error_response(
+                message="统计查询繁忙，请稍后重试",
+                details=str(e),
+                status_code=503
+            )
+        except QueryDeadlineExceeded as e:
+            return error_response(
+                message="患者名单排序超时",
+                details=str(e),
+                status_code=504
+            )
+        except Exception as e:
+            return error_response(
+                message="患者名单排序失败",
+                details=str(e),
+                status_code=500
+            )
@@ -13,9 +13,12 @@ from app.models.device import (
     DeviceResponseSchema,
     DeviceStatusSchema
 )
+from app.models.user import ROLE_ADMIN
+from app.services.completeness_service import CompletenessService
 from app.services.device_service import DeviceService
-from app.utils.decorators import validate_json
+from app.utils.decorators import roles_required, validate_json
 from app.utils.responses import success_response, error_response
+from app.utils.time_utils import parse_day_window
 
 # 创建命名空间
 devices_ns = Namespace('devices', description='设备管理')
@@ -57,10 +60,14 @@ device_status_model = devices_ns.model('DeviceStatus', {
 
 # 初始化服务和模式
 device_service = DeviceService()
+completeness_service = CompletenessService()
 device_registration_schema = DeviceRegistrationSchema()
 device_response_schema = DeviceResponseSchema()
 device_status_schema = DeviceStatusSchema()
 
+# 全设备完整性排名返回的最大设备数
+FLEET_COMPLETENESS_MAX_LIMIT = 500
+
 
 @devices_ns.route('')
 class DeviceListResource(Resource):
@@ -165,6 +172,53 @@ class DeviceListResource(Resource):
             )
 
 
+@devices_ns.route('/completeness')
+class FleetCompletenessResource(Resource):
+    """全设备数据完整性资源"""
+    
+    @devices_ns.doc('get_fleet_completeness')
+    @jwt_required()
+    @roles_required(ROLE_ADMIN)
+    def get(self):
+        """
+        全设备数据完整性排名 (仅限管理员)
+        按完整性从低到高列出设备 (基于日汇总，不扫描原始记录)
+        """
+        try:
+            start_date, end_date = parse_day_window(
+                request.args.get('end_date'), request.args.get('days')
+            )
+            
+            limit = request.args.get('limit', 50, type=int)
+            if limit < 1 or limit > FLEET_COMPLETENESS_MAX_LIMIT:
+                raise ValueError(f"limit 应在 1-{FLEET_COMPLETENESS_MAX_LIMIT} 之间")
+            
+            result = completeness_service.get_fleet_completeness(
+                start_date=start_date,
+                end_date=end_date,
+                device_type=request.args.get('device_type'),
+                limit=limit
+            )
+            
+            return success_response(
+                data=result,
+                message="查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="查询设备完整性失败",
+                details=str(e),
+                status_code=500
+            )
+
+
 @devices_ns.route('/<string:device_id>')
 class DeviceResource(Resource):
     """单个设备资源"""
@@ -299,3 +353,62 @@ class DeviceStatusResource(Resource):
                 details=str(e),
                 status_code=500
             )
+
+
+@devices_ns.route('/<string:device_id>/completeness')
+class DeviceCompletenessResource(Resource):
+    """设备数据完整性资源"""
+    
+    @devices_ns.doc('get_device_completeness')
+    @jwt_required()
+    def get(self, device_id):
+        """获取设备每日数据完整性 (预期/实际读数、缺口与重复读数)"""
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            
+            # 检查设备权限
+            device = device_service.get_device_by_device_id(device_id)
+            if not device:
+                return error_response(
+                    message="设备不存在",
+                    status_code=404
+                )
+            
+            if device.user_id != current_user_id:
+                return error_response(
+                    message="无权限查看此设备数据",
+                    status_code=403
+                )
+            
+            start_date, end_date = parse_day_window(
+                request.args.get('end_date'), request.args.get('days')
+            )
+            
+            days = completeness_service.get_device_days(device_id, start_date, end_date)
+            
+            return success_response(
+                data={
+                    'device_id': device_id,
+                    'device_type': device.device_type,
+                    'days': days,
+                    'time_range': {
+                        'start_date': start_date.isoformat(),
+                        'end_date': end_date.isoformat()
+                    }
+                },
+                message="查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="查询设备完整性失败",
+                details=str(e),
+                status_code=500
+            )
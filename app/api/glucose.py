@@ -3,6 +3,8 @@
 Glucose Data API Endpoints
 """
 
+from datetime import datetime, timedelta
+
 from flask import request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
@@ -14,6 +16,7 @@ from app.models.glucose import (
     GlucoseQuerySchema
 )
 from app.services.glucose_service import GlucoseService
+from app.services.snapshot_service import rate_of_change
 from app.utils.decorators import validate_json
 from app.utils.responses import success_response, error_response
 
@@ -124,6 +127,64 @@ class GlucoseListResource(Resource):
             )
 
 
+@glucose_ns.route('/recent')
+class RecentGlucoseResource(Resource):
+    """最近读数资源"""
+    
+    @glucose_ns.doc('get_recent_glucose', params={
+        'minutes': '最近分钟数 (默认180，最多1440)',
+        'rate_minutes': '计算变化速率的分钟数 (默认15)'
+    })
+    @jwt_required()
+    def get(self):
+        """
+        获取当前用户的最新记录、最近读数与变化速率
+        数据在最近读数缓存的窗口之内时不访问数据库
+        """
+        try:
+            user_id = get_jwt_identity()
+            minutes = int(request.args.get('minutes', 180))
+            rate_minutes = int(request.args.get('rate_minutes', 15))
+            if not 1 <= minutes <= 1440:
+                raise ValueError("minutes 应在 1-1440 之间")
+            if not 2 <= rate_minutes <= 60:
+                raise ValueError("rate_minutes 应在 2-60 之间")
+            
+            readings = glucose_service.get_recent_readings(user_id, max(minutes, rate_minutes))
+            cutoff = datetime.utcnow() - timedelta(minutes=rate_minutes)
+            rate = rate_of_change([reading for reading in readings if reading['timestamp'] >= cutoff])
+            if rate_minutes > minutes:
+                cutoff = datetime.utcnow() - timedelta(minutes=minutes)
+                readings = [reading for reading in readings if reading['timestamp'] >= cutoff]
+            latest = glucose_service.get_latest_record(user_id)
+            
+            return success_response(
+                data={
+                    'latest': glucose_response_schema.dump(latest) if latest else None,
+                    'readings': [
+                        {**reading, 'timestamp': reading['timestamp'].isoformat()}
+                        for reading in readings
+                    ],
+                    'rate_of_change': rate,
+                    'minutes': minutes
+                },
+                message="查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="查询最近读数失败",
+                details=str(e),
+                status_code=500
+            )
+
+
 @glucose_ns.route('/<string:record_id>')
 class GlucoseResource(Resource):
     """单个血糖记录资源"""
@@ -3,13 +3,27 @@
 Statistics and Analytics API Endpoints
 """
 
-from flask import request
+from flask import current_app, request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 
-from app.services.statistics_service import StatisticsService
+from app.services.episode_detector import EPISODE_RULES
+from app.services.event_service import EventService
+from app.services.local_time_service import LocalTimeService
+from app.services.reference_service import REFERENCE_METRICS, ReferenceService
+from app.services.statistics_service import TREND_GRANULARITIES, StatisticsService
+from app.services.user_service import UserService
+from app.models.user import ROLE_ADMIN, ROLE_CLINICIAN
+from app.utils.decorators import roles_required, validate_json
+from app.utils.alert_index import get_alert_index
+from app.utils.analytics_executor import get_analytics_executor
+from app.utils.cache import get_stats_cache
+from app.utils.query_pool import QueryDeadlineExceeded, QueryPoolBusy, get_query_pool
+from app.utils.reading_cache import get_reading_cache
+from app.utils.single_flight import get_single_flight
 from app.utils.responses import success_response, error_response
+from app.utils.time_utils import floor_day, parse_day_window, parse_timezone, to_utc_naive
 
 # 创建命名空间
 statistics_ns = Namespace('statistics', description='数据统计与分析')
@@ -35,8 +49,169 @@ trend_model = statistics_ns.model('Trend', {
     'record_count': fields.Integer(description='记录数量')
 })
 
+agp_batch_model = statistics_ns.model('AGPBatchRequest', {
+    'user_ids': fields.List(fields.String, required=True, description='用户ID列表'),
+    'end_date': fields.String(description='结束日期 (含，默认今天)'),
+    'days': fields.Integer(description='天数 (默认14)')
+})
+
+variability_batch_model = statistics_ns.model('VariabilityBatchRequest', {
+    'user_ids': fields.List(fields.String, required=True, description='用户ID列表'),
+    'end_date': fields.String(description='结束日期 (含，默认今天)'),
+    'days': fields.Integer(description='天数 (默认14)'),
+    'conga_hours': fields.Integer(description='CONGA 时间滞后小时数 (默认1)')
+})
+
+compare_period_model = statistics_ns.model('ComparePeriod', {
+    'start_date': fields.String(required=True, description='开始时间 (含)'),
+    'end_date': fields.String(required=True, description='结束时间 (不含)')
+})
+
+compare_model = statistics_ns.model('CompareRequest', {
+    'periods': fields.List(fields.Nested(compare_period_model), required=True,
+                           description='时间段列表'),
+    'baseline': fields.Integer(description='基准时间段序号 (默认0)'),
+    'device_id': fields.String(description='设备ID')
+})
+
 # 初始化服务
 statistics_service = StatisticsService()
+event_service = EventService()
+user_service = UserService()
+local_time_service = LocalTimeService()
+reference_service = ReferenceService()
+
+# 滚动窗口序列输出格式
+WINDOWED_SERIES_FORMATS = ('records', 'columnar')
+
+# CONGA 时间滞后上限 (小时)
+CONGA_MAX_HOURS = 24
+
+# 每日时段统计的天数
+TIME_OF_DAY_DEFAULT_DAYS = 90
+TIME_OF_DAY_MAX_DAYS = 365
+
+
+def check_trend_buckets(start_date, end_date, granularity):
+    """
+    检查分钟/小时级趋势的时间桶数量不超过 TREND_MAX_BUCKETS
+    
+    Args:
+        start_date: 开始日期
+        end_date: 结束日期
+        granularity: 时间粒度
+        
+    Raises:
+        ValueError: 时间桶过多
+    """
+    bucket = TREND_GRANULARITIES[granularity]
+    unit_seconds = {'minute': 60, 'hour': 3600}.get(bucket['unit'])
+    if unit_seconds is None:
+        return
+    
+    max_buckets = current_app.config.get('TREND_MAX_BUCKETS', 110000)
+    span = (to_utc_naive(end_date) - to_utc_naive(start_date)).total_seconds()
+    if span / (unit_seconds * bucket['bin_size']) > max_buckets:
+        raise ValueError(f"时间桶数量超过 {max_buckets}，请缩小时间范围或使用更粗的粒度")
+
+
+def parse_time_of_day(value, name):
+    """
+    解析一天中的时刻 (HH:MM)
+    
+    Args:
+        value: 时刻字符串 (24:00 表示一天结束)
+        name: 参数名称 (用于错误信息)
+        
+    Returns:
+        int: 一天中的分钟数 (0-1440)
+        
+    Raises:
+        ValueError: 格式错误
+    """
+    try:
+        hour, minute = (int(part) for part in value.split(':'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"{name} 应为 HH:MM 格式")
+    if not (0 <= hour <= 24 and 0 <= minute < 60) or (hour == 24 and minute):
+        raise ValueError(f"{name} 应在 00:00-24:00 之间")
+    return hour * 60 + minute
+
+
+def parse_compare_periods(periods, baseline):
+    """
+    解析时间段对比参数
+    
+    Args:
+        periods: [{start_date, end_date}] 列表
+        baseline: 基准时间段序号 (可选，默认0)
+        
+    Returns:
+        Tuple[List[Tuple[datetime, datetime]], int]: (时间段列表, 基准序号)
+        
+    Raises:
+        ValueError: 参数格式错误或超出范围
+    """
+    max_periods = current_app.config.get('COMPARE_MAX_PERIODS', 12)
+    if not isinstance(periods, list) or not 2 <= len(periods) <= max_periods:
+        raise ValueError(f"periods 应为 2-{max_periods} 个时间段")
+    
+    parsed = []
+    for period in periods:
+        if not isinstance(period, dict) or not period.get('start_date') or not period.get('end_date'):
+            raise ValueError("每个时间段须包含 start_date 与 end_date")
+        start = to_utc_naive(datetime.fromisoformat(period['start_date'].replace('Z', '+00:00')))
+        end = to_utc_naive(datetime.fromisoformat(period['end_date'].replace('Z', '+00:00')))
+        if start >= end:
+            raise ValueError("时间段的 start_date 应早于 end_date")
+        parsed.append((start, end))
+    
+    baseline = int(baseline) if baseline is not None else 0
+    if not 0 <= baseline < len(parsed):
+        raise ValueError(f"baseline 应在 0-{len(parsed) - 1} 之间")
+    return parsed, baseline
+
+
+def parse_conga_hours(conga_hours):
+    """
+    解析 CONGA 时间滞后参数
+    
+    Args:
+        conga_hours: 小时数 (可选，默认1)
+        
+    Returns:
+        int: 小时数
+        
+    Raises:
+        ValueError: 参数格式错误或超出范围
+    """
+    conga_hours = int(conga_hours) if conga_hours is not None else 1
+    if conga_hours < 1 or conga_hours > CONGA_MAX_HOURS:
+        raise ValueError(f"conga_hours 应在 1-{CONGA_MAX_HOURS} 之间")
+    return conga_hours
+
+
+def user_day_windows(user_ids, end_date, days):
+    """
+    按各用户时区解析批量查询的统计窗口 (end_date 为各用户的本地日期)
+    
+    Args:
+        user_ids: 用户ID列表
+        end_date: 结束日期字符串 (可选)
+        days: 天数 (可选)
+        
+    Returns:
+        Tuple[Dict, Dict]: ({用户ID: (窗口开始, 窗口结束)}, {用户ID: 时区名称})
+        
+    Raises:
+        ValueError: 参数格式错误或超出范围
+    """
+    timezones = local_time_service.get_timezones(list(dict.fromkeys(user_ids)))
+    windows = {
+        user_id: parse_day_window(end_date, days, parse_timezone(tz_name))
+        for user_id, tz_name in timezones.items()
+    }
+    return windows, timezones
 
 
 @statistics_ns.route('/summary')
@@ -117,13 +292,15 @@ class TrendsResource(Resource):
             # 获取查询参数
             start_date = request.args.get('start_date')
             end_date = request.args.get('end_date')
-            granularity = request.args.get('granularity', 'day')  # day, week, month
+            granularity = request.args.get('granularity', 'day')
             device_id = request.args.get('device_id')
+            tz_name = (request.args.get('timezone')
+                       or local_time_service.get_timezone(current_user_id))
             
             # 验证粒度参数
-            if granularity not in ['day', 'week', 'month']:
+            if granularity not in TREND_GRANULARITIES:
                 return error_response(
-                    message="粒度参数必须是day、week或month",
+                    message=f"粒度参数必须是{'、'.join(TREND_GRANULARITIES)}之一",
                     status_code=400
                 )
             
@@ -138,13 +315,18 @@ class TrendsResource(Resource):
             else:
                 end_date = datetime.utcnow()
             
+            # 校验时区与时间桶数量
+            parse_timezone(tz_name)
+            check_trend_buckets(start_date, end_date, granularity)
+            
             # 获取趋势数据
             trends = statistics_service.get_glucose_trends(
                 user_id=current_user_id,
                 start_date=start_date,
                 end_date=end_date,
                 granularity=granularity,
-                device_id=device_id
+                device_id=device_id,
+                timezone=tz_name
             )
             
             return success_response(
@@ -154,7 +336,7 @@ class TrendsResource(Resource):
             
         except ValueError as e:
             return error_response(
-                message="日期格式错误",
+                message="参数格式错误",
                 details=str(e),
                 status_code=400
             )
@@ -166,6 +348,84 @@ class TrendsResource(Resource):
             )
 
 
+@statistics_ns.route('/overview')
+class OverviewResource(Resource):
+    """统计概览资源"""
+    
+    @statistics_ns.doc('get_statistics_overview')
+    @jwt_required()
+    def get(self):
+        """
+        获取统计概览 (组合视图)
+        统计摘要、分布、模式与各设备趋势并发查询，耗时接近最慢的一项
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            
+            # 解析日期参数 (默认最近30天)
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            if end_date:
+                end_date = to_utc_naive(datetime.fromisoformat(end_date.replace('Z', '+00:00')))
+            else:
+                end_date = datetime.utcnow()
+            if start_date:
+                start_date = to_utc_naive(datetime.fromisoformat(start_date.replace('Z', '+00:00')))
+            else:
+                start_date = end_date - timedelta(days=30)
+            
+            granularity = request.args.get('granularity', 'day')
+            if granularity not in TREND_GRANULARITIES:
+                raise ValueError(f"粒度参数必须是{'、'.join(TREND_GRANULARITIES)}之一")
+            check_trend_buckets(start_date, end_date, granularity)
+            
+            device_ids = [device_id for device_id in request.args.get('device_ids', '').split(',')
+                          if device_id]
+            max_devices = current_app.config.get('OVERVIEW_MAX_DEVICES', 8)
+            if len(device_ids) > max_devices:
+                raise ValueError(f"device_ids 最多 {max_devices} 个")
+            
+            overview = statistics_service.get_overview(
+                user_id=current_user_id,
+                start_date=start_date,
+                end_date=end_date,
+                device_ids=device_ids,
+                granularity=granularity,
+                timezone=local_time_service.get_timezone(current_user_id)
+            )
+            
+            return success_response(
+                data=overview,
+                message="概览查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except QueryPoolBusy as e:
+            return error_response(
+                message="统计查询繁忙，请稍后重试",
+                details=str(e),
+                status_code=503
+            )
+        except QueryDeadlineExceeded as e:
+            return error_response(
+                message="概览查询超时",
+                details=str(e),
+                status_code=504
+            )
+        except Exception as e:
+            return error_response(
+                message="概览查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
 @statistics_ns.route('/distribution')
 class DistributionResource(Resource):
     """分布分析资源"""
@@ -255,12 +515,13 @@ class PatternsResource(Resource):
             else:
                 end_date = datetime.utcnow()
             
-            # 获取模式数据
+            # 获取模式数据 (按用户时区)
             patterns = statistics_service.get_glucose_patterns(
                 user_id=current_user_id,
                 start_date=start_date,
                 end_date=end_date,
-                device_id=device_id
+                device_id=device_id,
+                timezone=local_time_service.get_timezone(current_user_id)
             )
             
             return success_response(
@@ -280,3 +541,815 @@ class PatternsResource(Resource):
                 details=str(e),
                 status_code=500
             )
+
+
+@statistics_ns.route('/heatmap')
+class HeatmapResource(Resource):
+    """周×小时热力图资源"""
+    
+    @statistics_ns.doc('get_glucose_heatmap')
+    @jwt_required()
+    def get(self):
+        """
+        获取周×小时血糖热力图
+        按用户本地时间的星期与小时给出平均血糖与各水平占比
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            
+            # 获取查询参数
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            tz_name = (request.args.get('timezone')
+                       or local_time_service.get_timezone(current_user_id))
+            
+            # 解析日期参数
+            if start_date:
+                start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+            else:
+                start_date = datetime.utcnow() - timedelta(days=90)
+            
+            if end_date:
+                end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+            else:
+                end_date = datetime.utcnow()
+            
+            # 校验时区
+            parse_timezone(tz_name)
+            
+            # 获取热力图数据
+            heatmap = statistics_service.get_glucose_heatmap(
+                user_id=current_user_id,
+                start_date=start_date,
+                end_date=end_date,
+                device_id=request.args.get('device_id'),
+                timezone=tz_name
+            )
+            
+            return success_response(
+                data=heatmap,
+                message="热力图查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="热力图查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/time-of-day')
+class TimeOfDayResource(Resource):
+    """每日时段统计资源"""
+    
+    @statistics_ns.doc('get_time_of_day_statistics')
+    @jwt_required()
+    def get(self):
+        """
+        获取每日固定时段的统计摘要
+        例如最近90天每天本地时间 02:00-04:00 的血糖
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            
+            # 解析时段参数 (结束时刻小于开始时刻表示跨越午夜)
+            start_minute = parse_time_of_day(request.args.get('start_time'), 'start_time')
+            end_minute = parse_time_of_day(request.args.get('end_time'), 'end_time')
+            if start_minute == end_minute or start_minute == 24 * 60:
+                raise ValueError("start_time 与 end_time 不能相同，start_time 不能为 24:00")
+            
+            # 按用户本地日期计算窗口
+            days = request.args.get('days', TIME_OF_DAY_DEFAULT_DAYS, type=int)
+            if days < 1 or days > TIME_OF_DAY_MAX_DAYS:
+                raise ValueError(f"days 应在 1-{TIME_OF_DAY_MAX_DAYS} 之间")
+            
+            end_date = request.args.get('end_date')
+            if end_date:
+                end_day = datetime.strptime(end_date, '%Y-%m-%d').date()
+            else:
+                tz = parse_timezone(local_time_service.get_timezone(current_user_id))
+                end_day = datetime.now(tz).date()
+            start_day = end_day - timedelta(days=days - 1)
+            
+            statistics = statistics_service.get_time_of_day_statistics(
+                user_id=current_user_id,
+                start_day=start_day.isoformat(),
+                end_day=end_day.isoformat(),
+                start_minute=start_minute,
+                end_minute=end_minute % (24 * 60),
+                device_id=request.args.get('device_id')
+            )
+            # 修改时区后本地时间字段尚未重算时提示客户端
+            statistics = {
+                **statistics,
+                'local_time_pending': local_time_service.is_pending(current_user_id)
+            }
+            
+            return success_response(
+                data=statistics,
+                message="时段统计查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="时段统计查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/percentiles')
+class PercentilesResource(Resource):
+    """分位数资源"""
+    
+    @statistics_ns.doc('get_glucose_percentiles')
+    @jwt_required()
+    def get(self):
+        """
+        获取血糖分位数
+        长时间范围合并日汇总的分位数草图计算，误差不超过 error_bound
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            
+            # 获取查询参数
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            device_id = request.args.get('device_id')
+            percentiles = request.args.get('percentiles')
+            
+            # 解析百分位参数，如 "5,25,50,75,95"
+            if percentiles:
+                try:
+                    percentiles = [float(p) for p in percentiles.split(',') if p.strip()]
+                except ValueError:
+                    percentiles = []
+                if not percentiles or any(p < 0 or p > 100 for p in percentiles):
+                    return error_response(
+                        message="百分位参数无效",
+                        details="percentiles 应为 0-100 之间的数字，以逗号分隔",
+                        status_code=400
+                    )
+            else:
+                percentiles = None
+            
+            # 解析日期参数
+            if start_date:
+                start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+            else:
+                start_date = datetime.utcnow() - timedelta(days=30)
+            
+            if end_date:
+                end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+            else:
+                end_date = datetime.utcnow()
+            
+            # 获取分位数数据
+            result = statistics_service.get_glucose_percentiles(
+                user_id=current_user_id,
+                start_date=start_date,
+                end_date=end_date,
+                percentiles=percentiles,
+                device_id=device_id
+            )
+            
+            return success_response(
+                data=result,
+                message="分位数查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="日期格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="分位数查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/cache-stats')
+class CacheStatsResource(Resource):
+    """统计缓存状态资源"""
+    
+    @statistics_ns.doc('get_statistics_cache_stats')
+    @jwt_required()
+    def get(self):
+        """
+        获取统计结果缓存状态
+        包括命中、未命中、淘汰与失效次数，相同查询合并节省的执行次数，查询线程池与分析计算进程池的使用情况，
+        以及最近读数缓存的命中与内存占用
+        """
+        try:
+            stats_cache = get_stats_cache()
+            single_flight = get_single_flight()
+            query_pool = get_query_pool()
+            analytics_executor = get_analytics_executor()
+            reading_cache = get_reading_cache()
+            alert_index = get_alert_index()
+            
+            data = {'enabled': stats_cache is not None}
+            if stats_cache is not None:
+                data.update(stats_cache.get_stats())
+            if single_flight is not None:
+                data['single_flight'] = single_flight.get_stats()
+            if query_pool is not None:
+                data['query_pool'] = query_pool.get_stats()
+            if analytics_executor is not None:
+                data['analytics_executor'] = analytics_executor.get_stats()
+            if reading_cache is not None:
+                data['reading_cache'] = reading_cache.get_stats()
+            if alert_index is not None:
+                data['alert_index'] = alert_index.get_stats()
+            
+            return success_response(
+                data=data,
+                message="缓存状态查询成功"
+            )
+            
+        except Exception as e:
+            return error_response(
+                message="缓存状态查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/agp')
+class AGPResource(Resource):
+    """动态血糖图谱资源"""
+    
+    @statistics_ns.doc('get_glucose_agp')
+    @jwt_required()
+    def get(self):
+        """
+        获取动态血糖图谱 (AGP)
+        按一天中的15分钟时段给出 5/25/50/75/95 百分位曲线
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            
+            # 解析窗口参数 (按用户时区的本地日期)
+            tz_name = local_time_service.get_timezone(current_user_id)
+            start_date, end_date = parse_day_window(
+                request.args.get('end_date'), request.args.get('days'), parse_timezone(tz_name)
+            )
+            
+            # 获取AGP数据
+            agp = statistics_service.get_glucose_agp(
+                user_id=current_user_id,
+                start_date=start_date,
+                end_date=end_date,
+                device_id=request.args.get('device_id'),
+                timezone=tz_name
+            )
+            
+            return success_response(
+                data=agp,
+                message="AGP查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except QueryDeadlineExceeded as e:
+            return error_response(
+                message="AGP计算超时",
+                details=str(e),
+                status_code=504
+            )
+        except Exception as e:
+            return error_response(
+                message="AGP查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/cgm-metrics')
+class CGMMetricsResource(Resource):
+    """CGM核心指标资源"""
+    
+    @statistics_ns.doc('get_cgm_metrics')
+    @jwt_required()
+    def get(self):
+        """
+        获取CGM国际共识核心指标
+        包括按时间加权的TIR/TBR/TAR、GMI、CV与传感器佩戴时间，使用用户自定义目标范围
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            
+            # 获取查询参数
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            device_id = request.args.get('device_id')
+            
+            # 解析日期参数 (默认最近14天)
+            if start_date:
+                start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+            else:
+                start_date = datetime.utcnow() - timedelta(days=14)
+            
+            if end_date:
+                end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+            else:
+                end_date = datetime.utcnow()
+            
+            # 获取CGM指标
+            metrics = statistics_service.get_cgm_metrics(
+                user_id=current_user_id,
+                start_date=start_date,
+                end_date=end_date,
+                device_id=device_id,
+                targets=user_service.get_glucose_targets(current_user_id)
+            )
+            
+            return success_response(
+                data=metrics,
+                message="CGM指标查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="日期格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="CGM指标查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/compare')
+class CompareResource(Resource):
+    """时间段对比资源"""
+    
+    @statistics_ns.doc('compare_periods')
+    @statistics_ns.expect(compare_model)
+    @jwt_required()
+    @validate_json
+    def post(self):
+        """
+        对比多个时间段的统计摘要、TIR 与血糖分布 (如最近14天与之前14天)
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            data = request.get_json()
+            
+            # 解析时间段参数
+            periods, baseline = parse_compare_periods(data.get('periods'), data.get('baseline'))
+            
+            # 对比各时间段
+            result = statistics_service.compare_periods(
+                user_id=current_user_id,
+                periods=periods,
+                device_id=data.get('device_id'),
+                targets=user_service.get_glucose_targets(current_user_id),
+                baseline=baseline
+            )
+            
+            return success_response(
+                data=result,
+                message="时间段对比成功"
+            )
+            
+        except (AttributeError, TypeError, ValueError) as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="时间段对比失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/agp/batch')
+class AGPBatchResource(Resource):
+    """批量动态血糖图谱资源"""
+    
+    @statistics_ns.doc('get_glucose_agp_batch')
+    @statistics_ns.expect(agp_batch_model)
+    @jwt_required()
+    @roles_required(ROLE_CLINICIAN, ROLE_ADMIN)
+    @validate_json
+    def post(self):
+        """
+        批量获取多个患者的动态血糖图谱 (患者列表视图，仅限医生与管理员)
+        """
+        try:
+            data = request.get_json()
+            user_ids = data.get('user_ids')
+            
+            max_users = current_app.config.get('AGP_BATCH_MAX_USERS', 500)
+            if (not isinstance(user_ids, list) or not user_ids
+                    or not all(isinstance(user_id, str) for user_id in user_ids)):
+                return error_response(
+                    message="user_ids 应为非空的用户ID列表",
+                    status_code=400
+                )
+            if len(user_ids) > max_users:
+                return error_response(
+                    message=f"单次最多查询 {max_users} 个用户",
+                    status_code=400
+                )
+            
+            # 解析窗口参数 (按各用户时区的本地日期)
+            windows, timezones = user_day_windows(user_ids, data.get('end_date'), data.get('days'))
+            
+            # 获取AGP数据
+            results = statistics_service.get_glucose_agp_batch(
+                windows=windows,
+                timezones=timezones
+            )
+            
+            return success_response(
+                data={'results': results},
+                message="AGP批量查询成功"
+            )
+            
+        except (TypeError, ValueError) as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except QueryDeadlineExceeded as e:
+            return error_response(
+                message="AGP计算超时",
+                details=str(e),
+                status_code=504
+            )
+        except Exception as e:
+            return error_response(
+                message="AGP批量查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/variability')
+class VariabilityResource(Resource):
+    """血糖变异性资源"""
+    
+    @statistics_ns.doc('get_glycemic_variability')
+    @jwt_required()
+    def get(self):
+        """
+        获取血糖变异性指标
+        包括 MAGE、CONGA-n、MODD 与低/高血糖风险指数 (LBGI/HBGI)
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            
+            # 解析窗口参数 (按用户时区的本地日期)
+            start_date, end_date = parse_day_window(
+                request.args.get('end_date'), request.args.get('days'),
+                parse_timezone(local_time_service.get_timezone(current_user_id))
+            )
+            conga_hours = parse_conga_hours(request.args.get('conga_hours'))
+            
+            # 获取变异性指标
+            result = statistics_service.get_glycemic_variability(
+                user_id=current_user_id,
+                start_date=start_date,
+                end_date=end_date,
+                device_id=request.args.get('device_id'),
+                conga_hours=conga_hours
+            )
+            
+            return success_response(
+                data=result,
+                message="变异性指标查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except QueryDeadlineExceeded as e:
+            return error_response(
+                message="变异性指标计算超时",
+                details=str(e),
+                status_code=504
+            )
+        except Exception as e:
+            return error_response(
+                message="变异性指标查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/variability/batch')
+class VariabilityBatchResource(Resource):
+    """批量血糖变异性资源"""
+    
+    @statistics_ns.doc('get_glycemic_variability_batch')
+    @statistics_ns.expect(variability_batch_model)
+    @jwt_required()
+    @roles_required(ROLE_CLINICIAN, ROLE_ADMIN)
+    @validate_json
+    def post(self):
+        """
+        批量获取多个用户的血糖变异性指标 (研究队列，仅限医生与管理员)
+        """
+        try:
+            data = request.get_json()
+            user_ids = data.get('user_ids')
+            
+            max_users = current_app.config.get('VARIABILITY_BATCH_MAX_USERS', 200)
+            if (not isinstance(user_ids, list) or not user_ids
+                    or not all(isinstance(user_id, str) for user_id in user_ids)):
+                return error_response(
+                    message="user_ids 应为非空的用户ID列表",
+                    status_code=400
+                )
+            if len(user_ids) > max_users:
+                return error_response(
+                    message=f"单次最多查询 {max_users} 个用户",
+                    status_code=400
+                )
+            
+            # 解析窗口参数 (按各用户时区的本地日期)
+            windows, _ = user_day_windows(user_ids, data.get('end_date'), data.get('days'))
+            conga_hours = parse_conga_hours(data.get('conga_hours'))
+            
+            # 获取变异性指标
+            results = statistics_service.get_glycemic_variability_batch(
+                windows=windows,
+                conga_hours=conga_hours
+            )
+            
+            return success_response(
+                data={'results': results},
+                message="变异性指标批量查询成功"
+            )
+            
+        except (TypeError, ValueError) as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except QueryDeadlineExceeded as e:
+            return error_response(
+                message="变异性指标计算超时",
+                details=str(e),
+                status_code=504
+            )
+        except Exception as e:
+            return error_response(
+                message="变异性指标批量查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/windowed-series')
+class WindowedSeriesResource(Resource):
+    """滚动窗口序列资源"""
+    
+    @statistics_ns.doc('get_windowed_series')
+    @jwt_required()
+    def get(self):
+        """
+        获取带滚动窗口指标的血糖序列
+        每条读数附带 1/3/24 小时滚动均值、变化率与趋势箭头，format=columnar 时按列输出
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            
+            # 获取查询参数
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            device_id = request.args.get('device_id')
+            output_format = request.args.get('format', 'records')
+            
+            if output_format not in WINDOWED_SERIES_FORMATS:
+                return error_response(
+                    message="输出格式无效",
+                    details=f"format 应为 {' / '.join(WINDOWED_SERIES_FORMATS)}",
+                    status_code=400
+                )
+            
+            # 解析日期参数 (默认最近24小时，统一为朴素UTC时间)
+            if end_date:
+                end_date = to_utc_naive(datetime.fromisoformat(end_date.replace('Z', '+00:00')))
+            else:
+                end_date = datetime.utcnow()
+            
+            if start_date:
+                start_date = to_utc_naive(datetime.fromisoformat(start_date.replace('Z', '+00:00')))
+            else:
+                start_date = end_date - timedelta(days=1)
+            
+            max_days = current_app.config.get('WINDOWED_SERIES_MAX_DAYS', 31)
+            if end_date - start_date > timedelta(days=max_days):
+                raise ValueError(f"查询范围不能超过 {max_days} 天")
+            
+            # 获取滚动窗口序列
+            result = statistics_service.get_windowed_series(
+                user_id=current_user_id,
+                start_date=start_date,
+                end_date=end_date,
+                device_id=device_id,
+                output_format=output_format
+            )
+            
+            return success_response(
+                data=result,
+                message="滚动窗口序列查询成功"
+            )
+            
+        except (TypeError, ValueError) as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except QueryDeadlineExceeded as e:
+            return error_response(
+                message="滚动窗口计算超时",
+                details=str(e),
+                status_code=504
+            )
+        except Exception as e:
+            return error_response(
+                message="滚动窗口序列查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/episodes')
+class EpisodesResource(Resource):
+    """低/高血糖事件资源"""
+    
+    @statistics_ns.doc('get_glucose_episodes')
+    @jwt_required()
+    def get(self):
+        """
+        获取低/高血糖事件
+        事件在写入记录时增量检测，查询直接读取事件集合
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            
+            # 获取查询参数
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            device_id = request.args.get('device_id')
+            kind = request.args.get('kind')
+            min_level = int(request.args.get('min_level', 1))
+            
+            if kind and kind not in EPISODE_RULES:
+                raise ValueError(f"kind 应为 {' / '.join(EPISODE_RULES)}")
+            if min_level not in (1, 2):
+                raise ValueError("min_level 应为 1 或 2")
+            
+            # 解析日期参数 (默认最近30天)
+            if start_date:
+                start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+            else:
+                start_date = datetime.utcnow() - timedelta(days=30)
+            
+            if end_date:
+                end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+            else:
+                end_date = datetime.utcnow()
+            
+            # 查询事件
+            result = event_service.get_episodes(
+                user_id=current_user_id,
+                start_date=start_date,
+                end_date=end_date,
+                kind=kind,
+                min_level=min_level,
+                device_id=device_id
+            )
+            
+            return success_response(
+                data=result,
+                message="血糖事件查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="血糖事件查询失败",
+                details=str(e),
+                status_code=500
+            )
+
+
+@statistics_ns.route('/reference-percentiles')
+class ReferencePercentilesResource(Resource):
+    """人群参考百分位资源"""
+    
+    @statistics_ns.doc('get_reference_percentiles')
+    @jwt_required()
+    def get(self):
+        """
+        获取当前用户的 TIR 与平均血糖在同年龄段、同性别人群中的百分位
+        默认使用与参考分布相同窗口 (最近 REFERENCE_WINDOW_DAYS 个UTC整天) 的统计摘要，也可通过 tir/mean_glucose 参数指定指标值
+        """
+        try:
+            # 获取当前用户身份
+            current_user_id = get_jwt_identity()
+            user = user_service.get_user_by_id(current_user_id)
+            if not user:
+                return error_response(
+                    message="用户不存在",
+                    status_code=404
+                )
+            
+            # 解析指标参数，未指定时按参考分布的统计窗口读取统计摘要
+            metrics = {
+                name: float(request.args[name]) if request.args.get(name) else None
+                for name in REFERENCE_METRICS
+            }
+            if any(value is None for value in metrics.values()):
+                end_date = floor_day(datetime.utcnow())
+                start_date = end_date - timedelta(
+                    days=current_app.config.get('REFERENCE_WINDOW_DAYS', 14)
+                )
+                # 与参考分布的窗口一致：今天UTC零点不含
+                stats = statistics_service.get_glucose_statistics(
+                    user_id=current_user_id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    end_exclusive=True
+                )
+                if metrics['tir'] is None:
+                    metrics['tir'] = stats.get('normal_percentage')
+                if metrics['mean_glucose'] is None:
+                    metrics['mean_glucose'] = stats.get('avg_glucose')
+            
+            result = reference_service.lookup(user.age, user.gender, metrics)
+            if result is None:
+                return error_response(
+                    message="人群参考分布尚未生成",
+                    status_code=404
+                )
+            
+            return success_response(
+                data=result,
+                message="参考百分位查询成功"
+            )
+            
+        except ValueError as e:
+            return error_response(
+                message="参数格式错误",
+                details=str(e),
+                status_code=400
+            )
+        except Exception as e:
+            return error_response(
+                message="参考百分位查询失败",
+                details=str(e),
+                status_code=500
+            )
@@ -12,6 +12,7 @@ from app.models.user import (
     UserRegistrationSchema,
     UserResponseSchema
 )
+from app.services.snapshot_service import SnapshotService
 from app.services.user_service import UserService
 from app.utils.decorators import validate_json
 from app.utils.responses import success_response, error_response
@@ -27,7 +28,9 @@ user_registration_model = users_ns.model('UserRegistration', {
     'full_name': fields.String(description='全名'),
     'age': fields.Integer(description='年龄'),
     'gender': fields.String(description='性别'),
-    'phone': fields.String(description='电话')
+    'phone': fields.String(description='电话'),
+    'glucose_targets': fields.Raw(description='血糖目标范围 (very_low/low/high/very_high，mmol/L)'),
+    'timezone': fields.String(description='IANA时区名称 (如 Asia/Shanghai，默认UTC)')
 })
 
 user_output_model = users_ns.model('UserOutput', {
@@ -39,12 +42,16 @@ user_output_model = users_ns.model('UserOutput', {
     'gender': fields.String(description='性别'),
     'phone': fields.String(description='电话'),
     'is_active': fields.Boolean(description='是否激活'),
+    'glucose_targets': fields.Raw(description='血糖目标范围'),
+    'timezone': fields.String(description='时区'),
+    'role': fields.String(description='角色 (patient/clinician/admin)'),
     'created_at': fields.String(description='创建时间'),
     'updated_at': fields.String(description='更新时间')
 })
 
 # 初始化服务和模式
 user_service = UserService()
+snapshot_service = SnapshotService()
 user_registration_schema = UserRegistrationSchema()
 user_response_schema = UserResponseSchema()
 
@@ -147,6 +154,33 @@ class UserListResource(Resource):
             )
 
 
+@users_ns.route('/me/snapshot')
+class UserSnapshotResource(Resource):
+    """当前用户首页快照资源"""
+    
+    @users_ns.doc('get_user_snapshot')
+    @jwt_required()
+    def get(self):
+        """
+        获取首页快照
+        最新读数、趋势箭头、今天的TIR、近几天平均血糖与设备状态，一次读取
+        """
+        try:
+            snapshot = snapshot_service.get_snapshot(get_jwt_identity())
+            
+            return success_response(
+                data=snapshot,
+                message="查询成功"
+            )
+            
+        except Exception as e:
+            return error_response(
+                message="查询首页快照失败",
+                details=str(e),
+                status_code=500
+            )
+
+
 @users_ns.route('/<string:user_id>')
 class UserResource(Resource):
     """单个用户资源"""
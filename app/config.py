@@ -37,6 +37,119 @@ class Config:
     MIN_GLUCOSE_VALUE = 0.1   # mmol/L
     SUPPORTED_UNITS = ['mmol/L', 'mg/dL']
     
+    # 统计汇总配置
+    ROLLUPS_ENABLED = True
+    ROLLUP_MIN_RANGE_DAYS = 7  # 时间范围达到该天数时读取汇总数据
+    STATS_DEBUG_HEADERS = False  # 输出 X-Stats-Tiers 调试响应头
+    
+    # 统计结果缓存配置
+    STATS_CACHE_BACKEND = os.environ.get('STATS_CACHE_BACKEND', 'memory')  # memory / redis / none
+    STATS_CACHE_TTL = 300  # 秒
+    STATS_CACHE_MAX_ENTRIES = 2048
+    STATS_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+    STATS_CACHE_RANGE_QUANTUM = 60  # 查询时间范围量化粒度 (秒)
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    
+    # 相同统计查询合并配置 (single-flight)
+    STATS_SINGLE_FLIGHT_ENABLED = True
+    STATS_SINGLE_FLIGHT_TIMEOUT = 30  # 等待相同查询结果的超时时间 (秒)
+    
+    # 组合视图中独立统计查询的并发执行 (有界线程池，0 表示按顺序执行)
+    STATS_QUERY_POOL_WORKERS = 8
+    STATS_QUERY_POOL_MAX_PENDING = 64  # 排队中的查询数上限，超过时返回503
+    STATS_QUERY_TIMEOUT = 10  # 组合查询的截止时间 (秒)
+    OVERVIEW_MAX_DEVICES = 8
+    
+    # CPU密集分析计算 (百分位、变异性、滚动窗口) 的进程池 (0 表示在请求线程中计算)
+    ANALYTICS_PROCESS_WORKERS = 2
+    ANALYTICS_INLINE_MAX_POINTS = 20000  # 数组元素总数不超过该值时在请求线程中计算
+    ANALYTICS_PROCESS_TIMEOUT = 60  # 等待子进程计算结果的超时时间 (秒)
+    
+    # 后台任务线程池 (0 表示在请求线程中执行)
+    JOB_WORKERS = 2  # 同时运行的任务数
+    JOB_PARTITION_WORKERS = 4  # 任务分区计算线程数
+    
+    # 研究队列统计
+    COHORT_PARTITION_SIZE = 200  # 每个分区的用户数
+    COHORT_MIN_READINGS = 288  # 计入群体统计的用户最少读数
+    COHORT_SYNC_MAX_USERS = 500  # 同步接口的最大成员数，更大的队列使用后台任务
+    COHORT_MAX_USER_IDS = 10000  # 按用户ID列表定义队列时的最大用户数
+    
+    # 患者名单风险排序
+    ROSTER_MAX_USERS = 2000  # 单次排序的最大用户数
+    ROSTER_MAX_PAGE_SIZE = 200
+    ROSTER_WINDOW_DAYS = 14  # TIR/TBR 统计天数 (含今天)
+    ROSTER_EPISODE_DAYS = 7  # 计入最近低血糖事件的天数
+    ROSTER_RISK_WEIGHTS = {  # 风险组成项的默认权重 (请求中可覆盖)
+        'tbr': 3.0,
+        'tir': 2.0,
+        'hypo_episodes': 2.0,
+        'latest_reading': 2.0,
+        'sync_gap': 1.0
+    }
+    
+    # 人群参考分布 (flask build-references 定时生成)
+    REFERENCE_WINDOW_DAYS = 14  # 统计窗口天数
+    REFERENCE_MIN_USERS = 20  # 分组人数不足时回退到更粗的分组
+    REFERENCE_CACHE_TTL = 300  # 进程内缓存时间 (秒)
+    
+    # 批量AGP查询的最大用户数
+    AGP_BATCH_MAX_USERS = 500
+    
+    # 批量变异性指标查询的最大用户数
+    VARIABILITY_BATCH_MAX_USERS = 200
+    
+    # 时间段对比的最大时间段数
+    COMPARE_MAX_PERIODS = 12
+    
+    # CGM指标时间加权配置
+    CGM_EXPECTED_INTERVAL_MINUTES = 5  # 传感器读数间隔
+    CGM_MAX_GAP_MINUTES = 15  # 单个读数最多代表的时长，超出部分视为数据缺失
+    
+    # 写入血糖记录时增量检测低/高血糖事件
+    EVENTS_ENABLED = True
+    
+    # 写入血糖记录与设备状态变化时维护用户首页快照 (user_snapshots)
+    SNAPSHOTS_ENABLED = True
+    SNAPSHOT_AVERAGE_DAYS = 7  # 首页平均血糖的天数 (UTC整天，含今天)
+    
+    # 最近读数缓存 (进程内，READING_CACHE_MAX_USERS 为0时关闭)
+    READING_CACHE_MAX_USERS = 10000
+    READING_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 估计内存上限，超出时淘汰最久未访问的用户
+    READING_CACHE_HOURS = 3  # 每位用户缓存读数的时长
+    READING_CACHE_MAX_POINTS = 2048  # 每位用户最多缓存的读数条数
+    READING_CACHE_TTL = None  # 用户数据加载后的有效时间 (秒)，多进程部署时设置
+    
+    # 写入时评估的血糖告警 (进程内规则索引)
+    ALERTS_ENABLED = True
+    ALERT_MAX_RULES_PER_USER = 20
+    ALERT_INDEX_MAX_USERS = 100000  # 规则索引的最大用户数，超出时淘汰最久没有写入的用户
+    ALERT_RULES_TTL = 60  # 规则加载后的有效时间 (秒)，其他进程修改的规则在该时间内生效
+    ALERT_RATE_MINUTES = 15  # 速率规则计算变化速率的分钟数
+    ALERT_RENOTIFY_MINUTES = 30  # 未确认告警的重复通知间隔
+    ALERT_MAX_DELAY_MINUTES = 15  # 读数时间早于该分钟数之前 (补传的历史数据) 不评估
+    
+    # 短时血糖预测 (预测低血糖告警规则与 flask backtest-forecast)
+    FORECAST_HORIZON_MINUTES = 30  # 预测时长
+    FORECAST_HISTORY_MINUTES = 60  # 拟合使用的最近读数时长
+    FORECAST_HALF_LIFE_MINUTES = 20  # 读数权重的半衰期
+    FORECAST_MIN_POINTS = 4  # 拟合最少读数条数
+    
+    # 滚动窗口序列配置
+    STATS_WINDOW_FUNCTIONS_ENABLED = True  # 使用 $setWindowFields (需 MongoDB 5.0+)
+    WINDOWED_SERIES_MAX_DAYS = 31
+    
+    # 分钟/小时级趋势查询的最大时间桶数 (约一年的5分钟桶)
+    TREND_MAX_BUCKETS = 110000
+    
+    # 设备数据完整性日汇总：各设备类型每天预期读数与缺口阈值 (分钟，None 表示不分析缺口)
+    COMPLETENESS_ENABLED = True
+    DEVICE_COMPLETENESS_PROFILES = {
+        'cgm': {'expected_per_day': 288, 'gap_minutes': 30},
+        'glucose_meter': {'expected_per_day': 4, 'gap_minutes': None}
+    }
+    COMPLETENESS_DUPLICATE_SECONDS = 30  # 间隔不超过该值的读数视为重复
+    
     # 文件上传配置
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     UPLOAD_FOLDER = 'uploads'
@@ -58,6 +171,9 @@ class DevelopmentConfig(Config):
 
     # 开发环境日志
     LOG_LEVEL = 'DEBUG'
+    
+    # 开发环境输出统计调试响应头
+    STATS_DEBUG_HEADERS = True
 
 
 class TestingConfig(Config):
@@ -74,6 +190,19 @@ class TestingConfig(Config):
 
     # 禁用CSRF保护
     WTF_CSRF_ENABLED = False
+    
+    # 测试环境输出统计调试响应头
+    STATS_DEBUG_HEADERS = True
+    
+    # 测试环境使用进程内缓存
+    STATS_CACHE_BACKEND = 'memory'
+    
+    # 测试环境使用向量化实现计算滚动窗口
+    STATS_WINDOW_FUNCTIONS_ENABLED = False
+    
+    # 测试环境在请求线程中计算 (不启动子进程)，后台任务在请求线程中执行
+    ANALYTICS_PROCESS_WORKERS = 0
+    JOB_WORKERS = 0
 
 
 class ProductionConfig(Config):
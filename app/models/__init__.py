@@ -6,5 +6,6 @@ Data Models Module
 from .glucose import GlucoseRecord
 from .user import User
 from .device import Device
+from .alert import AlertRule
 
-__all__ = ['GlucoseRecord', 'User', 'Device']
+__all__ = ['GlucoseRecord', 'User', 'Device', 'AlertRule']
@@ -0,0 +1,167 @@
+"""
+血糖告警规则数据模型
+Glucose Alert Rule Data Model
+"""
+
+from datetime import datetime
+from typing import Optional, Dict, Any
+from bson import ObjectId
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError
+
+
+# 规则类型：阈值 (mmol/L)、变化速率 (mmol/L/分钟，按绝对值) 与预测值 (mmol/L，预测低血糖)
+RULE_THRESHOLD = 'threshold'
+RULE_RATE = 'rate'
+RULE_FORECAST = 'forecast'
+
+# 各规则类型允许的条件
+RULE_CONDITIONS = {
+    RULE_THRESHOLD: ('below', 'above'),
+    RULE_RATE: ('falling', 'rising'),
+    RULE_FORECAST: ('below',)
+}
+
+ALERT_SEVERITIES = ('urgent', 'warning', 'info')
+
+
+class AlertRule:
+    """告警规则模型"""
+
+    def __init__(self, user_id: str, name: str, rule_type: str, condition: str,
+                 value: float, duration_minutes: int = 0, severity: str = 'warning',
+                 device_id: Optional[str] = None, enabled: bool = True,
+                 snoozed_until: Optional[datetime] = None, _id: Optional[ObjectId] = None,
+                 created_at: Optional[datetime] = None, updated_at: Optional[datetime] = None):
+        """
+        初始化告警规则
+
+        Args:
+            user_id: 用户ID
+            name: 规则名称
+            rule_type: 规则类型 (threshold/rate/forecast)
+            condition: 条件 (threshold: below/above，rate: falling/rising，forecast: below)
+            value: 阈值或预测值阈值 (mmol/L)，或变化速率 (mmol/L/分钟，绝对值)
+            duration_minutes: 条件持续满足的分钟数 (0 表示单个读数即触发)
+            severity: 严重程度 (urgent/warning/info)
+            device_id: 只评估该设备的读数 (可选，默认全部设备)
+            enabled: 是否启用
+            snoozed_until: 暂停通知至该时间 (可选)
+            _id: MongoDB文档ID (可选)
+            created_at: 创建时间 (可选)
+            updated_at: 更新时间 (可选)
+        """
+        self._id = _id
+        self.user_id = user_id
+        self.name = name
+        self.rule_type = rule_type
+        self.condition = condition
+        self.value = value
+        self.duration_minutes = duration_minutes
+        self.severity = severity
+        self.device_id = device_id
+        self.enabled = enabled
+        self.snoozed_until = snoozed_until
+        self.created_at = created_at or datetime.utcnow()
+        self.updated_at = updated_at or datetime.utcnow()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        return {
+            '_id': self._id,
+            'user_id': self.user_id,
+            'name': self.name,
+            'rule_type': self.rule_type,
+            'condition': self.condition,
+            'value': self.value,
+            'duration_minutes': self.duration_minutes,
+            'severity': self.severity,
+            'device_id': self.device_id,
+            'enabled': self.enabled,
+            'snoozed_until': self.snoozed_until,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AlertRule':
+        """从字典创建实例"""
+        return cls(
+            _id=data.get('_id'),
+            user_id=data['user_id'],
+            name=data['name'],
+            rule_type=data['rule_type'],
+            condition=data['condition'],
+            value=data['value'],
+            duration_minutes=data.get('duration_minutes', 0),
+            severity=data.get('severity', 'warning'),
+            device_id=data.get('device_id'),
+            enabled=data.get('enabled', True),
+            snoozed_until=data.get('snoozed_until'),
+            created_at=data.get('created_at'),
+            updated_at=data.get('updated_at')
+        )
+
+
+class AlertRuleSchema(Schema):
+    """告警规则验证模式"""
+
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=100))
+    rule_type = fields.Str(required=True, validate=validate.OneOf(list(RULE_CONDITIONS)))
+    condition = fields.Str(required=True)
+    value = fields.Float(required=True, validate=validate.Range(min=0, min_inclusive=False, max=50))
+    duration_minutes = fields.Int(load_default=0, validate=validate.Range(min=0, max=240))
+    severity = fields.Str(load_default='warning', validate=validate.OneOf(ALERT_SEVERITIES))
+    device_id = fields.Str(load_default=None, allow_none=True, validate=validate.Length(min=1, max=100))
+    enabled = fields.Bool(load_default=True)
+
+    @validates_schema
+    def validate_condition(self, data, **kwargs):
+        """验证条件与规则类型匹配"""
+        conditions = RULE_CONDITIONS.get(data.get('rule_type'), ())
+        if data.get('condition') not in conditions:
+            raise ValidationError(f"条件应为 {'/'.join(conditions)} 之一", 'condition')
+
+
+class AlertRuleResponseSchema(Schema):
+    """告警规则响应模式"""
+
+    id = fields.Str(attribute='_id', dump_only=True)
+    user_id = fields.Str()
+    name = fields.Str()
+    rule_type = fields.Str()
+    condition = fields.Str()
+    value = fields.Float()
+    duration_minutes = fields.Int()
+    severity = fields.Str()
+    device_id = fields.Str(allow_none=True)
+    enabled = fields.Bool()
+    snoozed_until = fields.DateTime(format='iso', allow_none=True)
+    created_at = fields.DateTime(format='iso')
+    updated_at = fields.DateTime(format='iso')
+
+
+class AlertResponseSchema(Schema):
+    """告警响应模式"""
+
+    id = fields.Str(attribute='_id', dump_only=True)
+    user_id = fields.Str()
+    rule_id = fields.Str()
+    rule_name = fields.Str()
+    rule_type = fields.Str()
+    condition = fields.Str()
+    threshold = fields.Float()
+    severity = fields.Str()
+    device_id = fields.Str(allow_none=True)
+    value = fields.Float()
+    rate_per_minute = fields.Float(allow_none=True)
+    forecast_value = fields.Float(allow_none=True)
+    extreme_value = fields.Float(allow_none=True)
+    started_at = fields.DateTime(format='iso')
+    triggered_at = fields.DateTime(format='iso')
+    last_reading_at = fields.DateTime(format='iso')
+    active = fields.Bool()
+    resolved_at = fields.DateTime(format='iso', allow_none=True)
+    acknowledged_at = fields.DateTime(format='iso', allow_none=True)
+    snoozed_until = fields.DateTime(format='iso', allow_none=True)
+    notified_at = fields.DateTime(format='iso', allow_none=True)
+    notify_count = fields.Int()
@@ -6,9 +6,18 @@ User Data Model
 from datetime import datetime
 from typing import Optional, Dict, Any
 from bson import ObjectId
-from marshmallow import Schema, fields, validate, post_load
+from marshmallow import Schema, fields, validate, post_load, validates_schema, ValidationError
 import bcrypt
 
+from app.services.analytics_core import DEFAULT_GLUCOSE_TARGETS
+from app.utils.time_utils import parse_timezone
+
+# 用户角色：患者只能访问本人数据，医生与管理员可以访问多个用户的汇总数据 (批量/队列接口)
+ROLE_PATIENT = 'patient'
+ROLE_CLINICIAN = 'clinician'
+ROLE_ADMIN = 'admin'
+USER_ROLES = [ROLE_PATIENT, ROLE_CLINICIAN, ROLE_ADMIN]
+
 
 class User:
     """用户模型"""
@@ -17,7 +26,9 @@ class User:
                  full_name: Optional[str] = None, age: Optional[int] = None,
                  gender: Optional[str] = None, phone: Optional[str] = None,
                  is_active: bool = True, _id: Optional[ObjectId] = None,
-                 created_at: Optional[datetime] = None, updated_at: Optional[datetime] = None):
+                 created_at: Optional[datetime] = None, updated_at: Optional[datetime] = None,
+                 glucose_targets: Optional[Dict[str, float]] = None,
+                 timezone: Optional[str] = None, role: str = ROLE_PATIENT):
         """
         初始化用户
         
@@ -33,6 +44,9 @@ class User:
             _id: MongoDB文档ID (可选)
             created_at: 创建时间 (可选)
             updated_at: 更新时间 (可选)
+            glucose_targets: 血糖目标范围 (可选，very_low/low/high/very_high，单位mmol/L)
+            timezone: IANA时区名称 (可选，未设置时按UTC)
+            role: 用户角色 (patient/clinician/admin，默认patient)
         """
         self._id = _id
         self.username = username
@@ -45,6 +59,9 @@ class User:
         self.is_active = is_active
         self.created_at = created_at or datetime.utcnow()
         self.updated_at = updated_at or datetime.utcnow()
+        self.glucose_targets = glucose_targets
+        self.timezone = timezone
+        self.role = role
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
@@ -59,7 +76,10 @@ class User:
             'phone': self.phone,
             'is_active': self.is_active,
             'created_at': self.created_at,
-            'updated_at': self.updated_at
+            'updated_at': self.updated_at,
+            'glucose_targets': self.glucose_targets,
+            'timezone': self.timezone,
+            'role': self.role
         }
     
     @classmethod
@@ -76,7 +96,10 @@ class User:
             phone=data.get('phone'),
             is_active=data.get('is_active', True),
             created_at=data.get('created_at'),
-            updated_at=data.get('updated_at')
+            updated_at=data.get('updated_at'),
+            glucose_targets=data.get('glucose_targets'),
+            timezone=data.get('timezone'),
+            role=data.get('role', ROLE_PATIENT)
         )
     
     @staticmethod
@@ -89,6 +112,31 @@ class User:
         return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
 
 
+class GlucoseTargetsSchema(Schema):
+    """血糖目标范围验证模式 (mmol/L)"""
+    
+    very_low = fields.Float(validate=validate.Range(min=1.0, max=50.0))
+    low = fields.Float(validate=validate.Range(min=1.0, max=50.0))
+    high = fields.Float(validate=validate.Range(min=1.0, max=50.0))
+    very_high = fields.Float(validate=validate.Range(min=1.0, max=50.0))
+    
+    @validates_schema
+    def validate_order(self, data, **kwargs):
+        """验证阈值递增 (未提供的阈值按默认值参与比较，与统计时的合并方式一致)"""
+        merged = {**DEFAULT_GLUCOSE_TARGETS, **data}
+        thresholds = [merged[key] for key in ('very_low', 'low', 'high', 'very_high')]
+        if any(a >= b for a, b in zip(thresholds, thresholds[1:])):
+            raise ValidationError('目标范围阈值须满足 very_low < low < high < very_high')
+
+
+def validate_timezone(value: str) -> None:
+    """验证IANA时区名称"""
+    try:
+        parse_timezone(value)
+    except ValueError as e:
+        raise ValidationError(str(e))
+
+
 class UserRegistrationSchema(Schema):
     """用户注册验证模式"""
     
@@ -108,6 +156,8 @@ class UserRegistrationSchema(Schema):
         allow_none=True
     )
     phone = fields.Str(validate=validate.Length(max=20), allow_none=True)
+    glucose_targets = fields.Nested(GlucoseTargetsSchema, allow_none=True)
+    timezone = fields.Str(validate=validate_timezone, allow_none=True)
 
 
 class UserLoginSchema(Schema):
@@ -128,5 +178,8 @@ class UserResponseSchema(Schema):
     gender = fields.Str(allow_none=True)
     phone = fields.Str(allow_none=True)
     is_active = fields.Bool()
+    glucose_targets = fields.Dict(allow_none=True)
+    timezone = fields.Str(allow_none=True)
+    role = fields.Str()
     created_at = fields.DateTime(format='iso')
     updated_at = fields.DateTime(format='iso')
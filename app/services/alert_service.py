@@ -0,0 +1,594 @@
+"""
+血糖告警服务
+Glucose Alert Service
+
+用户的告警规则 (alert_rules) 在写入血糖记录时评估 (见 GlucoseService._sync_derived_data)：
+- 阈值规则：读数低于/高于阈值；速率规则：同一设备最近 ALERT_RATE_MINUTES 分钟读数的最小二乘斜率
+  下降/上升超过阈值；预测规则：FORECAST_HORIZON_MINUTES 分钟后的预测值 (app.services.glucose_forecast)
+  低于阈值 (预测低血糖)
+- 条件在同一设备上持续满足 duration_minutes (读数间隔不超过 CGM_MAX_GAP_MINUTES) 后触发，不满足时解除
+- 评估只使用进程内的规则索引 (app.utils.alert_index)，触发、重复通知检查与解除时才访问数据库；
+  速率与预测规则使用进程内保存的设备最近读数，多进程部署时需按用户ID粘性路由写入请求
+- 每条规则每个设备最多一条未解除的告警 (alerts 集合唯一索引)，持续满足与重复触发合并到同一告警
+- 首次触发时通知，未确认的告警每 ALERT_RENOTIFY_MINUTES 分钟重复通知；
+  已确认的告警不再通知，规则或告警暂停 (snooze) 期间不通知
+- 读数时间早于 ALERT_MAX_DELAY_MINUTES 分钟之前 (补传的历史数据) 不评估
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from bson import ObjectId
+from flask import current_app
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app import mongo
+from app.models.alert import RULE_FORECAST, RULE_RATE
+from app.services.analytics_core import EPOCH
+from app.services.glucose_forecast import forecast_latest
+from app.utils.alert_index import AlertRuleIndex, RuleState, UserAlerts, get_alert_index
+from app.utils.reading_cache import get_reading_cache
+
+
+ACTION_FIRE = 'fire'
+ACTION_RENOTIFY = 'renotify'
+ACTION_RESOLVE = 'resolve'
+
+# 计算变化速率至少需要的读数条数
+RATE_MIN_POINTS = 3
+
+# 规则加载期间规则被修改时重新加载的次数
+RULE_LOAD_RETRIES = 3
+
+
+class CompiledRule(NamedTuple):
+    """已编译的告警规则 (规则索引中保存)"""
+
+    rule_id: str
+    name: str
+    rule_type: str
+    condition: str
+    value: float
+    duration: timedelta
+    severity: str
+    device_id: Optional[str]
+    snoozed_until: Optional[datetime]
+
+    @property
+    def criteria(self) -> Tuple[Any, ...]:
+        """决定评估结果的字段 (字段不变时保留评估状态)"""
+        return (self.rule_type, self.condition, self.value, self.duration, self.device_id)
+
+    def breached(self, value: float, rate: Optional[float],
+                 forecast: Optional[float] = None) -> bool:
+        """
+        读数是否满足规则条件
+
+        Args:
+            value: 血糖值 (mmol/L)
+            rate: 变化速率 (mmol/L/分钟，读数不足时为None)
+            forecast: 预测值 (mmol/L，读数不足时为None)
+
+        Returns:
+            bool: 是否满足
+        """
+        if self.rule_type == RULE_FORECAST:
+            return forecast is not None and forecast < self.value
+        if self.condition == 'below':
+            return value < self.value
+        if self.condition == 'above':
+            return value > self.value
+        if rate is None:
+            return False
+        if self.condition == 'falling':
+            return rate <= -self.value
+        return rate >= self.value
+
+
+def compile_rule(doc: Dict[str, Any]) -> CompiledRule:
+    """告警规则文档编译为索引中保存的形式"""
+    return CompiledRule(
+        rule_id=str(doc['_id']),
+        name=doc['name'],
+        rule_type=doc['rule_type'],
+        condition=doc['condition'],
+        value=float(doc['value']),
+        duration=timedelta(minutes=doc.get('duration_minutes', 0)),
+        severity=doc.get('severity', 'warning'),
+        device_id=doc.get('device_id'),
+        snoozed_until=doc.get('snoozed_until')
+    )
+
+
+def least_squares_rate(points) -> Optional[float]:
+    """
+    按时间升序读数的最小二乘斜率
+
+    Args:
+        points: (时间, 血糖值) 序列
+
+    Returns:
+        Optional[float]: mmol/L/分钟，读数不足 RATE_MIN_POINTS 条或时间相同时返回None
+    """
+    count = len(points)
+    if count < RATE_MIN_POINTS:
+        return None
+    origin = points[0][0]
+    minutes = [(timestamp - origin).total_seconds() / 60 for timestamp, _ in points]
+    mean_x = sum(minutes) / count
+    mean_y = sum(value for _, value in points) / count
+    variance = sum((x - mean_x) ** 2 for x in minutes)
+    if variance == 0:
+        return None
+    covariance = sum((x - mean_x) * (value - mean_y) for x, (_, value) in zip(minutes, points))
+    return covariance / variance
+
+
+def advance(rule: CompiledRule, state: RuleState, timestamp: datetime, value: float,
+            rate: Optional[float], max_gap: timedelta, renotify: timedelta,
+            now: datetime, forecast: Optional[float] = None) -> Optional[str]:
+    """
+    用一条新读数推进规则在设备上的评估状态
+
+    Args:
+        rule: 规则
+        state: 评估状态 (原地修改)
+        timestamp: 读数时间
+        value: 血糖值
+        rate: 变化速率 (速率规则使用)
+        max_gap: 读数最大间隔，超过时持续时间重新计时
+        renotify: 重复通知间隔
+        now: 当前时间
+        forecast: 预测值 (预测规则使用)
+
+    Returns:
+        Optional[str]: 需要写入数据库的动作 (fire/renotify/resolve)，没有时返回None
+    """
+    if state.last_timestamp is not None and timestamp <= state.last_timestamp:
+        # 乱序或重复的读数不改变状态
+        return None
+    continuous = state.last_timestamp is not None and timestamp - state.last_timestamp <= max_gap
+    state.last_timestamp = timestamp
+
+    if not rule.breached(value, rate, forecast):
+        state.breach_start = None
+        state.extreme = None
+        if state.open is False:
+            return None
+        # 有未解除的告警或状态未知时解除
+        state.open = False
+        return ACTION_RESOLVE
+
+    if state.breach_start is None or not continuous:
+        state.breach_start = timestamp
+        state.extreme = value
+    elif rule.condition in ('below', 'falling'):
+        state.extreme = min(state.extreme, value)
+    else:
+        state.extreme = max(state.extreme, value)
+
+    if timestamp - state.breach_start < rule.duration:
+        return None
+    if not state.open:
+        state.open = True
+        state.notify_due = now + renotify
+        return ACTION_FIRE
+    if now >= state.notify_due:
+        state.notify_due = now + renotify
+        return ACTION_RENOTIFY
+    return None
+
+
+def should_notify(alert: Dict[str, Any], rule_snoozed_until: Optional[datetime], now: datetime,
+                  renotify: timedelta) -> bool:
+    """
+    告警是否需要 (重复) 通知
+
+    Args:
+        alert: 告警文档
+        rule_snoozed_until: 规则暂停通知至该时间
+        now: 当前时间
+        renotify: 重复通知间隔
+
+    Returns:
+        bool: 是否通知
+    """
+    if alert.get('acknowledged_at') is not None:
+        return False
+    for snoozed_until in (rule_snoozed_until, alert.get('snoozed_until')):
+        if snoozed_until is not None and snoozed_until > now:
+            return False
+    notified_at = alert.get('notified_at')
+    return notified_at is None or now - notified_at >= renotify
+
+
+class AlertService:
+    """血糖告警服务类"""
+
+    def __init__(self):
+        self.rules_collection = mongo.db.alert_rules
+        self.collection = mongo.db.alerts
+
+    @staticmethod
+    def _config_minutes(key: str, default: int) -> timedelta:
+        """分钟数配置"""
+        return timedelta(minutes=current_app.config.get(key, default))
+
+    def _user_entry(self, index: AlertRuleIndex, user_id: str) -> UserAlerts:
+        """用户的索引条目，未加载时从数据库加载规则"""
+        entry = index.get(user_id)
+        if entry is not None:
+            return entry
+        for _ in range(RULE_LOAD_RETRIES):
+            generation = index.generation(user_id)
+            rules = tuple(
+                compile_rule(doc)
+                for doc in self.rules_collection.find({'user_id': user_id, 'enabled': True})
+            )
+            entry = index.load(user_id, rules, generation)
+            if entry is not None:
+                return entry
+        # 规则持续被修改：本次使用刚加载的规则评估，不保存
+        return UserAlerts(rules)
+
+    @staticmethod
+    def _seed_recent(entry: UserAlerts, user_id: str, device_id: Optional[str],
+                     timestamp: datetime, window: timedelta) -> None:
+        """设备的最近读数不完整时从最近读数缓存补齐 (未命中时不访问数据库)"""
+        reading_cache = get_reading_cache()
+        readings = reading_cache.get_since(user_id, timestamp - window) if reading_cache else None
+        if readings:
+            entry.merge_recent(device_id, (
+                (reading['timestamp'], reading['glucose_value']) for reading in readings
+                if reading['device_id'] == device_id
+            ))
+
+    def evaluate(self, record: Dict[str, Any], now: Optional[datetime] = None,
+                 index: Optional[AlertRuleIndex] = None) -> List[Dict[str, Any]]:
+        """
+        用新写入的读数评估用户的告警规则 (只读写进程内的评估状态)
+
+        Args:
+            record: 新写入的血糖记录 (timestamp 为朴素UTC时间)
+            now: 当前时间 (默认当前UTC时间)
+            index: 规则索引 (默认当前应用的索引)
+
+        Returns:
+            List[Dict]: 需要写入数据库的动作
+        """
+        index = index or get_alert_index()
+        if index is None:
+            return []
+        now = now or datetime.utcnow()
+        timestamp = record['timestamp']
+        if timestamp < now - self._config_minutes('ALERT_MAX_DELAY_MINUTES', 15):
+            return []
+
+        user_id = record['user_id']
+        entry = self._user_entry(index, user_id)
+        if not entry.rules:
+            return []
+
+        device_id = record.get('device_id')
+        value = record['glucose_value']
+        max_gap = self._config_minutes('CGM_MAX_GAP_MINUTES', 15)
+        renotify = self._config_minutes('ALERT_RENOTIFY_MINUTES', 30)
+        actions = []
+        rule_types = {rule.rule_type for rule in entry.rules}
+        with entry.lock:
+            rate = forecast = None
+            if RULE_RATE in rule_types or RULE_FORECAST in rule_types:
+                rate_window = self._config_minutes('ALERT_RATE_MINUTES', 15)
+                window = rate_window
+                if RULE_FORECAST in rule_types:
+                    window = max(window, self._config_minutes('FORECAST_HISTORY_MINUTES', 60))
+                if entry.has_gap(device_id, timestamp, window, max_gap):
+                    self._seed_recent(entry, user_id, device_id, timestamp, window)
+                recent = entry.recent(device_id, timestamp, value, window)
+                if RULE_RATE in rule_types:
+                    rate = least_squares_rate(
+                        [point for point in recent if point[0] >= timestamp - rate_window]
+                    )
+                if RULE_FORECAST in rule_types:
+                    forecast = forecast_latest(
+                        [((point_time - EPOCH).total_seconds(), point_value)
+                         for point_time, point_value in recent],
+                        horizon_minutes=current_app.config.get('FORECAST_HORIZON_MINUTES', 30),
+                        half_life_minutes=current_app.config.get('FORECAST_HALF_LIFE_MINUTES', 20),
+                        min_points=current_app.config.get('FORECAST_MIN_POINTS', 4),
+                        max_gap_minutes=current_app.config.get('CGM_MAX_GAP_MINUTES', 15)
+                    )
+            for rule in entry.rules:
+                if rule.device_id is not None and rule.device_id != device_id:
+                    continue
+                state = entry.state(rule.rule_id, device_id)
+                # 解除时状态被重置，记录解除前的极值
+                extreme = state.extreme
+                action = advance(rule, state, timestamp, value, rate, max_gap, renotify, now,
+                                 forecast)
+                if action is not None:
+                    actions.append({
+                        'action': action, 'rule': rule, 'user_id': user_id,
+                        'device_id': device_id, 'timestamp': timestamp, 'value': value,
+                        'rate': rate, 'forecast': forecast, 'breach_start': state.breach_start,
+                        'extreme': extreme if action == ACTION_RESOLVE else state.extreme
+                    })
+        return actions
+
+    def process_record(self, record: Dict[str, Any], now: Optional[datetime] = None) -> int:
+        """
+        评估新写入的读数，保存触发、解除的告警并通知
+
+        Args:
+            record: 新写入的血糖记录
+            now: 当前时间 (默认当前UTC时间)
+
+        Returns:
+            int: 发出的通知数
+        """
+        now = now or datetime.utcnow()
+        try:
+            notified = 0
+            for action in self.evaluate(record, now):
+                if action['action'] == ACTION_RESOLVE:
+                    self._resolve(action, now)
+                elif self._touch(action, now, upsert=action['action'] == ACTION_FIRE):
+                    notified += 1
+            return notified
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
+
+    @staticmethod
+    def _active_filter(action: Dict[str, Any]) -> Dict[str, Any]:
+        """规则在设备上未解除的告警"""
+        return {'rule_id': action['rule'].rule_id, 'device_id': action['device_id'], 'active': True}
+
+    def _touch(self, action: Dict[str, Any], now: datetime, upsert: bool) -> bool:
+        """触发 (合并到未解除的告警) 或更新告警，按去重与暂停规则通知"""
+        rule = action['rule']
+        update = {
+            '$set': {'value': action['value'], 'rate_per_minute': action['rate'],
+                     'forecast_value': action['forecast'],
+                     'extreme_value': action['extreme'], 'last_reading_at': action['timestamp']}
+        }
+        if upsert:
+            update['$setOnInsert'] = {
+                'user_id': action['user_id'], 'rule_name': rule.name, 'rule_type': rule.rule_type,
+                'condition': rule.condition, 'threshold': rule.value, 'severity': rule.severity,
+                'started_at': action['breach_start'], 'triggered_at': action['timestamp'],
+                'resolved_at': None, 'acknowledged_at': None, 'snoozed_until': None,
+                'notified_at': None, 'notify_count': 0, 'created_at': now
+            }
+        try:
+            alert = self.collection.find_one_and_update(
+                self._active_filter(action), update, upsert=upsert,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # 其他进程同时触发：合并到其创建的告警
+            alert = self.collection.find_one_and_update(
+                self._active_filter(action), update, return_document=ReturnDocument.AFTER
+            )
+        if alert is None:
+            return False
+        return self._deliver(alert, rule.snoozed_until, now)
+
+    def _deliver(self, alert: Dict[str, Any], rule_snoozed_until: Optional[datetime],
+                 now: datetime) -> bool:
+        """
+        通知告警 (以 notified_at 为条件更新，多个进程同时检查时只有一个通知)
+
+        Returns:
+            bool: 是否通知
+        """
+        renotify = self._config_minutes('ALERT_RENOTIFY_MINUTES', 30)
+        if not should_notify(alert, rule_snoozed_until, now, renotify):
+            return False
+        result = self.collection.update_one(
+            {'_id': alert['_id'], 'notified_at': alert.get('notified_at')},
+            {'$set': {'notified_at': now}, '$inc': {'notify_count': 1}}
+        )
+        if result.modified_count != 1:
+            return False
+        current_app.logger.warning(
+            f"血糖告警 [{alert['severity']}] 用户 {alert['user_id']} {alert['rule_name']}: "
+            f"{alert['value']} mmol/L ({alert.get('device_id')})"
+        )
+        return True
+
+    def _resolve(self, action: Dict[str, Any], now: datetime) -> None:
+        """解除规则在设备上未解除的告警"""
+        update = {'active': False, 'resolved_at': action['timestamp'], 'updated_at': now}
+        if action['extreme'] is not None:
+            update['extreme_value'] = action['extreme']
+        self.collection.update_many(self._active_filter(action), {'$set': update})
+
+    def _invalidate(self, user_id: str) -> None:
+        """用户的规则被修改，本进程的规则索引重新加载"""
+        index = get_alert_index()
+        if index is not None:
+            index.invalidate(user_id)
+
+    def create_rule(self, user_id: str, rule_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        创建告警规则
+
+        Args:
+            user_id: 用户ID
+            rule_data: 已验证的规则字段 (AlertRuleSchema)
+
+        Returns:
+            Dict: 规则文档
+        """
+        try:
+            max_rules = current_app.config.get('ALERT_MAX_RULES_PER_USER', 20)
+            if self.rules_collection.count_documents({'user_id': user_id}) >= max_rules:
+                raise ValueError(f"每位用户最多 {max_rules} 条告警规则")
+
+            now = datetime.utcnow()
+            doc = {**rule_data, 'user_id': user_id, 'snoozed_until': None,
+                   'created_at': now, 'updated_at': now}
+            doc['_id'] = self.rules_collection.insert_one(doc).inserted_id
+            self._invalidate(user_id)
+            return doc
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
+
+    def get_rules(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        获取用户的告警规则
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            List[Dict]: 规则文档 (按创建时间)
+        """
+        try:
+            return list(self.rules_collection.find({'user_id': user_id}).sort('created_at', 1))
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+
+    def update_rule(self, user_id: str, rule_id: str,
+                    rule_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        修改告警规则 (整体替换规则字段)
+
+        Args:
+            user_id: 用户ID
+            rule_id: 规则ID
+            rule_data: 已验证的规则字段 (AlertRuleSchema)
+
+        Returns:
+            Optional[Dict]: 修改后的规则文档，规则不存在时返回None
+        """
+        if not ObjectId.is_valid(rule_id):
+            return None
+        try:
+            rule = self.rules_collection.find_one_and_update(
+                {'_id': ObjectId(rule_id), 'user_id': user_id},
+                {'$set': {**rule_data, 'updated_at': datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER
+            )
+            if rule is not None:
+                self._invalidate(user_id)
+            return rule
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
+
+    def delete_rule(self, user_id: str, rule_id: str) -> bool:
+        """
+        删除告警规则并解除其未解除的告警
+
+        Args:
+            user_id: 用户ID
+            rule_id: 规则ID
+
+        Returns:
+            bool: 是否删除
+        """
+        if not ObjectId.is_valid(rule_id):
+            return False
+        try:
+            result = self.rules_collection.delete_one({'_id': ObjectId(rule_id), 'user_id': user_id})
+            if not result.deleted_count:
+                return False
+            now = datetime.utcnow()
+            self.collection.update_many(
+                {'rule_id': rule_id, 'active': True},
+                {'$set': {'active': False, 'resolved_at': now, 'updated_at': now}}
+            )
+            self._invalidate(user_id)
+            return True
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
+
+    def get_alerts(self, user_id: str, active_only: bool = False, since: Optional[datetime] = None,
+                   limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        获取用户的告警
+
+        Args:
+            user_id: 用户ID
+            active_only: 只返回未解除的告警
+            since: 只返回该时间之后触发或通知的告警 (客户端增量获取)
+            limit: 最大数量
+
+        Returns:
+            List[Dict]: 告警文档 (按触发时间倒序)
+        """
+        try:
+            query: Dict[str, Any] = {'user_id': user_id}
+            if active_only:
+                query['active'] = True
+            if since is not None:
+                query['$or'] = [{'triggered_at': {'$gte': since}}, {'notified_at': {'$gte': since}}]
+            return list(self.collection.find(query).sort('triggered_at', DESCENDING).limit(limit))
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+
+    def acknowledge(self, user_id: str, alert_id: str) -> Optional[Dict[str, Any]]:
+        """
+        确认告警 (告警在条件解除前不再重复通知)
+
+        Args:
+            user_id: 用户ID
+            alert_id: 告警ID
+
+        Returns:
+            Optional[Dict]: 确认后的告警文档，告警不存在时返回None
+        """
+        if not ObjectId.is_valid(alert_id):
+            return None
+        try:
+            now = datetime.utcnow()
+            return self.collection.find_one_and_update(
+                {'_id': ObjectId(alert_id), 'user_id': user_id},
+                {'$set': {'acknowledged_at': now, 'updated_at': now}},
+                return_document=ReturnDocument.AFTER
+            )
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
+
+    def snooze(self, user_id: str, alert_id: str, minutes: int) -> Optional[Dict[str, Any]]:
+        """
+        暂停告警及其规则的通知 (暂停期间规则新触发的告警也不通知)
+
+        Args:
+            user_id: 用户ID
+            alert_id: 告警ID
+            minutes: 暂停的分钟数
+
+        Returns:
+            Optional[Dict]: 暂停后的告警文档，告警不存在时返回None
+        """
+        if not ObjectId.is_valid(alert_id):
+            return None
+        try:
+            now = datetime.utcnow()
+            snoozed_until = now + timedelta(minutes=minutes)
+            alert = self.collection.find_one_and_update(
+                {'_id': ObjectId(alert_id), 'user_id': user_id},
+                {'$set': {'snoozed_until': snoozed_until, 'updated_at': now}},
+                return_document=ReturnDocument.AFTER
+            )
+            if alert is None:
+                return None
+            if ObjectId.is_valid(alert['rule_id']):
+                self.rules_collection.update_one(
+                    {'_id': ObjectId(alert['rule_id']), 'user_id': user_id},
+                    {'$set': {'snoozed_until': snoozed_until, 'updated_at': now}}
+                )
+                self._invalidate(user_id)
+            return alert
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
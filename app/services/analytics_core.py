@@ -0,0 +1,491 @@
+"""
+血糖分析计算核心
+Glucose Analytics Core
+
+将查询游标按批读入连续的 NumPy 数组 (血糖值 float64、时间戳 int64 秒)，
+所有指标用向量化运算计算。返回值均转换为 Python 内置类型，可直接序列化。
+
+均值与 statistics.mean 一样按精确和计算并只舍入一次 (接口输出保留两位小数，
+浮点求和或两次舍入的末位误差会改变恰好位于 .xx5 的值的舍入方向)。
+"""
+
+import math
+from datetime import datetime
+from fractions import Fraction
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.rollup_service import HIGH_THRESHOLD, LOW_THRESHOLD
+from app.utils.time_utils import parse_timezone, to_local
+
+# 游标每批读取的文档数
+DEFAULT_BATCH_SIZE = 10000
+
+SECONDS_PER_MINUTE = 60
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class GlucoseSeries:
+    """血糖时间序列 (按读取顺序，未排序)"""
+
+    __slots__ = ('values', 'timestamps', 'local_minutes')
+
+    def __init__(self, values: Optional[np.ndarray] = None,
+                 timestamps: Optional[np.ndarray] = None,
+                 local_minutes: Optional[np.ndarray] = None):
+        """
+        初始化序列
+
+        Args:
+            values: 血糖值数组 (float64)
+            timestamps: UTC时间戳数组 (int64，秒)
+            local_minutes: 本地时间的分钟序号数组 (int64，可选，按时区读取时提供)
+        """
+        self.values = values if values is not None else np.empty(0, dtype=np.float64)
+        self.timestamps = timestamps if timestamps is not None else np.empty(0, dtype=np.int64)
+        self.local_minutes = local_minutes
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _take(self, index) -> 'GlucoseSeries':
+        """按下标或切片取子序列"""
+        local_minutes = self.local_minutes[index] if self.local_minutes is not None else None
+        return GlucoseSeries(self.values[index], self.timestamps[index], local_minutes)
+
+    def sorted(self) -> 'GlucoseSeries':
+        """按时间排序后的序列"""
+        return self._take(np.argsort(self.timestamps, kind='stable'))
+
+    def hours_of_day(self) -> np.ndarray:
+        """每条读数的UTC小时 (0-23)"""
+        return (self.timestamps // SECONDS_PER_HOUR) % 24
+
+    def day_index(self) -> np.ndarray:
+        """每条读数所在的UTC日序号 (自1970-01-01起)"""
+        return self.timestamps // SECONDS_PER_DAY
+
+    def minutes_of_day(self) -> np.ndarray:
+        """每条读数在一天中的分钟序号 (0-1439)：按时区读取时为本地时间，否则为UTC"""
+        if self.local_minutes is not None:
+            return self.local_minutes
+        return (self.timestamps % SECONDS_PER_DAY) // SECONDS_PER_MINUTE
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]],
+                       batch_size: int = DEFAULT_BATCH_SIZE,
+                       timezone_of: Optional[Callable[[Dict[str, Any]], str]] = None
+                       ) -> 'GlucoseSeries':
+        """
+        按批将文档转换为数组
+
+        每批先收集为列表，再一次性转换为数组
+
+        Args:
+            documents: 含 glucose_value 与 timestamp (朴素UTC时间) 的文档
+            batch_size: 每批文档数
+            timezone_of: 返回文档所属用户时区名称的函数 (可选)。提供时读取本地分钟序号：
+                local_tz 与该时区一致的文档直接使用写入时计算的 minute_of_day，
+                其余文档 (未回填或时区修改后尚未重算) 按该时区换算
+
+        Returns:
+            GlucoseSeries: 血糖时间序列
+        """
+        value_chunks: List[np.ndarray] = []
+        timestamp_chunks: List[np.ndarray] = []
+        minute_chunks: List[np.ndarray] = []
+        values: List[float] = []
+        timestamps: List[float] = []
+        minutes: List[int] = []
+        zones: Dict[str, Any] = {}
+
+        def flush():
+            value_chunks.append(np.asarray(values, dtype=np.float64))
+            timestamp_chunks.append(
+                np.floor(np.asarray(timestamps, dtype=np.float64)).astype(np.int64)
+            )
+            minute_chunks.append(np.asarray(minutes, dtype=np.int64))
+            values.clear()
+            timestamps.clear()
+            minutes.clear()
+
+        for document in documents:
+            values.append(document['glucose_value'])
+            timestamps.append((document['timestamp'] - EPOCH).total_seconds())
+            if timezone_of is not None:
+                name = timezone_of(document)
+                if document.get('local_tz') == name and 'minute_of_day' in document:
+                    minutes.append(document['minute_of_day'])
+                else:
+                    if name not in zones:
+                        zones[name] = parse_timezone(name)
+                    local = to_local(document['timestamp'], zones[name])
+                    minutes.append(local.hour * 60 + local.minute)
+            if len(values) >= batch_size:
+                flush()
+        if values or not value_chunks:
+            flush()
+
+        local_minutes = None
+        if timezone_of is not None:
+            local_minutes = minute_chunks[0] if len(minute_chunks) == 1 else np.concatenate(minute_chunks)
+        if len(value_chunks) == 1:
+            return cls(value_chunks[0], timestamp_chunks[0], local_minutes)
+        return cls(np.concatenate(value_chunks), np.concatenate(timestamp_chunks), local_minutes)
+
+
+def load_series(collection, filter_dict: Dict[str, Any],
+                batch_size: int = DEFAULT_BATCH_SIZE,
+                timezone: Optional[str] = None) -> GlucoseSeries:
+    """
+    查询血糖记录并读入数组，只传输血糖值与时间两个字段 (按时区读取时另含本地时间字段)
+
+    Args:
+        collection: 血糖记录集合
+        filter_dict: 查询条件
+        batch_size: 游标每批读取的文档数
+        timezone: 用户时区名称 (可选，提供时序列带本地分钟序号)
+
+    Returns:
+        GlucoseSeries: 血糖时间序列
+    """
+    projection = {'_id': 0, 'glucose_value': 1, 'timestamp': 1}
+    if timezone is not None:
+        projection.update({'minute_of_day': 1, 'local_tz': 1})
+    cursor = collection.find(filter_dict, projection).batch_size(batch_size)
+    return GlucoseSeries.from_documents(
+        cursor, batch_size, (lambda document: timezone) if timezone is not None else None
+    )
+
+
+def values_from_documents(documents: Iterable[Dict[str, Any]]) -> np.ndarray:
+    """将文档的血糖值读入数组"""
+    return np.fromiter((document['glucose_value'] for document in documents), dtype=np.float64)
+
+
+def load_values(collection, filter_dict: Dict[str, Any],
+                batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+    """
+    查询血糖记录并只读入血糖值 (不需要时间的指标使用)
+
+    Args:
+        collection: 血糖记录集合
+        filter_dict: 查询条件
+        batch_size: 游标每批读取的文档数
+
+    Returns:
+        np.ndarray: 血糖值数组 (float64)
+    """
+    cursor = collection.find(filter_dict, {'_id': 0, 'glucose_value': 1}).batch_size(batch_size)
+    return values_from_documents(cursor)
+
+
+def exact_mean(values: np.ndarray) -> float:
+    """
+    平均值 (values 非空)，结果为精确平均值的就近舍入
+
+    math.fsum 给出舍入后的和，再求一次舍入误差，两者相加后精确相除
+    """
+    items = values.tolist()
+    total = math.fsum(items)
+    residual = math.fsum(chain(items, (-total,)))
+    return float((Fraction(total) + Fraction(residual)) / len(items))
+
+
+def summarize(values: np.ndarray) -> Dict[str, Any]:
+    """
+    基本统计量与 偏低/正常/偏高 分类计数
+
+    Args:
+        values: 血糖值数组 (非空)
+
+    Returns:
+        Dict: count、mean、std (样本标准差)、min、max、low_count、normal_count、high_count
+    """
+    count = len(values)
+    low_count = int(np.count_nonzero(values < LOW_THRESHOLD))
+    high_count = int(np.count_nonzero(values > HIGH_THRESHOLD))
+
+    return {
+        'count': count,
+        'mean': exact_mean(values),
+        'std': float(values.std(ddof=1)) if count > 1 else 0,
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'low_count': low_count,
+        'normal_count': count - low_count - high_count,
+        'high_count': high_count
+    }
+
+
+def range_counts(values: np.ndarray, ranges: List[Dict[str, Any]]) -> List[int]:
+    """
+    各血糖范围 [min, max) 内的读数数量
+
+    Args:
+        values: 血糖值数组
+        ranges: 范围定义列表 (含 min、max)
+
+    Returns:
+        List[int]: 与 ranges 顺序一致的计数
+    """
+    ordered = np.sort(values)
+    lower = np.searchsorted(ordered, [r['min'] for r in ranges], side='left')
+    upper = np.searchsorted(ordered, [r['max'] for r in ranges], side='left')
+    return [int(count) for count in upper - lower]
+
+
+def grouped_stats(keys: np.ndarray, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    按整数键分组计算 计数/总和/最小/最大 (一次排序 + reduceat)
+
+    Args:
+        keys: 分组键数组 (int64)
+        values: 血糖值数组
+
+    Returns:
+        Dict: keys (升序唯一键)、count、sum、min、max 数组
+    """
+    if len(keys) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return {'keys': np.empty(0, dtype=np.int64), 'count': np.empty(0, dtype=np.int64),
+                'sum': empty, 'min': empty, 'max': empty}
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    sorted_values = values[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_keys)) + 1))
+
+    return {
+        'keys': sorted_keys[starts],
+        'count': np.diff(np.append(starts, len(sorted_keys))),
+        'sum': np.add.reduceat(sorted_values, starts),
+        'min': np.minimum.reduceat(sorted_values, starts),
+        'max': np.maximum.reduceat(sorted_values, starts)
+    }
+
+
+def period_means(hours: np.ndarray, hourly_means: np.ndarray, hourly_counts: np.ndarray,
+                 periods: Dict[str, List[int]]) -> Dict[str, Tuple[Optional[float], int]]:
+    """
+    时段内各小时均值的平均值与记录总数
+
+    Args:
+        hours: 小时数组
+        hourly_means: 各小时的平均血糖
+        hourly_counts: 各小时的记录数
+        periods: {时段: 小时列表}
+
+    Returns:
+        Dict: {时段: (小时均值的平均值，无数据时为None, 记录总数)}
+    """
+    results = {}
+    for period, period_hours in periods.items():
+        mask = np.isin(hours, period_hours)
+        if mask.any():
+            results[period] = (exact_mean(hourly_means[mask]), int(hourly_counts[mask].sum()))
+        else:
+            results[period] = (None, 0)
+    return results
+
+
+def load_grouped_series(collection, filter_dict: Dict[str, Any], group_field: str,
+                        groups: List[Any],
+                        batch_size: int = DEFAULT_BATCH_SIZE,
+                        timezones: Optional[List[str]] = None) -> Tuple[GlucoseSeries, np.ndarray]:
+    """
+    查询多个分组 (如多个用户) 的血糖记录并读入数组
+
+    Args:
+        collection: 血糖记录集合
+        filter_dict: 查询条件
+        group_field: 分组字段名
+        groups: 分组值列表，返回的分组序号为其下标
+        batch_size: 游标每批读取的文档数
+        timezones: 各分组的时区名称 (可选，与 groups 对应，提供时序列带本地分钟序号)
+
+    Returns:
+        Tuple: (血糖时间序列, 每条读数的分组序号数组 int64)
+    """
+    group_index = {group: index for index, group in enumerate(groups)}
+    codes: List[int] = []
+    projection = {'_id': 0, 'glucose_value': 1, 'timestamp': 1, group_field: 1}
+    if timezones is not None:
+        projection.update({'minute_of_day': 1, 'local_tz': 1})
+
+    def timezone_of(document):
+        return timezones[group_index[document[group_field]]]
+
+    def documents():
+        cursor = collection.find(filter_dict, projection).batch_size(batch_size)
+        for document in cursor:
+            codes.append(group_index[document[group_field]])
+            yield document
+
+    series = GlucoseSeries.from_documents(
+        documents(), batch_size, timezone_of if timezones is not None else None
+    )
+    return series, np.asarray(codes, dtype=np.int64)
+
+
+def split_groups(series: GlucoseSeries, codes: np.ndarray,
+                 group_count: int) -> List[GlucoseSeries]:
+    """
+    按分组序号将序列拆分为各组的序列 (一次稳定排序)
+
+    Args:
+        series: 多个分组的血糖时间序列
+        codes: 每条读数的分组序号
+        group_count: 分组数量
+
+    Returns:
+        List[GlucoseSeries]: 各分组的序列 (按分组序号)
+    """
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(group_count + 1))
+    ordered = series._take(order)
+    return [
+        ordered._take(slice(start, end))
+        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+    ]
+
+
+def grouped_percentiles(keys: np.ndarray, values: np.ndarray, percentiles: List[float],
+                        group_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按整数键 (0 至 group_count-1) 分组计算分位数 (线性插值，与 numpy.percentile 默认定义一致)
+
+    一次 lexsort 得到按 (键, 值) 排序的数组，所有分组的所有分位数由向量化索引一次算出
+
+    Args:
+        keys: 分组键数组 (int64)
+        values: 血糖值数组
+        percentiles: 百分位列表 (0-100)
+        group_count: 分组数
+
+    Returns:
+        Tuple: (各组读数数量 [group_count], 分位数矩阵 [group_count, len(percentiles)]，空组为NaN)
+    """
+    counts = np.bincount(keys, minlength=group_count)[:group_count]
+    result = np.full((group_count, len(percentiles)), np.nan)
+    if len(values) == 0:
+        return counts, result
+
+    order = np.lexsort((values, keys))
+    sorted_values = values[order]
+    starts = np.cumsum(counts) - counts
+
+    present = counts > 0
+    fractions = np.asarray(percentiles, dtype=np.float64) / 100
+    positions = (counts[present] - 1)[:, None] * fractions[None, :]
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    offsets = starts[present][:, None]
+
+    low_values = sorted_values[offsets + lower]
+    high_values = sorted_values[offsets + upper]
+    # 与 numpy 的插值写法一致，保证舍入后的结果相同
+    weights = positions - lower
+    spans = high_values - low_values
+    result[present] = np.where(weights >= 0.5,
+                               high_values - spans * (1 - weights),
+                               low_values + spans * weights)
+    return counts, result
+
+
+# 国际共识 CGM 目标范围 (mmol/L)：极低 <3.0，低 3.0-3.8，目标 3.9-10.0，高 10.1-13.9，极高 >13.9
+DEFAULT_GLUCOSE_TARGETS = {
+    'very_low': 3.0,
+    'low': 3.9,
+    'high': 10.0,
+    'very_high': 13.9
+}
+TIR_TIERS = ['very_low', 'low', 'in_range', 'high', 'very_high']
+
+# mmol/L 转换为 mg/dL
+MMOL_TO_MGDL = 18.018
+
+
+def tir_tiers(values: np.ndarray, targets: Dict[str, float]) -> np.ndarray:
+    """
+    每条读数所属的共识分层序号 (0-4，对应 TIR_TIERS)
+
+    低侧区间为 [下限, 上限)，高侧区间为 (下限, 上限]，目标范围两端均含
+    """
+    return ((values >= targets['very_low']).astype(np.int64)
+            + (values >= targets['low'])
+            + (values > targets['high'])
+            + (values > targets['very_high']))
+
+
+def time_weights(timestamps: np.ndarray, expected_interval: int, max_gap: int) -> np.ndarray:
+    """
+    时间加权的每条读数代表时长 (秒)
+
+    每条读数代表到下一条读数之间的时长，超过 max_gap 的间隔视为传感器中断只计 max_gap；
+    最后一条读数计 expected_interval
+
+    Args:
+        timestamps: 已排序的时间戳数组 (秒)
+        expected_interval: 传感器标称读数间隔 (秒)
+        max_gap: 单条读数最多代表的时长 (秒)
+
+    Returns:
+        np.ndarray: 时长数组 (float64)
+    """
+    if len(timestamps) == 0:
+        return np.empty(0, dtype=np.float64)
+    gaps = np.minimum(np.diff(timestamps), max_gap).astype(np.float64)
+    return np.append(gaps, min(expected_interval, max_gap))
+
+
+def cgm_metrics(series: GlucoseSeries, window_seconds: int, targets: Dict[str, float],
+                expected_interval: int, max_gap: int) -> Dict[str, Any]:
+    """
+    国际共识 CGM 指标：时间加权的 TIR/TBR/TAR 五级分布、GMI、CV、传感器佩戴时间
+
+    一次计算分层序号，时间加权与计数加权分布共用同一次扫描 (bincount)
+
+    Args:
+        series: 血糖时间序列 (非空)
+        window_seconds: 统计窗口时长 (秒)
+        targets: 目标范围 (very_low/low/high/very_high)
+        expected_interval: 传感器标称读数间隔 (秒)
+        max_gap: 单条读数最多代表的时长 (秒)
+
+    Returns:
+        Dict: 指标 (百分比为0-100)
+    """
+    ordered = series.sorted()
+    values = ordered.values
+    weights = time_weights(ordered.timestamps, expected_interval, max_gap)
+    tiers = tir_tiers(values, targets)
+
+    tier_seconds = np.bincount(tiers, weights=weights, minlength=len(TIR_TIERS))
+    tier_counts = np.bincount(tiers, minlength=len(TIR_TIERS))
+    covered_seconds = float(weights.sum())
+    wear_percentage = covered_seconds / window_seconds * 100 if window_seconds > 0 else 0.0
+
+    mean = exact_mean(values)
+    std = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+    mean_mgdl = mean * MMOL_TO_MGDL
+
+    return {
+        'count': len(values),
+        'mean': mean,
+        'std': std,
+        'cv': std / mean * 100 if mean else 0.0,
+        # GMI (%) = 3.31 + 0.02392 × 平均血糖 (mg/dL)
+        'gmi': 3.31 + 0.02392 * mean_mgdl,
+        'gmi_mmol_mol': 12.71 + 4.70587 * mean,
+        'tier_seconds': dict(zip(TIR_TIERS, tier_seconds.tolist())),
+        'tier_counts': dict(zip(TIR_TIERS, tier_counts.tolist())),
+        'covered_seconds': covered_seconds,
+        'wear_percentage': min(wear_percentage, 100.0),
+        'data_days': int(len(np.unique(ordered.day_index())))
+    }
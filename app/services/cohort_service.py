@@ -0,0 +1,520 @@
+"""
+研究队列统计业务逻辑服务
+Cohort Analytics Business Logic Service
+
+按用户属性 (年龄段、性别) 或用户ID列表定义研究队列，计算群体统计：
+- 各用户达标时间 (TIR) 的分布
+- 各用户平均血糖的直方图
+- 按用户本地小时的群体血糖模式
+
+队列按用户分区，各分区通过一次查询读取分区内所有用户的日汇总 (含小时子文档)，
+在分区线程池中并发计算后合并；汇总未启用时按用户与小时聚合原始记录。
+大队列通过后台任务计算，任务状态与结果保存在 cohort_jobs 集合中。
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from flask import current_app
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.services.rollup_service import (
+    GRANULARITY_DAY,
+    GlucoseAggregate,
+    cell_group_stage,
+    hour_group_id
+)
+from app.utils.job_runner import get_job_runner
+from app.utils.time_utils import parse_timezone, to_local
+
+
+# 队列任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+# 用户TIR分布的区间边界 (%)，最后一个区间包含100%
+TIR_BIN_EDGES = [10, 20, 30, 40, 50, 60, 70, 80, 90]
+
+# 用户平均血糖直方图的区间边界 (mmol/L)，首尾区间不设下限/上限
+MEAN_GLUCOSE_BIN_EDGES = [4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]
+
+# 群体汇总输出的分位数
+SUMMARY_PERCENTILES = [10, 25, 50, 75, 90]
+
+# 队列定义中可按属性筛选的性别
+COHORT_GENDERS = ('male', 'female', 'other')
+
+
+def parse_cohort_definition(definition: Any) -> Dict[str, Any]:
+    """
+    解析队列定义
+
+    Args:
+        definition: {user_ids} 或 {age_min, age_max, gender} 的组合
+
+    Returns:
+        Dict: 规范化的队列定义
+
+    Raises:
+        ValueError: 参数格式错误
+    """
+    if not isinstance(definition, dict):
+        raise ValueError("cohort 应为队列定义对象")
+
+    user_ids = definition.get('user_ids')
+    if user_ids is not None:
+        max_users = current_app.config.get('COHORT_MAX_USER_IDS', 10000)
+        if (not isinstance(user_ids, list) or not user_ids
+                or not all(isinstance(user_id, str) for user_id in user_ids)):
+            raise ValueError("user_ids 应为非空的用户ID列表")
+        if len(user_ids) > max_users:
+            raise ValueError(f"user_ids 最多 {max_users} 个")
+        if any(definition.get(name) is not None for name in ('age_min', 'age_max', 'gender')):
+            raise ValueError("user_ids 不能与属性条件同时使用")
+        return {'user_ids': sorted(set(user_ids))}
+
+    parsed = {}
+    for name in ('age_min', 'age_max'):
+        if definition.get(name) is not None:
+            parsed[name] = int(definition[name])
+            if not 0 <= parsed[name] <= 150:
+                raise ValueError(f"{name} 应在 0-150 之间")
+    if parsed.get('age_min', 0) > parsed.get('age_max', 150):
+        raise ValueError("age_min 不能大于 age_max")
+    if definition.get('gender') is not None:
+        if definition['gender'] not in COHORT_GENDERS:
+            raise ValueError(f"gender 应为 {', '.join(COHORT_GENDERS)} 之一")
+        parsed['gender'] = definition['gender']
+    if not parsed:
+        raise ValueError("队列定义须包含 user_ids 或至少一个属性条件 (age_min/age_max/gender)")
+    return parsed
+
+
+def histogram(values: List[float], edges: List[float]) -> List[Dict[str, Any]]:
+    """
+    按区间边界统计用户数 (区间左闭右开，首尾区间不设下限/上限)
+
+    Args:
+        values: 各用户的指标值
+        edges: 区间边界 (升序)
+
+    Returns:
+        List[Dict]: 各区间的下限、上限、用户数与占比
+    """
+    counts = np.bincount(np.searchsorted(edges, values, side='right'),
+                         minlength=len(edges) + 1).tolist()
+    bounds = [None] + list(edges) + [None]
+    return [
+        {
+            'min': bounds[index],
+            'max': bounds[index + 1],
+            'users': count,
+            'percentage': round(count / len(values) * 100, 1) if values else 0
+        }
+        for index, count in enumerate(counts)
+    ]
+
+
+def summarize_values(values: List[float]) -> Dict[str, Optional[float]]:
+    """各用户指标值的均值与分位数"""
+    if not values:
+        return {'mean': None, **{f'p{p}': None for p in SUMMARY_PERCENTILES}}
+    bands = np.percentile(values, SUMMARY_PERCENTILES).tolist()
+    return {
+        'mean': round(float(np.mean(values)), 2),
+        **{f'p{p}': round(value, 2) for p, value in zip(SUMMARY_PERCENTILES, bands)}
+    }
+
+
+class CohortAccumulator:
+    """可合并的队列统计中间结果 (各分区分别累积后合并)"""
+
+    def __init__(self, min_readings: int = 1):
+        """
+        初始化
+
+        Args:
+            min_readings: 计入群体统计的用户最少读数
+        """
+        self.min_readings = min_readings
+        self.users_without_data = 0
+        self.total_records = 0
+        self.tir: List[float] = []
+        self.tbr: List[float] = []
+        self.tar: List[float] = []
+        self.means: List[float] = []
+        self.hours = [GlucoseAggregate() for _ in range(24)]
+        self.hour_means: List[List[float]] = [[] for _ in range(24)]
+
+    def add_user(self, total: GlucoseAggregate, by_hour: Dict[int, GlucoseAggregate]) -> None:
+        """
+        加入一位用户的聚合量
+
+        Args:
+            total: 用户在统计窗口内的合计
+            by_hour: {本地小时: 聚合量}
+        """
+        if total.count < self.min_readings:
+            self.users_without_data += 1
+            return
+
+        levels = total.level_counts
+        self.total_records += total.count
+        self.tir.append(levels['normal'] / total.count * 100)
+        self.tbr.append(levels['low'] / total.count * 100)
+        self.tar.append(levels['high'] / total.count * 100)
+        self.means.append(total.mean)
+        for hour, aggregate in by_hour.items():
+            if aggregate.count:
+                self.hours[hour].merge(aggregate)
+                self.hour_means[hour].append(aggregate.mean)
+
+    def merge(self, other: 'CohortAccumulator') -> 'CohortAccumulator':
+        """合并另一个分区的中间结果"""
+        self.users_without_data += other.users_without_data
+        self.total_records += other.total_records
+        self.tir.extend(other.tir)
+        self.tbr.extend(other.tbr)
+        self.tar.extend(other.tar)
+        self.means.extend(other.means)
+        for hour in range(24):
+            self.hours[hour].merge(other.hours[hour])
+            self.hour_means[hour].extend(other.hour_means[hour])
+        return self
+
+    def result(self) -> Dict[str, Any]:
+        """生成群体统计结果"""
+        hourly_patterns = []
+        for hour, aggregate in enumerate(self.hours):
+            if not aggregate.count:
+                continue
+            bands = np.percentile(self.hour_means[hour], [25, 50, 75]).tolist()
+            hourly_patterns.append({
+                'hour': hour,
+                'time_label': f"{hour:02d}:00",
+                'avg_glucose': round(aggregate.mean, 2),
+                'record_count': aggregate.count,
+                'user_count': len(self.hour_means[hour]),
+                'user_p25': round(bands[0], 2),
+                'user_p50': round(bands[1], 2),
+                'user_p75': round(bands[2], 2)
+            })
+
+        return {
+            'users_with_data': len(self.means),
+            'users_without_data': self.users_without_data,
+            'total_records': self.total_records,
+            'tir_distribution': {
+                'bins': histogram(self.tir, TIR_BIN_EDGES),
+                'tir': summarize_values(self.tir),
+                'tbr': summarize_values(self.tbr),
+                'tar': summarize_values(self.tar)
+            },
+            'mean_glucose_histogram': {
+                'bins': histogram(self.means, MEAN_GLUCOSE_BIN_EDGES),
+                'summary': summarize_values(self.means)
+            },
+            'hourly_patterns': hourly_patterns
+        }
+
+
+class CohortService:
+    """研究队列统计服务类"""
+
+    def __init__(self):
+        self.users_collection = mongo.db.users
+        self.rollup_collection = mongo.db.glucose_rollups
+        self.glucose_collection = mongo.db.glucose_records
+        self.jobs_collection = mongo.db.cohort_jobs
+
+    def resolve_users(self, definition: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """
+        解析队列定义得到成员
+
+        Args:
+            definition: 队列定义，user_ids (用户ID列表) 或 age_min/age_max (含)/gender 的组合
+
+        Returns:
+            List[Tuple[str, str]]: (用户ID, 时区名称) 列表，按用户ID排序
+        """
+        try:
+            if definition.get('user_ids'):
+                object_ids = [ObjectId(user_id) for user_id in definition['user_ids']
+                              if ObjectId.is_valid(user_id)]
+                filter_dict: Dict[str, Any] = {'_id': {'$in': object_ids}}
+            else:
+                filter_dict = {'is_active': True}
+                age = {}
+                if definition.get('age_min') is not None:
+                    age['$gte'] = definition['age_min']
+                if definition.get('age_max') is not None:
+                    age['$lte'] = definition['age_max']
+                if age:
+                    filter_dict['age'] = age
+                if definition.get('gender'):
+                    filter_dict['gender'] = definition['gender']
+
+            members = [
+                (str(user_doc['_id']), user_doc.get('timezone') or 'UTC')
+                for user_doc in self.users_collection.find(filter_dict, {'timezone': 1})
+            ]
+            return sorted(members)
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+
+    def compute(self, members: List[Tuple[str, str]], start_date: datetime,
+                end_date: datetime, progress=None) -> Dict[str, Any]:
+        """
+        计算队列的群体统计 (按用户分区并发计算)
+
+        Args:
+            members: (用户ID, 时区名称) 列表
+            start_date: 开始时间 (含，UTC整天边界)
+            end_date: 结束时间 (不含，UTC整天边界)
+            progress: 每完成一个分区时调用的回调 (可选)
+
+        Returns:
+            Dict: 群体统计
+        """
+        try:
+            size = current_app.config.get('COHORT_PARTITION_SIZE', 200)
+            total = self.accumulate(members, start_date, end_date, progress)
+
+            return {
+                'user_count': len(members),
+                'partitions': -(-len(members) // size),
+                **total.result(),
+                'time_range': {
+                    'start_date': start_date.isoformat(),
+                    'end_date': end_date.isoformat()
+                }
+            }
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"队列统计失败: {str(e)}")
+
+    def accumulate(self, members: List[Tuple[str, str]], start_date: datetime,
+                   end_date: datetime, progress=None) -> CohortAccumulator:
+        """
+        按用户分区并发累积队列的中间结果 (后台任务线程池未启用时按顺序计算)
+
+        Args:
+            members: (用户ID, 时区名称) 列表
+            start_date: 开始时间 (含，UTC整天边界)
+            end_date: 结束时间 (不含，UTC整天边界)
+            progress: 每完成一个分区时调用的回调 (可选)
+
+        Returns:
+            CohortAccumulator: 合并后的中间结果
+        """
+        size = current_app.config.get('COHORT_PARTITION_SIZE', 200)
+        min_readings = current_app.config.get('COHORT_MIN_READINGS', 288)
+        partitions = [members[index:index + size] for index in range(0, len(members), size)]
+
+        def run(partition):
+            accumulator = self._partition_statistics(partition, start_date, end_date,
+                                                     min_readings)
+            if progress:
+                progress()
+            return accumulator
+
+        runner = get_job_runner()
+        if runner is None:
+            accumulators = [run(partition) for partition in partitions]
+        else:
+            accumulators = runner.map(run, partitions)
+
+        total = CohortAccumulator(min_readings)
+        for accumulator in accumulators:
+            total.merge(accumulator)
+        return total
+
+    def _partition_statistics(self, partition: List[Tuple[str, str]], start: datetime,
+                              end: datetime, min_readings: int) -> CohortAccumulator:
+        """
+        计算一个用户分区的中间结果
+
+        读取分区内所有用户的日汇总 (一次查询)，小时子文档按用户时区换算为本地小时；
+        偏移不是整小时的时区，UTC小时计入其开始时刻所在的本地小时
+        """
+        timezones = {user_id: parse_timezone(name) for user_id, name in partition}
+        totals = {user_id: GlucoseAggregate() for user_id in timezones}
+        by_hour: Dict[str, Dict[int, GlucoseAggregate]] = {user_id: {} for user_id in timezones}
+        offsets: Dict[Tuple[str, datetime], Optional[int]] = {}
+
+        def local_hour(user_id: str, hour_start: datetime) -> int:
+            # 同一天首尾小时的UTC偏移相同时整天使用该偏移，否则 (夏令时切换日) 逐小时换算
+            day_start = hour_start.replace(hour=0)
+            key = (user_id, day_start)
+            if key not in offsets:
+                tz = timezones[user_id]
+                first = to_local(day_start, tz) - day_start
+                last = to_local(day_start + timedelta(hours=23), tz) - day_start - timedelta(hours=23)
+                offsets[key] = int(first.total_seconds() // 60) if first == last else None
+            offset = offsets[key]
+            if offset is None:
+                return to_local(hour_start, timezones[user_id]).hour
+            return (hour_start.hour * 60 + offset) // 60 % 24
+
+        def add_hour(user_id: str, hour_start: datetime, aggregate: GlucoseAggregate) -> None:
+            by_hour[user_id].setdefault(local_hour(user_id, hour_start),
+                                        GlucoseAggregate()).merge(aggregate)
+
+        user_ids = list(timezones)
+        if current_app.config.get('ROLLUPS_ENABLED', True):
+            cursor = self.rollup_collection.find(
+                {
+                    'user_id': {'$in': user_ids},
+                    'granularity': GRANULARITY_DAY,
+                    'bucket_start': {'$gte': start, '$lt': end}
+                },
+                {'_id': 0, 'sketch': 0, 'sketch_version': 0, 'updated_at': 0}
+            )
+            for doc in cursor:
+                user_id = doc['user_id']
+                totals[user_id].merge(GlucoseAggregate.from_doc(doc))
+                for hour, hour_doc in doc.get('hours', {}).items():
+                    add_hour(user_id, doc['bucket_start'] + timedelta(hours=int(hour)),
+                             GlucoseAggregate.from_doc(hour_doc))
+        else:
+            pipeline = [
+                {'$match': {
+                    'user_id': {'$in': user_ids},
+                    'timestamp': {'$gte': start, '$lt': end}
+                }},
+                cell_group_stage(hour_group_id({'user_id': '$user_id'}))
+            ]
+            for result in self.glucose_collection.aggregate(pipeline, allowDiskUse=True):
+                key = result['_id']
+                aggregate = GlucoseAggregate.from_group(result)
+                totals[key['user_id']].merge(aggregate)
+                add_hour(key['user_id'],
+                         datetime(key['year'], key['month'], key['day'], key['hour']), aggregate)
+
+        accumulator = CohortAccumulator(min_readings)
+        for user_id in user_ids:
+            accumulator.add_user(totals[user_id], by_hour[user_id])
+        return accumulator
+
+    def create_job(self, definition: Dict[str, Any], start_date: datetime, end_date: datetime,
+                   created_by: str) -> str:
+        """
+        创建队列统计后台任务 (后台任务线程池未启用时在当前线程执行)
+
+        Args:
+            definition: 队列定义
+            start_date: 开始时间 (含，UTC整天边界)
+            end_date: 结束时间 (不含，UTC整天边界)
+            created_by: 创建者用户ID
+
+        Returns:
+            str: 任务ID
+        """
+        try:
+            result = self.jobs_collection.insert_one({
+                'status': JOB_QUEUED,
+                'definition': definition,
+                'start_date': start_date,
+                'end_date': end_date,
+                'created_by': created_by,
+                'created_at': datetime.utcnow(),
+                'progress': {'partitions_done': 0, 'partitions_total': None},
+                'result': None,
+                'error': None
+            })
+            job_id = str(result.inserted_id)
+
+            runner = get_job_runner()
+            if runner is None:
+                self.run_job(job_id)
+            else:
+                runner.submit(self.run_job, job_id)
+            return job_id
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
+
+    def run_job(self, job_id: str) -> None:
+        """
+        执行队列统计任务，结果或错误写入任务文档
+
+        Args:
+            job_id: 任务ID
+        """
+        _id = ObjectId(job_id)
+        job = self.jobs_collection.find_one_and_update(
+            {'_id': _id, 'status': JOB_QUEUED},
+            {'$set': {'status': JOB_RUNNING, 'started_at': datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not job:
+            return
+
+        try:
+            members = self.resolve_users(job['definition'])
+            size = current_app.config.get('COHORT_PARTITION_SIZE', 200)
+            self.jobs_collection.update_one(
+                {'_id': _id},
+                {'$set': {'progress.partitions_total': -(-len(members) // size)}}
+            )
+
+            def progress():
+                self.jobs_collection.update_one({'_id': _id},
+                                                {'$inc': {'progress.partitions_done': 1}})
+
+            result = self.compute(members, job['start_date'], job['end_date'], progress)
+            update = {'status': JOB_COMPLETED, 'result': result}
+        except Exception as e:
+            current_app.logger.error(f"队列统计任务 {job_id} 失败: {str(e)}")
+            update = {'status': JOB_FAILED, 'error': str(e)}
+
+        update['finished_at'] = datetime.utcnow()
+        self.jobs_collection.update_one({'_id': _id}, {'$set': update})
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取队列统计任务的状态与结果
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Optional[Dict]: 任务信息，不存在时返回None
+        """
+        try:
+            if not ObjectId.is_valid(job_id):
+                return None
+
+            job = self.jobs_collection.find_one({'_id': ObjectId(job_id)})
+            if not job:
+                return None
+
+            def isoformat(value):
+                return value.isoformat() if value else None
+
+            return {
+                'job_id': job_id,
+                'status': job['status'],
+                'definition': job['definition'],
+                'start_date': isoformat(job['start_date']),
+                'end_date': isoformat(job['end_date']),
+                'created_by': job['created_by'],
+                'created_at': isoformat(job['created_at']),
+                'started_at': isoformat(job.get('started_at')),
+                'finished_at': isoformat(job.get('finished_at')),
+                'progress': job['progress'],
+                'result': job['result'],
+                'error': job['error']
+            }
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
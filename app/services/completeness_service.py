@@ -0,0 +1,328 @@
+"""
+设备数据完整性服务
+Device Data Completeness Service
+
+按 (设备, UTC日) 保存数据完整性日汇总 (device_completeness 集合)：实际读数与按设备类型的预期读数、
+超过阈值的数据缺口与重复时间戳簇。写入原始记录时只重新计算该设备当天的汇总；
+全设备排名只读取日汇总与设备信息，不扫描原始记录。
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from flask import current_app
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.services.analytics_core import EPOCH, SECONDS_PER_DAY
+from app.utils.time_utils import floor_day, to_utc_naive
+
+# 日汇总中最多列出的缺口与重复簇数量
+MAX_LISTED_ITEMS = 50
+
+
+def _to_datetime(timestamp: int) -> datetime:
+    """时间戳 (秒) 转换为朴素UTC时间"""
+    return EPOCH + timedelta(seconds=int(timestamp))
+
+
+def analyze_day(timestamps: np.ndarray, day_start: int, observed_end: int,
+                expected_per_day: int, gap_seconds: Optional[int],
+                duplicate_seconds: int) -> Dict[str, Any]:
+    """
+    分析一个设备一天的读数时间分布
+
+    间隔不超过 duplicate_seconds 的相邻读数归为同一重复簇，只计一次有效读数；
+    缺口包括当天开始到首条读数、读数之间、末条读数到观测结束的间隔
+
+    Args:
+        timestamps: 当天读数的时间戳 (秒，已排序)
+        day_start: 当天开始时间戳
+        observed_end: 观测结束时间戳 (过去的日期为次日零点，当天为当前时间)
+        expected_per_day: 每天预期读数
+        gap_seconds: 缺口阈值 (秒，None 表示该设备类型不分析缺口)
+        duplicate_seconds: 重复读数的最大间隔 (秒)
+
+    Returns:
+        Dict: 完整性指标
+    """
+    close = np.diff(timestamps) <= duplicate_seconds
+    duplicate_count = int(np.count_nonzero(close))
+    effective_count = len(timestamps) - duplicate_count
+
+    # 重复簇：close 中连续为 True 的区段
+    edges = np.flatnonzero(np.diff(np.r_[0, close.astype(np.int8), 0]))
+    clusters = [
+        {'timestamp': _to_datetime(timestamps[start]), 'count': int(end - start + 1)}
+        for start, end in zip(edges[::2].tolist(), edges[1::2].tolist())
+    ]
+
+    gaps = []
+    max_gap_seconds = 0
+    if gap_seconds is not None:
+        bounds = np.r_[day_start, timestamps, max(observed_end, day_start)]
+        intervals = np.diff(bounds)
+        max_gap_seconds = int(intervals.max()) if len(intervals) else 0
+        for index in np.flatnonzero(intervals > gap_seconds).tolist():
+            gaps.append({
+                'start': _to_datetime(bounds[index]),
+                'end': _to_datetime(bounds[index + 1]),
+                'minutes': round(int(intervals[index]) / 60, 1)
+            })
+
+    observed_fraction = min(max(observed_end - day_start, 0) / SECONDS_PER_DAY, 1.0)
+    expected_count = expected_per_day * observed_fraction
+
+    return {
+        'reading_count': len(timestamps),
+        'effective_count': effective_count,
+        'expected_count': round(expected_count, 2),
+        'completeness': round(min(effective_count / expected_count, 1.0) * 100, 1)
+        if expected_count else None,
+        'duplicate_count': duplicate_count,
+        'duplicate_clusters': clusters[:MAX_LISTED_ITEMS],
+        'gap_count': len(gaps),
+        'gap_minutes': round(sum(gap['minutes'] for gap in gaps), 1),
+        'max_gap_minutes': round(max_gap_seconds / 60, 1),
+        'gaps': gaps[:MAX_LISTED_ITEMS]
+    }
+
+
+class CompletenessService:
+    """设备数据完整性服务类"""
+
+    def __init__(self):
+        self.collection = mongo.db.device_completeness
+        self.glucose_collection = mongo.db.glucose_records
+        self.devices_collection = mongo.db.devices
+
+    @staticmethod
+    def _profiles() -> Dict[str, Dict[str, Any]]:
+        """各设备类型的预期读数与缺口阈值"""
+        return current_app.config.get('DEVICE_COMPLETENESS_PROFILES', {})
+
+    def refresh_day(self, device_id: str, day: datetime,
+                    device: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        重新计算设备某天的完整性汇总 (写入、修改或删除读数后调用)
+
+        Args:
+            device_id: 设备ID
+            day: 当天任意时间
+            device: 设备文档 (可选，未提供时查询)
+
+        Returns:
+            Optional[Dict]: 日汇总 (未注册设备、无预期读数的设备类型或当天无读数时为None)
+        """
+        try:
+            if device is None:
+                device = self.devices_collection.find_one(
+                    {'device_id': device_id}, {'user_id': 1, 'device_type': 1}
+                )
+            profile = self._profiles().get(device['device_type']) if device else None
+            if profile is None:
+                return None
+
+            day_start = floor_day(to_utc_naive(day))
+            day_end = day_start + timedelta(days=1)
+            timestamps = np.array([
+                int((record['timestamp'] - EPOCH).total_seconds())
+                for record in self.glucose_collection.find(
+                    {'device_id': device_id, 'timestamp': {'$gte': day_start, '$lt': day_end}},
+                    {'_id': 0, 'timestamp': 1}
+                ).sort('timestamp', 1)
+            ], dtype=np.int64)
+
+            key = {'device_id': device_id, 'day': day_start}
+            if not len(timestamps):
+                self.collection.delete_one(key)
+                return None
+
+            now = datetime.utcnow()
+            summary = analyze_day(
+                timestamps,
+                day_start=int((day_start - EPOCH).total_seconds()),
+                observed_end=int((min(day_end, now) - EPOCH).total_seconds()),
+                expected_per_day=profile['expected_per_day'],
+                gap_seconds=profile['gap_minutes'] * 60 if profile.get('gap_minutes') else None,
+                duplicate_seconds=current_app.config.get('COMPLETENESS_DUPLICATE_SECONDS', 30)
+            )
+            summary.update({
+                'user_id': device['user_id'],
+                'device_type': device['device_type'],
+                'updated_at': now
+            })
+            self.collection.update_one(key, {'$set': summary}, upsert=True)
+            return {**key, **summary}
+
+        except PyMongoError as e:
+            raise Exception(f"完整性汇总更新失败: {str(e)}")
+
+    def rebuild(self, device_id: Optional[str] = None) -> int:
+        """
+        从原始记录重建完整性日汇总 (用于历史数据回填)
+
+        Args:
+            device_id: 设备ID (可选，不指定时处理所有已注册设备)
+
+        Returns:
+            int: 写入的日汇总数
+        """
+        try:
+            scope = {'device_id': device_id} if device_id else {}
+            self.collection.delete_many(scope)
+
+            written = 0
+            device_filter = {**scope, 'device_type': {'$in': list(self._profiles())}}
+            for device in self.devices_collection.find(
+                device_filter, {'device_id': 1, 'user_id': 1, 'device_type': 1}
+            ):
+                days = self.glucose_collection.aggregate([
+                    {'$match': {'device_id': device['device_id']}},
+                    {'$group': {'_id': {
+                        'year': {'$year': '$timestamp'},
+                        'month': {'$month': '$timestamp'},
+                        'day': {'$dayOfMonth': '$timestamp'}
+                    }}}
+                ])
+                for result in days:
+                    key = result['_id']
+                    day = datetime(key['year'], key['month'], key['day'])
+                    if self.refresh_day(device['device_id'], day, device) is not None:
+                        written += 1
+
+            return written
+
+        except PyMongoError as e:
+            raise Exception(f"完整性汇总重建失败: {str(e)}")
+
+    def get_device_days(self, device_id: str, start_date: datetime,
+                        end_date: datetime) -> List[Dict[str, Any]]:
+        """
+        获取设备的完整性日汇总
+
+        Args:
+            device_id: 设备ID
+            start_date: 开始日期
+            end_date: 结束日期 (不含)
+
+        Returns:
+            List[Dict]: 按日期排序的日汇总
+        """
+        try:
+            days = []
+            for doc in self.collection.find(
+                {'device_id': device_id,
+                 'day': {'$gte': floor_day(start_date), '$lt': end_date}},
+                {'_id': 0, 'updated_at': 0}
+            ).sort('day', 1):
+                doc['day'] = doc['day'].date().isoformat()
+                for item in doc['duplicate_clusters']:
+                    item['timestamp'] = item['timestamp'].isoformat()
+                for gap in doc['gaps']:
+                    gap['start'] = gap['start'].isoformat()
+                    gap['end'] = gap['end'].isoformat()
+                days.append(doc)
+            return days
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+
+    def get_fleet_completeness(self, start_date: datetime, end_date: datetime,
+                               device_type: Optional[str] = None,
+                               limit: int = 50) -> Dict[str, Any]:
+        """
+        全设备完整性排名 (完整性从低到高)
+
+        预期读数按设备注册后落在查询范围内的天数计算，没有任何读数的日期计为0，
+        停止上传数据的设备同样参与排名
+
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期 (不含)
+            device_type: 设备类型 (可选)
+            limit: 返回的设备数量
+
+        Returns:
+            Dict: 设备总数与完整性最低的设备列表
+        """
+        try:
+            profiles = self._profiles()
+            types = [device_type] if device_type else list(profiles)
+            range_start = floor_day(start_date)
+            now = datetime.utcnow()
+            range_end = min(end_date, now)
+
+            totals = {
+                result['_id']: result
+                for result in self.collection.aggregate([
+                    {'$match': {
+                        'day': {'$gte': range_start, '$lt': range_end},
+                        'device_type': {'$in': types}
+                    }},
+                    {'$group': {
+                        '_id': '$device_id',
+                        'effective_count': {'$sum': '$effective_count'},
+                        'duplicate_count': {'$sum': '$duplicate_count'},
+                        'gap_count': {'$sum': '$gap_count'},
+                        'gap_minutes': {'$sum': '$gap_minutes'},
+                        'days_reported': {'$sum': 1}
+                    }}
+                ])
+            }
+
+            devices = []
+            for device in self.devices_collection.find(
+                {'device_type': {'$in': [t for t in types if t in profiles]}},
+                {'device_id': 1, 'user_id': 1, 'device_type': 1, 'is_active': 1,
+                 'created_at': 1, 'last_sync': 1}
+            ):
+                observed_start = max(range_start, floor_day(device.get('created_at') or range_start))
+                observed_days = max((range_end - observed_start).total_seconds(), 0) / SECONDS_PER_DAY
+                expected = profiles[device['device_type']]['expected_per_day'] * observed_days
+                total = totals.get(device['device_id'], {})
+                effective = total.get('effective_count', 0)
+                devices.append({
+                    'device_id': device['device_id'],
+                    'user_id': device['user_id'],
+                    'device_type': device['device_type'],
+                    'is_active': device.get('is_active', True),
+                    'effective_count': effective,
+                    'expected_count': round(expected, 1),
+                    'completeness': round(min(effective / expected, 1.0) * 100, 1) if expected else None,
+                    'days_reported': total.get('days_reported', 0),
+                    'gap_count': total.get('gap_count', 0),
+                    'gap_minutes': round(total.get('gap_minutes', 0), 1),
+                    'duplicate_count': total.get('duplicate_count', 0)
+                })
+
+            ranked = sorted(
+                (device for device in devices if device['completeness'] is not None),
+                key=lambda device: (device['completeness'], device['device_id'])
+            )
+            return {
+                'total_devices': len(ranked),
+                'devices': ranked[:limit],
+                'time_range': {
+                    'start_date': range_start.isoformat(),
+                    'end_date': range_end.isoformat()
+                }
+            }
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+
+    def sync_records(self, records: List[Dict[str, Any]]) -> None:
+        """
+        按记录涉及的 (设备, 日期) 更新日汇总
+
+        Args:
+            records: 写入前后的血糖记录
+        """
+        days = {
+            (record['device_id'], floor_day(record['timestamp']))
+            for record in records if record.get('device_id')
+        }
+        for device_id, day in days:
+            self.refresh_day(device_id, day)
@@ -6,10 +6,13 @@ Device Management Business Logic Service
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from bson import ObjectId
+from flask import current_app
+from pymongo import ReturnDocument
 from pymongo.errors import PyMongoError
 
 from app import mongo
 from app.models.device import Device
+from app.services.snapshot_service import SnapshotService
 
 
 class DeviceService:
@@ -17,6 +20,25 @@ class DeviceService:
     
     def __init__(self):
         self.collection = mongo.db.devices
+        self.snapshot_service = SnapshotService()
+    
+    def _sync_snapshot(self, device_dict: Optional[Dict[str, Any]]) -> None:
+        """
+        设备注册或状态变化后同步用户快照
+        
+        快照可通过CLI命令重建，同步失败时只记录日志，测试环境 (TESTING) 直接抛出异常
+        
+        Args:
+            device_dict: 变化后的设备文档 (设备不存在时为None)
+        """
+        if not device_dict or not current_app.config.get('SNAPSHOTS_ENABLED', True):
+            return
+        try:
+            self.snapshot_service.sync_device(device_dict)
+        except Exception as e:
+            if current_app.config.get('TESTING'):
+                raise
+            current_app.logger.warning(f"用户快照同步失败: {str(e)}")
     
     def register_device(self, device_data: Dict[str, Any]) -> Device:
         """
@@ -49,6 +71,7 @@ class DeviceService:
             
             # 插入数据库
             result = self.collection.insert_one(device_dict)
+            self._sync_snapshot(device_dict)
             
             # 返回创建的设备
             device._id = result.inserted_id
@@ -191,6 +214,7 @@ class DeviceService:
             )
             
             if result:
+                self._sync_snapshot(result)
                 return Device.from_dict(result)
             return None
             
@@ -209,12 +233,14 @@ class DeviceService:
         """
         try:
             # 执行停用
-            result = self.collection.update_one(
+            result = self.collection.find_one_and_update(
                 {'device_id': device_id},
-                {'$set': {'is_active': False, 'updated_at': datetime.utcnow()}}
+                {'$set': {'is_active': False, 'updated_at': datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER
             )
+            self._sync_snapshot(result)
             
-            return result.modified_count > 0
+            return result is not None
             
         except PyMongoError as e:
             raise Exception(f"数据库更新失败: {str(e)}")
@@ -231,12 +257,15 @@ class DeviceService:
         """
         try:
             # 更新最后同步时间
-            result = self.collection.update_one(
+            now = datetime.utcnow()
+            result = self.collection.find_one_and_update(
                 {'device_id': device_id},
-                {'$set': {'last_sync': datetime.utcnow(), 'updated_at': datetime.utcnow()}}
+                {'$set': {'last_sync': now, 'updated_at': now}},
+                return_document=ReturnDocument.AFTER
             )
+            self._sync_snapshot(result)
             
-            return result.modified_count > 0
+            return result is not None
             
         except PyMongoError as e:
             raise Exception(f"数据库更新失败: {str(e)}")
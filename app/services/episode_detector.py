@@ -0,0 +1,176 @@
+"""
+低/高血糖事件检测
+Hypo/Hyperglycemia Episode Detection
+
+逐条读入按时间排序的读数的小型状态机 (流式，不回看)：
+- 读数越过进入阈值后进入候选状态，持续不少于 min_minutes 分钟成为事件
+- 事件期间读数回到阈值内且持续不少于 exit_minutes 分钟时事件结束，结束时间为回到阈值内的时刻
+- 越过2级阈值持续不少于 min_minutes 分钟时事件升为2级
+- 读数间隔超过 max_gap 视为传感器中断，进行中的事件以中断前最后一条读数结束
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# 事件类型
+EVENT_HYPO = 'hypo'
+EVENT_HYPER = 'hyper'
+
+# 事件状态
+STATUS_CLOSED = 'closed'  # 已恢复
+STATUS_ONGOING = 'ongoing'  # 数据末尾仍在进行
+STATUS_INTERRUPTED = 'interrupted'  # 因传感器中断结束
+
+# 国际共识事件定义 (mmol/L)：低血糖 <3.9 (1级) / <3.0 (2级)，高血糖 >10.0 (1级) / >13.9 (2级)，
+# 均需持续15分钟，恢复需持续15分钟
+EPISODE_RULES = {
+    EVENT_HYPO: {'direction': -1, 'threshold': 3.9, 'level2_threshold': 3.0,
+                 'min_minutes': 15, 'exit_minutes': 15},
+    EVENT_HYPER: {'direction': 1, 'threshold': 10.0, 'level2_threshold': 13.9,
+                  'min_minutes': 15, 'exit_minutes': 15}
+}
+
+
+class EpisodeDetector:
+    """单一事件类型的检测状态机"""
+
+    def __init__(self, kind: str, max_gap: timedelta, rule: Optional[Dict[str, Any]] = None):
+        """
+        初始化检测器
+
+        Args:
+            kind: 事件类型 (hypo/hyper)
+            max_gap: 读数最大间隔，超过视为传感器中断
+            rule: 事件规则 (可选，默认 EPISODE_RULES[kind])
+        """
+        rule = rule or EPISODE_RULES[kind]
+        self.kind = kind
+        self.max_gap = max_gap
+        self.direction = rule['direction']
+        self.threshold = rule['threshold']
+        self.level2_threshold = rule['level2_threshold']
+        self.min_duration = timedelta(minutes=rule['min_minutes'])
+        self.exit_duration = timedelta(minutes=rule['exit_minutes'])
+        self._reset()
+        self.last_time: Optional[datetime] = None
+
+    def _reset(self) -> None:
+        """回到空闲状态"""
+        self.start: Optional[datetime] = None  # 候选/事件开始时间
+        self.active = False
+        self.last_beyond: Optional[datetime] = None
+        self.level2_since: Optional[datetime] = None
+        self.level = 1
+        self.extreme: Optional[float] = None
+        self.count = 0
+        self.exit_since: Optional[datetime] = None
+
+    @property
+    def idle(self) -> bool:
+        """是否处于空闲状态 (无候选或进行中的事件)"""
+        return self.start is None
+
+    def _beyond(self, value: float, threshold: float) -> bool:
+        """读数是否越过阈值 (低血糖为低于，高血糖为高于)"""
+        return (value - threshold) * self.direction > 0
+
+    def _episode(self, end: datetime, status: str) -> Dict[str, Any]:
+        """生成事件数据"""
+        return {
+            'kind': self.kind,
+            'level': self.level,
+            'start': self.start,
+            'end': end,
+            'duration_minutes': round((end - self.start).total_seconds() / 60, 1),
+            'extreme_value': self.extreme,
+            'reading_count': self.count,
+            'status': status
+        }
+
+    def feed(self, timestamp: datetime, value: float) -> List[Dict[str, Any]]:
+        """
+        读入一条读数
+
+        Args:
+            timestamp: 读数时间 (不早于上一条)
+            value: 血糖值
+
+        Returns:
+            List[Dict]: 因本条读数而结束的事件
+        """
+        closed = []
+        if self.last_time is not None and timestamp - self.last_time > self.max_gap:
+            if self.active:
+                closed.append(self._episode(self.last_beyond, STATUS_INTERRUPTED))
+            self._reset()
+        self.last_time = timestamp
+
+        if self._beyond(value, self.threshold):
+            if self.start is None:
+                self.start = timestamp
+            self.last_beyond = timestamp
+            self.exit_since = None
+            self.count += 1
+            if self.extreme is None or self._beyond(value, self.extreme):
+                self.extreme = value
+
+            if self._beyond(value, self.level2_threshold):
+                if self.level2_since is None:
+                    self.level2_since = timestamp
+                if timestamp - self.level2_since >= self.min_duration:
+                    self.level = 2
+            else:
+                self.level2_since = None
+
+            if timestamp - self.start >= self.min_duration:
+                self.active = True
+            return closed
+
+        self.level2_since = None
+        if not self.active:
+            # 候选持续时间不足，放弃
+            self._reset()
+            return closed
+
+        if self.exit_since is None:
+            self.exit_since = timestamp
+        if timestamp - self.exit_since >= self.exit_duration:
+            closed.append(self._episode(self.exit_since, STATUS_CLOSED))
+            self._reset()
+        return closed
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        """
+        数据结束时进行中的事件
+
+        Returns:
+            Optional[Dict]: 进行中的事件 (结束时间为最后一条越过阈值的读数)，无则为None
+        """
+        if not self.active:
+            return None
+        return self._episode(self.last_beyond, STATUS_ONGOING)
+
+
+def detect_episodes(readings, max_gap: timedelta,
+                    kinds: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    检测一个设备按时间排序的读数中的全部事件
+
+    Args:
+        readings: (时间, 血糖值) 序列
+        max_gap: 读数最大间隔
+        kinds: 事件类型列表 (可选，默认全部)
+
+    Returns:
+        List[Dict]: 按开始时间排序的事件
+    """
+    detectors = [EpisodeDetector(kind, max_gap) for kind in (kinds or list(EPISODE_RULES))]
+    episodes = []
+    for timestamp, value in readings:
+        for detector in detectors:
+            episodes.extend(detector.feed(timestamp, value))
+    for detector in detectors:
+        episode = detector.finish()
+        if episode:
+            episodes.append(episode)
+    return sorted(episodes, key=lambda episode: episode['start'])
@@ -0,0 +1,259 @@
+"""
+血糖事件服务
+Glucose Event (Episode) Service
+
+检测到的低/高血糖事件保存在 glucose_events 集合中，每个 (用户, 设备) 独立检测。
+写入原始记录时只在记录附近的局部窗口内重放检测状态机并替换该窗口内的事件，
+历史数据通过 CLI 命令 rebuild-events 回填。
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.services.episode_detector import EPISODE_RULES, STATUS_ONGOING, EpisodeDetector
+from app.utils.time_utils import to_utc_naive
+
+
+class EventService:
+    """血糖事件服务类"""
+
+    def __init__(self):
+        self.collection = mongo.db.glucose_events
+        self.glucose_collection = mongo.db.glucose_records
+
+    @staticmethod
+    def _max_gap() -> timedelta:
+        """读数最大间隔 (超过视为传感器中断)"""
+        return timedelta(minutes=current_app.config.get('CGM_MAX_GAP_MINUTES', 15))
+
+    def _context(self) -> timedelta:
+        """局部重放窗口向两侧扩展的时长"""
+        longest_rule = max(rule['min_minutes'] + rule['exit_minutes']
+                           for rule in EPISODE_RULES.values())
+        return timedelta(minutes=longest_rule) + self._max_gap()
+
+    def _detectors(self) -> List[EpisodeDetector]:
+        """每种事件类型一个检测器"""
+        return [EpisodeDetector(kind, self._max_gap()) for kind in EPISODE_RULES]
+
+    @staticmethod
+    def _event_doc(user_id: str, device_id: Optional[str], episode: Dict[str, Any],
+                   now: datetime) -> Dict[str, Any]:
+        """生成事件文档"""
+        return {'user_id': user_id, 'device_id': device_id, **episode, 'updated_at': now}
+
+    def refresh(self, user_id: str, device_id: Optional[str], timestamp: datetime) -> int:
+        """
+        重新检测某条读数附近的事件 (写入、修改或删除读数后调用)
+
+        重放起点为记录前的扩展时长，并向前扩展到与窗口重叠的已有事件的开始，
+        此处所有检测器均为空闲状态；重放至窗口结束后所有检测器回到空闲 (或数据结束) 为止
+
+        Args:
+            user_id: 用户ID
+            device_id: 设备ID
+            timestamp: 读数时间 (朴素UTC或带时区)
+
+        Returns:
+            int: 窗口内检测到的事件数
+        """
+        try:
+            timestamp = to_utc_naive(timestamp)
+            context = self._context()
+            partition = {'user_id': user_id, 'device_id': device_id}
+            window_start, window_end = timestamp - context, timestamp + context
+
+            # 扩展窗口直到覆盖所有与之重叠的已有事件；进行中的事件由其后的下一条读数结束，
+            # 无论相隔多久都需重放
+            while True:
+                overlapping = list(self.collection.find(
+                    {
+                        **partition,
+                        'start': {'$lte': window_end},
+                        '$or': [{'end': {'$gte': window_start}}, {'status': STATUS_ONGOING}]
+                    },
+                    {'start': 1, 'end': 1}
+                ))
+                new_start = min([window_start] + [doc['start'] for doc in overlapping])
+                new_end = max([window_end] + [doc['end'] for doc in overlapping])
+                if (new_start, new_end) == (window_start, window_end):
+                    break
+                window_start, window_end = new_start, new_end
+
+            detectors = self._detectors()
+            episodes: List[Dict[str, Any]] = []
+            replay_end = window_start
+            cursor = self.glucose_collection.find(
+                {**partition, 'timestamp': {'$gte': window_start}},
+                {'_id': 0, 'timestamp': 1, 'glucose_value': 1}
+            ).sort('timestamp', 1)
+            for reading in cursor:
+                if reading['timestamp'] > window_end and all(d.idle for d in detectors):
+                    break
+                replay_end = reading['timestamp']
+                for detector in detectors:
+                    episodes.extend(detector.feed(reading['timestamp'], reading['glucose_value']))
+            for detector in detectors:
+                episode = detector.finish()
+                if episode:
+                    episodes.append(episode)
+
+            self._replace_events(partition, window_start, max(replay_end, window_end), episodes)
+            return len(episodes)
+
+        except PyMongoError as e:
+            raise Exception(f"事件检测失败: {str(e)}")
+
+    def _replace_events(self, partition: Dict[str, Any], start: datetime, end: datetime,
+                        episodes: List[Dict[str, Any]]) -> None:
+        """
+        用重放结果替换窗口内的事件
+
+        按 (用户, 设备, 类型, 开始时间) 幂等写入，并发重放同一窗口时结果一致
+
+        Args:
+            partition: 用户与设备条件
+            start: 窗口开始
+            end: 重放结束
+            episodes: 检测到的事件
+        """
+        stale_filter = {**partition, 'start': {'$gte': start, '$lte': end}}
+        if episodes:
+            stale_filter['$nor'] = [
+                {'kind': episode['kind'], 'start': episode['start']} for episode in episodes
+            ]
+        self.collection.delete_many(stale_filter)
+
+        if episodes:
+            now = datetime.utcnow()
+            self.collection.bulk_write([
+                UpdateOne(
+                    {**partition, 'kind': episode['kind'], 'start': episode['start']},
+                    {'$set': self._event_doc(partition['user_id'], partition['device_id'],
+                                             episode, now)},
+                    upsert=True
+                )
+                for episode in episodes
+            ], ordered=False)
+
+    def rebuild(self, user_id: Optional[str] = None, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        从原始记录重新检测全部事件 (用于历史数据回填)
+
+        按 (用户, 设备, 时间) 顺序流式读取读数，每个分区运行一组检测器
+
+        Args:
+            user_id: 用户ID (可选，不指定时处理所有用户)
+            batch_size: 批量写入大小
+
+        Returns:
+            Dict: 各事件类型写入的事件数
+        """
+        try:
+            scope = {'user_id': user_id} if user_id else {}
+            self.collection.delete_many(scope)
+
+            now = datetime.utcnow()
+            written = {kind: 0 for kind in EPISODE_RULES}
+            operations: List[InsertOne] = []
+            current: Optional[Tuple[str, Optional[str]]] = None
+            detectors: List[EpisodeDetector] = []
+
+            def emit(episode: Dict[str, Any]) -> None:
+                operations.append(InsertOne(self._event_doc(current[0], current[1], episode, now)))
+                written[episode['kind']] += 1
+                if len(operations) >= batch_size:
+                    self.collection.bulk_write(operations, ordered=False)
+                    operations.clear()
+
+            def finish_partition() -> None:
+                for detector in detectors:
+                    episode = detector.finish()
+                    if episode:
+                        emit(episode)
+
+            cursor = self.glucose_collection.find(
+                scope, {'_id': 0, 'user_id': 1, 'device_id': 1, 'timestamp': 1, 'glucose_value': 1}
+            ).sort([('user_id', 1), ('device_id', 1), ('timestamp', 1)]).batch_size(batch_size)
+
+            for reading in cursor:
+                key = (reading['user_id'], reading.get('device_id'))
+                if key != current:
+                    if current is not None:
+                        finish_partition()
+                    current, detectors = key, self._detectors()
+                for detector in detectors:
+                    for episode in detector.feed(reading['timestamp'], reading['glucose_value']):
+                        emit(episode)
+
+            if current is not None:
+                finish_partition()
+            if operations:
+                self.collection.bulk_write(operations, ordered=False)
+
+            return written
+
+        except PyMongoError as e:
+            raise Exception(f"事件回填失败: {str(e)}")
+
+    def get_episodes(self, user_id: str, start_date: datetime, end_date: datetime,
+                     kind: Optional[str] = None, min_level: int = 1,
+                     device_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        查询血糖事件
+
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期 (事件开始时间)
+            end_date: 结束日期
+            kind: 事件类型 (可选，hypo/hyper)
+            min_level: 最低事件等级 (1或2)
+            device_id: 设备ID (可选)
+
+        Returns:
+            Dict: 事件列表与汇总
+        """
+        try:
+            filter_dict = {
+                'user_id': user_id,
+                'start': {'$gte': start_date, '$lte': end_date}
+            }
+            if kind:
+                filter_dict['kind'] = kind
+            if min_level > 1:
+                filter_dict['level'] = {'$gte': min_level}
+            if device_id:
+                filter_dict['device_id'] = device_id
+
+            episodes = []
+            for doc in self.collection.find(filter_dict, {'updated_at': 0}).sort('start', 1):
+                doc['_id'] = str(doc['_id'])
+                doc['start'] = doc['start'].isoformat()
+                doc['end'] = doc['end'].isoformat()
+                episodes.append(doc)
+
+            summary = {}
+            for event_kind in ([kind] if kind else list(EPISODE_RULES)):
+                matched = [episode for episode in episodes if episode['kind'] == event_kind]
+                summary[event_kind] = {
+                    'count': len(matched),
+                    'level2_count': sum(1 for episode in matched if episode['level'] == 2),
+                    'total_minutes': round(sum(e['duration_minutes'] for e in matched), 1)
+                }
+
+            return {
+                'episodes': episodes,
+                'summary': summary,
+                'time_range': {
+                    'start_date': start_date.isoformat(),
+                    'end_date': end_date.isoformat()
+                }
+            }
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
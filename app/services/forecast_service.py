@@ -0,0 +1,174 @@
+"""
+血糖预测回测服务
+Glucose Forecast Backtest Service
+
+按 (用户, 设备, 时间) 顺序流式读取历史读数，以每条读数为最新读数预测 horizon 分钟后的血糖值，
+与实际读数比较得到误差与预测低血糖的准确度 (flask backtest-forecast)。
+
+多个设备分区拼接为一个数组一次向量化计算：每个分区的时间戳加上分区序号 × PARTITION_OFFSET_SECONDS，
+窗口与传感器中断的判定不会跨越分区。累计超过 BACKTEST_BATCH_POINTS 条读数时在分区边界处计算一批。
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.services.analytics_core import EPOCH
+from app.services.glucose_forecast import evaluate_forecasts, forecast_series
+from app.services.rollup_service import LOW_THRESHOLD
+
+
+# 拼接分区时相邻分区的时间间隔 (秒，约317年)
+PARTITION_OFFSET_SECONDS = 10 ** 10
+
+# 每批计算的读数条数
+BACKTEST_BATCH_POINTS = 200000
+
+
+class ForecastService:
+    """血糖预测回测服务类"""
+
+    def __init__(self):
+        self.collection = mongo.db.glucose_records
+
+    @staticmethod
+    def _parameters(horizon_minutes: Optional[int]) -> Dict[str, Any]:
+        """预测参数 (配置)"""
+        config = current_app.config
+        return {
+            'horizon_minutes': horizon_minutes or config.get('FORECAST_HORIZON_MINUTES', 30),
+            'history_minutes': config.get('FORECAST_HISTORY_MINUTES', 60),
+            'half_life_minutes': config.get('FORECAST_HALF_LIFE_MINUTES', 20),
+            'min_points': config.get('FORECAST_MIN_POINTS', 4),
+            'max_gap_minutes': config.get('CGM_MAX_GAP_MINUTES', 15)
+        }
+
+    @staticmethod
+    def _empty_totals() -> Dict[str, Any]:
+        """回测累计量"""
+        return {'readings': 0, 'partitions': 0, 'forecasts': 0, 'abs_error': 0.0,
+                'squared_error': 0.0, 'error': 0.0, 'baseline_abs_error': 0.0,
+                'true_positive': 0, 'false_positive': 0, 'false_negative': 0,
+                'model_seconds': 0.0}
+
+    def backtest(self, user_id: Optional[str] = None, days: int = 14,
+                 horizon_minutes: Optional[int] = None, threshold: float = LOW_THRESHOLD,
+                 end: Optional[datetime] = None, batch_size: int = 10000) -> Dict[str, Any]:
+        """
+        回放历史读数评估预测
+
+        Args:
+            user_id: 用户ID (可选，不指定时回放所有用户)
+            days: 回放的天数 (截至 end)
+            horizon_minutes: 预测时长 (默认 FORECAST_HORIZON_MINUTES)
+            threshold: 低血糖阈值 (mmol/L)
+            end: 结束时间 (默认当前UTC时间)
+            batch_size: 游标每批读取的文档数
+
+        Returns:
+            Dict: 读数与分区数、可评估的预测数、误差 (MAE/RMSE/偏差，及不变预测的 MAE 作为基线)、
+                  预测低血糖的混淆计数与精确率/召回率、模型计算耗时与吞吐量
+        """
+        try:
+            parameters = self._parameters(horizon_minutes)
+            end = end or datetime.utcnow()
+            query: Dict[str, Any] = {'timestamp': {'$gte': end - timedelta(days=days), '$lt': end}}
+            if user_id:
+                query['user_id'] = user_id
+
+            totals = self._empty_totals()
+            timestamps: List[float] = []
+            values: List[float] = []
+            current: Optional[Tuple[str, Any]] = None
+
+            def flush() -> None:
+                if timestamps:
+                    self._evaluate_batch(np.asarray(timestamps), np.asarray(values), parameters,
+                                         threshold, totals)
+                    timestamps.clear()
+                    values.clear()
+
+            started = time.perf_counter()
+            cursor = self.collection.find(
+                query, {'_id': 0, 'user_id': 1, 'device_id': 1, 'timestamp': 1, 'glucose_value': 1}
+            ).sort([('user_id', 1), ('device_id', 1), ('timestamp', 1)]).batch_size(batch_size)
+
+            for reading in cursor:
+                key = (reading['user_id'], reading.get('device_id'))
+                if key != current:
+                    if len(timestamps) >= BACKTEST_BATCH_POINTS:
+                        flush()
+                    current = key
+                    totals['partitions'] += 1
+                offset = totals['partitions'] * PARTITION_OFFSET_SECONDS
+                timestamps.append((reading['timestamp'] - EPOCH).total_seconds() + offset)
+                values.append(reading['glucose_value'])
+                totals['readings'] += 1
+            flush()
+
+            return self._summary(totals, parameters, threshold, days,
+                                 time.perf_counter() - started)
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+
+    @staticmethod
+    def _evaluate_batch(timestamps: np.ndarray, values: np.ndarray, parameters: Dict[str, Any],
+                        threshold: float, totals: Dict[str, Any]) -> None:
+        """对一批已按分区与时间排序的读数预测并累计误差与混淆计数"""
+        started = time.perf_counter()
+        predicted, _ = forecast_series(timestamps, values, **parameters)
+        totals['model_seconds'] += time.perf_counter() - started
+
+        result = evaluate_forecasts(timestamps, values, predicted, parameters['horizon_minutes'],
+                                    threshold)
+        error = result['predicted'] - result['actual']
+        totals['forecasts'] += len(error)
+        totals['abs_error'] += float(np.abs(error).sum())
+        totals['squared_error'] += float((error ** 2).sum())
+        totals['error'] += float(error.sum())
+        totals['baseline_abs_error'] += float(np.abs(result['current'] - result['actual']).sum())
+        totals['true_positive'] += int((result['predicted_low'] & result['actual_low']).sum())
+        totals['false_positive'] += int((result['predicted_low'] & ~result['actual_low']).sum())
+        totals['false_negative'] += int((~result['predicted_low'] & result['actual_low']).sum())
+
+    @staticmethod
+    def _summary(totals: Dict[str, Any], parameters: Dict[str, Any], threshold: float, days: int,
+                 elapsed: float) -> Dict[str, Any]:
+        """回测结果"""
+        count = totals['forecasts']
+        true_positive = totals['true_positive']
+        predicted = true_positive + totals['false_positive']
+        actual = true_positive + totals['false_negative']
+        model_seconds = totals['model_seconds']
+
+        def ratio(numerator: float, denominator: float, digits: int = 4) -> Optional[float]:
+            return round(numerator / denominator, digits) if denominator else None
+
+        return {
+            'days': days,
+            'parameters': parameters,
+            'threshold': threshold,
+            'readings': totals['readings'],
+            'partitions': totals['partitions'],
+            'forecasts': count,
+            'mae': ratio(totals['abs_error'], count),
+            'rmse': round(float(np.sqrt(totals['squared_error'] / count)), 4) if count else None,
+            'bias': ratio(totals['error'], count),
+            'baseline_mae': ratio(totals['baseline_abs_error'], count),
+            'predicted_low': {
+                'true_positive': true_positive,
+                'false_positive': totals['false_positive'],
+                'false_negative': totals['false_negative'],
+                'precision': ratio(true_positive, predicted),
+                'recall': ratio(true_positive, actual)
+            },
+            'model_seconds': round(model_seconds, 4),
+            'forecasts_per_second': round(totals['readings'] / model_seconds) if model_seconds else None,
+            'elapsed_seconds': round(elapsed, 3)
+        }
@@ -0,0 +1,194 @@
+"""
+短时血糖预测
+Short-Horizon Glucose Forecasting
+
+以最近 history 分钟 (同一设备、传感器未中断) 的读数拟合加权线性趋势，外推 horizon 分钟后的血糖值：
+- 权重随读数距最新读数的时间按 half_life 分钟半衰，近期读数对趋势影响更大
+- 读数少于 min_points 条时不预测
+- 计算对所有预测点向量化：每个预测点的窗口排成 (点数 × 窗口读数) 的矩阵，一次求出全部加权最小二乘解，
+  单个用户的写入路径与历史回测使用同一实现
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.rolling_windows import window_bounds
+
+
+# 默认参数 (分钟)
+DEFAULT_HORIZON_MINUTES = 30
+DEFAULT_HISTORY_MINUTES = 60
+DEFAULT_HALF_LIFE_MINUTES = 20
+DEFAULT_MIN_POINTS = 4
+
+# 单个窗口最多使用的读数条数 (1分钟间隔的CGM两小时)
+MAX_WINDOW_POINTS = 120
+
+# 历史回测每块计算的预测点数
+CHUNK_POINTS = 20000
+
+
+def segment_starts(timestamps: np.ndarray, max_gap_seconds: float) -> np.ndarray:
+    """
+    每条读数所在连续段 (相邻读数间隔不超过 max_gap_seconds) 的起始下标
+
+    Args:
+        timestamps: 已排序的时间戳 (秒)
+        max_gap_seconds: 最大间隔 (秒)
+
+    Returns:
+        np.ndarray: 起始下标
+    """
+    breaks = np.zeros(len(timestamps), dtype=np.int64)
+    if len(timestamps) > 1:
+        gaps = np.flatnonzero(np.diff(timestamps) > max_gap_seconds) + 1
+        breaks[gaps] = gaps
+    return np.maximum.accumulate(breaks)
+
+
+def fit_windows(timestamps: np.ndarray, values: np.ndarray, left: np.ndarray, right: np.ndarray,
+                horizon_minutes: float, half_life_minutes: float,
+                min_points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    对每个窗口 [left, right) 拟合加权线性趋势并外推到最后一条读数之后 horizon_minutes 分钟
+
+    Args:
+        timestamps: 已排序的时间戳 (秒)
+        values: 血糖值
+        left: 窗口起始下标
+        right: 窗口结束下标 (不含，最后一条读数为 right - 1)
+        horizon_minutes: 预测时长 (分钟)
+        half_life_minutes: 权重半衰期 (分钟)
+        min_points: 最少读数条数
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (预测值, 斜率 mmol/L/分钟)，读数不足的窗口为 NaN
+    """
+    count = len(left)
+    if count == 0:
+        return np.empty(0), np.empty(0)
+    width = int(min(max((right - left).max(), 1), MAX_WINDOW_POINTS))
+    index = right[:, None] - width + np.arange(width)[None, :]
+    valid = index >= left[:, None]
+    index = np.clip(index, 0, None)
+
+    x = (timestamps[index] - timestamps[right - 1][:, None]) / 60.0
+    y = values[index]
+    weights = np.where(valid, np.exp2(x / half_life_minutes), 0.0)
+
+    total = weights.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = (weights * x).sum(axis=1) / total
+        mean_y = (weights * y).sum(axis=1) / total
+        dx = x - mean_x[:, None]
+        sxx = (weights * dx * dx).sum(axis=1)
+        sxy = (weights * dx * (y - mean_y[:, None])).sum(axis=1)
+        slope = sxy / sxx
+    # x 以最后一条读数为0，外推到 horizon_minutes
+    predicted = mean_y + slope * (horizon_minutes - mean_x)
+
+    enough = (valid.sum(axis=1) >= min_points) & (sxx > 0)
+    return np.where(enough, predicted, np.nan), np.where(enough, slope, np.nan)
+
+
+def forecast_series(timestamps: np.ndarray, values: np.ndarray,
+                    horizon_minutes: float = DEFAULT_HORIZON_MINUTES,
+                    history_minutes: float = DEFAULT_HISTORY_MINUTES,
+                    half_life_minutes: float = DEFAULT_HALF_LIFE_MINUTES,
+                    min_points: int = DEFAULT_MIN_POINTS,
+                    max_gap_minutes: float = 15) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    以一个设备的每条读数为最新读数预测 horizon_minutes 分钟后的血糖值 (历史回测使用)
+
+    Args:
+        timestamps: 已排序的时间戳 (秒)
+        values: 血糖值
+        horizon_minutes: 预测时长 (分钟)
+        history_minutes: 拟合使用的历史时长 (分钟)
+        half_life_minutes: 权重半衰期 (分钟)
+        min_points: 最少读数条数
+        max_gap_minutes: 传感器中断的读数间隔 (分钟)，中断之前的读数不参与拟合
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (预测值, 斜率)
+    """
+    left, right = window_bounds(timestamps, int(history_minutes * 60))
+    left = np.maximum(left, segment_starts(timestamps, max_gap_minutes * 60))
+    predicted = np.empty(len(timestamps))
+    slopes = np.empty(len(timestamps))
+    # 分块计算，限制窗口矩阵的内存
+    for start in range(0, len(timestamps), CHUNK_POINTS):
+        end = start + CHUNK_POINTS
+        predicted[start:end], slopes[start:end] = fit_windows(
+            timestamps, values, left[start:end], right[start:end],
+            horizon_minutes, half_life_minutes, min_points
+        )
+    return predicted, slopes
+
+
+def forecast_latest(points: Sequence[Tuple[float, float]],
+                    horizon_minutes: float = DEFAULT_HORIZON_MINUTES,
+                    half_life_minutes: float = DEFAULT_HALF_LIFE_MINUTES,
+                    min_points: int = DEFAULT_MIN_POINTS,
+                    max_gap_minutes: float = 15) -> Optional[float]:
+    """
+    以最后一条读数为最新读数预测 horizon_minutes 分钟后的血糖值 (写入路径使用)
+
+    Args:
+        points: 按时间升序的 (时间戳秒, 血糖值)，已限定在历史时长内
+        horizon_minutes: 预测时长 (分钟)
+        half_life_minutes: 权重半衰期 (分钟)
+        min_points: 最少读数条数
+        max_gap_minutes: 传感器中断的读数间隔 (分钟)，中断之前的读数不参与拟合
+
+    Returns:
+        Optional[float]: 预测值，读数不足时返回None
+    """
+    if len(points) < min_points:
+        return None
+    array = np.asarray(points, dtype=np.float64)
+    left = segment_starts(array[:, 0], max_gap_minutes * 60)[-1:]
+    predicted, _ = fit_windows(array[:, 0], array[:, 1], left, np.array([len(array)]),
+                               horizon_minutes, half_life_minutes, min_points)
+    return None if np.isnan(predicted[0]) else float(predicted[0])
+
+
+def evaluate_forecasts(timestamps: np.ndarray, values: np.ndarray, predicted: np.ndarray,
+                       horizon_minutes: float, threshold: float,
+                       tolerance_minutes: float = 2.5) -> Dict[str, np.ndarray]:
+    """
+    把预测值与 horizon_minutes 分钟后实际的读数对齐
+
+    Args:
+        timestamps: 已排序的时间戳 (秒)
+        values: 血糖值
+        predicted: 每条读数的预测值 (NaN 表示未预测)
+        horizon_minutes: 预测时长 (分钟)
+        threshold: 低血糖阈值 (mmol/L)
+        tolerance_minutes: 实际读数与目标时间的最大偏差 (分钟)
+
+    Returns:
+        Dict: 可评估的预测 (有预测值且目标时间附近有实际读数) 的
+              predicted/actual/current 数组与 predicted_low/actual_low 布尔数组
+              (只统计当前读数不低于阈值的预测点)
+    """
+    target = timestamps + horizon_minutes * 60
+    position = np.searchsorted(timestamps, target)
+    after = np.minimum(position, len(timestamps) - 1)
+    before = np.maximum(position - 1, 0)
+    nearest = np.where(np.abs(timestamps[after] - target) < np.abs(timestamps[before] - target),
+                       after, before)
+    matched = (np.abs(timestamps[nearest] - target) <= tolerance_minutes * 60) & ~np.isnan(predicted)
+
+    actual = values[nearest][matched]
+    forecast = predicted[matched]
+    current = values[matched]
+    eligible = current >= threshold
+    return {
+        'predicted': forecast,
+        'actual': actual,
+        'current': current,
+        'predicted_low': (forecast < threshold) & eligible,
+        'actual_low': (actual < threshold) & eligible
+    }
@@ -3,13 +3,24 @@
 Glucose Data Business Logic Service
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from bson import ObjectId
+from flask import current_app
+from pymongo import ReturnDocument
 from pymongo.errors import PyMongoError
 
 from app import mongo
 from app.models.glucose import GlucoseRecord
+from app.services.alert_service import AlertService
+from app.services.completeness_service import CompletenessService
+from app.services.event_service import EventService
+from app.services.local_time_service import LocalTimeService
+from app.services.rollup_service import RollupService
+from app.services.snapshot_service import SnapshotService
+from app.utils.cache import get_stats_cache
+from app.utils.reading_cache import get_reading_cache
+from app.utils.time_utils import to_utc_naive
 
 
 class GlucoseService:
@@ -17,6 +28,93 @@ class GlucoseService:
     
     def __init__(self):
         self.collection = mongo.db.glucose_records
+        self.rollup_service = RollupService()
+        self.event_service = EventService()
+        self.completeness_service = CompletenessService()
+        self.local_time_service = LocalTimeService()
+        self.snapshot_service = SnapshotService()
+        self.alert_service = AlertService()
+    
+    def _sync_derived_data(self, old_record: Optional[Dict[str, Any]],
+                           new_record: Optional[Dict[str, Any]]) -> None:
+        """
+        同步派生数据 (汇总、血糖事件、设备完整性、用户快照、告警、统计结果缓存等)
+        
+        派生数据可通过CLI命令重建，同步失败时只记录日志，不影响原始记录的写入结果；
+        测试环境 (TESTING) 直接抛出异常，避免同步代码的错误被日志掩盖
+        
+        Args:
+            old_record: 写入前的记录 (新建时为None)
+            new_record: 写入后的记录 (删除时为None)
+        """
+        # 请求数据的时间带时区，数据库中为朴素UTC，统一后再比较
+        old_record, new_record = (
+            {**record, 'timestamp': to_utc_naive(record['timestamp'])} if record else None
+            for record in (old_record, new_record)
+        )
+        records = [record for record in (old_record, new_record) if record]
+        
+        if current_app.config.get('ROLLUPS_ENABLED', True):
+            try:
+                if old_record:
+                    self.rollup_service.remove_record(old_record)
+                if new_record:
+                    self.rollup_service.add_record(new_record)
+            except Exception as e:
+                self._sync_failed("派生数据同步失败", e)
+        
+        if current_app.config.get('EVENTS_ENABLED', True):
+            try:
+                positions = {
+                    (record['user_id'], record.get('device_id'), record['timestamp'])
+                    for record in records
+                }
+                for user_id, device_id, timestamp in positions:
+                    self.event_service.refresh(user_id, device_id, timestamp)
+            except Exception as e:
+                self._sync_failed("血糖事件同步失败", e)
+        
+        if current_app.config.get('COMPLETENESS_ENABLED', True):
+            try:
+                self.completeness_service.sync_records(records)
+            except Exception as e:
+                self._sync_failed("设备完整性汇总同步失败", e)
+        
+        # 快照的统计部分读取日汇总，在汇总更新之后同步
+        if current_app.config.get('SNAPSHOTS_ENABLED', True):
+            try:
+                self.snapshot_service.sync_records(old_record, new_record)
+            except Exception as e:
+                self._sync_failed("用户快照同步失败", e)
+        
+        # 新建的记录追加到最近读数缓存，修改与删除丢弃该用户的缓存
+        reading_cache = get_reading_cache()
+        if reading_cache is not None:
+            if old_record:
+                for user_id in {record['user_id'] for record in records}:
+                    reading_cache.invalidate(user_id)
+            elif new_record:
+                reading_cache.add(new_record)
+        
+        # 新建的记录评估用户的告警规则 (修改与删除历史记录不触发告警)
+        if new_record and not old_record and current_app.config.get('ALERTS_ENABLED', True):
+            try:
+                self.alert_service.process_record(new_record)
+            except Exception as e:
+                self._sync_failed("血糖告警评估失败", e)
+        
+        # 汇总更新之后再使缓存失效，避免并发查询读到旧汇总后重新写入缓存
+        stats_cache = get_stats_cache()
+        if stats_cache is not None:
+            for record in records:
+                stats_cache.invalidate(record['user_id'], record['timestamp'])
+    
+    @staticmethod
+    def _sync_failed(message: str, error: Exception) -> None:
+        """派生数据同步失败：记录日志，测试环境重新抛出"""
+        if current_app.config.get('TESTING'):
+            raise error
+        current_app.logger.warning(f"{message}: {str(error)}")
     
     def create_record(self, glucose_record: GlucoseRecord) -> GlucoseRecord:
         """
@@ -36,9 +134,17 @@ class GlucoseService:
             record_dict = glucose_record.to_dict()
             record_dict.pop('_id', None)  # 移除_id，让MongoDB自动生成
             
+            # 按用户时区写入本地时间字段
+            record_dict.update(self.local_time_service.fields_for(
+                record_dict['user_id'], record_dict['timestamp']
+            ))
+            
             # 插入数据库
             result = self.collection.insert_one(record_dict)
             
+            # 同步派生数据
+            self._sync_derived_data(None, record_dict)
+            
             # 返回创建的记录
             glucose_record._id = result.inserted_id
             return glucose_record
@@ -155,15 +261,20 @@ class GlucoseService:
             update_dict = glucose_record.to_dict()
             update_dict.pop('_id', None)
             update_dict['updated_at'] = datetime.utcnow()
+            update_dict.update(self.local_time_service.fields_for(
+                update_dict['user_id'], update_dict['timestamp']
+            ))
             
-            # 执行更新
-            result = self.collection.find_one_and_update(
+            # 执行更新 (返回更新前的记录用于同步派生数据)
+            previous = self.collection.find_one_and_update(
                 {'_id': ObjectId(record_id)},
                 {'$set': update_dict},
-                return_document=True
+                return_document=ReturnDocument.BEFORE
             )
             
-            if result:
+            if previous:
+                result = {**previous, **update_dict}
+                self._sync_derived_data(previous, result)
                 return GlucoseRecord.from_dict(result)
             return None
             
@@ -186,9 +297,12 @@ class GlucoseService:
                 return False
             
             # 执行删除
-            result = self.collection.delete_one({'_id': ObjectId(record_id)})
+            deleted = self.collection.find_one_and_delete({'_id': ObjectId(record_id)})
             
-            return result.deleted_count > 0
+            if deleted:
+                self._sync_derived_data(deleted, None)
+                return True
+            return False
             
         except PyMongoError as e:
             raise Exception(f"数据库删除失败: {str(e)}")
@@ -210,7 +324,7 @@ class GlucoseService:
     
     def get_latest_record(self, user_id: str, device_id: Optional[str] = None) -> Optional[GlucoseRecord]:
         """
-        获取用户最新的血糖记录
+        获取用户最新的血糖记录 (优先读取最近读数缓存)
         
         Args:
             user_id: 用户ID
@@ -220,6 +334,13 @@ class GlucoseService:
             Optional[GlucoseRecord]: 最新记录或None
         """
         try:
+            reading_cache = get_reading_cache()
+            if reading_cache is not None:
+                hit, record_dict = reading_cache.get_latest(user_id, device_id)
+                if hit:
+                    return GlucoseRecord.from_dict(record_dict) if record_dict else None
+                generation = reading_cache.generation(user_id)
+            
             filter_dict = {'user_id': user_id}
             if device_id:
                 filter_dict['device_id'] = device_id
@@ -229,9 +350,63 @@ class GlucoseService:
                 sort=[('timestamp', -1)]
             )
             
+            if reading_cache is not None:
+                reading_cache.set_latest(user_id, device_id, record_dict, generation)
+            
             if record_dict:
                 return GlucoseRecord.from_dict(record_dict)
             return None
             
         except PyMongoError as e:
             raise Exception(f"数据库查询失败: {str(e)}")
+    
+    def get_recent_readings(self, user_id: str, minutes: int,
+                            now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        获取最近一段时间的读数 (所有设备，优先读取最近读数缓存)
+        
+        缓存未覆盖时从数据库读取；范围在缓存窗口 (READING_CACHE_HOURS) 之内时按整个窗口读取并写入缓存
+        
+        Args:
+            user_id: 用户ID
+            minutes: 分钟数
+            now: 当前时间 (可选，默认当前UTC时间)
+            
+        Returns:
+            List[Dict]: 按时间升序的读数 (timestamp/glucose_value/device_id)
+        """
+        try:
+            now = now or datetime.utcnow()
+            start = now - timedelta(minutes=minutes)
+            load_start = start
+            
+            reading_cache = get_reading_cache()
+            cacheable = False
+            if reading_cache is not None:
+                readings = reading_cache.get_since(user_id, start)
+                if readings is not None:
+                    return readings
+                generation = reading_cache.generation(user_id)
+                cacheable = now - reading_cache.window <= start
+                if cacheable:
+                    load_start = now - reading_cache.window
+            
+            records = list(self.collection.find(
+                {'user_id': user_id, 'timestamp': {'$gte': load_start}},
+                {'_id': 0, 'timestamp': 1, 'glucose_value': 1, 'device_id': 1}
+            ).sort('timestamp', 1))
+            
+            if cacheable:
+                reading_cache.load(user_id, records, load_start, generation)
+            
+            return [
+                {
+                    'timestamp': record['timestamp'],
+                    'glucose_value': record['glucose_value'],
+                    'device_id': record.get('device_id')
+                }
+                for record in records if record['timestamp'] >= start
+            ]
+            
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
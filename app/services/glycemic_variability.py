@@ -0,0 +1,292 @@
+"""
+血糖变异性指标
+Glycemic Variability Indices
+
+在按固定间隔重采样的序列上计算 MAGE、CONGA-n、MODD 与 Kovatchev 低/高血糖风险指数
+(LBGI/HBGI)。重采样使时间滞后 (CONGA 的 n 小时、MODD 的24小时) 成为固定的数组位移，
+指标均为向量化运算；MAGE 的拐点检测向量化完成，仅对拐点序列做一次阈值过滤。
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.services.analytics_core import (
+    GlucoseSeries,
+    MMOL_TO_MGDL,
+    SECONDS_PER_DAY,
+    SECONDS_PER_HOUR,
+    split_groups
+)
+
+# Kovatchev 风险函数的血糖定义域 (mg/dL)
+RISK_MIN_MGDL = 20.0
+RISK_MAX_MGDL = 600.0
+
+
+def resample(series: GlucoseSeries, interval: int, max_gap: int) -> np.ndarray:
+    """
+    按固定间隔重采样 (网格对齐到 interval 的整数倍时间戳)
+
+    网格点位于两条相邻读数之间且两者间隔不超过 max_gap 时线性插值，否则为 NaN
+
+    Args:
+        series: 血糖时间序列
+        interval: 重采样间隔 (秒)
+        max_gap: 允许插值的最大读数间隔 (秒)
+
+    Returns:
+        np.ndarray: 重采样后的血糖值 (缺失为 NaN)
+    """
+    ordered = series.sorted()
+    timestamps, values = ordered.timestamps, ordered.values
+    if not len(timestamps):
+        return np.empty(0, dtype=np.float64)
+
+    first = -(-int(timestamps[0]) // interval) * interval
+    grid = np.arange(first, int(timestamps[-1]) + 1, interval, dtype=np.int64)
+
+    right = np.searchsorted(timestamps, grid, side='right')
+    left = right - 1
+    right_clipped = np.minimum(right, len(timestamps) - 1)
+
+    exact = timestamps[left] == grid
+    span = timestamps[right_clipped] - timestamps[left]
+    inside = (right < len(timestamps)) & (span <= max_gap)
+    weight = (grid - timestamps[left]) / np.where(span > 0, span, 1)
+    interpolated = values[left] + (values[right_clipped] - values[left]) * weight
+
+    return np.where(exact, values[left], np.where(inside, interpolated, np.nan))
+
+
+def lagged_differences(grid: np.ndarray, lag: int) -> np.ndarray:
+    """网格上相隔 lag 个点的差值 (两端均有值的点对)"""
+    if lag <= 0 or len(grid) <= lag:
+        return np.empty(0, dtype=np.float64)
+    differences = grid[lag:] - grid[:-lag]
+    return differences[~np.isnan(differences)]
+
+
+def conga(grid: np.ndarray, interval: int, hours: int = 1) -> Optional[float]:
+    """
+    CONGA-n：当前值与 n 小时前值之差的标准差
+
+    Args:
+        grid: 重采样序列
+        interval: 重采样间隔 (秒)
+        hours: 时间滞后 n (小时)
+
+    Returns:
+        Optional[float]: CONGA-n (点对不足时为None)
+    """
+    differences = lagged_differences(grid, hours * SECONDS_PER_HOUR // interval)
+    if len(differences) < 2:
+        return None
+    return float(differences.std(ddof=1))
+
+
+def modd(grid: np.ndarray, interval: int) -> Optional[float]:
+    """
+    MODD：相邻两天同一时刻血糖差的绝对值均值
+
+    Args:
+        grid: 重采样序列
+        interval: 重采样间隔 (秒)
+
+    Returns:
+        Optional[float]: MODD (数据不足一天时为None)
+    """
+    differences = lagged_differences(grid, SECONDS_PER_DAY // interval)
+    if not len(differences):
+        return None
+    return float(np.abs(differences).mean())
+
+
+def risk_indices(values: np.ndarray) -> Dict[str, Optional[float]]:
+    """
+    Kovatchev 低/高血糖风险指数
+
+    f(BG) = 1.509 × (ln(BG)^1.084 − 5.381)，BG 单位 mg/dL；r = 10 × f²，
+    LBGI 为 f < 0 时 r 的均值，HBGI 为 f > 0 时 r 的均值 (另一侧计0)
+
+    Args:
+        values: 血糖值 (mmol/L，不含 NaN)
+
+    Returns:
+        Dict: lbgi 与 hbgi (无数据时为None)
+    """
+    if not len(values):
+        return {'lbgi': None, 'hbgi': None}
+
+    glucose = np.clip(values * MMOL_TO_MGDL, RISK_MIN_MGDL, RISK_MAX_MGDL)
+    f = 1.509 * (np.log(glucose) ** 1.084 - 5.381)
+    risk = 10 * f * f
+    return {
+        'lbgi': float(np.where(f < 0, risk, 0.0).mean()),
+        'hbgi': float(np.where(f > 0, risk, 0.0).mean())
+    }
+
+
+def turning_points(values: np.ndarray) -> np.ndarray:
+    """
+    序列的拐点 (局部极大/极小值，含首尾点)
+
+    先合并连续相等的值，再取一阶差分符号变化的位置
+
+    Args:
+        values: 连续的血糖序列 (不含 NaN)
+
+    Returns:
+        np.ndarray: 交替出现的峰值与谷值
+    """
+    if len(values) < 3:
+        return values
+    distinct = values[np.r_[True, np.diff(values) != 0]]
+    if len(distinct) < 3:
+        return distinct
+    signs = np.sign(np.diff(distinct))
+    turns = np.flatnonzero(signs[1:] != signs[:-1]) + 1
+    return distinct[np.r_[0, turns, len(distinct) - 1]]
+
+
+def excursions(extrema: List[float], threshold: float) -> List[float]:
+    """
+    幅度不小于阈值的血糖波动 (带符号，上升为正)
+
+    在拐点序列上按阈值确认峰谷：只有反向变化达到阈值时，当前极值才被确认为峰或谷，
+    幅度不足的小波动被并入所在的大波动。只计入两端均为已确认峰谷的波动，
+    被序列首尾截断的波动不计入
+
+    Args:
+        extrema: 交替的峰谷值
+        threshold: 有效波动的最小幅度
+
+    Returns:
+        List[float]: 按时间顺序的有效波动幅度
+    """
+    if len(extrema) < 2:
+        return []
+
+    low = high = extrema[0]
+    low_index = high_index = 0
+    direction = 0
+    index = 1
+    while direction == 0 and index < len(extrema):
+        value = extrema[index]
+        if value < low:
+            low, low_index = value, index
+        elif value > high:
+            high, high_index = value, index
+        index += 1
+        if high - low >= threshold:
+            direction = 1 if value == high else -1
+    if direction == 0:
+        return []
+
+    # 起点为序列首点时，第一个波动被截断
+    pivot, extreme = (low, high) if direction > 0 else (high, low)
+    confirmed = (low_index if direction > 0 else high_index) > 0
+
+    swings = []
+    for value in extrema[index:]:
+        if direction > 0:
+            if value >= extreme:
+                extreme = value
+                continue
+            if extreme - value < threshold:
+                continue
+        else:
+            if value <= extreme:
+                extreme = value
+                continue
+            if value - extreme < threshold:
+                continue
+        if confirmed:
+            swings.append(extreme - pivot)
+        pivot, extreme, direction, confirmed = extreme, value, -direction, True
+    return swings
+
+
+def mage(grid: np.ndarray) -> Dict[str, Any]:
+    """
+    MAGE：幅度超过1个标准差的血糖波动的平均幅度
+
+    阈值为整个重采样序列的标准差；按首个有效波动的方向 (上升或下降) 计数。
+    缺失数据处断开，波动不跨越传感器中断
+
+    Args:
+        grid: 重采样序列
+
+    Returns:
+        Dict: mage (无有效波动时为None) 与 excursions (计入的波动数)
+    """
+    valid = ~np.isnan(grid)
+    if np.count_nonzero(valid) < 3:
+        return {'mage': None, 'excursions': 0}
+    threshold = float(grid[valid].std(ddof=1))
+    if threshold == 0:
+        return {'mage': None, 'excursions': 0}
+
+    # 连续有值的片段边界
+    edges = np.flatnonzero(np.diff(np.r_[0, valid.astype(np.int8), 0]))
+    swings: List[float] = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        swings.extend(excursions(turning_points(grid[start:end]).tolist(), threshold))
+
+    if not swings:
+        return {'mage': None, 'excursions': 0}
+    counted = [abs(swing) for swing in swings if (swing > 0) == (swings[0] > 0)]
+    return {'mage': sum(counted) / len(counted), 'excursions': len(counted)}
+
+
+def variability_indices(series: GlucoseSeries, interval: int, max_gap: int,
+                        conga_hours: int = 1) -> Dict[str, Any]:
+    """
+    计算全部血糖变异性指标
+
+    Args:
+        series: 血糖时间序列
+        interval: 重采样间隔 (秒)
+        max_gap: 允许插值的最大读数间隔 (秒)
+        conga_hours: CONGA 的时间滞后 (小时)
+
+    Returns:
+        Dict: 重采样点数与各项指标 (数据不足的指标为None)
+    """
+    grid = resample(series, interval, max_gap)
+    values = grid[~np.isnan(grid)]
+    excursion_stats = mage(grid)
+
+    return {
+        'resampled_points': len(values),
+        'mage': excursion_stats['mage'],
+        'mage_excursions': excursion_stats['excursions'],
+        'conga': conga(grid, interval, conga_hours),
+        'modd': modd(grid, interval),
+        **risk_indices(values)
+    }
+
+
+def grouped_variability_indices(values: np.ndarray, timestamps: np.ndarray, codes: np.ndarray,
+                                group_count: int, interval: int, max_gap: int,
+                                conga_hours: int = 1) -> List[Dict[str, Any]]:
+    """
+    按分组 (如用户) 计算变异性指标 (数组参数，可提交到分析计算进程池)
+
+    Args:
+        values: 血糖值数组
+        timestamps: UTC时间戳数组 (秒)
+        codes: 每条读数的分组序号 (0 至 group_count-1)
+        group_count: 分组数
+        interval: 重采样间隔 (秒)
+        max_gap: 允许插值的最大读数间隔 (秒)
+        conga_hours: CONGA 的时间滞后 (小时)
+
+    Returns:
+        List[Dict]: 各分组的指标 (按分组序号)
+    """
+    series = GlucoseSeries(values, timestamps)
+    return [
+        variability_indices(group, interval, max_gap, conga_hours)
+        for group in split_groups(series, codes, group_count)
+    ]
@@ -0,0 +1,194 @@
+"""
+本地时间字段服务
+Local Time Fields Service
+
+血糖记录写入时按用户时区预先计算本地时间字段，按一天中时段的查询无需在聚合中换算时区，
+并可使用 (user_id, minute_of_day, local_date) 复合索引：
+- local_date: 本地日期 (YYYY-MM-DD 字符串)
+- local_hour: 本地小时 (0-23)
+- minute_of_day: 本地时间在一天中的分钟数 (0-1439)
+- local_tz: 计算以上字段所用的时区名称
+
+用户修改时区后只标记 local_time_pending，不在请求中重写记录；历史数据与待重算的记录
+由 CLI 命令 backfill-local-time 分批重算 (只处理 local_tz 与用户当前时区不一致的记录，可中断后继续)。
+重算完成前，需要本地时间的查询对 local_tz 不一致的记录按用户当前时区换算。
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.utils.time_utils import parse_timezone, timezone_name, to_local, to_utc_naive
+
+# 未设置时区的用户按UTC计算
+DEFAULT_TIMEZONE = 'UTC'
+
+
+def local_fields(timestamp: datetime, tz) -> Dict[str, Any]:
+    """
+    计算记录的本地时间字段
+
+    Args:
+        timestamp: 记录时间 (朴素UTC或带时区)
+        tz: 用户时区
+
+    Returns:
+        Dict: local_date、local_hour、minute_of_day、local_tz
+    """
+    local = to_local(to_utc_naive(timestamp), tz)
+    return {
+        'local_date': local.strftime('%Y-%m-%d'),
+        'local_hour': local.hour,
+        'minute_of_day': local.hour * 60 + local.minute,
+        'local_tz': timezone_name(tz)
+    }
+
+
+class LocalTimeService:
+    """本地时间字段服务类"""
+
+    def __init__(self):
+        self.collection = mongo.db.glucose_records
+        self.users_collection = mongo.db.users
+
+    def get_timezone(self, user_id: str) -> str:
+        """
+        获取用户时区
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            str: IANA时区名称 (未设置或用户不存在时为UTC)
+        """
+        try:
+            if not ObjectId.is_valid(user_id):
+                return DEFAULT_TIMEZONE
+
+            user_doc = self.users_collection.find_one({'_id': ObjectId(user_id)}, {'timezone': 1})
+            return (user_doc or {}).get('timezone') or DEFAULT_TIMEZONE
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+
+    def get_timezones(self, user_ids: List[str]) -> Dict[str, str]:
+        """
+        批量获取用户时区 (一次查询)
+
+        Args:
+            user_ids: 用户ID列表
+
+        Returns:
+            Dict[str, str]: {用户ID: IANA时区名称}，未设置或用户不存在时为UTC
+        """
+        try:
+            object_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+            timezones = {
+                str(user_doc['_id']): user_doc.get('timezone') or DEFAULT_TIMEZONE
+                for user_doc in self.users_collection.find(
+                    {'_id': {'$in': object_ids}}, {'timezone': 1}
+                )
+            }
+            return {user_id: timezones.get(user_id, DEFAULT_TIMEZONE) for user_id in user_ids}
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+
+    def is_pending(self, user_id: str) -> bool:
+        """
+        用户修改时区后记录的本地时间字段是否尚未重算
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            bool: 是否等待回填
+        """
+        try:
+            if not ObjectId.is_valid(user_id):
+                return False
+
+            return self.users_collection.count_documents(
+                {'_id': ObjectId(user_id), 'local_time_pending': True}, limit=1
+            ) > 0
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+
+    def fields_for(self, user_id: str, timestamp: datetime) -> Dict[str, Any]:
+        """
+        按用户时区计算记录的本地时间字段
+
+        Args:
+            user_id: 用户ID
+            timestamp: 记录时间
+
+        Returns:
+            Dict: 本地时间字段
+        """
+        return local_fields(timestamp, parse_timezone(self.get_timezone(user_id)))
+
+    def backfill(self, user_id: Optional[str] = None, batch_size: int = 1000,
+                 pending_only: bool = False) -> int:
+        """
+        按用户当前时区分批重算记录的本地时间字段
+
+        只读取 local_tz 与用户当前时区不一致 (含缺少本地时间字段) 的记录，
+        中断后重新运行从未处理的记录继续。用户的记录全部重算后清除 local_time_pending 标记
+        (期间时区再次修改时保留标记，由下次运行处理)
+
+        Args:
+            user_id: 用户ID (可选，不指定时处理所有用户)
+            batch_size: 批量写入大小
+            pending_only: 只处理修改时区后等待回填的用户
+
+        Returns:
+            int: 更新的记录数
+        """
+        try:
+            if user_id:
+                user_ids = [user_id]
+            elif pending_only:
+                user_ids = [str(user_doc['_id']) for user_doc in self.users_collection.find(
+                    {'local_time_pending': True}, {'_id': 1}
+                )]
+            else:
+                user_ids = self.collection.distinct('user_id')
+            updated = 0
+
+            for current_user in user_ids:
+                tz_name = self.get_timezone(current_user)
+                tz = parse_timezone(tz_name)
+                operations: List[UpdateOne] = []
+                cursor = self.collection.find(
+                    {'user_id': current_user, 'local_tz': {'$ne': tz_name}}, {'timestamp': 1}
+                ).batch_size(batch_size)
+
+                for record in cursor:
+                    operations.append(UpdateOne(
+                        {'_id': record['_id']},
+                        {'$set': local_fields(record['timestamp'], tz)}
+                    ))
+                    if len(operations) >= batch_size:
+                        updated += self.collection.bulk_write(operations, ordered=False).modified_count
+                        operations = []
+
+                if operations:
+                    updated += self.collection.bulk_write(operations, ordered=False).modified_count
+
+                if ObjectId.is_valid(current_user):
+                    timezone_filter = ({'timezone': tz_name} if tz_name != DEFAULT_TIMEZONE
+                                       else {'timezone': {'$in': [None, '', DEFAULT_TIMEZONE]}})
+                    self.users_collection.update_one(
+                        {'_id': ObjectId(current_user), **timezone_filter},
+                        {'$unset': {'local_time_pending': ''}}
+                    )
+
+            return updated
+
+        except PyMongoError as e:
+            raise Exception(f"本地时间字段回填失败: {str(e)}")
@@ -0,0 +1,268 @@
+"""
+人群参考分布业务逻辑服务
+Population Reference Distribution Business Logic Service
+
+定时任务 (flask build-references) 按人口学分组 (年龄段 × 性别) 从日汇总计算各用户的
+达标时间 (TIR) 与平均血糖，每个分组的每项指标保存为固定分档的累计直方图 (reference_distributions 集合)。
+
+查询时由累计直方图直接换算用户指标在同组人群中的百分位 (O(1))，不需要扫描人群数据：
+- 分档内按均匀分布处理，返回值与精确百分位之差不超过一个分档内用户数的占比的一半
+- 分组人数不足 REFERENCE_MIN_USERS 时依次回退到 年龄段/全部性别、全部年龄/同性别、全部用户
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+from pymongo import ReplaceOne
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.services.cohort_service import COHORT_GENDERS, CohortAccumulator, CohortService
+from app.utils.time_utils import floor_day
+
+
+# 年龄段 (标签, 最小年龄, 最大年龄 (含))
+AGE_BANDS = [
+    ('0-17', 0, 17),
+    ('18-29', 18, 29),
+    ('30-39', 30, 39),
+    ('40-49', 40, 49),
+    ('50-59', 50, 59),
+    ('60-69', 60, 69),
+    ('70+', 70, 150)
+]
+
+# 不区分年龄段或性别的分组标签
+ALL = 'all'
+
+# 各指标累计直方图的分档 (下限, 上限, 档宽)
+REFERENCE_METRICS = {
+    'tir': (0.0, 100.0, 0.5),
+    'mean_glucose': (2.0, 25.0, 0.1)
+}
+
+
+def age_band(age: Optional[int]) -> Optional[str]:
+    """年龄所在的年龄段标签 (年龄未知时返回None)"""
+    if age is None:
+        return None
+    for label, low, high in AGE_BANDS:
+        if low <= age <= high:
+            return label
+    return None
+
+
+class ReferenceHistogram:
+    """固定分档的累计直方图 (用于百分位换算)"""
+
+    __slots__ = ('low', 'step', 'cumulative')
+
+    def __init__(self, low: float, step: float, cumulative: List[int]):
+        """
+        初始化
+
+        Args:
+            low: 第一档下限
+            step: 档宽
+            cumulative: 累计人数，cumulative[i] 为前 i 档的人数 (长度为档数+1)
+        """
+        self.low = low
+        self.step = step
+        self.cumulative = cumulative
+
+    @classmethod
+    def from_values(cls, values: List[float], low: float, high: float,
+                    step: float) -> 'ReferenceHistogram':
+        """由各用户的指标值构建 (超出范围的值计入首/末档)"""
+        bins = int(round((high - low) / step))
+        indexes = np.clip(np.floor((np.asarray(values, dtype=np.float64) - low) / step),
+                          0, bins - 1).astype(np.int64)
+        counts = np.bincount(indexes, minlength=bins)
+        return cls(low, step, [0] + np.cumsum(counts).tolist())
+
+    @property
+    def count(self) -> int:
+        """人数"""
+        return self.cumulative[-1]
+
+    def percentile_rank(self, value: float) -> Optional[float]:
+        """
+        指标值在人群中的百分位 (低于该值的人数占比，同档人数计一半)
+
+        Args:
+            value: 指标值
+
+        Returns:
+            Optional[float]: 0-100，人群为空时为None
+        """
+        total = self.count
+        if not total:
+            return None
+        index = min(max(int((value - self.low) // self.step), 0), len(self.cumulative) - 2)
+        below = self.cumulative[index]
+        within = self.cumulative[index + 1] - below
+        return round((below + within / 2) / total * 100, 1)
+
+    def to_doc(self) -> Dict[str, Any]:
+        """转换为文档字段"""
+        return {'low': self.low, 'step': self.step, 'cumulative': self.cumulative}
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> 'ReferenceHistogram':
+        """从文档字段创建"""
+        return cls(doc['low'], doc['step'], doc['cumulative'])
+
+
+class ReferenceService:
+    """人群参考分布服务类"""
+
+    def __init__(self):
+        self.collection = mongo.db.reference_distributions
+        self.users_collection = mongo.db.users
+        self.cohort_service = CohortService()
+        # 进程内缓存: (加载时间, {(年龄段, 性别): 分布})
+        self._cache: Tuple[float, Dict[Tuple[str, str], Dict[str, Any]]] = (0.0, {})
+        self._lock = threading.Lock()
+
+    def build(self, days: Optional[int] = None,
+              end_date: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        计算并保存各人口学分组的参考分布 (替换上次生成的结果)
+
+        Args:
+            days: 统计窗口天数 (可选，默认 REFERENCE_WINDOW_DAYS)
+            end_date: 窗口结束时间 (不含，可选，默认今天UTC零点)
+
+        Returns:
+            Dict[str, int]: {分组键: 人数}
+        """
+        try:
+            days = days or current_app.config.get('REFERENCE_WINDOW_DAYS', 14)
+            window_end = floor_day(end_date or datetime.utcnow())
+            window_start = window_end - timedelta(days=days)
+
+            # 按 (年龄段, 性别) 分组累积，年龄或性别未知的用户只计入更粗的分组
+            groups: Dict[Tuple[Optional[str], Optional[str]], List[Tuple[str, str]]] = {}
+            for user_doc in self.users_collection.find(
+                    {'is_active': True}, {'timezone': 1, 'age': 1, 'gender': 1}):
+                gender = user_doc.get('gender')
+                key = (age_band(user_doc.get('age')),
+                       gender if gender in COHORT_GENDERS else None)
+                groups.setdefault(key, []).append(
+                    (str(user_doc['_id']), user_doc.get('timezone') or 'UTC')
+                )
+
+            buckets: Dict[Tuple[str, str], CohortAccumulator] = {}
+            for (band, gender), members in sorted(groups.items(), key=str):
+                accumulator = self.cohort_service.accumulate(sorted(members), window_start,
+                                                             window_end)
+                for key in {(band, gender), (band, ALL), (ALL, gender), (ALL, ALL)}:
+                    if None in key:
+                        continue
+                    buckets.setdefault(key, CohortAccumulator()).merge(accumulator)
+
+            generated_at = datetime.utcnow()
+            operations = []
+            for (band, gender), accumulator in buckets.items():
+                values = {'tir': accumulator.tir, 'mean_glucose': accumulator.means}
+                doc = {
+                    '_id': f'{band}:{gender}',
+                    'age_band': band,
+                    'gender': gender,
+                    'users': len(accumulator.means),
+                    'window_days': days,
+                    'window_end': window_end,
+                    'generated_at': generated_at,
+                    'metrics': {
+                        name: ReferenceHistogram.from_values(values[name], *bins).to_doc()
+                        for name, bins in REFERENCE_METRICS.items()
+                    }
+                }
+                operations.append(ReplaceOne({'_id': doc['_id']}, doc, upsert=True))
+
+            if operations:
+                self.collection.bulk_write(operations, ordered=False)
+            # 删除本次没有用户的分组
+            self.collection.delete_many({'generated_at': {'$lt': generated_at}})
+            self._cache = (0.0, {})
+
+            return {f'{band}:{gender}': len(accumulator.means)
+                    for (band, gender), accumulator in sorted(buckets.items())}
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"参考分布生成失败: {str(e)}")
+
+    def _distributions(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """读取参考分布 (进程内缓存 REFERENCE_CACHE_TTL 秒)"""
+        loaded_at, distributions = self._cache
+        ttl = current_app.config.get('REFERENCE_CACHE_TTL', 300)
+        if time.monotonic() - loaded_at < ttl:
+            return distributions
+
+        with self._lock:
+            loaded_at, distributions = self._cache
+            if time.monotonic() - loaded_at < ttl:
+                return distributions
+
+            distributions = {}
+            for doc in self.collection.find({}):
+                doc['metrics'] = {name: ReferenceHistogram.from_doc(metric)
+                                  for name, metric in doc['metrics'].items()}
+                distributions[(doc['age_band'], doc['gender'])] = doc
+            self._cache = (time.monotonic(), distributions)
+            return distributions
+
+    def lookup(self, age: Optional[int], gender: Optional[str],
+               metrics: Dict[str, Optional[float]]) -> Optional[Dict[str, Any]]:
+        """
+        将用户的指标换算为同组人群中的百分位
+
+        Args:
+            age: 用户年龄 (可选)
+            gender: 用户性别 (可选)
+            metrics: {指标名: 指标值}，指标名为 tir 或 mean_glucose
+
+        Returns:
+            Optional[Dict]: 使用的分组与各指标的百分位，尚未生成参考分布时返回None
+        """
+        try:
+            distributions = self._distributions()
+            if not distributions:
+                return None
+
+            band = age_band(age) or ALL
+            gender = gender if gender in COHORT_GENDERS else ALL
+            min_users = current_app.config.get('REFERENCE_MIN_USERS', 20)
+            candidates = [(band, gender), (band, ALL), (ALL, gender), (ALL, ALL)]
+            distribution = next(
+                (distributions[key] for key in candidates
+                 if key in distributions and distributions[key]['users'] >= min_users),
+                distributions.get((ALL, ALL))
+            )
+            if distribution is None:
+                return None
+
+            return {
+                'age_band': distribution['age_band'],
+                'gender': distribution['gender'],
+                'users': distribution['users'],
+                'window_days': distribution['window_days'],
+                'generated_at': distribution['generated_at'].isoformat(),
+                'metrics': {
+                    name: {
+                        'value': value,
+                        'percentile': (distribution['metrics'][name].percentile_rank(value)
+                                       if value is not None else None)
+                    }
+                    for name, value in metrics.items()
+                }
+            }
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
@@ -0,0 +1,229 @@
+"""
+滚动窗口血糖序列
+Rolling-Window Glucose Series
+
+为每条读数计算 1/3/24 小时滚动均值、变化率 (mmol/L/min) 与趋势箭头。
+主路径通过 MongoDB `$setWindowFields` (按用户与设备分区、按时间排序) 在数据库内计算；
+数据库不支持窗口函数时 (MongoDB < 5.0、测试环境) 使用等价的 NumPy 向量化实现。
+窗口均按时间范围定义，[t - 窗口, t] 两端均含，与 `$setWindowFields` 的 range 窗口一致。
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.analytics_core import EPOCH, GlucoseSeries
+
+# 滚动均值窗口 (输出字段名 -> 窗口秒数)
+ROLLING_WINDOWS = {
+    'mean_1h': 3600,
+    'mean_3h': 3 * 3600,
+    'mean_24h': 24 * 3600
+}
+
+# 变化率按最近15分钟窗口内首尾读数的斜率计算
+RATE_WINDOW_SECONDS = 15 * 60
+
+# 读取窗口所需的回看时长
+LOOKBACK_SECONDS = max(ROLLING_WINDOWS.values())
+
+# 趋势箭头 (变化率下限 mmol/L/min，名称)，对应 CGM 常用的 ±1/2/3 mg/dL/min 分级
+TREND_ARROWS = [
+    (-float('inf'), 'double_down'),
+    (-0.17, 'single_down'),
+    (-0.11, 'forty_five_down'),
+    (-0.06, 'flat'),
+    (0.06, 'forty_five_up'),
+    (0.11, 'single_up'),
+    (0.17, 'double_up')
+]
+
+# 输出列顺序
+COLUMNS = ['timestamp', 'device_id', 'glucose_value'] + list(ROLLING_WINDOWS) + [
+    'rate_of_change', 'trend'
+]
+
+
+def window_pipeline(filter_dict: Dict[str, Any], start_date: datetime) -> List[Dict[str, Any]]:
+    """
+    构建 `$setWindowFields` 聚合管道
+
+    filter_dict 的时间条件应已向前扩展 LOOKBACK_SECONDS，使窗口开头的读数也有完整的回看数据；
+    窗口计算完成后再筛选出 start_date 之后的读数
+
+    Args:
+        filter_dict: 查询条件 (含回看区间)
+        start_date: 输出的开始时间
+
+    Returns:
+        List: 聚合管道
+    """
+    output = {
+        name: {
+            '$avg': '$glucose_value',
+            'window': {'range': [-seconds, 0], 'unit': 'second'}
+        }
+        for name, seconds in ROLLING_WINDOWS.items()
+    }
+    output['rate_of_change'] = {
+        '$derivative': {'input': '$glucose_value', 'unit': 'minute'},
+        'window': {'range': [-RATE_WINDOW_SECONDS, 0], 'unit': 'second'}
+    }
+
+    return [
+        {'$match': filter_dict},
+        {'$setWindowFields': {
+            'partitionBy': {'user_id': '$user_id', 'device_id': '$device_id'},
+            'sortBy': {'timestamp': 1},
+            'output': output
+        }},
+        {'$match': {'timestamp': {'$gte': start_date}}},
+        {'$sort': {'timestamp': 1}},
+        {'$project': {'_id': 0, 'timestamp': 1, 'device_id': 1, 'glucose_value': 1,
+                      'rate_of_change': 1, **{name: 1 for name in ROLLING_WINDOWS}}}
+    ]
+
+
+def window_bounds(timestamps: np.ndarray, seconds: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    每条读数的时间窗口 [t - seconds, t] 在已排序时间戳中的下标范围 [left, right)
+
+    Args:
+        timestamps: 已排序的时间戳 (秒)
+        seconds: 窗口时长 (秒)
+
+    Returns:
+        Tuple: (left, right)
+    """
+    left = np.searchsorted(timestamps, timestamps - seconds, side='left')
+    right = np.searchsorted(timestamps, timestamps, side='right')
+    return left, right
+
+
+def rolling_means(timestamps: np.ndarray, values: np.ndarray, seconds: int) -> np.ndarray:
+    """
+    时间窗口滚动均值 (前缀和相减)
+
+    Args:
+        timestamps: 已排序的时间戳 (秒)
+        values: 血糖值
+        seconds: 窗口时长 (秒)
+
+    Returns:
+        np.ndarray: 每条读数的滚动均值
+    """
+    left, right = window_bounds(timestamps, seconds)
+    cumulative = np.r_[0.0, np.cumsum(values)]
+    return (cumulative[right] - cumulative[left]) / (right - left)
+
+
+def window_slopes(timestamps: np.ndarray, values: np.ndarray, seconds: int) -> np.ndarray:
+    """
+    时间窗口内首尾读数的斜率 (每分钟变化量，与 `$derivative` 一致)
+
+    Args:
+        timestamps: 已排序的时间戳 (秒)
+        values: 血糖值
+        seconds: 窗口时长 (秒)
+
+    Returns:
+        np.ndarray: 每条读数的变化率 (窗口内只有一个时间点时为 NaN)
+    """
+    left, right = window_bounds(timestamps, seconds)
+    last = right - 1
+    span = (timestamps[last] - timestamps[left]).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = (values[last] - values[left]) / span * 60
+    return np.where(span > 0, slopes, np.nan)
+
+
+def trend_arrows(rates: np.ndarray) -> List[Optional[str]]:
+    """
+    按变化率分级的趋势箭头名称
+
+    Args:
+        rates: 变化率 (mmol/L/min，缺失为 NaN)
+
+    Returns:
+        List: 箭头名称 (变化率缺失时为None)
+    """
+    names = [name for _, name in TREND_ARROWS]
+    levels = np.searchsorted([bound for bound, _ in TREND_ARROWS[1:]], rates, side='right')
+    return [None if np.isnan(rate) else names[level]
+            for rate, level in zip(rates.tolist(), levels.tolist())]
+
+
+def load_partitions(documents: Iterable[Dict[str, Any]]) -> Tuple[GlucoseSeries, np.ndarray, List[Any]]:
+    """
+    读入文档并记录每条读数所属的设备分区
+
+    Args:
+        documents: 含 timestamp、glucose_value、device_id 的文档
+
+    Returns:
+        Tuple: (血糖时间序列, 分区序号数组, 分区设备ID列表)
+    """
+    devices: Dict[Any, int] = {}
+    codes: List[int] = []
+
+    def tagged():
+        for document in documents:
+            codes.append(devices.setdefault(document.get('device_id'), len(devices)))
+            yield document
+
+    series = GlucoseSeries.from_documents(tagged())
+    return series, np.asarray(codes, dtype=np.int64), list(devices)
+
+
+def compute_windows(series: GlucoseSeries, codes: np.ndarray,
+                    start_timestamp: int) -> Dict[str, np.ndarray]:
+    """
+    NumPy 向量化计算滚动窗口列 (按设备分区)
+
+    Args:
+        series: 含回看区间的血糖时间序列
+        codes: 每条读数的分区序号
+        start_timestamp: 输出的开始时间戳 (秒)
+
+    Returns:
+        Dict: 按时间排序、已筛除回看区间的列数组 (含 partition 分区序号列)
+    """
+    order = np.lexsort((series.timestamps, codes))
+    timestamps, values, codes = series.timestamps[order], series.values[order], codes[order]
+
+    columns = {name: np.empty(len(values)) for name in ROLLING_WINDOWS}
+    columns['rate_of_change'] = np.empty(len(values))
+
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(codes)]):
+        part_timestamps, part_values = timestamps[start:end], values[start:end]
+        for name, seconds in ROLLING_WINDOWS.items():
+            columns[name][start:end] = rolling_means(part_timestamps, part_values, seconds)
+        columns['rate_of_change'][start:end] = window_slopes(
+            part_timestamps, part_values, RATE_WINDOW_SECONDS
+        )
+
+    keep = timestamps >= start_timestamp
+    keep_order = np.argsort(timestamps[keep], kind='stable')
+    result = {name: column[keep][keep_order] for name, column in columns.items()}
+    result['timestamp'] = timestamps[keep][keep_order]
+    result['glucose_value'] = values[keep][keep_order]
+    result['partition'] = codes[keep][keep_order]
+    return result
+
+
+def compute_windows_from_arrays(values: np.ndarray, timestamps: np.ndarray, codes: np.ndarray,
+                                start_timestamp: int) -> Dict[str, np.ndarray]:
+    """compute_windows 的数组参数形式 (可提交到分析计算进程池)"""
+    return compute_windows(GlucoseSeries(values, timestamps), codes, start_timestamp)
+
+
+def lookback_start(start_date: datetime) -> datetime:
+    """读取窗口所需的最早时间"""
+    return start_date - timedelta(seconds=LOOKBACK_SECONDS)
+
+
+def epoch_seconds(value: datetime) -> int:
+    """朴素UTC时间转换为时间戳 (秒)"""
+    return int((value - EPOCH).total_seconds())
@@ -0,0 +1,687 @@
+"""
+血糖汇总(Rollup)业务逻辑服务
+Glucose Rollup Business Logic Service
+
+按 用户/设备/粒度/时间桶 增量维护 glucose_rollups 集合，
+使长时间范围的统计查询读取少量汇总文档而不是全部原始记录。
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Iterable
+from pymongo import UpdateOne, InsertOne, ReturnDocument
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.utils.quantile_sketch import QuantileSketch
+from app.utils.time_utils import to_utc_naive, floor_hour, floor_day, floor_month, add_months
+
+
+# 汇总粒度
+GRANULARITY_HOUR = 'hour'
+GRANULARITY_DAY = 'day'
+GRANULARITY_MONTH = 'month'
+ROLLUP_GRANULARITIES = [GRANULARITY_HOUR, GRANULARITY_DAY, GRANULARITY_MONTH]
+
+# 摘要统计使用的阈值 (mmol/L)
+LOW_THRESHOLD = 3.9
+HIGH_THRESHOLD = 7.8
+
+# 国际共识目标范围上限 (mmol/L)：目标范围内时间 (TIR) 统计 LOW_THRESHOLD-TARGET_HIGH_THRESHOLD，两端均含
+TARGET_HIGH_THRESHOLD = 10.0
+
+# 血糖分布区间 (左闭右开，与分布统计接口一致)
+DISTRIBUTION_RANGES = [
+    {'key': 'severe_low', 'name': '严重低血糖', 'min': 0, 'max': 2.8, 'color': '#ff4444'},
+    {'key': 'low', 'name': '低血糖', 'min': 2.8, 'max': 3.9, 'color': '#ff8800'},
+    {'key': 'normal', 'name': '正常', 'min': 3.9, 'max': 7.8, 'color': '#00cc44'},
+    {'key': 'mild_high', 'name': '轻度高血糖', 'min': 7.8, 'max': 11.1, 'color': '#ffaa00'},
+    {'key': 'high', 'name': '高血糖', 'min': 11.1, 'max': 50, 'color': '#ff4444'}
+]
+
+LEVEL_KEYS = ['low', 'normal', 'high']
+
+# 日汇总分位数草图的乐观并发更新重试次数
+SKETCH_MAX_RETRIES = 5
+
+
+def classify_level(value: float) -> str:
+    """按摘要统计规则分类 (低/正常/高)"""
+    if value < LOW_THRESHOLD:
+        return 'low'
+    if value > HIGH_THRESHOLD:
+        return 'high'
+    return 'normal'
+
+
+def in_target_range(value: float) -> bool:
+    """是否在共识目标范围 (3.9-10.0 mmol/L) 内"""
+    return LOW_THRESHOLD <= value <= TARGET_HIGH_THRESHOLD
+
+
+def classify_range(value: float) -> Optional[str]:
+    """按分布区间分类，不落入任何区间时返回None"""
+    for range_info in DISTRIBUTION_RANGES:
+        if range_info['min'] <= value < range_info['max']:
+            return range_info['key']
+    return None
+
+
+def cell_group_stage(group_id: Any) -> Dict[str, Any]:
+    """
+    构建将原始记录聚合为汇总单元的 $group 阶段
+
+    Args:
+        group_id: 分组键表达式
+
+    Returns:
+        Dict: $group 阶段
+    """
+    value = '$glucose_value'
+    group = {
+        '_id': group_id,
+        'count': {'$sum': 1},
+        'sum': {'$sum': value},
+        'sum_sq': {'$sum': {'$multiply': [value, value]}},
+        'min': {'$min': value},
+        'max': {'$max': value},
+        'level_low': {'$sum': {'$cond': [{'$lt': [value, LOW_THRESHOLD]}, 1, 0]}},
+        'level_high': {'$sum': {'$cond': [{'$gt': [value, HIGH_THRESHOLD]}, 1, 0]}},
+        'in_range': {'$sum': {'$cond': [{'$and': [
+            {'$gte': [value, LOW_THRESHOLD]},
+            {'$lte': [value, TARGET_HIGH_THRESHOLD]}
+        ]}, 1, 0]}}
+    }
+    for range_info in DISTRIBUTION_RANGES:
+        in_range = {'$and': [
+            {'$gte': [value, range_info['min']]},
+            {'$lt': [value, range_info['max']]}
+        ]}
+        group[f"range_{range_info['key']}"] = {'$sum': {'$cond': [in_range, 1, 0]}}
+    return {'$group': group}
+
+
+def bucket_end(granularity: str, bucket_start: datetime) -> datetime:
+    """计算时间桶的结束时间 (不含)"""
+    if granularity == GRANULARITY_HOUR:
+        return bucket_start + timedelta(hours=1)
+    if granularity == GRANULARITY_DAY:
+        return bucket_start + timedelta(days=1)
+    return add_months(bucket_start, 1)
+
+
+def hour_group_id(extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """按UTC小时分组的键表达式"""
+    group_id = dict(extra or {})
+    group_id.update({
+        'year': {'$year': '$timestamp'},
+        'month': {'$month': '$timestamp'},
+        'day': {'$dayOfMonth': '$timestamp'},
+        'hour': {'$hour': '$timestamp'}
+    })
+    return group_id
+
+
+class GlucoseAggregate:
+    """可合并的血糖聚合量 (计数/和/平方和/最值/区间计数/目标范围内计数)"""
+
+    __slots__ = ('count', 'sum', 'sum_sq', 'min', 'max', 'range_counts', 'level_counts',
+                 'in_range')
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min = None
+        self.max = None
+        self.range_counts = {r['key']: 0 for r in DISTRIBUTION_RANGES}
+        self.level_counts = {key: 0 for key in LEVEL_KEYS}
+        self.in_range = 0
+
+    def add(self, value: float) -> None:
+        """加入单个血糖值"""
+        self.count += 1
+        self.sum += value
+        self.sum_sq += value * value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.level_counts[classify_level(value)] += 1
+        self.in_range += in_target_range(value)
+        range_key = classify_range(value)
+        if range_key:
+            self.range_counts[range_key] += 1
+
+    def merge(self, other: 'GlucoseAggregate') -> 'GlucoseAggregate':
+        """合并另一个聚合量"""
+        if not other.count:
+            return self
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        for key, count in other.range_counts.items():
+            self.range_counts[key] = self.range_counts.get(key, 0) + count
+        for key, count in other.level_counts.items():
+            self.level_counts[key] = self.level_counts.get(key, 0) + count
+        self.in_range += other.in_range
+        return self
+
+    @property
+    def mean(self) -> Optional[float]:
+        """平均值"""
+        return self.sum / self.count if self.count else None
+
+    @property
+    def std(self) -> float:
+        """样本标准差"""
+        if self.count < 2:
+            return 0
+        variance = (self.sum_sq - self.sum * self.sum / self.count) / (self.count - 1)
+        return max(variance, 0.0) ** 0.5
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> 'GlucoseAggregate':
+        """从汇总文档 (或其小时子文档) 创建"""
+        aggregate = cls()
+        aggregate.count = doc.get('count', 0)
+        aggregate.sum = doc.get('sum', 0.0)
+        aggregate.sum_sq = doc.get('sum_sq', 0.0)
+        aggregate.min = doc.get('min')
+        aggregate.max = doc.get('max')
+        aggregate.range_counts.update(doc.get('range_counts', {}))
+        aggregate.level_counts.update(doc.get('level_counts', {}))
+        aggregate.in_range = doc.get('in_range', 0)
+        return aggregate
+
+    @classmethod
+    def from_group(cls, result: Dict[str, Any]) -> 'GlucoseAggregate':
+        """从 cell_group_stage 的聚合结果创建"""
+        aggregate = cls()
+        aggregate.count = result['count']
+        aggregate.sum = result['sum']
+        aggregate.sum_sq = result['sum_sq']
+        aggregate.min = result['min']
+        aggregate.max = result['max']
+        for range_info in DISTRIBUTION_RANGES:
+            aggregate.range_counts[range_info['key']] = result[f"range_{range_info['key']}"]
+        aggregate.level_counts['low'] = result['level_low']
+        aggregate.level_counts['high'] = result['level_high']
+        aggregate.level_counts['normal'] = result['count'] - result['level_low'] - result['level_high']
+        aggregate.in_range = result['in_range']
+        return aggregate
+
+    def to_fields(self, include_counts: bool = True) -> Dict[str, Any]:
+        """转换为汇总文档字段"""
+        fields = {
+            'count': self.count,
+            'sum': self.sum,
+            'sum_sq': self.sum_sq,
+            'min': self.min,
+            'max': self.max
+        }
+        if include_counts:
+            fields['range_counts'] = dict(self.range_counts)
+            fields['level_counts'] = dict(self.level_counts)
+            fields['in_range'] = self.in_range
+        return fields
+
+
+class BucketedAggregates:
+    """
+    按时间桶与一天中小时组织的聚合结果，供统计服务组合输出
+
+    periods 以桶起始时间为键：原始记录与日汇总按天，月汇总按月。
+    hours_of_day 以UTC小时 (0-23) 为键。
+    """
+
+    def __init__(self):
+        self.periods: Dict[datetime, GlucoseAggregate] = {}
+        self.hours_of_day: Dict[int, GlucoseAggregate] = {}
+
+    def add_cell(self, hour_start: datetime, aggregate: GlucoseAggregate) -> None:
+        """加入一个原始记录小时单元 (含区间计数)"""
+        self.hours_of_day.setdefault(hour_start.hour, GlucoseAggregate()).merge(aggregate)
+        self.periods.setdefault(floor_day(hour_start), GlucoseAggregate()).merge(aggregate)
+
+    def add_rollup_doc(self, doc: Dict[str, Any]) -> None:
+        """加入一个日/月汇总文档 (小时子文档不含区间计数)"""
+        self.periods.setdefault(doc['bucket_start'], GlucoseAggregate()).merge(
+            GlucoseAggregate.from_doc(doc)
+        )
+        for hour, hour_doc in doc.get('hours', {}).items():
+            self.hours_of_day.setdefault(int(hour), GlucoseAggregate()).merge(
+                GlucoseAggregate.from_doc(hour_doc)
+            )
+
+    def total(self) -> GlucoseAggregate:
+        """全部范围的合计"""
+        total = GlucoseAggregate()
+        for aggregate in self.periods.values():
+            total.merge(aggregate)
+        return total
+
+
+class RollupService:
+    """血糖汇总服务类"""
+
+    def __init__(self):
+        self.collection = mongo.db.glucose_rollups
+        self.glucose_collection = mongo.db.glucose_records
+
+    @staticmethod
+    def _bucket_filter(user_id: str, device_id: Optional[str], granularity: str,
+                       bucket_start: datetime) -> Dict[str, Any]:
+        """汇总文档的唯一键"""
+        return {
+            'user_id': user_id,
+            'device_id': device_id,
+            'granularity': granularity,
+            'bucket_start': bucket_start
+        }
+
+    def add_record(self, record: Dict[str, Any]) -> None:
+        """
+        将一条原始记录计入汇总 ($inc/$min/$max 原子更新)
+
+        Args:
+            record: 血糖记录字典
+        """
+        try:
+            value = record['glucose_value']
+            timestamp = to_utc_naive(record['timestamp'])
+            hour_start = floor_hour(timestamp)
+            range_key = classify_range(value)
+            now = datetime.utcnow()
+
+            operations = []
+            for granularity, bucket_start, prefixes in self._target_buckets(hour_start):
+                inc = {f'level_counts.{classify_level(value)}': 1,
+                       'in_range': int(in_target_range(value))}
+                if range_key:
+                    inc[f'range_counts.{range_key}'] = 1
+                min_update = {}
+                max_update = {}
+                for prefix in prefixes:
+                    inc[f'{prefix}count'] = 1
+                    inc[f'{prefix}sum'] = value
+                    inc[f'{prefix}sum_sq'] = value * value
+                    min_update[f'{prefix}min'] = value
+                    max_update[f'{prefix}max'] = value
+
+                operations.append(UpdateOne(
+                    self._bucket_filter(record['user_id'], record.get('device_id'),
+                                        granularity, bucket_start),
+                    {
+                        '$inc': inc,
+                        '$min': min_update,
+                        '$max': max_update,
+                        '$set': {'updated_at': now}
+                    },
+                    upsert=True
+                ))
+
+            self.collection.bulk_write(operations, ordered=False)
+
+            self._update_sketch(record['user_id'], record.get('device_id'),
+                                floor_day(hour_start), value, 1)
+
+        except PyMongoError as e:
+            raise Exception(f"汇总更新失败: {str(e)}")
+
+    def remove_record(self, record: Dict[str, Any]) -> None:
+        """
+        将一条原始记录从汇总中扣除
+
+        计数与和可直接 $inc 扣除；最值无法扣除，
+        当被删除的值恰为桶的最值时，从更细一级的数据重新计算该桶的最值。
+        调用前原始记录应已删除或已更新。
+
+        Args:
+            record: 血糖记录字典 (删除或更新前的值)
+        """
+        try:
+            value = record['glucose_value']
+            timestamp = to_utc_naive(record['timestamp'])
+            hour_start = floor_hour(timestamp)
+            hour_key = str(hour_start.hour)
+            range_key = classify_range(value)
+            user_id = record['user_id']
+            device_id = record.get('device_id')
+
+            for granularity, bucket_start, prefixes in self._target_buckets(hour_start):
+                inc = {f'level_counts.{classify_level(value)}': -1,
+                       'in_range': -int(in_target_range(value))}
+                if range_key:
+                    inc[f'range_counts.{range_key}'] = -1
+                for prefix in prefixes:
+                    inc[f'{prefix}count'] = -1
+                    inc[f'{prefix}sum'] = -value
+                    inc[f'{prefix}sum_sq'] = -value * value
+
+                bucket_filter = self._bucket_filter(user_id, device_id, granularity, bucket_start)
+                doc = self.collection.find_one_and_update(
+                    bucket_filter,
+                    {'$inc': inc, '$set': {'updated_at': datetime.utcnow()}},
+                    projection={'sketch': 0},
+                    return_document=ReturnDocument.AFTER
+                )
+                if not doc:
+                    continue
+
+                if doc['count'] <= 0:
+                    # 条件删除：扣除与删除之间并发写入的读数使计数重新为正时保留该桶
+                    deleted = self.collection.delete_one({'_id': doc['_id'], 'count': {'$lte': 0}})
+                    if deleted.deleted_count:
+                        continue
+                    doc = self.collection.find_one({'_id': doc['_id']}, {'sketch': 0})
+                    if not doc:
+                        continue
+
+                if granularity == GRANULARITY_DAY:
+                    self._update_sketch(user_id, device_id, bucket_start, value, -1)
+
+                # 被扣除的值可能是最值：从更细一级的数据重新计算
+                extremes = {}
+                if doc.get('min') is None or value <= doc['min'] or value >= doc['max']:
+                    extremes.update(self._finer_extremes(
+                        user_id, device_id, granularity, bucket_start
+                    ))
+
+                unset = {}
+                if granularity != GRANULARITY_HOUR:
+                    hour_doc = doc.get('hours', {}).get(hour_key, {})
+                    if hour_doc.get('count', 0) <= 0:
+                        unset[f'hours.{hour_key}'] = ''
+                    elif value <= hour_doc['min'] or value >= hour_doc['max']:
+                        hour_extremes = self._finer_extremes(
+                            user_id, device_id, granularity, bucket_start, hour_start.hour
+                        )
+                        extremes.update({f'hours.{hour_key}.{k}': v for k, v in hour_extremes.items()})
+
+                update = {}
+                if extremes:
+                    update['$set'] = extremes
+                if unset:
+                    update['$unset'] = unset
+                if update:
+                    self.collection.update_one({'_id': doc['_id']}, update)
+
+        except PyMongoError as e:
+            raise Exception(f"汇总更新失败: {str(e)}")
+
+    def _update_sketch(self, user_id: str, device_id: Optional[str], day_start: datetime,
+                       value: float, count: int) -> None:
+        """
+        更新日汇总的分位数草图
+
+        草图以 BSON Binary 存储，无法 $inc，采用 sketch_version 乐观并发控制
+
+        Args:
+            user_id: 用户ID
+            device_id: 设备ID
+            day_start: 日汇总桶起始时间
+            value: 血糖值
+            count: 加入 (1) 或扣除 (-1)
+        """
+        bucket_filter = self._bucket_filter(user_id, device_id, GRANULARITY_DAY, day_start)
+        for _ in range(SKETCH_MAX_RETRIES):
+            doc = self.collection.find_one(bucket_filter, {'sketch': 1, 'sketch_version': 1})
+            if not doc:
+                return
+
+            sketch = QuantileSketch.from_binary(doc.get('sketch'))
+            sketch.add(value, count)
+            result = self.collection.update_one(
+                {'_id': doc['_id'], 'sketch_version': doc.get('sketch_version')},
+                {'$set': {'sketch': sketch.to_binary()}, '$inc': {'sketch_version': 1}}
+            )
+            if result.matched_count:
+                return
+
+        raise Exception("分位数草图更新冲突，请稍后使用 rebuild-rollups 重建")
+
+    @staticmethod
+    def _target_buckets(hour_start: datetime):
+        """一条记录需要更新的汇总桶：(粒度, 桶起始, 字段前缀列表)"""
+        hour_prefix = f'hours.{hour_start.hour}.'
+        return (
+            (GRANULARITY_HOUR, hour_start, ['']),
+            (GRANULARITY_DAY, floor_day(hour_start), ['', hour_prefix]),
+            (GRANULARITY_MONTH, floor_month(hour_start), ['', hour_prefix])
+        )
+
+    def _finer_extremes(self, user_id: str, device_id: Optional[str], granularity: str,
+                        bucket_start: datetime, hour: Optional[int] = None) -> Dict[str, Any]:
+        """
+        从更细一级的数据重新计算时间桶的最值
+
+        小时桶读取原始记录，日桶读取小时汇总，月桶读取日汇总 (均已先行更新)。
+
+        Args:
+            user_id: 用户ID
+            device_id: 设备ID
+            granularity: 时间桶粒度
+            bucket_start: 桶起始时间
+            hour: 只计算桶内该小时子文档的最值 (可选，日/月桶)
+
+        Returns:
+            Dict: {'min': ..., 'max': ...}，没有数据时为空
+        """
+        end = bucket_end(granularity, bucket_start)
+        if granularity == GRANULARITY_HOUR:
+            collection = self.glucose_collection
+            match = {'timestamp': {'$gte': bucket_start, '$lt': end}}
+            min_field = max_field = '$glucose_value'
+        else:
+            collection = self.collection
+            if granularity == GRANULARITY_DAY and hour is not None:
+                finer = GRANULARITY_HOUR
+                bucket_start = bucket_start + timedelta(hours=hour)
+                end = bucket_start + timedelta(hours=1)
+                hour = None
+            else:
+                finer = GRANULARITY_DAY if granularity == GRANULARITY_MONTH else GRANULARITY_HOUR
+            match = {'granularity': finer, 'bucket_start': {'$gte': bucket_start, '$lt': end}}
+            prefix = f'hours.{hour}.' if hour is not None else ''
+            min_field = f'${prefix}min'
+            max_field = f'${prefix}max'
+
+        match.update({'user_id': user_id, 'device_id': device_id})
+        pipeline = [
+            {'$match': match},
+            {'$group': {
+                '_id': None,
+                'min': {'$min': min_field},
+                'max': {'$max': max_field}
+            }}
+        ]
+        results = list(collection.aggregate(pipeline))
+        if not results or results[0]['min'] is None:
+            return {}
+        return {'min': results[0]['min'], 'max': results[0]['max']}
+
+    def get_buckets(self, user_id: str, granularity: str, start: datetime, end: datetime,
+                    device_id: Optional[str] = None,
+                    projection: Optional[Dict[str, Any]] = None) -> Iterable[Dict[str, Any]]:
+        """
+        获取时间范围内的汇总文档
+
+        Args:
+            user_id: 用户ID
+            granularity: 粒度 ('hour', 'day', 'month')
+            start: 起始桶 (含)
+            end: 结束桶 (不含)
+            device_id: 设备ID (可选，不指定时返回所有设备的汇总)
+            projection: 返回字段 (可选，默认不含分位数草图)
+
+        Returns:
+            Iterable[Dict]: 汇总文档游标
+        """
+        try:
+            filter_dict = {
+                'user_id': user_id,
+                'granularity': granularity,
+                'bucket_start': {'$gte': start, '$lt': end}
+            }
+            if device_id:
+                filter_dict['device_id'] = device_id
+
+            if projection is None:
+                projection = {'_id': 0, 'updated_at': 0, 'sketch': 0, 'sketch_version': 0}
+
+            return self.collection.find(filter_dict, projection)
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+
+    def _rebuild_sketches(self, scope: Dict[str, Any], batch_size: int) -> None:
+        """
+        按 用户/设备/天/血糖值 聚合原始记录，重建日汇总的分位数草图
+
+        按原始值分组 (而非在数据库中计算桶序号)，保证分桶规则与增量维护一致；
+        血糖值精度有限，每天的分组数很少。
+        """
+        pipeline = [
+            {'$match': scope},
+            {'$group': {
+                '_id': {
+                    'user_id': '$user_id',
+                    'device_id': '$device_id',
+                    'year': {'$year': '$timestamp'},
+                    'month': {'$month': '$timestamp'},
+                    'day': {'$dayOfMonth': '$timestamp'},
+                    'value': '$glucose_value'
+                },
+                'count': {'$sum': 1}
+            }},
+            {'$sort': {
+                '_id.user_id': 1, '_id.device_id': 1, '_id.year': 1,
+                '_id.month': 1, '_id.day': 1
+            }}
+        ]
+
+        operations: List[UpdateOne] = []
+        current_key = None
+        sketch = QuantileSketch()
+
+        def finish(day_key):
+            user_id, device_id, day_start = day_key
+            operations.append(UpdateOne(
+                self._bucket_filter(user_id, device_id, GRANULARITY_DAY, day_start),
+                {'$set': {'sketch': sketch.to_binary(), 'sketch_version': 1}}
+            ))
+            if len(operations) >= batch_size:
+                self.collection.bulk_write(operations, ordered=False)
+                operations.clear()
+
+        for result in self.glucose_collection.aggregate(pipeline, allowDiskUse=True):
+            key = result['_id']
+            day_key = (key['user_id'], key.get('device_id'),
+                       datetime(key['year'], key['month'], key['day']))
+            if day_key != current_key:
+                if current_key is not None:
+                    finish(current_key)
+                current_key = day_key
+                sketch = QuantileSketch()
+            sketch.add(key['value'], result['count'])
+
+        if current_key is not None:
+            finish(current_key)
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def rebuild(self, user_id: Optional[str] = None, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        从原始记录重建汇总 (用于历史数据回填)
+
+        Args:
+            user_id: 用户ID (可选，不指定时重建所有用户)
+            batch_size: 批量写入大小
+
+        Returns:
+            Dict: 各粒度写入的汇总文档数
+        """
+        try:
+            scope = {'user_id': user_id} if user_id else {}
+            self.collection.delete_many(scope)
+
+            pipeline = [
+                {'$match': scope},
+                cell_group_stage(hour_group_id({
+                    'user_id': '$user_id',
+                    'device_id': '$device_id'
+                })),
+                {'$sort': {
+                    '_id.user_id': 1, '_id.device_id': 1, '_id.year': 1,
+                    '_id.month': 1, '_id.day': 1, '_id.hour': 1
+                }}
+            ]
+
+            now = datetime.utcnow()
+            written = {granularity: 0 for granularity in ROLLUP_GRANULARITIES}
+            operations: List[InsertOne] = []
+            # 正在累积的日/月汇总 (结果按时间排序，键变化时写出)
+            open_buckets: Dict[str, Dict[str, Any]] = {}
+
+            def flush(force: bool = False):
+                if operations and (force or len(operations) >= batch_size):
+                    self.collection.bulk_write(operations, ordered=False)
+                    operations.clear()
+
+            def close_bucket(granularity: str):
+                state = open_buckets.pop(granularity)
+                doc = self._bucket_filter(state['user_id'], state['device_id'],
+                                          granularity, state['bucket_start'])
+                doc.update(state['aggregate'].to_fields())
+                doc['hours'] = {
+                    str(hour): aggregate.to_fields(include_counts=False)
+                    for hour, aggregate in state['hours'].items()
+                }
+                doc['updated_at'] = now
+                operations.append(InsertOne(doc))
+                written[granularity] += 1
+
+            for result in self.glucose_collection.aggregate(pipeline, allowDiskUse=True):
+                key = result['_id']
+                hour_start = datetime(key['year'], key['month'], key['day'], key['hour'])
+                aggregate = GlucoseAggregate.from_group(result)
+
+                hour_doc = self._bucket_filter(key['user_id'], key.get('device_id'),
+                                               GRANULARITY_HOUR, hour_start)
+                hour_doc.update(aggregate.to_fields())
+                hour_doc['updated_at'] = now
+                operations.append(InsertOne(hour_doc))
+                written[GRANULARITY_HOUR] += 1
+
+                for granularity, bucket_start in (
+                    (GRANULARITY_DAY, floor_day(hour_start)),
+                    (GRANULARITY_MONTH, floor_month(hour_start))
+                ):
+                    bucket_key = (key['user_id'], key.get('device_id'), bucket_start)
+                    state = open_buckets.get(granularity)
+                    if state is not None and state['key'] != bucket_key:
+                        close_bucket(granularity)
+                        state = None
+                    if state is None:
+                        state = open_buckets[granularity] = {
+                            'key': bucket_key,
+                            'user_id': key['user_id'],
+                            'device_id': key.get('device_id'),
+                            'bucket_start': bucket_start,
+                            'aggregate': GlucoseAggregate(),
+                            'hours': {}
+                        }
+                    state['aggregate'].merge(aggregate)
+                    state['hours'].setdefault(hour_start.hour, GlucoseAggregate()).merge(aggregate)
+                flush()
+
+            for granularity in list(open_buckets):
+                close_bucket(granularity)
+            flush(force=True)
+
+            self._rebuild_sketches(scope, batch_size)
+
+            return written
+
+        except PyMongoError as e:
+            raise Exception(f"汇总重建失败: {str(e)}")
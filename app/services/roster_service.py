@@ -0,0 +1,346 @@
+"""
+患者名单风险排序业务逻辑服务
+Clinic Roster Triage Business Logic Service
+
+按可配置的风险评分对医生给出的一组患者排序，评分只读取已维护的派生数据，不扫描原始记录：
+- 最近 ROSTER_WINDOW_DAYS 天的日汇总 (TIR 按共识目标范围 3.9-10.0 mmol/L，TBR <3.9 mmol/L)
+- 最近 ROSTER_EPISODE_DAYS 天的低血糖事件 (glucose_events)
+- 每位用户的最新读数 (用户首页快照 user_snapshots 中的 readings[0])
+- 设备最后同步时间 (devices.last_sync)
+
+各项数据分别通过一次 $in 批量查询读取，并在查询线程池中并发执行；
+分页时以堆选出前 offset+limit 名 (O(n log k))，只为当前页生成明细。
+"""
+
+import heapq
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from flask import current_app
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.services.episode_detector import EPISODE_RULES, EVENT_HYPER, EVENT_HYPO
+from app.services.rollup_service import GRANULARITY_DAY, LOW_THRESHOLD, TARGET_HIGH_THRESHOLD
+from app.utils.query_pool import QueryDeadlineExceeded, QueryPoolBusy, get_query_pool
+from app.utils.time_utils import floor_day
+
+
+# 风险评分的组成项 (各项取值 0-1)，默认权重见 ROSTER_RISK_WEIGHTS
+RISK_COMPONENTS = ('tbr', 'tir', 'hypo_episodes', 'latest_reading', 'sync_gap')
+
+# 各组成项达到满分的取值
+TBR_SATURATION = 10.0  # 低于目标范围时间 (%)
+TIR_TARGET = 70.0  # 目标范围内时间 (3.9-10.0 mmol/L) 目标 (%)，低于目标的差距按比例计分
+HYPO_EPISODES_SATURATION = 4  # 低血糖事件数 (2级事件计两次)
+SYNC_GAP_SATURATION_HOURS = 72.0  # 距最后同步的小时数
+
+# 最新读数的风险分 (严重低血糖、低血糖、严重高血糖)
+LATEST_LEVEL2_LOW_SCORE = 1.0
+LATEST_LOW_SCORE = 0.6
+LATEST_LEVEL2_HIGH_SCORE = 0.5
+
+
+def parse_risk_weights(weights: Any) -> Dict[str, float]:
+    """
+    解析风险评分权重 (未给出的组成项使用 ROSTER_RISK_WEIGHTS 中的默认值)
+
+    Args:
+        weights: {组成项: 权重} (可选)
+
+    Returns:
+        Dict[str, float]: 全部组成项的权重
+
+    Raises:
+        ValueError: 参数格式错误
+    """
+    parsed = {name: float(value)
+              for name, value in current_app.config.get('ROSTER_RISK_WEIGHTS', {}).items()}
+    if weights is None:
+        return {name: parsed.get(name, 0.0) for name in RISK_COMPONENTS}
+    if not isinstance(weights, dict):
+        raise ValueError("weights 应为 {组成项: 权重} 对象")
+
+    for name, value in weights.items():
+        if name not in RISK_COMPONENTS:
+            raise ValueError(f"未知的风险组成项: {name}，应为 {', '.join(RISK_COMPONENTS)} 之一")
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"{name} 的权重应为非负数")
+        parsed[name] = float(value)
+    return {name: parsed.get(name, 0.0) for name in RISK_COMPONENTS}
+
+
+def risk_components(metrics: Dict[str, Any], now: datetime) -> Dict[str, float]:
+    """
+    计算一位患者的风险组成项
+
+    Args:
+        metrics: 患者的派生数据 (readings/low/in_range 读数计数、hypo_episodes、
+                 severe_hypo_episodes、latest_value、last_sync)
+        now: 当前时间 (UTC)
+
+    Returns:
+        Dict[str, float]: {组成项: 0-1}，窗口内没有读数时TIR/TBR两项为0 (由同步间隔体现)
+    """
+    readings = metrics.get('readings', 0)
+    if readings:
+        tbr = metrics.get('low', 0) / readings * 100
+        tir = metrics.get('in_range', 0) / readings * 100
+        tbr_score = min(tbr / TBR_SATURATION, 1.0)
+        tir_score = min(max((TIR_TARGET - tir) / TIR_TARGET, 0.0), 1.0)
+    else:
+        tbr_score = tir_score = 0.0
+
+    episodes = metrics.get('hypo_episodes', 0) + metrics.get('severe_hypo_episodes', 0)
+
+    latest = metrics.get('latest_value')
+    hypo, hyper = EPISODE_RULES[EVENT_HYPO], EPISODE_RULES[EVENT_HYPER]
+    if latest is None:
+        latest_score = 0.0
+    elif latest < hypo['level2_threshold']:
+        latest_score = LATEST_LEVEL2_LOW_SCORE
+    elif latest < hypo['threshold']:
+        latest_score = LATEST_LOW_SCORE
+    elif latest > hyper['level2_threshold']:
+        latest_score = LATEST_LEVEL2_HIGH_SCORE
+    else:
+        latest_score = 0.0
+
+    last_sync = metrics.get('last_sync')
+    if last_sync is None:
+        sync_score = 1.0
+    else:
+        hours = max((now - last_sync).total_seconds() / 3600, 0.0)
+        sync_score = min(hours / SYNC_GAP_SATURATION_HOURS, 1.0)
+
+    return {
+        'tbr': tbr_score,
+        'tir': tir_score,
+        'hypo_episodes': min(episodes / HYPO_EPISODES_SATURATION, 1.0),
+        'latest_reading': latest_score,
+        'sync_gap': sync_score
+    }
+
+
+def risk_score(components: Dict[str, float], weights: Dict[str, float]) -> float:
+    """按权重合计风险组成项"""
+    return sum(weights[name] * components[name] for name in RISK_COMPONENTS)
+
+
+def top_ranked(scores: List[Tuple[float, str]], limit: int,
+               offset: int = 0) -> List[Tuple[float, str]]:
+    """
+    以堆选出风险最高的一页 (同分时保持输入顺序)
+
+    Args:
+        scores: (风险分, 用户ID) 列表
+        limit: 每页数量
+        offset: 跳过的数量
+
+    Returns:
+        List[Tuple[float, str]]: 第 offset+1 到 offset+limit 名
+    """
+    return heapq.nlargest(offset + limit, scores, key=lambda item: item[0])[offset:]
+
+
+class RosterService:
+    """患者名单风险排序服务类"""
+
+    def __init__(self):
+        self.users_collection = mongo.db.users
+        self.rollup_collection = mongo.db.glucose_rollups
+        self.glucose_collection = mongo.db.glucose_records
+        self.events_collection = mongo.db.glucose_events
+        self.devices_collection = mongo.db.devices
+        self.snapshot_collection = mongo.db.user_snapshots
+
+    def _existing_users(self, user_ids: List[str]) -> List[str]:
+        """存在的用户ID"""
+        object_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+        return [str(user_doc['_id'])
+                for user_doc in self.users_collection.find({'_id': {'$in': object_ids}}, {'_id': 1})]
+
+    def _level_counts(self, user_ids: List[str], start: datetime,
+                      end: datetime) -> Dict[str, Dict[str, int]]:
+        """
+        窗口内各用户的读数、低于目标范围 (<3.9) 与目标范围内 (3.9-10.0) 读数计数
+
+        读取日汇总 (in_range 由 flask rebuild-rollups 回填)，汇总未启用时聚合原始记录
+        """
+        if current_app.config.get('ROLLUPS_ENABLED', True):
+            pipeline = [
+                {'$match': {
+                    'user_id': {'$in': user_ids},
+                    'granularity': GRANULARITY_DAY,
+                    'bucket_start': {'$gte': start, '$lt': end}
+                }},
+                {'$group': {
+                    '_id': '$user_id',
+                    'readings': {'$sum': '$count'},
+                    'low': {'$sum': '$level_counts.low'},
+                    'in_range': {'$sum': '$in_range'}
+                }}
+            ]
+            collection = self.rollup_collection
+        else:
+            pipeline = [
+                {'$match': {
+                    'user_id': {'$in': user_ids},
+                    'timestamp': {'$gte': start, '$lt': end}
+                }},
+                {'$group': {
+                    '_id': '$user_id',
+                    'readings': {'$sum': 1},
+                    'low': {'$sum': {'$cond': [
+                        {'$lt': ['$glucose_value', LOW_THRESHOLD]}, 1, 0
+                    ]}},
+                    'in_range': {'$sum': {'$cond': [
+                        {'$and': [{'$gte': ['$glucose_value', LOW_THRESHOLD]},
+                                  {'$lte': ['$glucose_value', TARGET_HIGH_THRESHOLD]}]}, 1, 0
+                    ]}}
+                }}
+            ]
+            collection = self.glucose_collection
+        return {result['_id']: result for result in collection.aggregate(pipeline)}
+
+    def _hypo_episodes(self, user_ids: List[str], since: datetime) -> Dict[str, Dict[str, int]]:
+        """各用户开始于 since 之后的低血糖事件数与其中的2级事件数"""
+        pipeline = [
+            {'$match': {
+                'user_id': {'$in': user_ids},
+                'kind': EVENT_HYPO,
+                'start': {'$gte': since}
+            }},
+            {'$group': {
+                '_id': '$user_id',
+                'hypo_episodes': {'$sum': 1},
+                'severe_hypo_episodes': {'$sum': {'$cond': [{'$eq': ['$level', 2]}, 1, 0]}}
+            }}
+        ]
+        return {result['_id']: result for result in self.events_collection.aggregate(pipeline)}
+
+    def _latest_readings(self, user_ids: List[str], since: datetime) -> Dict[str, Dict[str, Any]]:
+        """各用户 since 之后的最新读数 (一次 _id $in 查询读取首页快照的 readings[0])"""
+        latest = {}
+        cursor = self.snapshot_collection.find({'_id': {'$in': user_ids}},
+                                               {'readings': {'$slice': 1}})
+        for doc in cursor:
+            readings = doc.get('readings') or []
+            if readings and readings[0]['timestamp'] >= since:
+                latest[doc['_id']] = {'latest_value': readings[0]['glucose_value'],
+                                      'latest_timestamp': readings[0]['timestamp']}
+        return latest
+
+    def _last_syncs(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """各用户所有设备中最近的同步时间"""
+        pipeline = [
+            {'$match': {'user_id': {'$in': user_ids}}},
+            {'$group': {'_id': '$user_id', 'last_sync': {'$max': '$last_sync'}}}
+        ]
+        return {result['_id']: result for result in self.devices_collection.aggregate(pipeline)}
+
+    def rank(self, user_ids: List[str], limit: int = 20, offset: int = 0,
+             weights: Optional[Dict[str, float]] = None,
+             now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        按风险评分对患者排序并返回一页
+
+        Args:
+            user_ids: 用户ID列表 (去重后计算，不存在的用户单独列出)
+            limit: 每页数量
+            offset: 跳过的数量
+            weights: 各组成项的权重 (可选，默认 ROSTER_RISK_WEIGHTS)
+            now: 当前时间 (可选，默认当前UTC时间)
+
+        Returns:
+            Dict: 当前页的患者 (风险分、组成项与派生数据)、总数与使用的权重
+
+        Raises:
+            QueryDeadlineExceeded: 超过截止时间
+            QueryPoolBusy: 查询线程池排队已满
+        """
+        try:
+            now = now or datetime.utcnow()
+            weights = weights or parse_risk_weights(None)
+            user_ids = sorted(set(user_ids))
+            window_days = current_app.config.get('ROSTER_WINDOW_DAYS', 14)
+            episode_days = current_app.config.get('ROSTER_EPISODE_DAYS', 7)
+            window_end = floor_day(now) + timedelta(days=1)
+            window_start = window_end - timedelta(days=window_days)
+
+            tasks = {
+                'users': lambda: self._existing_users(user_ids),
+                'levels': lambda: self._level_counts(user_ids, window_start, window_end),
+                'episodes': lambda: self._hypo_episodes(
+                    user_ids, now - timedelta(days=episode_days)
+                ),
+                'latest': lambda: self._latest_readings(user_ids, window_start),
+                'syncs': lambda: self._last_syncs(user_ids)
+            }
+            query_pool = get_query_pool()
+            if query_pool is None:
+                results = {name: task() for name, task in tasks.items()}
+            else:
+                results = query_pool.run(tasks)
+
+            existing = set(results['users'])
+            metrics: Dict[str, Dict[str, Any]] = {}
+            scores: List[Tuple[float, str]] = []
+            for user_id in user_ids:
+                if user_id not in existing:
+                    continue
+                user_metrics: Dict[str, Any] = {}
+                for name in ('levels', 'episodes', 'latest', 'syncs'):
+                    user_metrics.update(results[name].get(user_id, {}))
+                components = risk_components(user_metrics, now)
+                user_metrics['components'] = components
+                metrics[user_id] = user_metrics
+                scores.append((risk_score(components, weights), user_id))
+
+            patients = []
+            for rank, (score, user_id) in enumerate(top_ranked(scores, limit, offset),
+                                                    start=offset + 1):
+                user_metrics = metrics[user_id]
+                readings = user_metrics.get('readings', 0)
+                last_sync = user_metrics.get('last_sync')
+                latest_timestamp = user_metrics.get('latest_timestamp')
+                patients.append({
+                    'rank': rank,
+                    'user_id': user_id,
+                    'risk_score': round(score, 3),
+                    'components': {name: round(value, 3)
+                                   for name, value in user_metrics['components'].items()},
+                    'readings': readings,
+                    'tir_3_9_10': (round(user_metrics['in_range'] / readings * 100, 1)
+                                   if readings else None),
+                    'tbr': round(user_metrics['low'] / readings * 100, 1) if readings else None,
+                    'hypo_episodes': user_metrics.get('hypo_episodes', 0),
+                    'severe_hypo_episodes': user_metrics.get('severe_hypo_episodes', 0),
+                    'latest_reading': {
+                        'glucose_value': user_metrics['latest_value'],
+                        'timestamp': latest_timestamp.isoformat()
+                    } if latest_timestamp else None,
+                    'last_sync': last_sync.isoformat() if last_sync else None,
+                    'hours_since_sync': (round((now - last_sync).total_seconds() / 3600, 1)
+                                         if last_sync else None)
+                })
+
+            return {
+                'patients': patients,
+                'total': len(scores),
+                'limit': limit,
+                'offset': offset,
+                'unknown_user_ids': [user_id for user_id in user_ids if user_id not in existing],
+                'weights': weights,
+                'window_days': window_days,
+                'episode_days': episode_days,
+                'generated_at': now.isoformat()
+            }
+
+        except (QueryDeadlineExceeded, QueryPoolBusy):
+            raise
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"患者名单排序失败: {str(e)}")
@@ -0,0 +1,509 @@
+"""
+用户首页快照服务
+User Dashboard Snapshot Service
+
+每位用户一个 user_snapshots 文档 (_id 为用户ID)，保存首页需要的全部数据：
+- 最新两条读数 (最新读数与趋势箭头)
+- 今天 (用户时区) 的读数数与TIR (3.9-10.0 mmol/L)、最近 SNAPSHOT_AVERAGE_DAYS 天的平均血糖
+  (写入时计算：本地日界对应的整UTC天读取日汇总，首尾不足一天的部分读取小时汇总)
+- 各设备的状态
+
+写入、修改、删除血糖记录与设备状态变化时同步更新，读取为一次 _id 查询。
+每次修改按 version 乐观并发写入 (冲突时重读重试)，各部分只向更新的方向合并：
+读数按时间戳、统计按计算时间、设备按设备的 updated_at，乱序到达的写入不会使快照倒退。
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from flask import current_app
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app import mongo
+from app.services.local_time_service import LocalTimeService
+from app.services.rollup_service import (
+    GRANULARITY_DAY,
+    GRANULARITY_HOUR,
+    LOW_THRESHOLD,
+    TARGET_HIGH_THRESHOLD
+)
+from app.utils.time_utils import (
+    ceil_day,
+    floor_day,
+    from_local,
+    has_whole_hour_offsets,
+    parse_timezone,
+    timezone_name,
+    to_local
+)
+
+
+# 乐观并发更新的重试次数
+SNAPSHOT_MAX_RETRIES = 5
+
+# 趋势箭头 (变化速率下限 mmol/L/min, 上升方向, 下降方向)，按速率绝对值从大到小匹配
+TREND_ARROWS = [
+    (0.17, 'rising_fast', 'falling_fast'),
+    (0.11, 'rising', 'falling'),
+    (0.06, 'rising_slowly', 'falling_slowly')
+]
+TREND_STEADY = 'steady'
+
+# 设备在线判定：最后同步在该秒数之内 (与设备状态接口一致)
+DEVICE_ONLINE_SECONDS = 300
+
+DEVICE_FIELDS = ('device_id', 'device_name', 'device_type', 'is_active', 'last_sync', 'updated_at')
+
+
+def reading_entry(record: Dict[str, Any]) -> Dict[str, Any]:
+    """血糖记录在快照中保存的字段"""
+    return {
+        'record_id': str(record['_id']),
+        'glucose_value': record['glucose_value'],
+        'timestamp': record['timestamp'],
+        'device_id': record.get('device_id')
+    }
+
+
+def merge_readings(current: List[Dict[str, Any]], added: List[Dict[str, Any]],
+                   removed_ids: Set[str]) -> List[Dict[str, Any]]:
+    """
+    合并快照中的读数与新读数，保留时间最新的两条
+
+    Args:
+        current: 快照中已有的读数
+        added: 新写入或修改后的读数 (同一记录覆盖已有的条目)
+        removed_ids: 已删除或修改前的记录ID (先于 added 移除)
+
+    Returns:
+        List[Dict]: 按时间从新到旧的最多两条读数
+    """
+    readings = {entry['record_id']: entry for entry in current
+                if entry['record_id'] not in removed_ids}
+    for entry in added:
+        readings[entry['record_id']] = entry
+    return sorted(readings.values(), key=lambda entry: entry['timestamp'], reverse=True)[:2]
+
+
+def trend_direction(rate: float) -> str:
+    """变化速率 (mmol/L/min) 对应的趋势方向"""
+    for threshold, rising, falling in TREND_ARROWS:
+        if abs(rate) >= threshold:
+            return rising if rate > 0 else falling
+    return TREND_STEADY
+
+
+def rate_of_change(readings: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    由一段时间内的读数计算变化速率 (最小二乘斜率，只使用最新读数所在设备的读数)
+
+    Args:
+        readings: 按时间升序的读数 (timestamp/glucose_value/device_id)
+
+    Returns:
+        Optional[Dict]: {'direction', 'rate_per_minute', 'points'}，不足两条或时间相同时返回None
+    """
+    if not readings:
+        return None
+    device_id = readings[-1]['device_id']
+    points = [(reading['timestamp'], reading['glucose_value'])
+              for reading in readings if reading['device_id'] == device_id]
+    if len(points) < 2:
+        return None
+
+    origin = points[-1][0]
+    minutes = [(timestamp - origin).total_seconds() / 60 for timestamp, _ in points]
+    values = [value for _, value in points]
+    mean_minute = sum(minutes) / len(minutes)
+    mean_value = sum(values) / len(values)
+    spread = sum((minute - mean_minute) ** 2 for minute in minutes)
+    if not spread:
+        return None
+    rate = sum((minute - mean_minute) * (value - mean_value)
+               for minute, value in zip(minutes, values)) / spread
+    return {'direction': trend_direction(rate), 'rate_per_minute': round(rate, 3),
+            'points': len(points)}
+
+
+def trend_arrow(readings: List[Dict[str, Any]], max_gap_minutes: float) -> Optional[Dict[str, Any]]:
+    """
+    由最新两条读数计算趋势箭头
+
+    Args:
+        readings: 按时间从新到旧的读数
+        max_gap_minutes: 两条读数的最大间隔 (分钟)
+
+    Returns:
+        Optional[Dict]: {'direction', 'rate_per_minute'}，
+                        不足两条、来自不同设备或间隔过大时返回None
+    """
+    if len(readings) < 2:
+        return None
+    latest, previous = readings
+    minutes = (latest['timestamp'] - previous['timestamp']).total_seconds() / 60
+    if latest['device_id'] != previous['device_id'] or not 0 < minutes <= max_gap_minutes:
+        return None
+
+    rate = (latest['glucose_value'] - previous['glucose_value']) / minutes
+    return {'direction': trend_direction(rate), 'rate_per_minute': round(rate, 3)}
+
+
+def local_day(now: datetime, timezone: Optional[str]) -> datetime:
+    """now (朴素UTC) 在时区 timezone (为空时UTC) 中的本地日期 (朴素本地午夜)"""
+    return floor_day(to_local(now, parse_timezone(timezone)))
+
+
+def merge_devices(current: List[Dict[str, Any]],
+                  updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """合并设备状态，同一设备保留 updated_at 较新的条目"""
+    devices = {entry['device_id']: entry for entry in current}
+    for entry in updates:
+        existing = devices.get(entry['device_id'])
+        if existing is None or entry['updated_at'] >= existing['updated_at']:
+            devices[entry['device_id']] = entry
+    return sorted(devices.values(), key=lambda entry: entry['device_id'])
+
+
+def format_snapshot(doc: Dict[str, Any], now: datetime, max_gap_minutes: float) -> Dict[str, Any]:
+    """
+    生成快照响应
+
+    Args:
+        doc: 快照文档
+        now: 当前时间 (UTC)
+        max_gap_minutes: 趋势箭头使用的两条读数最大间隔 (分钟)
+
+    Returns:
+        Dict: 最新读数、趋势、今天与近几天统计、设备状态
+    """
+    readings = doc.get('readings', [])
+    latest = readings[0] if readings else None
+    stats = doc.get('stats') or {}
+    today = local_day(now, stats.get('timezone'))
+    current_day = stats.get('day') == today
+    today_readings = stats.get('today_readings', 0) if current_day else 0
+    window_readings = stats.get('window_readings', 0)
+
+    return {
+        'user_id': doc['_id'],
+        'version': doc.get('version', 0),
+        'latest_reading': {
+            'record_id': latest['record_id'],
+            'glucose_value': latest['glucose_value'],
+            'timestamp': latest['timestamp'].isoformat(),
+            'device_id': latest['device_id'],
+            'minutes_ago': round((now - latest['timestamp']).total_seconds() / 60, 1)
+        } if latest else None,
+        'trend': trend_arrow(readings, max_gap_minutes),
+        'today': {
+            'date': today.date().isoformat(),
+            'readings': today_readings,
+            'tir_3_9_10': (round(stats['today_in_range'] / today_readings * 100, 1)
+                           if today_readings else None)
+        },
+        'average': {
+            'days': stats.get('days'),
+            'readings': window_readings,
+            'avg_glucose': (round(stats['window_sum'] / window_readings, 2)
+                            if window_readings else None)
+        },
+        'devices': [
+            {
+                'device_id': device['device_id'],
+                'device_name': device.get('device_name'),
+                'device_type': device.get('device_type'),
+                'is_active': device.get('is_active', True),
+                'is_online': bool(device.get('last_sync')) and
+                (now - device['last_sync']).total_seconds() < DEVICE_ONLINE_SECONDS,
+                'last_sync': device['last_sync'].isoformat() if device.get('last_sync') else None
+            }
+            for device in doc.get('devices', [])
+        ],
+        'updated_at': doc['updated_at'].isoformat() if doc.get('updated_at') else None
+    }
+
+
+class SnapshotService:
+    """用户首页快照服务类"""
+
+    def __init__(self):
+        self.collection = mongo.db.user_snapshots
+        self.glucose_collection = mongo.db.glucose_records
+        self.rollup_collection = mongo.db.glucose_rollups
+        self.devices_collection = mongo.db.devices
+        self.users_collection = mongo.db.users
+        self.local_time_service = LocalTimeService()
+
+    def _apply(self, user_id: str,
+               mutate: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        按 version 乐观并发修改快照 (文档不存在时创建)
+
+        Args:
+            user_id: 用户ID
+            mutate: 由当前文档 (不存在时为空字典) 计算需要 $set 的字段，无变化时返回空字典
+
+        Returns:
+            Dict: 修改后的快照文档
+        """
+        for _ in range(SNAPSHOT_MAX_RETRIES):
+            doc = self.collection.find_one({'_id': user_id})
+            changes = mutate(doc or {})
+            if doc is not None and not changes:
+                return doc
+
+            now = datetime.utcnow()
+            if doc is None:
+                doc = {'_id': user_id, 'readings': [], 'stats': None, 'devices': [],
+                       **changes, 'version': 1, 'updated_at': now}
+                try:
+                    self.collection.insert_one(doc)
+                    return doc
+                except DuplicateKeyError:
+                    continue
+
+            result = self.collection.update_one(
+                {'_id': user_id, 'version': doc['version']},
+                {'$set': {**changes, 'updated_at': now}, '$inc': {'version': 1}}
+            )
+            if result.matched_count:
+                return {**doc, **changes, 'version': doc['version'] + 1, 'updated_at': now}
+
+        raise Exception("用户快照更新冲突，请稍后使用 rebuild-snapshots 重建")
+
+    def _window_stats(self, user_id: str, now: datetime, timezone: str) -> Dict[str, Any]:
+        """
+        今天与最近 SNAPSHOT_AVERAGE_DAYS 天 (用户时区的整天，含今天) 的读数统计
+
+        今天之前与今天两段中完整的UTC天读取日汇总，不足一天的部分读取小时汇总；
+        时区存在非整小时偏移或汇总未启用时聚合原始记录
+
+        Args:
+            user_id: 用户ID
+            now: 当前时间 (UTC)
+            timezone: 用户时区名称
+
+        Returns:
+            Dict: 统计 (day 为本地日期，timezone 为计算所用的时区)
+        """
+        days = current_app.config.get('SNAPSHOT_AVERAGE_DAYS', 7)
+        tz = parse_timezone(timezone)
+        today = floor_day(to_local(now, tz))
+        start = from_local(today - timedelta(days=days - 1), tz)
+        today_start = from_local(today, tz)
+        end = from_local(today + timedelta(days=1), tz)
+        stats = {'day': today, 'timezone': timezone_name(tz), 'days': days,
+                 'today_readings': 0, 'today_in_range': 0,
+                 'window_readings': 0, 'window_sum': 0.0, 'computed_at': now}
+
+        if (current_app.config.get('ROLLUPS_ENABLED', True)
+                and has_whole_hour_offsets(tz, start, end)):
+            projection = {'bucket_start': 1, 'count': 1, 'sum': 1, 'in_range': 1}
+            ranges: Dict[str, List[Dict[str, datetime]]] = {GRANULARITY_DAY: [],
+                                                             GRANULARITY_HOUR: []}
+            for range_start, range_end in ((start, today_start), (today_start, end)):
+                days_start, days_end = ceil_day(range_start), floor_day(range_end)
+                if days_start < days_end:
+                    ranges[GRANULARITY_DAY].append({'$gte': days_start, '$lt': days_end})
+                    ranges[GRANULARITY_HOUR].extend([{'$gte': range_start, '$lt': days_start},
+                                                     {'$gte': days_end, '$lt': range_end}])
+                else:
+                    ranges[GRANULARITY_HOUR].append({'$gte': range_start, '$lt': range_end})
+
+            docs = []
+            for granularity, bucket_ranges in ranges.items():
+                bucket_ranges = [bucket_range for bucket_range in bucket_ranges
+                                 if bucket_range['$gte'] < bucket_range['$lt']]
+                if bucket_ranges:
+                    docs.extend(self.rollup_collection.find({
+                        'user_id': user_id,
+                        'granularity': granularity,
+                        '$or': [{'bucket_start': bucket_range} for bucket_range in bucket_ranges]
+                    }, projection))
+            rows = [(doc['bucket_start'] >= today_start, doc['count'], doc['sum'],
+                     doc.get('in_range', 0))
+                    for doc in docs]
+        else:
+            pipeline = [
+                {'$match': {'user_id': user_id, 'timestamp': {'$gte': start, '$lt': end}}},
+                {'$group': {
+                    '_id': {'$gte': ['$timestamp', today_start]},
+                    'count': {'$sum': 1},
+                    'sum': {'$sum': '$glucose_value'},
+                    'in_range': {'$sum': {'$cond': [
+                        {'$and': [{'$gte': ['$glucose_value', LOW_THRESHOLD]},
+                                  {'$lte': ['$glucose_value', TARGET_HIGH_THRESHOLD]}]}, 1, 0
+                    ]}}
+                }}
+            ]
+            rows = [(result['_id'], result['count'], result['sum'], result['in_range'])
+                    for result in self.glucose_collection.aggregate(pipeline)]
+
+        for is_today, count, total, in_range in rows:
+            stats['window_readings'] += count
+            stats['window_sum'] += total
+            if is_today:
+                stats['today_readings'] += count
+                stats['today_in_range'] += in_range
+        return stats
+
+    @staticmethod
+    def _newer_stats(doc: Dict[str, Any], stats: Dict[str, Any]) -> Dict[str, Any]:
+        """统计的计算时间不早于快照中的统计时才替换"""
+        current = doc.get('stats')
+        if current and current['computed_at'] > stats['computed_at']:
+            return {}
+        return {'stats': stats}
+
+    def _latest_readings(self, user_id: str) -> List[Dict[str, Any]]:
+        """从原始记录读取用户最新的两条读数"""
+        cursor = self.glucose_collection.find(
+            {'user_id': user_id},
+            {'glucose_value': 1, 'timestamp': 1, 'device_id': 1}
+        ).sort('timestamp', -1).limit(2)
+        return [reading_entry(record) for record in cursor]
+
+    def sync_records(self, old_record: Optional[Dict[str, Any]],
+                     new_record: Optional[Dict[str, Any]]) -> None:
+        """
+        血糖记录写入、修改或删除后同步快照 (在汇总更新之后调用)
+
+        Args:
+            old_record: 修改或删除前的记录 (新建时为None)
+            new_record: 写入或修改后的记录 (删除时为None)
+        """
+        try:
+            user_ids = {record['user_id'] for record in (old_record, new_record) if record}
+            for user_id in user_ids:
+                removed = old_record if old_record and old_record['user_id'] == user_id else None
+                added = new_record if new_record and new_record['user_id'] == user_id else None
+                removed_ids = {str(removed['_id'])} if removed else set()
+                added_entries = [reading_entry(added)] if added else []
+                timezone = ((added or {}).get('local_tz')
+                            or self.local_time_service.get_timezone(user_id))
+                stats = self._window_stats(user_id, datetime.utcnow(), timezone)
+                reloaded: List[List[Dict[str, Any]]] = []
+
+                def mutate(doc):
+                    current = doc.get('readings', [])
+                    extra = list(added_entries)
+                    if removed_ids & {entry['record_id'] for entry in current}:
+                        # 移除了快照中的读数，从原始记录补足 (只查询一次)
+                        if not reloaded:
+                            reloaded.append(self._latest_readings(user_id))
+                        extra = reloaded[0] + extra
+                    changes = self._newer_stats(doc, stats)
+                    readings = merge_readings(current, extra, removed_ids)
+                    if readings != current:
+                        changes['readings'] = readings
+                    return changes
+
+                self._apply(user_id, mutate)
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
+
+    def sync_device(self, device: Dict[str, Any]) -> None:
+        """
+        设备注册或状态变化后同步快照
+
+        Args:
+            device: 设备文档 (含 user_id 与 updated_at)
+        """
+        try:
+            entry = {field: device.get(field) for field in DEVICE_FIELDS}
+
+            def mutate(doc):
+                current = doc.get('devices', [])
+                devices = merge_devices(current, [entry])
+                return {'devices': devices} if devices != current else {}
+
+            self._apply(device['user_id'], mutate)
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
+
+    def refresh_user(self, user_id: str) -> Dict[str, Any]:
+        """
+        从原始记录、日汇总与设备集合重新生成一位用户的快照 (与已有内容按新旧合并)
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            Dict: 快照文档
+        """
+        readings = self._latest_readings(user_id)
+        stats = self._window_stats(user_id, datetime.utcnow(),
+                                   self.local_time_service.get_timezone(user_id))
+        devices = [{field: device.get(field) for field in DEVICE_FIELDS}
+                   for device in self.devices_collection.find({'user_id': user_id})]
+
+        def mutate(doc):
+            changes = self._newer_stats(doc, stats)
+            current_readings = doc.get('readings', [])
+            merged_readings = merge_readings(current_readings, readings, set())
+            if merged_readings != current_readings:
+                changes['readings'] = merged_readings
+            current_devices = doc.get('devices', [])
+            merged_devices = merge_devices(current_devices, devices)
+            if merged_devices != current_devices:
+                changes['devices'] = merged_devices
+            return changes
+
+        return self._apply(user_id, mutate)
+
+    def get_snapshot(self, user_id: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        获取用户首页快照
+
+        快照不存在时 (如历史数据未回填) 即时生成；统计不是按用户时区的今天计算时
+        (今天还没有写入过读数) 按用户当前时区重新计算统计部分
+
+        Args:
+            user_id: 用户ID
+            now: 当前时间 (可选，默认当前UTC时间)
+
+        Returns:
+            Dict: 快照响应
+        """
+        try:
+            now = now or datetime.utcnow()
+            doc = self.collection.find_one({'_id': user_id})
+            if doc is None:
+                doc = self.refresh_user(user_id)
+            elif (not (doc.get('stats') or {}).get('timezone')
+                  or doc['stats']['day'] != local_day(now, doc['stats']['timezone'])):
+                stats = self._window_stats(user_id, now,
+                                           self.local_time_service.get_timezone(user_id))
+                doc = self._apply(user_id, lambda current: self._newer_stats(current, stats))
+
+            return format_snapshot(doc, now, current_app.config.get('CGM_MAX_GAP_MINUTES', 15))
+
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"快照查询失败: {str(e)}")
+
+    def rebuild(self, user_id: Optional[str] = None) -> int:
+        """
+        重新生成快照 (历史数据回填)
+
+        Args:
+            user_id: 只处理指定用户 (可选)
+
+        Returns:
+            int: 处理的用户数
+        """
+        try:
+            if user_id:
+                user_ids = [user_id]
+            else:
+                user_ids = [str(user_doc['_id'])
+                            for user_doc in self.users_collection.find({}, {'_id': 1})]
+            for current_id in user_ids:
+                self.refresh_user(current_id)
+            return len(user_ids)
+
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
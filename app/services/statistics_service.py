@@ -4,12 +4,225 @@ Statistics and Analytics Business Logic Service
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from bson import ObjectId
-from pymongo.errors import PyMongoError
-import statistics
+from flask import current_app, g, has_app_context
+from pymongo.errors import OperationFailure, PyMongoError
+import numpy as np
 
 from app import mongo
+from app.services.analytics_core import (
+    DEFAULT_BATCH_SIZE,
+    EPOCH,
+    GlucoseSeries,
+    load_values,
+    load_series,
+    load_grouped_series,
+    summarize,
+    range_counts,
+    period_means,
+    grouped_percentiles,
+    cgm_metrics,
+    DEFAULT_GLUCOSE_TARGETS,
+    TIR_TIERS
+)
+from app.services.glycemic_variability import grouped_variability_indices
+from app.services import rolling_windows
+from app.services.rollup_service import (
+    RollupService,
+    GlucoseAggregate,
+    BucketedAggregates,
+    DISTRIBUTION_RANGES,
+    GRANULARITY_DAY,
+    GRANULARITY_HOUR,
+    GRANULARITY_MONTH,
+    cell_group_stage,
+    hour_group_id
+)
+from app.utils.analytics_executor import run_analytics
+from app.utils.cache import cached_statistics, get_stats_cache
+from app.utils.query_pool import QueryDeadlineExceeded, QueryPoolBusy, get_query_pool
+from app.utils.quantile_sketch import QuantileSketch
+from app.utils.time_utils import (
+    to_utc_naive,
+    to_local,
+    floor_hour,
+    ceil_hour,
+    floor_day,
+    ceil_day,
+    floor_month,
+    ceil_month,
+    parse_timezone,
+    has_whole_hour_offsets
+)
+
+
+# 原始记录数据层级 (汇总层级使用汇总粒度名称)
+TIER_RAW = 'raw'
+
+# 默认输出的血糖百分位
+DEFAULT_PERCENTILES = [5, 25, 50, 75, 95]
+
+# 动态血糖图谱 (AGP)：一天按15分钟分为96个时段
+AGP_SLOT_MINUTES = 15
+AGP_SLOT_COUNT = 24 * 60 // AGP_SLOT_MINUTES
+AGP_PERCENTILES = [5, 25, 50, 75, 95]
+
+# 周×小时热力图行标签 (周一为第一行)
+WEEKDAY_LABELS = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+# 支持 $dateTrunc 的最低 MongoDB 版本
+DATE_TRUNC_MIN_VERSION = (5, 0)
+
+# 趋势时间桶：$dateTrunc 的 unit 与 binSize
+TREND_GRANULARITIES = {
+    '5min': {'unit': 'minute', 'bin_size': 5},
+    '15min': {'unit': 'minute', 'bin_size': 15},
+    'hour': {'unit': 'hour', 'bin_size': 1},
+    '4hour': {'unit': 'hour', 'bin_size': 4},
+    'day': {'unit': 'day', 'bin_size': 1},
+    'week': {'unit': 'week', 'bin_size': 1},
+    'month': {'unit': 'month', 'bin_size': 1}
+}
+
+
+def trend_bucket_start(local: datetime, granularity: str) -> datetime:
+    """
+    本地时间所在趋势时间桶的开始 (与 $dateTrunc 一致：分钟/小时桶在一天内对齐，周以周一开始)
+    
+    Args:
+        local: 本地时间 (朴素)
+        granularity: 时间粒度
+        
+    Returns:
+        datetime: 时间桶开始 (本地时间)
+    """
+    bucket = TREND_GRANULARITIES[granularity]
+    size = bucket['bin_size']
+    if bucket['unit'] == 'minute':
+        return local.replace(minute=local.minute // size * size, second=0, microsecond=0)
+    if bucket['unit'] == 'hour':
+        return local.replace(hour=local.hour // size * size, minute=0, second=0, microsecond=0)
+    if bucket['unit'] == 'day':
+        return floor_day(local)
+    if bucket['unit'] == 'week':
+        return floor_day(local) - timedelta(days=local.weekday())
+    return floor_month(local)
+
+
+def trend_date_trunc(bucket: Dict[str, Any], timezone: str) -> Dict[str, Any]:
+    """
+    按本地时间截断到趋势时间桶的 $dateTrunc 表达式 (结果为桶开始的UTC时间，需 MongoDB 5.0+)
+    
+    Args:
+        bucket: TREND_GRANULARITIES 中的时间桶定义
+        timezone: IANA时区名称
+        
+    Returns:
+        Dict: $group 的 _id 表达式
+    """
+    bucket_key = {
+        'date': '$timestamp',
+        'unit': bucket['unit'],
+        'binSize': bucket['bin_size'],
+        'timezone': timezone
+    }
+    if bucket['unit'] == 'week':
+        bucket_key['startOfWeek'] = 'monday'
+    return {'$dateTrunc': bucket_key}
+
+
+def trend_bucket_parts(bucket: Dict[str, Any], timezone: str) -> Dict[str, Any]:
+    """
+    按本地日期分量表示的趋势时间桶分组键 (服务器低于 MongoDB 5.0、不支持 $dateTrunc 时使用)
+    
+    Args:
+        bucket: TREND_GRANULARITIES 中的时间桶定义
+        timezone: IANA时区名称
+        
+    Returns:
+        Dict: $group 的 _id 表达式 (分量见 bucket_start_from_parts)
+    """
+    date = {'date': '$timestamp', 'timezone': timezone}
+    if bucket['unit'] == 'week':
+        return {'iso_year': {'$isoWeekYear': date}, 'iso_week': {'$isoWeek': date}}
+    
+    parts = {'year': {'$year': date}, 'month': {'$month': date}}
+    if bucket['unit'] == 'month':
+        return parts
+    parts['day'] = {'$dayOfMonth': date}
+    if bucket['unit'] == 'hour':
+        hour = {'$hour': date}
+        parts['hour'] = {'$subtract': [hour, {'$mod': [hour, bucket['bin_size']]}]}
+    elif bucket['unit'] == 'minute':
+        minute = {'$minute': date}
+        parts['hour'] = {'$hour': date}
+        parts['minute'] = {'$subtract': [minute, {'$mod': [minute, bucket['bin_size']]}]}
+    return parts
+
+
+def bucket_start_from_parts(parts: Dict[str, int]) -> datetime:
+    """由 trend_bucket_parts 的分组键得到时间桶开始 (本地时间)"""
+    parts = {name: int(value) for name, value in parts.items()}
+    if 'iso_week' in parts:
+        return datetime.fromisocalendar(parts['iso_year'], parts['iso_week'], 1)
+    return datetime(parts['year'], parts['month'], parts.get('day', 1),
+                    parts.get('hour', 0), parts.get('minute', 0))
+
+
+def trend_label(bucket_start: datetime, granularity: str) -> str:
+    """趋势时间桶标签 (周为ISO周，如 2025-W23)"""
+    unit = TREND_GRANULARITIES[granularity]['unit']
+    if unit in ('minute', 'hour'):
+        return bucket_start.strftime('%Y-%m-%dT%H:%M')
+    if unit == 'day':
+        return bucket_start.strftime('%Y-%m-%d')
+    if unit == 'week':
+        iso_year, iso_week, _ = bucket_start.isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    return bucket_start.strftime('%Y-%m')
+
+
+# 时间段对比差值的摘要字段
+COMPARISON_SUMMARY_FIELDS = ['total_records', 'avg_glucose', 'std_glucose',
+                             'normal_percentage', 'low_percentage', 'high_percentage']
+COMPARISON_TIR_FIELDS = ['tir', 'tbr', 'tar']
+
+
+def comparison_deltas(baseline: Dict[str, Any], period: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    时间段结果相对基准的差值 (时间段 - 基准)，任一方无数据的字段为None
+
+    Args:
+        baseline: 基准时间段结果
+        period: 对比时间段结果
+
+    Returns:
+        Dict: 摘要、TIR 与各分布区间百分比的差值
+    """
+    def delta(current, reference, digits=2):
+        if current is None or reference is None:
+            return None
+        return round(current - reference, digits)
+
+    deltas = {
+        field: delta(period['summary'].get(field), baseline['summary'].get(field))
+        for field in COMPARISON_SUMMARY_FIELDS
+    }
+    deltas.update({
+        field: delta(period['time_in_ranges'][field], baseline['time_in_ranges'][field], 1)
+        for field in COMPARISON_TIR_FIELDS
+    })
+
+    has_data = period['distribution']['total_records'] and baseline['distribution']['total_records']
+    deltas['distribution'] = {
+        range_info['key']: (round(current['percentage'] - reference['percentage'], 1)
+                            if has_data else None)
+        for range_info, current, reference in zip(DISTRIBUTION_RANGES,
+                                                  period['distribution']['ranges'],
+                                                  baseline['distribution']['ranges'])
+    }
+    return deltas
 
 
 class StatisticsService:
@@ -17,9 +230,21 @@ class StatisticsService:
     
     def __init__(self):
         self.glucose_collection = mongo.db.glucose_records
+        self.rollup_service = RollupService()
+        # 服务器是否支持 $dateTrunc (第一次按原始记录分组趋势时查询服务器版本)
+        self._date_trunc: Optional[bool] = None
+    
+    def _supports_date_trunc(self) -> bool:
+        """服务器版本是否支持 $dateTrunc (MongoDB 5.0+)"""
+        if self._date_trunc is None:
+            version = self.glucose_collection.database.client.server_info()['versionArray']
+            self._date_trunc = tuple(version[:2]) >= DATE_TRUNC_MIN_VERSION
+        return self._date_trunc
     
+    @cached_statistics('summary')
     def get_glucose_statistics(self, user_id: str, start_date: datetime, 
-                             end_date: datetime, device_id: Optional[str] = None) -> Dict[str, Any]:
+                             end_date: datetime, device_id: Optional[str] = None,
+                             end_exclusive: bool = False) -> Dict[str, Any]:
         """
         获取血糖统计信息
         
@@ -28,24 +253,32 @@ class StatisticsService:
             start_date: 开始日期
             end_date: 结束日期
             device_id: 设备ID (可选)
+            end_exclusive: 结束日期是否不含 (整天窗口使用，默认含)
             
         Returns:
             Dict: 统计信息
         """
         try:
+            # 长时间范围读取汇总数据
+            if self._use_rollups(start_date, end_date):
+                buckets = self._collect_buckets(user_id, start_date, end_date, device_id,
+                                                end_exclusive=end_exclusive)
+                return self._statistics_from_aggregate(buckets.total(), start_date, end_date)
+            
             # 构建查询条件
             filter_dict = {
                 'user_id': user_id,
-                'timestamp': {'$gte': start_date, '$lte': end_date}
+                'timestamp': {'$gte': start_date, '$lt' if end_exclusive else '$lte': end_date}
             }
             
             if device_id:
                 filter_dict['device_id'] = device_id
             
-            # 获取所有记录
-            records = list(self.glucose_collection.find(filter_dict))
+            # 读取血糖值数组
+            values = load_values(self.glucose_collection, filter_dict)
+            self._record_tiers({TIER_RAW: len(values)})
             
-            if not records:
+            if not len(values):
                 return {
                     'total_records': 0,
                     'avg_glucose': None,
@@ -61,41 +294,22 @@ class StatisticsService:
                     }
                 }
             
-            # 提取血糖值
-            glucose_values = [record['glucose_value'] for record in records]
-            
-            # 计算基本统计
-            total_records = len(records)
-            avg_glucose = statistics.mean(glucose_values)
-            max_glucose = max(glucose_values)
-            min_glucose = min(glucose_values)
-            std_glucose = statistics.stdev(glucose_values) if len(glucose_values) > 1 else 0
-            
-            # 血糖范围分类 (基于mmol/L)
-            normal_count = 0
-            high_count = 0
-            low_count = 0
-            
-            for value in glucose_values:
-                if value < 3.9:  # 低血糖
-                    low_count += 1
-                elif value > 7.8:  # 高血糖
-                    high_count += 1
-                else:  # 正常范围
-                    normal_count += 1
+            # 计算基本统计与范围分类 (基于mmol/L)
+            summary = summarize(values)
+            total_records = summary['count']
             
             return {
                 'total_records': total_records,
-                'avg_glucose': round(avg_glucose, 2),
-                'max_glucose': max_glucose,
-                'min_glucose': min_glucose,
-                'std_glucose': round(std_glucose, 2),
-                'normal_count': normal_count,
-                'high_count': high_count,
-                'low_count': low_count,
-                'normal_percentage': round((normal_count / total_records) * 100, 1),
-                'high_percentage': round((high_count / total_records) * 100, 1),
-                'low_percentage': round((low_count / total_records) * 100, 1),
+                'avg_glucose': round(summary['mean'], 2),
+                'max_glucose': summary['max'],
+                'min_glucose': summary['min'],
+                'std_glucose': round(summary['std'], 2),
+                'normal_count': summary['normal_count'],
+                'high_count': summary['high_count'],
+                'low_count': summary['low_count'],
+                'normal_percentage': round((summary['normal_count'] / total_records) * 100, 1),
+                'high_percentage': round((summary['high_count'] / total_records) * 100, 1),
+                'low_percentage': round((summary['low_count'] / total_records) * 100, 1),
                 'time_range': {
                     'start_date': start_date.isoformat(),
                     'end_date': end_date.isoformat()
@@ -107,23 +321,46 @@ class StatisticsService:
         except Exception as e:
             raise Exception(f"统计计算失败: {str(e)}")
     
+    @cached_statistics('trends')
     def get_glucose_trends(self, user_id: str, start_date: datetime, 
                           end_date: datetime, granularity: str = 'day',
-                          device_id: Optional[str] = None) -> List[Dict[str, Any]]:
+                          device_id: Optional[str] = None,
+                          timezone: str = 'UTC') -> List[Dict[str, Any]]:
         """
         获取血糖趋势数据
         
+        时间桶按本地时间截断 (与 $dateTrunc 一致，周以周一开始)，结果按时间桶排序。
+        长时间范围中，UTC的日/周/月粒度读取日、月汇总；小时级粒度及非UTC时区读取小时汇总
+        (时区偏移须为整小时)；5/15分钟粒度及其余情况由原始记录按 $dateTrunc 分组并在管道中排序，
+        服务器低于 MongoDB 5.0 时按本地日期分量分组
+        
         Args:
             user_id: 用户ID
             start_date: 开始日期
             end_date: 结束日期
-            granularity: 时间粒度 ('day', 'week', 'month')
+            granularity: 时间粒度 (TREND_GRANULARITIES 的键)
             device_id: 设备ID (可选)
+            timezone: IANA时区名称
             
         Returns:
             List[Dict]: 趋势数据列表
         """
         try:
+            tz = parse_timezone(timezone)
+            bucket = TREND_GRANULARITIES[granularity]
+            
+            # 长时间范围读取汇总数据
+            if self._use_rollups(start_date, end_date) and bucket['unit'] != 'minute':
+                start, end = to_utc_naive(start_date), to_utc_naive(end_date)
+                if timezone == 'UTC' and bucket['unit'] in ('day', 'week', 'month'):
+                    # 日/周粒度不能使用月汇总
+                    max_tier = GRANULARITY_MONTH if granularity == 'month' else GRANULARITY_DAY
+                    buckets = self._collect_buckets(user_id, start, end, device_id, max_tier)
+                    return self._trends_from_cells(buckets.periods.items(), granularity, tz)
+                if has_whole_hour_offsets(tz, start, end):
+                    cells = self._collect_hour_cells(user_id, start, end, device_id)
+                    return self._trends_from_cells(cells, granularity, tz)
+            
             # 构建聚合管道
             match_stage = {
                 'user_id': user_id,
@@ -133,26 +370,9 @@ class StatisticsService:
             if device_id:
                 match_stage['device_id'] = device_id
             
-            # 根据粒度设置分组格式
-            if granularity == 'day':
-                date_format = '%Y-%m-%d'
-                group_id = {
-                    'year': {'$year': '$timestamp'},
-                    'month': {'$month': '$timestamp'},
-                    'day': {'$dayOfMonth': '$timestamp'}
-                }
-            elif granularity == 'week':
-                date_format = '%Y-W%U'
-                group_id = {
-                    'year': {'$year': '$timestamp'},
-                    'week': {'$week': '$timestamp'}
-                }
-            else:  # month
-                date_format = '%Y-%m'
-                group_id = {
-                    'year': {'$year': '$timestamp'},
-                    'month': {'$month': '$timestamp'}
-                }
+            date_trunc = self._supports_date_trunc()
+            group_id = (trend_date_trunc(bucket, timezone) if date_trunc
+                        else trend_bucket_parts(bucket, timezone))
             
             pipeline = [
                 {'$match': match_stage},
@@ -162,28 +382,26 @@ class StatisticsService:
                         'avg_glucose': {'$avg': '$glucose_value'},
                         'max_glucose': {'$max': '$glucose_value'},
                         'min_glucose': {'$min': '$glucose_value'},
-                        'record_count': {'$sum': 1},
-                        'first_timestamp': {'$min': '$timestamp'}
+                        'record_count': {'$sum': 1}
                     }
                 },
-                {'$sort': {'first_timestamp': 1}}
+                # 桶开始的UTC时间与本地时间同序；日期分量分组键按字段顺序 (年、月、日...) 比较
+                {'$sort': {'_id': 1}}
             ]
             
             # 执行聚合查询
             results = list(self.glucose_collection.aggregate(pipeline))
+            self._record_tiers({TIER_RAW: len(results)})
+            
+            # 时间桶开始 (本地时间)
+            for result in results:
+                result['bucket_start'] = (to_local(result['_id'], tz) if date_trunc
+                                          else bucket_start_from_parts(result['_id']))
             
-            # 格式化结果
             trends = []
             for result in results:
-                if granularity == 'day':
-                    date_str = f"{result['_id']['year']}-{result['_id']['month']:02d}-{result['_id']['day']:02d}"
-                elif granularity == 'week':
-                    date_str = f"{result['_id']['year']}-W{result['_id']['week']:02d}"
-                else:  # month
-                    date_str = f"{result['_id']['year']}-{result['_id']['month']:02d}"
-                
                 trends.append({
-                    'date': date_str,
+                    'date': trend_label(result['bucket_start'], granularity),
                     'avg_glucose': round(result['avg_glucose'], 2),
                     'max_glucose': result['max_glucose'],
                     'min_glucose': result['min_glucose'],
@@ -197,6 +415,7 @@ class StatisticsService:
         except Exception as e:
             raise Exception(f"趋势分析失败: {str(e)}")
     
+    @cached_statistics('distribution')
     def get_glucose_distribution(self, user_id: str, start_date: datetime, 
                                end_date: datetime, device_id: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -222,17 +441,17 @@ class StatisticsService:
                 filter_dict['device_id'] = device_id
             
             # 定义血糖范围
-            ranges = [
-                {'name': '严重低血糖', 'min': 0, 'max': 2.8, 'color': '#ff4444'},
-                {'name': '低血糖', 'min': 2.8, 'max': 3.9, 'color': '#ff8800'},
-                {'name': '正常', 'min': 3.9, 'max': 7.8, 'color': '#00cc44'},
-                {'name': '轻度高血糖', 'min': 7.8, 'max': 11.1, 'color': '#ffaa00'},
-                {'name': '高血糖', 'min': 11.1, 'max': 50, 'color': '#ff4444'}
-            ]
+            ranges = DISTRIBUTION_RANGES
             
-            # 获取所有记录
-            records = list(self.glucose_collection.find(filter_dict))
-            total_records = len(records)
+            # 长时间范围读取汇总数据
+            if self._use_rollups(start_date, end_date):
+                buckets = self._collect_buckets(user_id, start_date, end_date, device_id)
+                return self._distribution_from_aggregate(buckets.total())
+            
+            # 读取血糖值数组
+            values = load_values(self.glucose_collection, filter_dict)
+            self._record_tiers({TIER_RAW: len(values)})
+            total_records = len(values)
             
             if total_records == 0:
                 return {
@@ -242,9 +461,7 @@ class StatisticsService:
             
             # 统计各范围的记录数
             distribution = []
-            for range_info in ranges:
-                count = sum(1 for record in records 
-                           if range_info['min'] <= record['glucose_value'] < range_info['max'])
+            for range_info, count in zip(ranges, range_counts(values, ranges)):
                 percentage = (count / total_records) * 100
                 
                 distribution.append({
@@ -266,22 +483,41 @@ class StatisticsService:
         except Exception as e:
             raise Exception(f"分布分析失败: {str(e)}")
     
+    @cached_statistics('patterns')
     def get_glucose_patterns(self, user_id: str, start_date: datetime, 
-                           end_date: datetime, device_id: Optional[str] = None) -> Dict[str, Any]:
+                           end_date: datetime, device_id: Optional[str] = None,
+                           timezone: str = 'UTC') -> Dict[str, Any]:
         """
-        获取血糖模式分析
+        获取血糖模式分析 (按用户本地时间的小时)
         
         Args:
             user_id: 用户ID
             start_date: 开始日期
             end_date: 结束日期
             device_id: 设备ID (可选)
+            timezone: 用户时区 (与记录的本地时间字段一致)
             
         Returns:
             Dict: 模式分析数据
         """
         try:
-            # 构建聚合管道，按小时分组
+            # 长时间范围读取汇总数据
+            if self._use_rollups(start_date, end_date):
+                if timezone == 'UTC':
+                    buckets = self._collect_buckets(user_id, start_date, end_date, device_id)
+                    return {**self._patterns_from_hours(buckets.hours_of_day), 'timezone': timezone}
+                
+                tz = parse_timezone(timezone)
+                start, end = to_utc_naive(start_date), to_utc_naive(end_date)
+                if has_whole_hour_offsets(tz, start, end):
+                    by_hour: Dict[int, GlucoseAggregate] = {}
+                    for hour_start, aggregate in self._collect_hour_cells(user_id, start, end,
+                                                                          device_id):
+                        local_hour = to_local(hour_start, tz).hour
+                        by_hour.setdefault(local_hour, GlucoseAggregate()).merge(aggregate)
+                    return {**self._patterns_from_hours(by_hour), 'timezone': timezone}
+            
+            # 构建聚合管道，按本地小时分组 (写入时预先计算，缺少该字段的旧记录在聚合中换算)
             match_stage = {
                 'user_id': user_id,
                 'timestamp': {'$gte': start_date, '$lte': end_date}
@@ -290,11 +526,22 @@ class StatisticsService:
             if device_id:
                 match_stage['device_id'] = device_id
             
+            if timezone == 'UTC':
+                hour_key = {'$hour': '$timestamp'}
+            else:
+                # 写入时按当前时区计算的记录直接使用 local_hour，其余记录 (未回填或修改时区后
+                # 尚未重算) 在聚合中换算
+                hour_key = {'$cond': [
+                    {'$eq': ['$local_tz', timezone]},
+                    '$local_hour',
+                    {'$hour': {'date': '$timestamp', 'timezone': timezone}}
+                ]}
+            
             pipeline = [
                 {'$match': match_stage},
                 {
                     '$group': {
-                        '_id': {'$hour': '$timestamp'},
+                        '_id': hour_key,
                         'avg_glucose': {'$avg': '$glucose_value'},
                         'max_glucose': {'$max': '$glucose_value'},
                         'min_glucose': {'$min': '$glucose_value'},
@@ -306,6 +553,7 @@ class StatisticsService:
             
             # 执行聚合查询
             results = list(self.glucose_collection.aggregate(pipeline))
+            self._record_tiers({TIER_RAW: len(results)})
             
             # 格式化结果
             hourly_patterns = []
@@ -320,49 +568,1308 @@ class StatisticsService:
                     'record_count': result['record_count']
                 })
             
-            # 分析时段模式
-            time_periods = {
-                'dawn': {'hours': [4, 5, 6, 7], 'name': '黎明时段', 'records': []},
-                'morning': {'hours': [8, 9, 10, 11], 'name': '上午时段', 'records': []},
-                'afternoon': {'hours': [12, 13, 14, 15, 16, 17], 'name': '下午时段', 'records': []},
-                'evening': {'hours': [18, 19, 20, 21], 'name': '晚上时段', 'records': []},
-                'night': {'hours': [22, 23, 0, 1, 2, 3], 'name': '夜间时段', 'records': []}
+            return {
+                'hourly_patterns': hourly_patterns,
+                'period_stats': self._summarize_periods(hourly_patterns),
+                'timezone': timezone
             }
             
-            # 将小时数据分配到时段
-            for pattern in hourly_patterns:
-                hour = pattern['hour']
-                for period_key, period_info in time_periods.items():
-                    if hour in period_info['hours']:
-                        period_info['records'].append(pattern)
-            
-            # 计算各时段统计
-            period_stats = {}
-            for period_key, period_info in time_periods.items():
-                if period_info['records']:
-                    avg_glucose = statistics.mean([r['avg_glucose'] for r in period_info['records']])
-                    total_records = sum([r['record_count'] for r in period_info['records']])
-                    
-                    period_stats[period_key] = {
-                        'name': period_info['name'],
-                        'avg_glucose': round(avg_glucose, 2),
-                        'record_count': total_records,
-                        'hours': period_info['hours']
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"模式分析失败: {str(e)}")
+    
+    def run_concurrently(self, tasks: Dict[str, Callable[[], Any]],
+                         timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        并发执行相互独立的统计查询 (线程池未启用时按顺序执行)
+        
+        Args:
+            tasks: {名称: 无参查询函数}
+            timeout: 截止时间 (秒，可选，默认 STATS_QUERY_TIMEOUT)
+            
+        Returns:
+            Dict[str, Any]: {名称: 查询结果}
+            
+        Raises:
+            QueryDeadlineExceeded: 超过截止时间
+            QueryPoolBusy: 查询线程池排队已满
+        """
+        query_pool = get_query_pool()
+        if query_pool is None:
+            return {name: task() for name, task in tasks.items()}
+        return query_pool.run(tasks, timeout)
+    
+    def get_overview(self, user_id: str, start_date: datetime, end_date: datetime,
+                     device_ids: Optional[List[str]] = None, granularity: str = 'day',
+                     timezone: str = 'UTC', timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        获取概览 (统计摘要、分布、模式与各设备趋势)
+        
+        各部分为相互独立的查询，通过 run_concurrently 并发执行，并各自使用结果缓存
+        
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期
+            end_date: 结束日期
+            device_ids: 分别给出趋势的设备ID列表 (可选，不指定时给出全部设备合并的趋势)
+            granularity: 趋势时间粒度
+            timezone: 用户时区
+            timeout: 截止时间 (秒，可选)
+            
+        Returns:
+            Dict: {'summary', 'distribution', 'patterns', 'trends': {设备ID或"all": 趋势}}
+        """
+        try:
+            window = {'user_id': user_id, 'start_date': start_date, 'end_date': end_date}
+            tasks: Dict[str, Callable[[], Any]] = {
+                'summary': lambda: self.get_glucose_statistics(**window),
+                'distribution': lambda: self.get_glucose_distribution(**window),
+                'patterns': lambda: self.get_glucose_patterns(**window, timezone=timezone)
+            }
+            for device_id in device_ids or [None]:
+                tasks[f'trends:{device_id or "all"}'] = (
+                    lambda device_id=device_id: self.get_glucose_trends(
+                        **window, granularity=granularity, device_id=device_id, timezone=timezone
+                    )
+                )
+            
+            results = self.run_concurrently(tasks, timeout)
+            return {
+                'summary': results['summary'],
+                'distribution': results['distribution'],
+                'patterns': results['patterns'],
+                'trends': {
+                    name.split(':', 1)[1]: result
+                    for name, result in results.items() if name.startswith('trends:')
+                },
+                'granularity': granularity,
+                'timezone': timezone
+            }
+            
+        except (QueryDeadlineExceeded, QueryPoolBusy):
+            raise
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"概览查询失败: {str(e)}")
+    
+    def get_time_of_day_statistics(self, user_id: str, start_day: str, end_day: str,
+                                   start_minute: int, end_minute: int,
+                                   device_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        获取每天固定时段 (用户本地时间) 的统计摘要，例如90天内每天 02:00-04:00
+        
+        按写入时预先计算的 local_date 与 minute_of_day 查询，
+        可使用 (user_id, minute_of_day, local_date) 复合索引
+        
+        Args:
+            user_id: 用户ID
+            start_day: 开始本地日期 (YYYY-MM-DD，含)
+            end_day: 结束本地日期 (YYYY-MM-DD，含)
+            start_minute: 时段开始 (一天中的分钟数，含)
+            end_minute: 时段结束 (不含；小于开始时表示跨越午夜)
+            device_id: 设备ID (可选)
+            
+        Returns:
+            Dict: 统计摘要
+        """
+        try:
+            date_filter = {'$gte': start_day, '$lte': end_day}
+            if start_minute < end_minute:
+                match_stage = {
+                    'user_id': user_id,
+                    'minute_of_day': {'$gte': start_minute, '$lt': end_minute},
+                    'local_date': date_filter
+                }
+            else:
+                match_stage = {'$or': [
+                    {'user_id': user_id, 'minute_of_day': minute_filter, 'local_date': date_filter}
+                    for minute_filter in ({'$gte': start_minute}, {'$lt': end_minute})
+                ]}
+            
+            if device_id:
+                match_stage['device_id'] = device_id
+            
+            aggregate = GlucoseAggregate()
+            for result in self.glucose_collection.aggregate([
+                {'$match': match_stage},
+                cell_group_stage(None)
+            ]):
+                aggregate = GlucoseAggregate.from_group(result)
+            self._record_tiers({TIER_RAW: 1})
+            
+            statistics = self._statistics_from_aggregate(
+                aggregate, datetime.fromisoformat(start_day), datetime.fromisoformat(end_day)
+            )
+            statistics['time_range'] = {'start_day': start_day, 'end_day': end_day}
+            statistics['time_of_day'] = {
+                'start': f"{start_minute // 60:02d}:{start_minute % 60:02d}",
+                'end': f"{end_minute // 60:02d}:{end_minute % 60:02d}"
+            }
+            return statistics
+            
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"时段统计失败: {str(e)}")
+    
+    def compare_periods(self, user_id: str, periods: List[Tuple[datetime, datetime]],
+                        device_id: Optional[str] = None,
+                        targets: Optional[Dict[str, float]] = None,
+                        baseline: int = 0) -> Dict[str, Any]:
+        """
+        对比多个时间段的统计摘要、TIR 与血糖分布
+        
+        所有时间段在一次聚合中完成：$match 只读取落在任一时间段内的读数，
+        每条读数标记所属时间段序号 (时间段重叠时属于多个)，再按序号分组，
+        扫描量与读数总数成正比而与时间段数无关。TIR/TBR/TAR 按读数计数
+        
+        Args:
+            user_id: 用户ID
+            periods: (开始 (含), 结束 (不含)) 列表
+            device_id: 设备ID (可选)
+            targets: 用户目标范围 (可选，默认国际共识 3.0/3.9/10.0/13.9)
+            baseline: 作为对比基准的时间段序号
+            
+        Returns:
+            Dict: 各时间段结果及相对基准的差值
+        """
+        try:
+            targets = {**DEFAULT_GLUCOSE_TARGETS, **(targets or {})}
+            in_period = [
+                {'$and': [{'$gte': ['$timestamp', start]}, {'$lt': ['$timestamp', end]}]}
+                for start, end in periods
+            ]
+            
+            match_stage = {
+                'user_id': user_id,
+                '$or': [{'timestamp': {'$gte': start, '$lt': end}} for start, end in periods]
+            }
+            
+            if device_id:
+                match_stage['device_id'] = device_id
+            
+            group_stage = cell_group_stage('$period')
+            value = '$glucose_value'
+            group_stage['$group'].update({
+                'tir_below_very_low': {'$sum': {'$cond': [{'$lt': [value, targets['very_low']]}, 1, 0]}},
+                'tir_below_low': {'$sum': {'$cond': [{'$lt': [value, targets['low']]}, 1, 0]}},
+                'tir_above_high': {'$sum': {'$cond': [{'$gt': [value, targets['high']]}, 1, 0]}},
+                'tir_above_very_high': {'$sum': {'$cond': [{'$gt': [value, targets['very_high']]}, 1, 0]}}
+            })
+            
+            pipeline = [
+                {'$match': match_stage},
+                {'$project': {
+                    'glucose_value': 1,
+                    'period': {'$concatArrays': [
+                        {'$cond': [condition, [index], []]}
+                        for index, condition in enumerate(in_period)
+                    ]}
+                }},
+                {'$unwind': '$period'},
+                group_stage
+            ]
+            
+            groups = {result['_id']: result for result in self.glucose_collection.aggregate(pipeline)}
+            self._record_tiers({TIER_RAW: len(groups)})
+            
+            results = []
+            for index, (start, end) in enumerate(periods):
+                group = groups.get(index)
+                aggregate = GlucoseAggregate.from_group(group) if group else GlucoseAggregate()
+                tier_counts = self._tir_counts(group) if group else dict.fromkeys(TIR_TIERS, 0)
+                results.append({
+                    'index': index,
+                    'summary': self._statistics_from_aggregate(aggregate, start, end),
+                    'time_in_ranges': self._tir_from_counts(tier_counts, aggregate.count),
+                    'distribution': self._distribution_from_aggregate(aggregate)
+                })
+            
+            for result in results:
+                if result['index'] != baseline:
+                    result['deltas'] = comparison_deltas(results[baseline], result)
+            
+            return {
+                'targets': targets,
+                'baseline': baseline,
+                'periods': results
+            }
+            
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"时间段对比失败: {str(e)}")
+    
+    @cached_statistics('heatmap')
+    def get_glucose_heatmap(self, user_id: str, start_date: datetime, end_date: datetime,
+                            device_id: Optional[str] = None,
+                            timezone: str = 'UTC') -> Dict[str, Any]:
+        """
+        获取周×小时血糖热力图 (用户本地时间)
+        
+        长时间范围读取小时汇总 (一年最多8760个文档)，按本地星期与小时合并；
+        时区偏移不是整小时 (UTC小时跨两个本地小时) 时改为按本地时间聚合原始记录
+        
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期
+            end_date: 结束日期
+            device_id: 设备ID (可选)
+            timezone: IANA时区名称
+            
+        Returns:
+            Dict: 7×24 矩阵 (平均血糖、各水平占比、记录数)
+        """
+        try:
+            tz = parse_timezone(timezone)
+            start = to_utc_naive(start_date)
+            end = to_utc_naive(end_date)
+            
+            if self._use_rollups(start, end) and has_whole_hour_offsets(tz, start, end):
+                cells = self._heatmap_from_hours(user_id, start, end, tz, device_id)
+            else:
+                cells = self._heatmap_from_raw(user_id, {'$gte': start, '$lte': end},
+                                               timezone, device_id)
+            
+            result = self._heatmap_result(cells)
+            result.update({
+                'timezone': timezone,
+                'time_range': {
+                    'start_date': start_date.isoformat(),
+                    'end_date': end_date.isoformat()
+                }
+            })
+            return result
+            
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"热力图查询失败: {str(e)}")
+    
+    @cached_statistics('percentiles')
+    def get_glucose_percentiles(self, user_id: str, start_date: datetime, end_date: datetime,
+                                percentiles: Optional[List[float]] = None,
+                                device_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        获取血糖分位数
+        
+        整天部分合并日汇总中的分位数草图，首尾不足一天的部分读取原始记录，
+        结果与精确值之差不超过 QuantileSketch.ERROR_BOUND
+        
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期
+            end_date: 结束日期
+            percentiles: 百分位列表，取值 0-100 (默认 5/25/50/75/95)
+            device_id: 设备ID (可选)
+            
+        Returns:
+            Dict: 分位数数据
+        """
+        try:
+            if percentiles is None:
+                percentiles = DEFAULT_PERCENTILES
+            
+            if self._use_rollups(start_date, end_date):
+                segments = self._plan_segments(start_date, end_date, GRANULARITY_DAY)
+            else:
+                segments = [(TIER_RAW, start_date, end_date)]
+            
+            sketch = QuantileSketch()
+            tiers_used: Dict[str, int] = {}
+            for index, (tier, segment_start, segment_end) in enumerate(segments):
+                read_count = 0
+                if tier == TIER_RAW:
+                    end_operator = '$lte' if index == len(segments) - 1 else '$lt'
+                    filter_dict = {
+                        'user_id': user_id,
+                        'timestamp': {'$gte': segment_start, end_operator: segment_end}
                     }
+                    if device_id:
+                        filter_dict['device_id'] = device_id
+                    
+                    values = load_values(self.glucose_collection, filter_dict)
+                    sketch.add_array(values)
+                    read_count = len(values)
                 else:
-                    period_stats[period_key] = {
-                        'name': period_info['name'],
-                        'avg_glucose': None,
-                        'record_count': 0,
-                        'hours': period_info['hours']
-                    }
+                    for doc in self.rollup_service.get_buckets(user_id, tier, segment_start,
+                                                                segment_end, device_id,
+                                                                projection={'sketch': 1}):
+                        sketch.merge(QuantileSketch.from_binary(doc.get('sketch')))
+                        read_count += 1
+                tiers_used[tier] = tiers_used.get(tier, 0) + read_count
+            self._record_tiers(tiers_used)
             
+            values = sketch.quantiles([p / 100 for p in percentiles])
             return {
-                'hourly_patterns': hourly_patterns,
-                'period_stats': period_stats
+                'total_records': sketch.count,
+                'percentiles': [
+                    {'percentile': p, 'value': value}
+                    for p, value in zip(percentiles, values)
+                ],
+                'error_bound': QuantileSketch.ERROR_BOUND,
+                'time_range': {
+                    'start': start_date.isoformat(),
+                    'end': end_date.isoformat()
+                }
             }
             
         except PyMongoError as e:
             raise Exception(f"数据库查询失败: {str(e)}")
         except Exception as e:
-            raise Exception(f"模式分析失败: {str(e)}")
+            raise Exception(f"分位数计算失败: {str(e)}")
+    
+    @cached_statistics('agp')
+    def get_glucose_agp(self, user_id: str, start_date: datetime, end_date: datetime,
+                        device_id: Optional[str] = None,
+                        timezone: str = 'UTC') -> Dict[str, Any]:
+        """
+        获取动态血糖图谱 (AGP)：按本地时间一天中的15分钟时段计算 5/25/50/75/95 百分位曲线
+        
+        时段使用写入时计算的 minute_of_day，local_tz 与 timezone 不一致的记录按 timezone 换算
+        
+        Args:
+            user_id: 用户ID
+            start_date: 窗口开始 (含)
+            end_date: 窗口结束 (不含)
+            device_id: 设备ID (可选)
+            timezone: 用户时区名称
+            
+        Returns:
+            Dict: AGP数据
+        """
+        try:
+            filter_dict = {
+                'user_id': user_id,
+                'timestamp': {'$gte': start_date, '$lt': end_date}
+            }
+            
+            if device_id:
+                filter_dict['device_id'] = device_id
+            
+            series = load_series(self.glucose_collection, filter_dict, timezone=timezone)
+            self._record_tiers({TIER_RAW: len(series)})
+            
+            counts, bands = run_analytics(
+                grouped_percentiles,
+                {'keys': series.minutes_of_day() // AGP_SLOT_MINUTES, 'values': series.values},
+                percentiles=AGP_PERCENTILES, group_count=AGP_SLOT_COUNT
+            )
+            return self._agp_result(counts, bands, start_date, end_date, timezone)
+            
+        except QueryDeadlineExceeded:
+            raise
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"AGP计算失败: {str(e)}")
+    
+    def get_glucose_agp_batch(self, windows: Dict[str, Tuple[datetime, datetime]],
+                              timezones: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取多个用户的AGP (患者列表视图)
+        
+        先读取各用户的缓存结果，未命中的用户通过一次查询读取 (各用户使用本地时间的窗口)，
+        所有 (用户, 时段) 的百分位在一次排序中计算，结果写回缓存 (与单用户查询共用缓存项)
+        
+        Args:
+            windows: {用户ID: (窗口开始 (含), 窗口结束 (不含))}
+            timezones: {用户ID: 时区名称}
+            
+        Returns:
+            Dict: {用户ID: AGP数据}
+        """
+        try:
+            stats_cache = get_stats_cache()
+            results: Dict[str, Dict[str, Any]] = {}
+            pending: Dict[str, Optional[Tuple[str, int, int, Optional[int]]]] = {}
+            
+            for user_id, (start_date, end_date) in windows.items():
+                if stats_cache is None:
+                    pending[user_id] = None
+                    continue
+                key, start, end = stats_cache.key_for(
+                    'agp', user_id, start_date, end_date, params={'timezone': timezones[user_id]}
+                )
+                hit, result = stats_cache.get(key)
+                if hit:
+                    results[user_id] = result
+                else:
+                    pending[user_id] = (key, start, end, stats_cache.generation(user_id))
+            
+            if pending:
+                missing = list(pending)
+                series, codes = load_grouped_series(
+                    self.glucose_collection, self._windows_filter(windows, missing),
+                    'user_id', missing, timezones=[timezones[user_id] for user_id in missing]
+                )
+                self._record_tiers({TIER_RAW: len(series)})
+                
+                keys = codes * AGP_SLOT_COUNT + series.minutes_of_day() // AGP_SLOT_MINUTES
+                counts, bands = run_analytics(
+                    grouped_percentiles, {'keys': keys, 'values': series.values},
+                    percentiles=AGP_PERCENTILES, group_count=len(missing) * AGP_SLOT_COUNT
+                )
+                
+                for index, user_id in enumerate(missing):
+                    rows = slice(index * AGP_SLOT_COUNT, (index + 1) * AGP_SLOT_COUNT)
+                    start_date, end_date = windows[user_id]
+                    result = self._agp_result(counts[rows], bands[rows], start_date, end_date,
+                                              timezones[user_id])
+                    results[user_id] = result
+                    if pending[user_id] is not None:
+                        key, start, end, generation = pending[user_id]
+                        stats_cache.set(key, result, user_id, start, end, generation)
+            
+            return {user_id: results[user_id] for user_id in windows}
+            
+        except QueryDeadlineExceeded:
+            raise
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"AGP计算失败: {str(e)}")
+    
+    @cached_statistics('cgm_metrics')
+    def get_cgm_metrics(self, user_id: str, start_date: datetime, end_date: datetime,
+                        device_id: Optional[str] = None,
+                        targets: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """
+        获取国际共识 CGM 指标
+        
+        TIR/TBR/TAR 按时间加权 (每条读数代表到下一条读数的时长，传感器中断不计)，
+        同时给出按读数计数的百分比；另含 GMI、CV、传感器佩戴时间与数据充分性
+        
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期
+            end_date: 结束日期
+            device_id: 设备ID (可选)
+            targets: 用户目标范围 (可选，默认国际共识 3.0/3.9/10.0/13.9)
+            
+        Returns:
+            Dict: CGM指标
+        """
+        try:
+            targets = {**DEFAULT_GLUCOSE_TARGETS, **(targets or {})}
+            time_range = {
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat()
+            }
+            
+            filter_dict = {
+                'user_id': user_id,
+                'timestamp': {'$gte': start_date, '$lte': end_date}
+            }
+            
+            if device_id:
+                filter_dict['device_id'] = device_id
+            
+            series = load_series(self.glucose_collection, filter_dict)
+            self._record_tiers({TIER_RAW: len(series)})
+            
+            if not len(series):
+                return {
+                    'total_records': 0,
+                    'targets': targets,
+                    'time_in_ranges': None,
+                    'sensor_wear_percentage': 0.0,
+                    'data_days': 0,
+                    'sufficient_data': False,
+                    'time_range': time_range
+                }
+            
+            window_seconds = int((to_utc_naive(end_date) - to_utc_naive(start_date)).total_seconds())
+            metrics = cgm_metrics(
+                series, window_seconds, targets,
+                expected_interval=current_app.config.get('CGM_EXPECTED_INTERVAL_MINUTES', 5) * 60,
+                max_gap=current_app.config.get('CGM_MAX_GAP_MINUTES', 15) * 60
+            )
+            
+            covered = metrics['covered_seconds']
+            total_records = metrics['count']
+            tier_names = {
+                'very_low': f"极低 (<{targets['very_low']})",
+                'low': f"低 ({targets['very_low']}-{targets['low']})",
+                'in_range': f"目标范围 ({targets['low']}-{targets['high']})",
+                'high': f"高 ({targets['high']}-{targets['very_high']})",
+                'very_high': f"极高 (>{targets['very_high']})"
+            }
+            time_in_ranges = [
+                {
+                    'key': tier,
+                    'name': tier_names[tier],
+                    'percentage': round(metrics['tier_seconds'][tier] / covered * 100, 1),
+                    'minutes': round(metrics['tier_seconds'][tier] / 60, 1),
+                    'count': metrics['tier_counts'][tier],
+                    'count_percentage': round(metrics['tier_counts'][tier] / total_records * 100, 1)
+                }
+                for tier in TIR_TIERS
+            ]
+            percentages = {tier['key']: tier['percentage'] for tier in time_in_ranges}
+            
+            # 数据充分性：共识建议至少14天且传感器佩戴时间不少于70%
+            window_days = window_seconds / 86400
+            
+            return {
+                'total_records': total_records,
+                'targets': targets,
+                'mean_glucose': round(metrics['mean'], 2),
+                'std_glucose': round(metrics['std'], 2),
+                'cv': round(metrics['cv'], 1),
+                'cv_stable': metrics['cv'] <= 36,
+                'gmi': round(metrics['gmi'], 1),
+                'gmi_mmol_mol': round(metrics['gmi_mmol_mol']),
+                'time_in_ranges': time_in_ranges,
+                'tir': percentages['in_range'],
+                'tbr': round(percentages['very_low'] + percentages['low'], 1),
+                'tar': round(percentages['high'] + percentages['very_high'], 1),
+                'sensor_wear_percentage': round(metrics['wear_percentage'], 1),
+                'data_days': metrics['data_days'],
+                'sufficient_data': window_days >= 14 and metrics['wear_percentage'] >= 70,
+                'time_range': time_range
+            }
+            
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"CGM指标计算失败: {str(e)}")
+    
+    @cached_statistics('variability')
+    def get_glycemic_variability(self, user_id: str, start_date: datetime, end_date: datetime,
+                                 device_id: Optional[str] = None,
+                                 conga_hours: int = 1) -> Dict[str, Any]:
+        """
+        获取血糖变异性指标 (MAGE、CONGA-n、MODD、LBGI/HBGI)
+        
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期
+            end_date: 结束日期 (不含)
+            device_id: 设备ID (可选)
+            conga_hours: CONGA 的时间滞后 (小时)
+            
+        Returns:
+            Dict: 变异性指标
+        """
+        try:
+            filter_dict = {
+                'user_id': user_id,
+                'timestamp': {'$gte': start_date, '$lt': end_date}
+            }
+            
+            if device_id:
+                filter_dict['device_id'] = device_id
+            
+            series = load_series(self.glucose_collection, filter_dict)
+            self._record_tiers({TIER_RAW: len(series)})
+            
+            indices = self._variability_indices(
+                series, np.zeros(len(series), dtype=np.int64), 1, conga_hours
+            )[0]
+            return self._variability_result(indices, len(series), start_date, end_date,
+                                            conga_hours)
+            
+        except QueryDeadlineExceeded:
+            raise
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"变异性指标计算失败: {str(e)}")
+    
+    def get_glycemic_variability_batch(self, windows: Dict[str, Tuple[datetime, datetime]],
+                                       conga_hours: int = 1) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取多个用户的血糖变异性指标
+        
+        先读取各用户的缓存结果，未命中的用户通过一次查询读取后逐用户计算，
+        结果写回缓存 (与单用户查询共用缓存项)
+        
+        Args:
+            windows: {用户ID: (开始日期, 结束日期 (不含))}
+            conga_hours: CONGA 的时间滞后 (小时)
+            
+        Returns:
+            Dict: {用户ID: 变异性指标}
+        """
+        try:
+            stats_cache = get_stats_cache()
+            params = {'conga_hours': conga_hours}
+            results: Dict[str, Dict[str, Any]] = {}
+            pending: Dict[str, Optional[Tuple[str, int, int, Optional[int]]]] = {}
+            
+            for user_id, (start_date, end_date) in windows.items():
+                if stats_cache is None:
+                    pending[user_id] = None
+                    continue
+                key, start, end = stats_cache.key_for(
+                    'variability', user_id, start_date, end_date, params=params
+                )
+                hit, result = stats_cache.get(key)
+                if hit:
+                    results[user_id] = result
+                else:
+                    pending[user_id] = (key, start, end, stats_cache.generation(user_id))
+            
+            if pending:
+                missing = list(pending)
+                series, codes = load_grouped_series(
+                    self.glucose_collection, self._windows_filter(windows, missing),
+                    'user_id', missing
+                )
+                self._record_tiers({TIER_RAW: len(series)})
+                
+                # 所有用户的指标在一次调用中计算 (数据量大时整体提交到分析计算进程池)
+                grouped = self._variability_indices(series, codes, len(missing), conga_hours)
+                totals = np.bincount(codes, minlength=len(missing)).tolist()
+                for index, user_id in enumerate(missing):
+                    start_date, end_date = windows[user_id]
+                    result = self._variability_result(grouped[index], totals[index],
+                                                      start_date, end_date, conga_hours)
+                    results[user_id] = result
+                    if pending[user_id] is not None:
+                        key, start, end, generation = pending[user_id]
+                        stats_cache.set(key, result, user_id, start, end, generation)
+            
+            return {user_id: results[user_id] for user_id in windows}
+            
+        except QueryDeadlineExceeded:
+            raise
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"变异性指标计算失败: {str(e)}")
+    
+    def get_windowed_series(self, user_id: str, start_date: datetime, end_date: datetime,
+                            device_id: Optional[str] = None,
+                            output_format: str = 'records') -> Dict[str, Any]:
+        """
+        获取带滚动窗口指标的血糖序列
+        
+        每条读数附带 1/3/24 小时滚动均值、变化率 (mmol/L/min) 与趋势箭头，按用户与设备分区计算。
+        窗口向开始时间之前回看24小时，开头的读数也有完整的窗口
+        
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期
+            end_date: 结束日期
+            device_id: 设备ID (可选)
+            output_format: 输出格式，records (逐条对象) 或 columnar (按列数组)
+            
+        Returns:
+            Dict: 滚动窗口序列
+        """
+        try:
+            start_date, end_date = to_utc_naive(start_date), to_utc_naive(end_date)
+            filter_dict = {
+                'user_id': user_id,
+                'timestamp': {
+                    '$gte': rolling_windows.lookback_start(start_date),
+                    '$lte': end_date
+                }
+            }
+            
+            if device_id:
+                filter_dict['device_id'] = device_id
+            
+            columns = None
+            if current_app.config.get('STATS_WINDOW_FUNCTIONS_ENABLED', True):
+                try:
+                    columns = self._windows_from_database(filter_dict, start_date)
+                except OperationFailure as e:
+                    # 数据库不支持窗口函数 (MongoDB < 5.0) 时回退到向量化实现
+                    current_app.logger.warning(f"窗口函数不可用，使用向量化实现: {str(e)}")
+            if columns is None:
+                columns = self._windows_from_arrays(filter_dict, start_date)
+            
+            return self._windowed_result(columns, start_date, end_date, output_format)
+            
+        except QueryDeadlineExceeded:
+            raise
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"滚动窗口计算失败: {str(e)}")
+    
+    def _windows_from_database(self, filter_dict: Dict[str, Any],
+                               start_date: datetime) -> Dict[str, Any]:
+        """通过 $setWindowFields 在数据库内计算滚动窗口列"""
+        pipeline = rolling_windows.window_pipeline(filter_dict, start_date)
+        documents = list(self.glucose_collection.aggregate(pipeline, allowDiskUse=True))
+        self._record_tiers({TIER_RAW: len(documents)})
+        
+        columns = {
+            name: np.array([
+                np.nan if document.get(name) is None else document[name]
+                for document in documents
+            ], dtype=np.float64)
+            for name in list(rolling_windows.ROLLING_WINDOWS) + ['rate_of_change', 'glucose_value']
+        }
+        columns['timestamp'] = np.array([
+            rolling_windows.epoch_seconds(document['timestamp']) for document in documents
+        ], dtype=np.int64)
+        columns['device_id'] = [document.get('device_id') for document in documents]
+        return columns
+    
+    def _windows_from_arrays(self, filter_dict: Dict[str, Any],
+                             start_date: datetime) -> Dict[str, Any]:
+        """读入数组后向量化计算滚动窗口列"""
+        cursor = self.glucose_collection.find(
+            filter_dict, {'_id': 0, 'glucose_value': 1, 'timestamp': 1, 'device_id': 1}
+        ).batch_size(DEFAULT_BATCH_SIZE)
+        series, codes, devices = rolling_windows.load_partitions(cursor)
+        self._record_tiers({TIER_RAW: len(series)})
+        
+        columns = run_analytics(
+            rolling_windows.compute_windows_from_arrays,
+            {'values': series.values, 'timestamps': series.timestamps, 'codes': codes},
+            start_timestamp=rolling_windows.epoch_seconds(start_date)
+        )
+        columns['device_id'] = [devices[code] for code in columns.pop('partition').tolist()]
+        return columns
+    
+    def _windowed_result(self, columns: Dict[str, Any], start_date: datetime,
+                         end_date: datetime, output_format: str) -> Dict[str, Any]:
+        """将滚动窗口列转换为 records 或 columnar 输出"""
+        def rounded(values: np.ndarray, digits: int) -> List[Optional[float]]:
+            return [None if np.isnan(value) else value
+                    for value in np.round(values, digits).tolist()]
+        
+        data = {
+            'timestamp': columns['timestamp'].tolist(),
+            'device_id': columns['device_id'],
+            'glucose_value': columns['glucose_value'].tolist(),
+            'rate_of_change': rounded(columns['rate_of_change'], 3),
+            'trend': rolling_windows.trend_arrows(columns['rate_of_change'])
+        }
+        for name in rolling_windows.ROLLING_WINDOWS:
+            data[name] = rounded(columns[name], 2)
+        
+        result = {
+            'count': len(data['timestamp']),
+            'format': output_format,
+            'windows_minutes': {
+                name: seconds // 60 for name, seconds in rolling_windows.ROLLING_WINDOWS.items()
+            },
+            'rate_window_minutes': rolling_windows.RATE_WINDOW_SECONDS // 60,
+            'time_range': {
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat()
+            }
+        }
+        
+        if output_format == 'columnar':
+            # 按列输出，时间为UTC时间戳 (秒)
+            result['columns'] = {name: data[name] for name in rolling_windows.COLUMNS}
+        else:
+            data['timestamp'] = [
+                (EPOCH + timedelta(seconds=value)).isoformat() for value in data['timestamp']
+            ]
+            result['readings'] = [
+                dict(zip(rolling_windows.COLUMNS, row))
+                for row in zip(*(data[name] for name in rolling_windows.COLUMNS))
+            ]
+        return result
+    
+    def _variability_indices(self, series: GlucoseSeries, codes: np.ndarray, group_count: int,
+                             conga_hours: int) -> List[Dict[str, Any]]:
+        """按分组计算变异性指标 (重采样间隔与插值上限使用CGM配置)"""
+        return run_analytics(
+            grouped_variability_indices,
+            {'values': series.values, 'timestamps': series.timestamps, 'codes': codes},
+            group_count=group_count,
+            interval=current_app.config.get('CGM_EXPECTED_INTERVAL_MINUTES', 5) * 60,
+            max_gap=current_app.config.get('CGM_MAX_GAP_MINUTES', 15) * 60,
+            conga_hours=conga_hours
+        )
+    
+    def _variability_result(self, indices: Dict[str, Any], total_records: int,
+                            start_date: datetime, end_date: datetime,
+                            conga_hours: int) -> Dict[str, Any]:
+        """由变异性指标生成返回数据"""
+        interval = current_app.config.get('CGM_EXPECTED_INTERVAL_MINUTES', 5) * 60
+        
+        def rounded(value):
+            return round(value, 2) if value is not None else None
+        
+        return {
+            'total_records': total_records,
+            'resample_minutes': interval // 60,
+            'resampled_points': indices['resampled_points'],
+            'mage': rounded(indices['mage']),
+            'mage_excursions': indices['mage_excursions'],
+            'conga': rounded(indices['conga']),
+            'conga_hours': conga_hours,
+            'modd': rounded(indices['modd']),
+            'lbgi': rounded(indices['lbgi']),
+            'hbgi': rounded(indices['hbgi']),
+            'time_range': {
+                'start': start_date.isoformat(),
+                'end': end_date.isoformat()
+            }
+        }
+    
+    @staticmethod
+    def _windows_filter(windows: Dict[str, Tuple[datetime, datetime]],
+                        user_ids: List[str]) -> Dict[str, Any]:
+        """多个用户各自时间窗口的查询条件 (窗口相同的用户合并为一个 $in 条件)"""
+        by_window: Dict[Tuple[datetime, datetime], List[str]] = {}
+        for user_id in user_ids:
+            by_window.setdefault(windows[user_id], []).append(user_id)
+        return {'$or': [
+            {'user_id': {'$in': members}, 'timestamp': {'$gte': start, '$lt': end}}
+            for (start, end), members in by_window.items()
+        ]}
+    
+    def _agp_result(self, counts: np.ndarray, bands: np.ndarray,
+                    start_date: datetime, end_date: datetime,
+                    timezone: str = 'UTC') -> Dict[str, Any]:
+        """由各时段的读数数量与百分位矩阵生成AGP数据"""
+        slots = []
+        for slot, (count, values) in enumerate(zip(counts.tolist(), bands.tolist())):
+            minutes = slot * AGP_SLOT_MINUTES
+            entry = {
+                'slot': slot,
+                'time_label': f"{minutes // 60:02d}:{minutes % 60:02d}",
+                'record_count': count
+            }
+            for percentile, value in zip(AGP_PERCENTILES, values):
+                entry[f'p{percentile}'] = round(value, 2) if count else None
+            slots.append(entry)
+        
+        return {
+            'total_records': int(counts.sum()),
+            'days': round((to_utc_naive(end_date) - to_utc_naive(start_date)).total_seconds() / 86400),
+            'timezone': timezone,
+            'slot_minutes': AGP_SLOT_MINUTES,
+            'percentiles': AGP_PERCENTILES,
+            'slots': slots,
+            'time_range': {
+                'start': start_date.isoformat(),
+                'end': end_date.isoformat()
+            }
+        }
+    
+    def _summarize_periods(self, hourly_patterns: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        将小时模式汇总为时段统计
+        
+        Args:
+            hourly_patterns: 按小时的模式数据
+            
+        Returns:
+            Dict: 各时段统计
+        """
+        # 分析时段模式
+        time_periods = {
+            'dawn': {'hours': [4, 5, 6, 7], 'name': '黎明时段'},
+            'morning': {'hours': [8, 9, 10, 11], 'name': '上午时段'},
+            'afternoon': {'hours': [12, 13, 14, 15, 16, 17], 'name': '下午时段'},
+            'evening': {'hours': [18, 19, 20, 21], 'name': '晚上时段'},
+            'night': {'hours': [22, 23, 0, 1, 2, 3], 'name': '夜间时段'}
+        }
+        
+        # 计算各时段统计
+        hours = np.array([r['hour'] for r in hourly_patterns], dtype=np.int64)
+        hourly_means = np.array([r['avg_glucose'] for r in hourly_patterns], dtype=np.float64)
+        hourly_counts = np.array([r['record_count'] for r in hourly_patterns], dtype=np.int64)
+        means = period_means(hours, hourly_means, hourly_counts,
+                             {key: info['hours'] for key, info in time_periods.items()})
+        
+        period_stats = {}
+        for period_key, period_info in time_periods.items():
+            avg_glucose, total_records = means[period_key]
+            period_stats[period_key] = {
+                'name': period_info['name'],
+                'avg_glucose': round(avg_glucose, 2) if avg_glucose is not None else None,
+                'record_count': total_records,
+                'hours': period_info['hours']
+            }
+        
+        return period_stats
+    
+    def _use_rollups(self, start_date: datetime, end_date: datetime) -> bool:
+        """判断时间范围是否足够长，需要读取汇总数据"""
+        if not current_app.config.get('ROLLUPS_ENABLED', True):
+            return False
+        
+        min_days = current_app.config.get('ROLLUP_MIN_RANGE_DAYS', 7)
+        span = to_utc_naive(end_date) - to_utc_naive(start_date)
+        return span >= timedelta(days=min_days)
+    
+    def _plan_segments(self, start_date: datetime, end_date: datetime,
+                       max_tier: str = GRANULARITY_MONTH) -> List[Tuple[str, datetime, datetime]]:
+        """
+        规划查询时间范围的数据来源
+        
+        首尾不足一天的部分读取原始记录，完整覆盖的整天读取日汇总，
+        完整覆盖的整月读取月汇总 (max_tier 允许时)。
+        原始记录段的结束时间仅在最后一段为闭区间。
+        
+        Args:
+            start_date: 开始日期 (含)
+            end_date: 结束日期 (含)
+            max_tier: 允许使用的最粗粒度 ('day', 'month')
+            
+        Returns:
+            List[Tuple]: (数据层级, 段开始, 段结束) 列表，按时间排序
+        """
+        start = to_utc_naive(start_date)
+        end = to_utc_naive(end_date)
+        first_day = ceil_day(start)
+        last_day = floor_day(end)
+        
+        if first_day >= last_day:
+            return [(TIER_RAW, start, end)]
+        
+        segments = []
+        if start < first_day:
+            segments.append((TIER_RAW, start, first_day))
+        
+        first_month = ceil_month(first_day)
+        last_month = floor_month(last_day)
+        if max_tier == GRANULARITY_MONTH and first_month < last_month:
+            if first_day < first_month:
+                segments.append((GRANULARITY_DAY, first_day, first_month))
+            segments.append((GRANULARITY_MONTH, first_month, last_month))
+            if last_month < last_day:
+                segments.append((GRANULARITY_DAY, last_month, last_day))
+        else:
+            segments.append((GRANULARITY_DAY, first_day, last_day))
+        
+        segments.append((TIER_RAW, last_day, end))
+        return segments
+    
+    def _collect_buckets(self, user_id: str, start_date: datetime, end_date: datetime,
+                         device_id: Optional[str] = None,
+                         max_tier: str = GRANULARITY_MONTH,
+                         end_exclusive: bool = False) -> BucketedAggregates:
+        """
+        按查询规划组合原始记录与汇总数据，得到时间范围内的聚合结果
+        
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期 (含)
+            end_date: 结束日期 (默认含)
+            device_id: 设备ID (可选)
+            max_tier: 允许使用的最粗粒度
+            end_exclusive: 结束日期是否不含
+            
+        Returns:
+            BucketedAggregates: 聚合结果
+        """
+        segments = self._plan_segments(start_date, end_date, max_tier)
+        buckets = BucketedAggregates()
+        tiers_used: Dict[str, int] = {}
+        
+        for index, (tier, segment_start, segment_end) in enumerate(segments):
+            read_count = 0
+            if tier == TIER_RAW:
+                last = index == len(segments) - 1
+                end_operator = '$lte' if last and not end_exclusive else '$lt'
+                read_count = self._add_raw_cells(
+                    buckets, user_id,
+                    {'$gte': segment_start, end_operator: segment_end},
+                    device_id
+                )
+            else:
+                for doc in self.rollup_service.get_buckets(user_id, tier, segment_start,
+                                                            segment_end, device_id):
+                    buckets.add_rollup_doc(doc)
+                    read_count += 1
+            tiers_used[tier] = tiers_used.get(tier, 0) + read_count
+        
+        self._record_tiers(tiers_used)
+        return buckets
+    
+    def _record_tiers(self, tiers_used: Dict[str, int]) -> None:
+        """
+        记录本次请求各数据层级读取的文档数 (原始层为聚合单元数)，供调试响应头输出
+        
+        Args:
+            tiers_used: {数据层级: 读取数}
+        """
+        if not has_app_context():
+            return
+        
+        stats_tiers = g.setdefault('stats_tiers', {})
+        for tier, count in tiers_used.items():
+            stats_tiers[tier] = stats_tiers.get(tier, 0) + count
+    
+    def _add_raw_cells(self, buckets: BucketedAggregates, user_id: str,
+                       timestamp_filter: Dict[str, Any], device_id: Optional[str] = None) -> int:
+        """从原始记录按小时聚合并加入结果，返回聚合单元数"""
+        match_stage = {
+            'user_id': user_id,
+            'timestamp': timestamp_filter
+        }
+        
+        if device_id:
+            match_stage['device_id'] = device_id
+        
+        pipeline = [
+            {'$match': match_stage},
+            cell_group_stage(hour_group_id())
+        ]
+        
+        cell_count = 0
+        for result in self.glucose_collection.aggregate(pipeline):
+            key = result['_id']
+            hour_start = datetime(key['year'], key['month'], key['day'], key['hour'])
+            buckets.add_cell(hour_start, GlucoseAggregate.from_group(result))
+            cell_count += 1
+        return cell_count
+    
+    def _collect_hour_cells(self, user_id: str, start: datetime, end: datetime,
+                            device_id: Optional[str] = None) -> List[Tuple[datetime, GlucoseAggregate]]:
+        """
+        读取时间范围内按UTC小时的聚合量：整小时读取小时汇总，首尾不足一小时的部分读取原始记录
+        
+        Args:
+            user_id: 用户ID
+            start: 开始时间 (含)
+            end: 结束时间 (含)
+            device_id: 设备ID (可选)
+            
+        Returns:
+            List[Tuple]: (小时开始, 聚合量) 列表 (不含空单元)
+        """
+        cells: List[Tuple[datetime, GlucoseAggregate]] = []
+        first_hour, last_hour = ceil_hour(start), floor_hour(end)
+        raw_filters = [{'$gte': last_hour, '$lte': end}]
+        if start < first_hour:
+            raw_filters.append({'$gte': start, '$lt': first_hour})
+        
+        raw_count = 0
+        for timestamp_filter in raw_filters:
+            match_stage = {'user_id': user_id, 'timestamp': timestamp_filter}
+            if device_id:
+                match_stage['device_id'] = device_id
+            for result in self.glucose_collection.aggregate([
+                {'$match': match_stage},
+                cell_group_stage(hour_group_id())
+            ]):
+                key = result['_id']
+                cells.append((datetime(key['year'], key['month'], key['day'], key['hour']),
+                              GlucoseAggregate.from_group(result)))
+                raw_count += 1
+        
+        hour_count = 0
+        if first_hour < last_hour:
+            for doc in self.rollup_service.get_buckets(user_id, GRANULARITY_HOUR, first_hour,
+                                                        last_hour, device_id):
+                hour_count += 1
+                if doc.get('count', 0) > 0:
+                    cells.append((doc['bucket_start'], GlucoseAggregate.from_doc(doc)))
+        
+        self._record_tiers({TIER_RAW: raw_count, GRANULARITY_HOUR: hour_count})
+        return cells
+    
+    def _heatmap_from_hours(self, user_id: str, start: datetime, end: datetime, tz,
+                            device_id: Optional[str] = None) -> Dict[Tuple[int, int], GlucoseAggregate]:
+        """由小时聚合量按本地 (星期, 小时) 合并 (时区UTC偏移为整小时)"""
+        cells: Dict[Tuple[int, int], GlucoseAggregate] = {}
+        for hour_start, aggregate in self._collect_hour_cells(user_id, start, end, device_id):
+            local = to_local(hour_start, tz)
+            cells.setdefault((local.weekday(), local.hour), GlucoseAggregate()).merge(aggregate)
+        return cells
+    
+    def _heatmap_from_raw(self, user_id: str, timestamp_filter: Dict[str, Any], timezone: str,
+                          device_id: Optional[str] = None) -> Dict[Tuple[int, int], GlucoseAggregate]:
+        """按本地 (星期, 小时) 聚合原始记录"""
+        match_stage = {'user_id': user_id, 'timestamp': timestamp_filter}
+        if device_id:
+            match_stage['device_id'] = device_id
+        
+        local_date = {'date': '$timestamp', 'timezone': timezone}
+        pipeline = [
+            {'$match': match_stage},
+            cell_group_stage({
+                'day_of_week': {'$isoDayOfWeek': local_date},
+                'hour': {'$hour': local_date}
+            })
+        ]
+        
+        cells = {}
+        for result in self.glucose_collection.aggregate(pipeline):
+            key = result['_id']
+            cells[(key['day_of_week'] - 1, key['hour'])] = GlucoseAggregate.from_group(result)
+        
+        self._record_tiers({TIER_RAW: len(cells)})
+        return cells
+    
+    @staticmethod
+    def _heatmap_result(cells: Dict[Tuple[int, int], GlucoseAggregate]) -> Dict[str, Any]:
+        """由 (星期, 小时) 聚合量生成 7×24 矩阵 (无数据的单元为None)"""
+        def matrix(value_of):
+            return [
+                [value_of(cells[(weekday, hour)]) if (weekday, hour) in cells else None
+                 for hour in range(24)]
+                for weekday in range(7)
+            ]
+        
+        def percentage(level):
+            return lambda aggregate: round(aggregate.level_counts[level] / aggregate.count * 100, 1)
+        
+        return {
+            'weekdays': WEEKDAY_LABELS,
+            'hours': list(range(24)),
+            'avg_glucose': matrix(lambda aggregate: round(aggregate.mean, 2)),
+            'normal_percentage': matrix(percentage('normal')),
+            'low_percentage': matrix(percentage('low')),
+            'high_percentage': matrix(percentage('high')),
+            'record_count': matrix(lambda aggregate: aggregate.count),
+            'total_records': sum(aggregate.count for aggregate in cells.values())
+        }
+    
+    def _statistics_from_aggregate(self, aggregate: GlucoseAggregate, start_date: datetime,
+                                   end_date: datetime) -> Dict[str, Any]:
+        """由聚合量生成统计摘要"""
+        time_range = {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        }
+        
+        if not aggregate.count:
+            return {
+                'total_records': 0,
+                'avg_glucose': None,
+                'max_glucose': None,
+                'min_glucose': None,
+                'std_glucose': None,
+                'normal_count': 0,
+                'high_count': 0,
+                'low_count': 0,
+                'time_range': time_range
+            }
+        
+        total_records = aggregate.count
+        levels = aggregate.level_counts
+        
+        return {
+            'total_records': total_records,
+            'avg_glucose': round(aggregate.mean, 2),
+            'max_glucose': aggregate.max,
+            'min_glucose': aggregate.min,
+            'std_glucose': round(aggregate.std, 2),
+            'normal_count': levels['normal'],
+            'high_count': levels['high'],
+            'low_count': levels['low'],
+            'normal_percentage': round((levels['normal'] / total_records) * 100, 1),
+            'high_percentage': round((levels['high'] / total_records) * 100, 1),
+            'low_percentage': round((levels['low'] / total_records) * 100, 1),
+            'time_range': time_range
+        }
+    
+    @staticmethod
+    def _tir_counts(group: Dict[str, Any]) -> Dict[str, int]:
+        """由累计阈值计数得到各共识分层的读数"""
+        return {
+            'very_low': group['tir_below_very_low'],
+            'low': group['tir_below_low'] - group['tir_below_very_low'],
+            'in_range': group['count'] - group['tir_below_low'] - group['tir_above_high'],
+            'high': group['tir_above_high'] - group['tir_above_very_high'],
+            'very_high': group['tir_above_very_high']
+        }
+    
+    @staticmethod
+    def _tir_from_counts(tier_counts: Dict[str, int], total_records: int) -> Dict[str, Any]:
+        """由分层读数生成按计数的 TIR/TBR/TAR"""
+        if not total_records:
+            return {'tiers': None, 'tir': None, 'tbr': None, 'tar': None}
+        
+        percentages = {tier: round(count / total_records * 100, 1)
+                       for tier, count in tier_counts.items()}
+        return {
+            'tiers': [
+                {'key': tier, 'count': tier_counts[tier], 'percentage': percentages[tier]}
+                for tier in TIR_TIERS
+            ],
+            'tir': percentages['in_range'],
+            'tbr': round(percentages['very_low'] + percentages['low'], 1),
+            'tar': round(percentages['high'] + percentages['very_high'], 1)
+        }
+    
+    def _distribution_from_aggregate(self, aggregate: GlucoseAggregate) -> Dict[str, Any]:
+        """由聚合量生成分布数据"""
+        total_records = aggregate.count
+        
+        if total_records == 0:
+            return {
+                'total_records': 0,
+                'ranges': [{'name': r['name'], 'count': 0, 'percentage': 0, 'color': r['color']}
+                           for r in DISTRIBUTION_RANGES]
+            }
+        
+        distribution = []
+        for range_info in DISTRIBUTION_RANGES:
+            count = aggregate.range_counts[range_info['key']]
+            distribution.append({
+                'name': range_info['name'],
+                'min': range_info['min'],
+                'max': range_info['max'],
+                'count': count,
+                'percentage': round((count / total_records) * 100, 1),
+                'color': range_info['color']
+            })
+        
+        return {
+            'total_records': total_records,
+            'ranges': distribution
+        }
+    
+    def _trends_from_cells(self, cells: Iterable[Tuple[datetime, GlucoseAggregate]],
+                           granularity: str, tz) -> List[Dict[str, Any]]:
+        """
+        由按时间的聚合量 (小时单元或日/月汇总，开始时间为UTC) 按本地时间桶合并生成趋势数据
+        
+        Args:
+            cells: (开始时间, 聚合量) 序列，聚合量的时间跨度不超过时间桶
+            granularity: 时间粒度
+            tz: 时区
+            
+        Returns:
+            List[Dict]: 按时间桶排序的趋势数据
+        """
+        groups: Dict[datetime, GlucoseAggregate] = {}
+        for cell_start, aggregate in cells:
+            if not aggregate.count:
+                continue
+            bucket_start = trend_bucket_start(to_local(cell_start, tz), granularity)
+            groups.setdefault(bucket_start, GlucoseAggregate()).merge(aggregate)
+        
+        trends = []
+        for bucket_start in sorted(groups):
+            aggregate = groups[bucket_start]
+            trends.append({
+                'date': trend_label(bucket_start, granularity),
+                'avg_glucose': round(aggregate.mean, 2),
+                'max_glucose': aggregate.max,
+                'min_glucose': aggregate.min,
+                'record_count': aggregate.count
+            })
+        
+        return trends
+    
+    def _patterns_from_hours(self, by_hour: Dict[int, GlucoseAggregate]) -> Dict[str, Any]:
+        """由按 (本地) 小时的聚合结果生成模式分析数据"""
+        hourly_patterns = []
+        for hour in sorted(by_hour):
+            aggregate = by_hour[hour]
+            if not aggregate.count:
+                continue
+            hourly_patterns.append({
+                'hour': hour,
+                'time_label': f"{hour:02d}:00",
+                'avg_glucose': round(aggregate.mean, 2),
+                'max_glucose': aggregate.max,
+                'min_glucose': aggregate.min,
+                'record_count': aggregate.count
+            })
+        
+        return {
+            'hourly_patterns': hourly_patterns,
+            'period_stats': self._summarize_periods(hourly_patterns)
+        }
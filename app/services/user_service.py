@@ -6,10 +6,11 @@ User Management Business Logic Service
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from bson import ObjectId
+from pymongo import ReturnDocument
 from pymongo.errors import PyMongoError
 
 from app import mongo
-from app.models.user import User
+from app.models.user import ROLE_PATIENT, USER_ROLES, User
 
 
 class UserService:
@@ -43,7 +44,10 @@ class UserService:
                 full_name=user_data.get('full_name'),
                 age=user_data.get('age'),
                 gender=user_data.get('gender'),
-                phone=user_data.get('phone')
+                phone=user_data.get('phone'),
+                glucose_targets=user_data.get('glucose_targets'),
+                timezone=user_data.get('timezone'),
+                role=user_data.get('role', ROLE_PATIENT)
             )
             
             # 转换为字典格式
@@ -166,7 +170,7 @@ class UserService:
             update_dict = {}
             
             # 只更新提供的字段
-            updatable_fields = ['full_name', 'age', 'gender', 'phone']
+            updatable_fields = ['full_name', 'age', 'gender', 'phone', 'glucose_targets', 'timezone']
             for field in updatable_fields:
                 if field in user_data:
                     update_dict[field] = user_data[field]
@@ -179,19 +183,101 @@ class UserService:
             update_dict['updated_at'] = datetime.utcnow()
             
             # 执行更新
-            result = self.collection.find_one_and_update(
+            previous = self.collection.find_one_and_update(
                 {'_id': ObjectId(user_id)},
                 {'$set': update_dict},
-                return_document=True
+                return_document=ReturnDocument.BEFORE
             )
             
-            if result:
-                return User.from_dict(result)
+            if previous:
+                # 时区变化后标记待重算，记录的本地时间字段由 backfill-local-time 分批重算
+                if 'timezone' in update_dict and update_dict['timezone'] != previous.get('timezone'):
+                    self.collection.update_one(
+                        {'_id': ObjectId(user_id)},
+                        {'$set': {'local_time_pending': True}}
+                    )
+                return User.from_dict({**previous, **update_dict})
             return None
             
         except PyMongoError as e:
             raise Exception(f"数据库更新失败: {str(e)}")
     
+    def get_glucose_targets(self, user_id: str) -> Optional[Dict[str, float]]:
+        """
+        获取用户自定义的血糖目标范围
+        
+        Args:
+            user_id: 用户ID
+            
+        Returns:
+            Optional[Dict[str, float]]: 目标范围 (未设置时返回None)
+        """
+        try:
+            if not ObjectId.is_valid(user_id):
+                return None
+            
+            user_doc = self.collection.find_one(
+                {'_id': ObjectId(user_id)},
+                {'glucose_targets': 1}
+            )
+            return user_doc.get('glucose_targets') if user_doc else None
+            
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+    
+    def get_role(self, user_id: str) -> Optional[str]:
+        """
+        获取用户角色
+        
+        Args:
+            user_id: 用户ID
+            
+        Returns:
+            Optional[str]: 角色 (用户不存在或已停用时返回None)
+        """
+        try:
+            if not ObjectId.is_valid(user_id):
+                return None
+            
+            user_doc = self.collection.find_one(
+                {'_id': ObjectId(user_id), 'is_active': True},
+                {'role': 1}
+            )
+            return user_doc.get('role', ROLE_PATIENT) if user_doc else None
+            
+        except PyMongoError as e:
+            raise Exception(f"数据库查询失败: {str(e)}")
+    
+    def set_role(self, user_id: str, role: str) -> bool:
+        """
+        设置用户角色 (仅供CLI使用，不通过API开放)
+        
+        Args:
+            user_id: 用户ID
+            role: 角色
+            
+        Returns:
+            bool: 是否找到并更新用户
+            
+        Raises:
+            ValueError: 未知角色
+        """
+        if role not in USER_ROLES:
+            raise ValueError(f"未知角色: {role}")
+        
+        try:
+            if not ObjectId.is_valid(user_id):
+                return False
+            
+            result = self.collection.update_one(
+                {'_id': ObjectId(user_id)},
+                {'$set': {'role': role, 'updated_at': datetime.utcnow()}}
+            )
+            return result.matched_count > 0
+            
+        except PyMongoError as e:
+            raise Exception(f"数据库操作失败: {str(e)}")
+    
     def deactivate_user(self, user_id: str) -> bool:
         """
         停用用户账户
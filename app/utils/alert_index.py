@@ -0,0 +1,276 @@
+"""
+告警规则索引
+Alert Rule Index
+
+每个进程按用户保存已编译的启用告警规则与评估状态，写入血糖记录时按用户ID直接取出该用户的规则评估，
+代价与该用户的规则数成正比，没有规则的用户只有一次字典查找：
+- 规则在用户第一次写入时从数据库加载 (没有规则的用户同样缓存)，本进程修改规则时重新加载
+- 每条规则按设备保存条件开始满足的时间、是否有未解除的告警等评估状态；
+  速率与预测规则另外保存每个设备最近的读数 (按时间排序，乱序到达的读数插入到对应位置)，
+  窗口内有超过 CGM_MAX_GAP_MINUTES 的间隔时从最近读数缓存补齐
+- 按用户数 (ALERT_INDEX_MAX_USERS) 淘汰最久没有写入的用户
+
+索引只在本进程内有效。多进程部署时其他进程修改的规则在 ALERT_RULES_TTL 秒后重新加载生效；
+评估状态丢失 (进程重启或淘汰) 时持续时间从下一条读数重新计时，告警去重由 alerts 集合的唯一索引保证。
+速率与预测规则依赖同一设备的连续读数：多进程部署时应按用户ID粘性路由写入请求，否则每个进程只看到部分读数，
+缺失的读数只能从最近读数缓存补齐 (缓存同样只在本进程内追加，需设置 READING_CACHE_TTL 定期从数据库重新加载)。
+"""
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+
+class RuleState:
+    """一条规则在一个设备上的评估状态"""
+
+    __slots__ = ('last_timestamp', 'breach_start', 'extreme', 'open', 'notify_due')
+
+    def __init__(self):
+        # 最后评估的读数时间 (更早的读数不再评估)
+        self.last_timestamp: Optional[datetime] = None
+        # 条件连续满足的开始时间 (None 表示当前不满足)
+        self.breach_start: Optional[datetime] = None
+        # 本次满足期间的极值 (低于/下降取最小值，高于/上升取最大值)
+        self.extreme: Optional[float] = None
+        # 是否有未解除的告警 (None 表示未知，例如进程重启后)
+        self.open: Optional[bool] = None
+        # 下次检查是否需要重复通知的时间
+        self.notify_due: Optional[datetime] = None
+
+
+class UserAlerts:
+    """一位用户的索引条目"""
+
+    __slots__ = ('rules', 'states', 'tails', 'lock', 'loaded_at')
+
+    def __init__(self, rules: Tuple[Any, ...]):
+        self.rules = rules
+        # {(规则ID, 设备ID): 评估状态}
+        self.states: Dict[Tuple[str, Optional[str]], RuleState] = {}
+        # {设备ID: 按时间升序的最近读数 (时间, 血糖值)}，只有速率与预测规则的用户使用
+        self.tails: Dict[Optional[str], List[Tuple[datetime, float]]] = {}
+        # 同一用户的读数依次评估 (不同用户互不阻塞)
+        self.lock = threading.Lock()
+        self.loaded_at = time.monotonic()
+
+    def state(self, rule_id: str, device_id: Optional[str]) -> RuleState:
+        """规则在设备上的评估状态 (调用方持有 lock)"""
+        key = (rule_id, device_id)
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = RuleState()
+        return state
+
+    def merge_recent(self, device_id: Optional[str],
+                     points: Iterable[Tuple[datetime, float]]) -> None:
+        """
+        将读数合并到设备的最近读数 (同一时间的读数只保留一条，调用方持有 lock)
+
+        Args:
+            device_id: 设备ID
+            points: (时间, 血糖值) 序列
+        """
+        merged = dict(points)
+        merged.update(self.tails.get(device_id, ()))
+        self.tails[device_id] = sorted(merged.items())
+
+    def has_gap(self, device_id: Optional[str], timestamp: datetime, window: timedelta,
+                max_gap: timedelta) -> bool:
+        """
+        设备在 timestamp 之前 window 内的最近读数是否不完整 (调用方持有 lock)
+
+        没有读数、窗口开始到第一条读数或相邻读数之间超过 max_gap 时视为不完整
+        (读数可能写入了其他进程，也可能是传感器中断)
+
+        Args:
+            device_id: 设备ID
+            timestamp: 当前读数时间
+            window: 窗口时长
+            max_gap: 读数最大间隔
+
+        Returns:
+            bool: 是否不完整
+        """
+        tail = self.tails.get(device_id) or []
+        start = timestamp - window
+        previous = start
+        for point_time, _ in tail[bisect.bisect_left(tail, (start,)):]:
+            if point_time >= timestamp:
+                break
+            if point_time - previous > max_gap:
+                return True
+            previous = point_time
+        return previous == start or timestamp - previous > max_gap
+
+    def recent(self, device_id: Optional[str], timestamp: datetime, value: float,
+               window: timedelta) -> List[Tuple[datetime, float]]:
+        """
+        将读数按时间插入设备的最近读数并丢弃窗口之外的读数 (调用方持有 lock)
+
+        乱序到达的读数插入到对应位置，之后的读数评估时使用
+
+        Args:
+            device_id: 设备ID
+            timestamp: 读数时间
+            value: 血糖值
+            window: 保留的时长
+
+        Returns:
+            List: 该读数及之前 window 内的读数 (按时间升序)
+        """
+        tail = self.tails.setdefault(device_id, [])
+        position = bisect.bisect_left(tail, (timestamp,))
+        if position < len(tail) and tail[position][0] == timestamp:
+            tail[position] = (timestamp, value)
+        else:
+            tail.insert(position, (timestamp, value))
+        expired = bisect.bisect_left(tail, (tail[-1][0] - window,))
+        if expired:
+            del tail[:expired]
+            position -= expired
+        if position < 0:
+            return []
+        return tail[bisect.bisect_left(tail, (timestamp - window,)):position + 1]
+
+
+class AlertRuleIndex:
+    """告警规则索引"""
+
+    def __init__(self, max_users: int = 100000, ttl: Optional[float] = None):
+        """
+        初始化索引
+
+        Args:
+            max_users: 最大用户数
+            ttl: 规则加载后的有效时间 (秒，None 表示不过期，多进程部署时设置)
+        """
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users: 'OrderedDict[str, UserAlerts]' = OrderedDict()
+        # 规则代数：加载前读取，保存时代数已变化说明加载期间规则被修改
+        self._generations: Dict[str, int] = {}
+        self._generation_counter = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'loads': 0, 'stale_loads': 0,
+                         'invalidations': 0, 'evictions': 0, 'expirations': 0}
+
+    def generation(self, user_id: str) -> int:
+        """用户的规则代数 (从数据库加载前读取)"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def get(self, user_id: str) -> Optional[UserAlerts]:
+        """
+        读取用户条目
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            Optional[UserAlerts]: 用户条目 (规则为空元组表示没有启用的规则)，未加载或已过期时返回None
+        """
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry.loaded_at is not None and self.ttl is not None and \
+                    time.monotonic() - entry.loaded_at > self.ttl:
+                self.counters['expirations'] += 1
+                entry.loaded_at = None
+                entry = None
+            if entry is None or entry.loaded_at is None:
+                self.counters['misses'] += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.counters['hits'] += 1
+            return entry
+
+    def load(self, user_id: str, rules: Tuple[Any, ...], generation: int) -> Optional[UserAlerts]:
+        """
+        保存从数据库加载的已编译规则
+
+        保留规则条件未变化的评估状态，条件被修改或删除的规则的状态被丢弃
+
+        Args:
+            user_id: 用户ID
+            rules: 已编译的启用规则 (需有 rule_id 与 criteria 属性)
+            generation: 读取数据库前的规则代数
+
+        Returns:
+            Optional[UserAlerts]: 用户条目，加载期间规则被修改时返回None
+        """
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                self.counters['stale_loads'] += 1
+                return None
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = self._users[user_id] = UserAlerts(rules)
+            else:
+                with entry.lock:
+                    previous = {rule.rule_id: rule.criteria for rule in entry.rules}
+                    current = {rule.rule_id: rule.criteria for rule in rules}
+                    entry.states = {
+                        key: state for key, state in entry.states.items()
+                        if key[0] in current and previous.get(key[0]) == current[key[0]]
+                    }
+                    entry.rules = rules
+                    entry.loaded_at = time.monotonic()
+            self._users.move_to_end(user_id)
+            self.counters['loads'] += 1
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.counters['evictions'] += 1
+            return entry
+
+    def invalidate(self, user_id: str) -> None:
+        """用户的规则被修改，下次评估前重新加载 (保留评估状态)"""
+        with self._lock:
+            self._generation_counter += 1
+            self._generations[user_id] = self._generation_counter
+            entry = self._users.get(user_id)
+            if entry is not None:
+                entry.loaded_at = None
+                self.counters['invalidations'] += 1
+
+    def clear(self) -> None:
+        """清空索引"""
+        with self._lock:
+            self._users.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中/未命中/加载/淘汰等统计"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['users'] = len(self._users)
+            stats['users_with_rules'] = sum(1 for entry in self._users.values() if entry.rules)
+            stats['rules'] = sum(len(entry.rules) for entry in self._users.values())
+        stats['max_users'] = self.max_users
+        return stats
+
+
+def init_alert_index(app) -> None:
+    """
+    按配置创建告警规则索引并注册到应用 (ALERTS_ENABLED 关闭时不启用)
+
+    Args:
+        app: Flask应用实例
+    """
+    if not app.config.get('ALERTS_ENABLED', True):
+        return
+    app.extensions['alert_index'] = AlertRuleIndex(
+        max_users=app.config.get('ALERT_INDEX_MAX_USERS', 100000),
+        ttl=app.config.get('ALERT_RULES_TTL')
+    )
+
+
+def get_alert_index() -> Optional[AlertRuleIndex]:
+    """获取当前应用的告警规则索引 (未启用时返回None)"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('alert_index')
+
@@ -0,0 +1,220 @@
+"""
+CPU密集分析计算的进程池
+Process Pool for CPU-Bound Analytics
+
+百分位、变异性指标与滚动窗口等计算在请求线程中执行时会长时间持有 GIL，
+使同一进程中其他请求线程 (run.py 以 threaded=True 运行) 的简单请求也被拖慢。
+数据量超过阈值的计算提交到独立的进程池执行：
+
+- 输入数组写入共享内存 (multiprocessing.shared_memory)，子进程直接映射为 NumPy 数组，
+  不把数组序列化为列表传输；只有参数与计算结果 (较小) 通过 pickle 传递
+- 读数总数低于 ANALYTICS_INLINE_MAX_POINTS 时在当前线程直接计算 (进程间传递的固定开销更大)
+- 子进程使用 spawn 方式启动，不继承父进程的线程与数据库连接
+- 进程池异常退出时重建进程池，本次计算回退到当前线程执行
+- 等待结果超过 ANALYTICS_PROCESS_TIMEOUT 秒时抛出 QueryDeadlineExceeded：尚未开始的计算被取消，
+  已开始的计算无法单独取消，终止该进程池的子进程并重建进程池 (同一进程池中其他计算回退到当前线程执行)
+- 重建进程池持锁进行，并发的调用方只替换一次
+
+提交的函数须为模块级函数 (可被子进程导入)，以数组关键字参数接收输入，
+返回值不能引用输入数组 (子进程返回前会释放共享内存)。
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app, has_app_context
+
+from app.utils.query_pool import QueryDeadlineExceeded
+
+
+def _attach(descriptors: Dict[str, Tuple[str, Tuple[int, ...], str]]
+            ) -> Tuple[List[SharedMemory], Dict[str, np.ndarray]]:
+    """在子进程中映射共享内存数组"""
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in descriptors.items():
+        block = SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+def _run_shared(fn: Callable[..., Any], descriptors: Dict[str, Tuple[str, Tuple[int, ...], str]],
+                kwargs: Dict[str, Any]) -> Any:
+    """子进程入口：映射共享内存后计算"""
+    blocks, arrays = _attach(descriptors)
+    try:
+        return fn(**arrays, **kwargs)
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+class AnalyticsExecutor:
+    """CPU密集分析计算的进程池"""
+
+    def __init__(self, max_workers: int = 2, inline_max_points: int = 20000,
+                 timeout: float = 60.0):
+        """
+        初始化进程池 (子进程在首次提交时启动)
+
+        Args:
+            max_workers: 最大子进程数
+            inline_max_points: 在当前线程计算的最大数组元素总数
+            timeout: 等待子进程计算结果的超时时间 (秒)
+        """
+        self.max_workers = max_workers
+        self.inline_max_points = inline_max_points
+        self.timeout = timeout
+        self._pool = self._create_pool()
+        self._pool_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.counters = {
+            'inline': 0,
+            'offloaded': 0,
+            'shared_bytes': 0,
+            'fallbacks': 0,
+            'timeouts': 0,
+            'pool_restarts': 0
+        }
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.max_workers,
+                                   mp_context=multiprocessing.get_context('spawn'))
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def _replace_pool(self, old: ProcessPoolExecutor, terminate: bool = False) -> None:
+        """
+        用新进程池替换 old (old 已被其他调用方替换时不做任何事)
+
+        Args:
+            old: 调用方提交计算时使用的进程池
+            terminate: 是否终止 old 的子进程 (停止已超时仍在运行的计算)
+        """
+        with self._pool_lock:
+            if self._pool is not old:
+                return
+            self._pool = self._create_pool()
+        self._count('pool_restarts')
+        if terminate:
+            # ProcessPoolExecutor 没有终止单个计算的接口；子进程被终止后 old 标记为损坏，
+            # 仍在其中等待的调用方收到 BrokenProcessPool 并回退到当前线程计算
+            for process in list((old._processes or {}).values()):
+                process.terminate()
+            old.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, fn: Callable[..., Any], arrays: Dict[str, np.ndarray], **kwargs) -> Any:
+        """
+        执行计算：数组元素总数超过阈值时提交到进程池，否则在当前线程执行
+
+        Args:
+            fn: 模块级计算函数
+            arrays: {参数名: 输入数组}
+            **kwargs: 其他参数 (须可 pickle)
+
+        Returns:
+            Any: fn 的返回值
+
+        Raises:
+            QueryDeadlineExceeded: 等待子进程计算结果超时
+        """
+        if sum(array.size for array in arrays.values()) <= self.inline_max_points:
+            self._count('inline')
+            return fn(**arrays, **kwargs)
+
+        blocks: List[SharedMemory] = []
+        try:
+            descriptors = {}
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                block = SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                descriptors[name] = (block.name, array.shape, array.dtype.str)
+            self._count('shared_bytes', sum(block.size for block in blocks))
+
+            pool = self._pool
+            future = None
+            try:
+                future = pool.submit(_run_shared, fn, descriptors, kwargs)
+                result = future.result(timeout=self.timeout)
+            except BrokenProcessPool:
+                # 子进程异常退出 (如内存不足被终止)：重建进程池，本次在当前线程计算
+                self._replace_pool(pool)
+                self._count('fallbacks')
+                return fn(**arrays, **kwargs)
+            except FutureTimeoutError:
+                self._count('timeouts')
+                if not future.cancel():
+                    self._replace_pool(pool, terminate=True)
+                raise QueryDeadlineExceeded(f"分析计算超过 {self.timeout} 秒")
+
+            self._count('offloaded')
+            return result
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """当前线程计算/提交到进程池/回退/超时/重建进程池次数与经共享内存传递的字节数"""
+        with self._lock:
+            stats = dict(self.counters)
+        stats['max_workers'] = self.max_workers
+        stats['inline_max_points'] = self.inline_max_points
+        return stats
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def init_analytics_executor(app) -> None:
+    """
+    按配置创建分析计算进程池并注册到应用
+
+    Args:
+        app: Flask应用实例
+    """
+    max_workers = app.config.get('ANALYTICS_PROCESS_WORKERS', 2)
+    if not max_workers:
+        return
+
+    app.extensions['analytics_executor'] = AnalyticsExecutor(
+        max_workers=max_workers,
+        inline_max_points=app.config.get('ANALYTICS_INLINE_MAX_POINTS', 20000),
+        timeout=app.config.get('ANALYTICS_PROCESS_TIMEOUT', 60)
+    )
+
+
+def get_analytics_executor() -> Optional[AnalyticsExecutor]:
+    """获取当前应用的分析计算进程池 (未启用时返回None)"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('analytics_executor')
+
+
+def run_analytics(fn: Callable[..., Any], arrays: Dict[str, np.ndarray], **kwargs) -> Any:
+    """
+    通过当前应用的进程池执行计算 (未启用时在当前线程执行)
+
+    Args:
+        fn: 模块级计算函数
+        arrays: {参数名: 输入数组}
+        **kwargs: 其他参数
+
+    Returns:
+        Any: fn 的返回值
+    """
+    executor = get_analytics_executor()
+    if executor is None:
+        return fn(**arrays, **kwargs)
+    return executor.run(fn, arrays, **kwargs)
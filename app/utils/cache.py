@@ -0,0 +1,559 @@
+"""
+统计结果缓存
+Statistics Result Cache
+
+缓存 StatisticsService 的查询结果，键为 (用户, 方法, 量化后的时间范围, 设备, 其他参数)。
+写入血糖记录时，按 (用户, 记录时间) 精确失效时间范围覆盖该记录的缓存项。
+计算期间发生失效时不写入结果：后端在同一原子操作中比较用户的失效代数并写入
+(memory 后端持锁，redis 后端使用 Lua 脚本)。
+
+后端可配置 (STATS_CACHE_BACKEND)：
+- memory: 进程内 LRU 缓存，支持 TTL、条目数与内存上限 (测试环境及单进程部署)
+- redis: 使用 docker-compose 中的 redis 服务，多进程/多实例共享 (需安装 redis 包)
+- none: 关闭缓存
+"""
+
+import hashlib
+import inspect
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+from app.utils.single_flight import get_single_flight
+from app.utils.time_utils import to_utc_naive
+
+try:
+    import redis
+except ImportError:  # 可选依赖，仅 redis 后端需要
+    redis = None
+
+
+KEY_PREFIX = 'stats'
+
+
+def _epoch(value: datetime) -> int:
+    """朴素UTC时间转换为时间戳 (秒)"""
+    return int(to_utc_naive(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+class CacheBackend:
+    """缓存后端接口"""
+
+    name = 'base'
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取缓存项，不存在或已过期时返回None"""
+        raise NotImplementedError
+
+    def set(self, key: str, payload: bytes, ttl: int, user_id: str,
+            start: int, end: int, generation: int) -> bool:
+        """
+        用户的失效代数仍为 generation 时写入缓存项并登记其时间范围 (比较与写入为原子操作)
+
+        Args:
+            key: 缓存键
+            payload: 序列化后的结果
+            ttl: 过期时间 (秒)
+            user_id: 用户ID
+            start: 时间范围开始 (时间戳，含)
+            end: 时间范围结束 (时间戳，含)
+            generation: 计算开始前读取的失效代数
+
+        Returns:
+            bool: 是否写入 (代数已变化时为False)
+        """
+        raise NotImplementedError
+
+    def invalidate(self, user_id: str, timestamp: int) -> int:
+        """使时间范围覆盖该时间戳的缓存项失效，返回失效条目数"""
+        raise NotImplementedError
+
+    def generation(self, user_id: str) -> int:
+        """用户缓存的失效代数 (每次失效变化，不会回到之前的值)"""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """清空缓存"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """后端统计信息"""
+        return {}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内 LRU 缓存后端"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024,
+                 max_generations: Optional[int] = None):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大条目数
+            max_bytes: 缓存结果的最大总字节数
+            max_generations: 保留失效代数的最大用户数 (默认与 max_entries 相同)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_generations = max_generations or max_entries
+        # key -> (payload, expires_at, user_id, start, end)，按最近使用排序
+        self._entries: 'OrderedDict[str, Tuple[bytes, float, str, int, int]]' = OrderedDict()
+        self._user_keys: Dict[str, set] = {}
+        # 失效代数取自全局递增计数；淘汰的用户代数记为淘汰时的计数 (_generation_floor)，
+        # 保证代数不会回到计算开始时读取的值
+        self._generations: 'OrderedDict[str, int]' = OrderedDict()
+        self._generation_counter = 0
+        self._generation_floor = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, payload: bytes, ttl: int, user_id: str,
+            start: int, end: int, generation: int) -> bool:
+        if len(payload) > self.max_bytes:
+            return False
+
+        with self._lock:
+            if self._generations.get(user_id, self._generation_floor) != generation:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (payload, time.monotonic() + ttl, user_id, start, end)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            self._bytes += len(payload)
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, user_id: str, timestamp: int) -> int:
+        with self._lock:
+            self._generation_counter += 1
+            self._generations[user_id] = self._generation_counter
+            self._generations.move_to_end(user_id)
+            while len(self._generations) > self.max_generations:
+                self._generations.popitem(last=False)
+                self._generation_floor = self._generation_counter
+
+            stale_keys = [
+                key for key in self._user_keys.get(user_id, ())
+                if self._entries[key][3] <= timestamp <= self._entries[key][4]
+            ]
+            for key in stale_keys:
+                self._remove(key)
+            return len(stale_keys)
+
+    def generation(self, user_id: str) -> int:
+        with self._lock:
+            return self._generations.get(user_id, self._generation_floor)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'generations': len(self._generations),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def _remove(self, key: str) -> None:
+        """删除缓存项 (调用方持有锁)"""
+        payload, _, user_id, _, _ = self._entries.pop(key)
+        self._bytes -= len(payload)
+        user_keys = self._user_keys.get(user_id)
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._user_keys[user_id]
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Redis 缓存后端
+
+    每个用户维护一个哈希索引 (缓存键 -> "开始:结束")，用于按记录时间失效；
+    内存上限与淘汰策略由 Redis 的 maxmemory / maxmemory-policy 配置。
+    写入 (比较代数) 与失效 (递增代数并删除) 各为一个 Lua 脚本，二者不会交错执行。
+
+    代数键不设过期时间，应使用 volatile-lru 淘汰策略 (只淘汰缓存项与索引)。代数键仍被删除或淘汰时：
+    写入因代数键缺失被拒绝，重新创建的代数以 Redis 服务器时间 (微秒) 为初值，不会与之前读取的代数相同。
+    """
+
+    name = 'redis'
+
+    # 代数键不存在时以服务器时间 (微秒) 创建
+    SEED_GENERATION = """
+local now = redis.call('TIME')
+redis.call('SET', KEYS[%d], now[1] .. string.format('%%06d', tonumber(now[2])), 'NX')
+"""
+
+    # KEYS: 代数键
+    GENERATION_SCRIPT = SEED_GENERATION % 1 + """
+return redis.call('GET', KEYS[1])
+"""
+
+    # KEYS: 缓存键, 索引键, 代数键  ARGV: 结果, 过期时间, "开始:结束", 代数
+    # 代数键缺失 (被删除或淘汰) 时 GET 返回 false，同样拒绝写入
+    SET_SCRIPT = """
+local current = redis.call('GET', KEYS[3])
+if current ~= ARGV[4] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('HSET', KEYS[2], KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+    # KEYS: 索引键, 代数键  ARGV: 记录时间戳
+    INVALIDATE_SCRIPT = SEED_GENERATION % 2 + """
+redis.call('INCR', KEYS[2])
+local timestamp = tonumber(ARGV[1])
+local entries = redis.call('HGETALL', KEYS[1])
+local removed = 0
+for i = 1, #entries, 2 do
+    local separator = string.find(entries[i + 1], ':', 1, true)
+    local start = tonumber(string.sub(entries[i + 1], 1, separator - 1))
+    local finish = tonumber(string.sub(entries[i + 1], separator + 1))
+    if start <= timestamp and timestamp <= finish then
+        redis.call('DEL', entries[i])
+        redis.call('HDEL', KEYS[1], entries[i])
+        removed = removed + 1
+    end
+end
+return removed
+"""
+
+    def __init__(self, url: Optional[str] = None, client: Optional[Any] = None):
+        """
+        初始化 Redis 连接
+
+        Args:
+            url: Redis 连接地址
+            client: 已创建的 Redis 客户端 (可选，指定时忽略 url)
+        """
+        if redis is None:
+            raise RuntimeError("使用 redis 缓存后端需要安装 redis 包")
+        self.client = client or redis.Redis.from_url(url, socket_timeout=1)
+        self._generation_script = self.client.register_script(self.GENERATION_SCRIPT)
+        self._set_script = self.client.register_script(self.SET_SCRIPT)
+        self._invalidate_script = self.client.register_script(self.INVALIDATE_SCRIPT)
+
+    @staticmethod
+    def _index_key(user_id: str) -> str:
+        return f'{KEY_PREFIX}:index:{user_id}'
+
+    @staticmethod
+    def _generation_key(user_id: str) -> str:
+        return f'{KEY_PREFIX}:generation:{user_id}'
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, payload: bytes, ttl: int, user_id: str,
+            start: int, end: int, generation: int) -> bool:
+        return bool(self._set_script(
+            keys=[key, self._index_key(user_id), self._generation_key(user_id)],
+            args=[payload, ttl, f'{start}:{end}', generation]
+        ))
+
+    def invalidate(self, user_id: str, timestamp: int) -> int:
+        return int(self._invalidate_script(
+            keys=[self._index_key(user_id), self._generation_key(user_id)],
+            args=[timestamp]
+        ))
+
+    def generation(self, user_id: str) -> int:
+        return int(self._generation_script(keys=[self._generation_key(user_id)]))
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=f'{KEY_PREFIX}:*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> Dict[str, Any]:
+        info = self.client.info('stats')
+        memory = self.client.info('memory')
+        return {
+            'evictions': info.get('evicted_keys', 0),
+            'expirations': info.get('expired_keys', 0),
+            'bytes': memory.get('used_memory', 0),
+            'max_bytes': memory.get('maxmemory', 0)
+        }
+
+
+class StatsCache:
+    """统计结果缓存 (后端 + 命中统计)"""
+
+    def __init__(self, backend: CacheBackend, ttl: int = 300, range_quantum: int = 60):
+        """
+        初始化缓存
+
+        Args:
+            backend: 缓存后端
+            ttl: 缓存项过期时间 (秒)
+            range_quantum: 查询时间范围的量化粒度 (秒)
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.range_quantum = max(int(range_quantum), 1)
+        self._lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'stale_skips': 0,
+            'invalidations': 0,
+            'errors': 0
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def quantize(self, start_date: datetime, end_date: datetime) -> Tuple[int, int]:
+        """
+        量化查询时间范围 (开始向下、结束向上取整)，使相近时刻发起的
+        "最近N天" 查询共用缓存项
+
+        Returns:
+            Tuple[int, int]: 量化后的 (开始, 结束) 时间戳
+        """
+        quantum = self.range_quantum
+        start = _epoch(start_date) // quantum * quantum
+        end = -(-_epoch(end_date) // quantum) * quantum
+        return start, end
+
+    @staticmethod
+    def make_key(user_id: str, method: str, start: Any, end: Any,
+                 device_id: Optional[str], params: Dict[str, Any]) -> str:
+        """生成缓存键 (start/end 为量化后的时间戳，未启用缓存时为时间字符串)"""
+        params_digest = hashlib.sha1(repr(sorted(params.items())).encode()).hexdigest()[:16]
+        return f'{KEY_PREFIX}:{user_id}:{method}:{start}:{end}:{device_id or "*"}:{params_digest}'
+
+    def key_for(self, method: str, user_id: str, start_date: datetime, end_date: datetime,
+                device_id: Optional[str] = None,
+                params: Optional[Dict[str, Any]] = None) -> Tuple[str, int, int]:
+        """
+        计算查询的缓存键与量化后的时间范围 (与 cached_statistics 装饰器一致)
+
+        Returns:
+            Tuple[str, int, int]: (缓存键, 开始时间戳, 结束时间戳)
+        """
+        start, end = self.quantize(start_date, end_date)
+        return self.make_key(user_id, method, start, end, device_id, params or {}), start, end
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        读取缓存结果
+
+        Returns:
+            Tuple[bool, Any]: (是否命中, 结果)
+        """
+        try:
+            payload = self.backend.get(key)
+        except Exception as e:
+            self._count('errors')
+            current_app.logger.warning(f"统计缓存读取失败: {str(e)}")
+            return False, None
+
+        if payload is None:
+            self._count('misses')
+            return False, None
+
+        self._count('hits')
+        return True, pickle.loads(payload)
+
+    def generation(self, user_id: str) -> Optional[int]:
+        """读取用户缓存的失效代数，后端不可用时返回None"""
+        try:
+            return self.backend.generation(user_id)
+        except Exception as e:
+            self._count('errors')
+            current_app.logger.warning(f"统计缓存读取失败: {str(e)}")
+            return None
+
+    def set(self, key: str, result: Any, user_id: str, start: int, end: int,
+            generation: Optional[int]) -> None:
+        """
+        写入缓存结果
+
+        计算期间发生过失效 (代数变化) 时不写入，避免缓存计算开始前的旧结果
+        """
+        if generation is None:
+            return
+
+        try:
+            stored = self.backend.set(key, pickle.dumps(result, pickle.HIGHEST_PROTOCOL),
+                                      self.ttl, user_id, start, end, generation)
+            self._count('stores' if stored else 'stale_skips')
+        except Exception as e:
+            self._count('errors')
+            current_app.logger.warning(f"统计缓存写入失败: {str(e)}")
+
+    def invalidate(self, user_id: str, timestamp: datetime) -> None:
+        """
+        使时间范围覆盖该记录时间的缓存项失效
+
+        Args:
+            user_id: 用户ID
+            timestamp: 血糖记录时间
+        """
+        try:
+            removed = self.backend.invalidate(user_id, _epoch(timestamp))
+            self._count('invalidations', removed)
+        except Exception as e:
+            self._count('errors')
+            current_app.logger.warning(f"统计缓存失效失败: {str(e)}")
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self.backend.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中/未命中/淘汰等统计"""
+        with self._lock:
+            stats = dict(self.counters)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['backend'] = self.backend.name
+        stats['ttl'] = self.ttl
+        try:
+            stats.update(self.backend.stats())
+        except Exception as e:
+            stats['backend_error'] = str(e)
+        return stats
+
+
+def init_stats_cache(app) -> None:
+    """
+    按配置创建统计结果缓存并注册到应用
+
+    Args:
+        app: Flask应用实例
+    """
+    backend_name = app.config.get('STATS_CACHE_BACKEND', 'memory')
+    if backend_name == 'memory':
+        backend = MemoryCacheBackend(
+            max_entries=app.config.get('STATS_CACHE_MAX_ENTRIES', 2048),
+            max_bytes=app.config.get('STATS_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        )
+    elif backend_name == 'redis':
+        backend = RedisCacheBackend(app.config['REDIS_URL'])
+    elif backend_name in (None, 'none'):
+        return
+    else:
+        raise ValueError(f"不支持的统计缓存后端: {backend_name}")
+
+    app.extensions['stats_cache'] = StatsCache(
+        backend,
+        ttl=app.config.get('STATS_CACHE_TTL', 300),
+        range_quantum=app.config.get('STATS_CACHE_RANGE_QUANTUM', 60)
+    )
+
+
+def get_stats_cache() -> Optional[StatsCache]:
+    """获取当前应用的统计结果缓存 (未启用时返回None)"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('stats_cache')
+
+
+def cached_statistics(method: str, timeout: Optional[float] = None) -> Callable:
+    """
+    统计方法结果缓存装饰器
+
+    被装饰方法须包含 user_id、start_date、end_date 参数，可选 device_id，
+    其余参数参与缓存键。时间范围只在缓存键中量化，方法按调用方传入的原始范围计算；
+    量化粒度内的相近查询共用缓存项 (命中时返回首次计算的结果)。
+    未命中的相同并发调用通过 single-flight 合并为一次计算。
+
+    Args:
+        method: 方法名称 (缓存键的一部分)
+        timeout: 等待相同查询计算结果的超时时间 (秒，可选，默认使用
+            STATS_SINGLE_FLIGHT_TIMEOUT)
+
+    Returns:
+        装饰器函数
+    """
+    def decorator(f):
+        signature = inspect.signature(f)
+
+        @wraps(f)
+        def decorated_function(self, *args, **kwargs):
+            cache = get_stats_cache()
+            flight = get_single_flight()
+            if cache is None and flight is None:
+                return f(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            params.pop('self')
+            user_id = params.pop('user_id')
+            start_date = params.pop('start_date')
+            end_date = params.pop('end_date')
+            device_id = params.get('device_id')
+            key_params = {name: value for name, value in params.items() if name != 'device_id'}
+
+            if cache is not None:
+                key, start, end = cache.key_for(method, user_id, start_date, end_date,
+                                                device_id, key_params)
+            else:
+                start = to_utc_naive(start_date).isoformat()
+                end = to_utc_naive(end_date).isoformat()
+                key = StatsCache.make_key(user_id, method, start, end, device_id, key_params)
+
+            if cache is not None:
+                hit, result = cache.get(key)
+                if hit:
+                    return result
+
+            def compute():
+                generation = cache.generation(user_id) if cache is not None else None
+                result = f(self, user_id=user_id, start_date=start_date,
+                           end_date=end_date, **params)
+                if cache is not None:
+                    cache.set(key, result, user_id, start, end, generation)
+                return result
+
+            if flight is None:
+                return compute()
+            return flight.do(key, compute, timeout)
+
+        return decorated_function
+    return decorator
@@ -6,8 +6,15 @@ CLI Command Utilities
 import click
 from flask import Flask
 from app import mongo
-from app.models.user import User
+from app.models.user import ROLE_ADMIN, USER_ROLES, User
 from app.services.user_service import UserService
+from app.services.rollup_service import RollupService
+from app.services.event_service import EventService
+from app.services.forecast_service import ForecastService
+from app.services.completeness_service import CompletenessService
+from app.services.local_time_service import LocalTimeService
+from app.services.reference_service import ReferenceService
+from app.services.snapshot_service import SnapshotService
 
 
 def register_cli_commands(app: Flask):
@@ -29,15 +36,54 @@ def register_cli_commands(app: Flask):
                 # 用户集合索引
                 mongo.db.users.create_index("username", unique=True)
                 mongo.db.users.create_index("email", unique=True)
+                # 研究队列按性别、年龄段筛选
+                mongo.db.users.create_index([("gender", 1), ("age", 1)])
                 
                 # 血糖记录集合索引
                 mongo.db.glucose_records.create_index([("user_id", 1), ("timestamp", -1)])
-                mongo.db.glucose_records.create_index("device_id")
+                # 按本地时段查询 (如每天 02:00-04:00)
+                mongo.db.glucose_records.create_index(
+                    [("user_id", 1), ("minute_of_day", 1), ("local_date", 1)]
+                )
+                # 设备完整性按设备、按天读取时间戳
+                mongo.db.glucose_records.create_index([("device_id", 1), ("timestamp", 1)])
+                # 滚动窗口按 (用户, 设备) 分区、按时间排序
+                mongo.db.glucose_records.create_index(
+                    [("user_id", 1), ("device_id", 1), ("timestamp", 1)]
+                )
+                
+                # 血糖汇总集合索引
+                mongo.db.glucose_rollups.create_index(
+                    [("user_id", 1), ("granularity", 1), ("bucket_start", 1), ("device_id", 1)],
+                    unique=True
+                )
+                
+                # 血糖事件集合索引
+                mongo.db.glucose_events.create_index(
+                    [("user_id", 1), ("device_id", 1), ("kind", 1), ("start", 1)],
+                    unique=True
+                )
+                mongo.db.glucose_events.create_index([("user_id", 1), ("kind", 1), ("start", 1)])
+                mongo.db.glucose_events.create_index([("user_id", 1), ("start", 1)])
+                
+                # 设备完整性日汇总集合索引
+                mongo.db.device_completeness.create_index([("device_id", 1), ("day", 1)], unique=True)
+                mongo.db.device_completeness.create_index([("day", 1), ("device_type", 1)])
                 
                 # 设备集合索引
                 mongo.db.devices.create_index("device_id", unique=True)
                 mongo.db.devices.create_index([("user_id", 1), ("device_type", 1)])
                 
+                # 告警规则与告警集合索引
+                mongo.db.alert_rules.create_index([("user_id", 1), ("enabled", 1)])
+                # 每条规则每个设备最多一条未解除的告警
+                mongo.db.alerts.create_index(
+                    [("rule_id", 1), ("device_id", 1)],
+                    unique=True,
+                    partialFilterExpression={"active": True}
+                )
+                mongo.db.alerts.create_index([("user_id", 1), ("triggered_at", -1)])
+                
             click.echo("数据库初始化完成！")
             
         except Exception as e:
@@ -69,7 +115,8 @@ def register_cli_commands(app: Flask):
                     'username': username,
                     'email': email,
                     'password': password,
-                    'full_name': '系统管理员'
+                    'full_name': '系统管理员',
+                    'role': ROLE_ADMIN
                 }
                 
                 user = user_service.create_user(user_data)
@@ -78,6 +125,22 @@ def register_cli_commands(app: Flask):
         except Exception as e:
             click.echo(f"创建管理员用户失败: {str(e)}")
     
+    @app.cli.command()
+    @click.option('--user-id', required=True, help='用户ID')
+    @click.option('--role', required=True, type=click.Choice(USER_ROLES), help='用户角色')
+    def set_role(user_id, role):
+        """设置用户角色 (医生/管理员可访问批量与队列接口)"""
+        try:
+            with app.app_context():
+                if not UserService().set_role(user_id, role):
+                    click.echo("用户不存在！")
+                    return
+                
+            click.echo(f"用户 {user_id} 的角色已设置为 {role}")
+            
+        except Exception as e:
+            click.echo(f"设置用户角色失败: {str(e)}")
+    
     @app.cli.command()
     def show_stats():
         """显示系统统计信息"""
@@ -115,6 +178,12 @@ def register_cli_commands(app: Flask):
                     mongo.db.users.delete_many({})
                     mongo.db.devices.delete_many({})
                     mongo.db.glucose_records.delete_many({})
+                    mongo.db.glucose_rollups.delete_many({})
+                    mongo.db.glucose_events.delete_many({})
+                    mongo.db.device_completeness.delete_many({})
+                    mongo.db.user_snapshots.delete_many({})
+                    mongo.db.alert_rules.delete_many({})
+                    mongo.db.alerts.delete_many({})
                     
                 click.echo("所有数据已清空！")
                 
@@ -131,7 +200,10 @@ def register_cli_commands(app: Flask):
         
         try:
             with app.app_context():
-                collections = [collection] if collection else ['users', 'devices', 'glucose_records']
+                collections = [collection] if collection else [
+                    'users', 'devices', 'glucose_records', 'glucose_rollups', 'glucose_events',
+                    'device_completeness'
+                ]
                 
                 for coll_name in collections:
                     click.echo(f"\n=== {coll_name} 集合索引 ===")
@@ -146,3 +218,135 @@ def register_cli_commands(app: Flask):
                 
         except Exception as e:
             click.echo(f"检查索引失败: {str(e)}")
+    
+    @app.cli.command()
+    @click.option('--user-id', default=None, help='只重建指定用户的汇总')
+    def rebuild_rollups(user_id):
+        """从原始记录重建血糖汇总（历史数据回填）"""
+        click.echo("正在重建血糖汇总...")
+        
+        try:
+            with app.app_context():
+                written = RollupService().rebuild(user_id=user_id)
+                
+            click.echo(f"小时汇总: {written['hour']} 条")
+            click.echo(f"日汇总: {written['day']} 条")
+            click.echo(f"月汇总: {written['month']} 条")
+            click.echo("血糖汇总重建完成！(含日分位数草图)")
+            
+        except Exception as e:
+            click.echo(f"重建血糖汇总失败: {str(e)}")
+    
+    @app.cli.command()
+    @click.option('--user-id', default=None, help='只处理指定用户')
+    def rebuild_events(user_id):
+        """从原始记录重新检测低/高血糖事件（历史数据回填）"""
+        click.echo("正在检测血糖事件...")
+        
+        try:
+            with app.app_context():
+                written = EventService().rebuild(user_id=user_id)
+                
+            click.echo(f"低血糖事件: {written['hypo']} 个")
+            click.echo(f"高血糖事件: {written['hyper']} 个")
+            click.echo("血糖事件回填完成！")
+            
+        except Exception as e:
+            click.echo(f"血糖事件回填失败: {str(e)}")
+    
+    @app.cli.command()
+    @click.option('--device-id', default=None, help='只处理指定设备')
+    def rebuild_completeness(device_id):
+        """从原始记录重建设备数据完整性日汇总（历史数据回填）"""
+        click.echo("正在重建设备完整性汇总...")
+        
+        try:
+            with app.app_context():
+                written = CompletenessService().rebuild(device_id=device_id)
+                
+            click.echo(f"日汇总: {written} 条")
+            click.echo("设备完整性汇总重建完成！")
+            
+        except Exception as e:
+            click.echo(f"设备完整性汇总重建失败: {str(e)}")
+    
+    @app.cli.command()
+    @click.option('--user-id', default=None, help='只处理指定用户')
+    def rebuild_snapshots(user_id):
+        """从原始记录、日汇总与设备重新生成用户首页快照（历史数据回填）"""
+        click.echo("正在生成用户快照...")
+        
+        try:
+            with app.app_context():
+                users = SnapshotService().rebuild(user_id=user_id)
+                
+            click.echo(f"用户快照: {users} 个")
+            click.echo("用户快照生成完成！")
+            
+        except Exception as e:
+            click.echo(f"用户快照生成失败: {str(e)}")
+    
+    @app.cli.command()
+    @click.option('--user-id', default=None, help='只处理指定用户')
+    @click.option('--batch-size', default=1000, help='批量写入大小')
+    @click.option('--pending', is_flag=True, help='只处理修改时区后等待重算的用户 (适合定时任务)')
+    def backfill_local_time(user_id, batch_size, pending):
+        """按用户时区回填血糖记录的本地时间字段"""
+        click.echo("正在回填本地时间字段...")
+        
+        try:
+            with app.app_context():
+                updated = LocalTimeService().backfill(user_id=user_id, batch_size=batch_size,
+                                                      pending_only=pending)
+                
+            click.echo(f"更新记录: {updated} 条")
+            click.echo("本地时间字段回填完成！")
+            
+        except Exception as e:
+            click.echo(f"本地时间字段回填失败: {str(e)}")
+    
+    @app.cli.command()
+    @click.option('--days', default=None, type=int, help='统计窗口天数 (默认 REFERENCE_WINDOW_DAYS)')
+    def build_references(days):
+        """按年龄段与性别生成人群参考分布（适合每日定时任务）"""
+        click.echo("正在生成人群参考分布...")
+        
+        try:
+            with app.app_context():
+                groups = ReferenceService().build(days=days)
+                
+            for key, users in groups.items():
+                click.echo(f"{key}: {users} 人")
+            click.echo("人群参考分布生成完成！")
+            
+        except Exception as e:
+            click.echo(f"人群参考分布生成失败: {str(e)}")
+    
+    @app.cli.command()
+    @click.option('--user-id', default=None, help='只回放指定用户')
+    @click.option('--days', default=14, type=int, help='回放最近的天数')
+    @click.option('--horizon', default=None, type=int, help='预测时长 (分钟，默认 FORECAST_HORIZON_MINUTES)')
+    @click.option('--threshold', default=3.9, type=float, help='低血糖阈值 (mmol/L)')
+    def backtest_forecast(user_id, days, horizon, threshold):
+        """回放历史血糖记录，评估低血糖预测的准确度与吞吐量"""
+        click.echo("正在回放历史血糖记录...")
+        
+        try:
+            with app.app_context():
+                result = ForecastService().backtest(user_id=user_id, days=days,
+                                                    horizon_minutes=horizon, threshold=threshold)
+                
+            low = result['predicted_low']
+            click.echo(f"读数: {result['readings']} 条，设备分区: {result['partitions']} 个")
+            click.echo(f"预测时长: {result['parameters']['horizon_minutes']} 分钟，"
+                       f"可评估的预测: {result['forecasts']} 个")
+            click.echo(f"MAE: {result['mae']} mmol/L (不变预测基线: {result['baseline_mae']})，"
+                       f"RMSE: {result['rmse']}，偏差: {result['bias']}")
+            click.echo(f"预测低血糖: 命中 {low['true_positive']}，误报 {low['false_positive']}，"
+                       f"漏报 {low['false_negative']}，精确率 {low['precision']}，召回率 {low['recall']}")
+            click.echo(f"模型计算: {result['model_seconds']} 秒 ({result['forecasts_per_second']} 次/秒)，"
+                       f"总耗时: {result['elapsed_seconds']} 秒")
+            click.echo("预测回测完成！")
+            
+        except Exception as e:
+            click.echo(f"预测回测失败: {str(e)}")
@@ -5,6 +5,7 @@ Decorator Utility Functions
 
 from functools import wraps
 from flask import request
+from flask_jwt_extended import get_jwt_identity
 from app.utils.responses import error_response
 
 
@@ -81,6 +82,45 @@ def require_fields(*required_fields):
     return decorator
 
 
+def roles_required(*roles):
+    """
+    验证当前用户具有指定角色之一 (须在 jwt_required 之后使用)
+    
+    角色每次请求从数据库读取，修改角色或停用账户后立即生效
+    
+    Args:
+        roles: 允许的角色列表
+        
+    Returns:
+        装饰器函数
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            from app.services.user_service import UserService
+            
+            try:
+                role = UserService().get_role(get_jwt_identity())
+            except Exception as e:
+                return error_response(
+                    message="权限验证失败",
+                    details=str(e),
+                    status_code=500
+                )
+            
+            if role not in roles:
+                return error_response(
+                    message="权限不足",
+                    details={"required_roles": list(roles)},
+                    status_code=403
+                )
+            
+            return f(*args, **kwargs)
+        
+        return decorated_function
+    return decorator
+
+
 def validate_content_type(content_type='application/json'):
     """
     验证请求的Content-Type
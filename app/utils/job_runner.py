@@ -0,0 +1,136 @@
+"""
+后台任务与分区计算线程池
+Background Job Runner with Partition Workers
+
+运行时间较长的分析任务 (如研究队列统计) 不在请求线程中执行：
+- submit 将任务放入任务线程池，请求立即返回，任务状态由调用方持久化
+- map 将任务拆分出的分区 (如按用户分组) 提交到分区线程池并发执行，按提交顺序返回结果
+
+任务与分区使用两个独立的线程池，任务线程等待分区结果时不会占满分区线程而互相等待。
+两个线程池中的函数都在推入的应用上下文中执行。
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from flask import current_app, has_app_context
+
+
+class JobRunner:
+    """后台任务与分区计算线程池"""
+
+    def __init__(self, job_workers: int = 2, partition_workers: int = 4):
+        """
+        初始化线程池
+
+        Args:
+            job_workers: 同时运行的任务数 (其余任务排队)
+            partition_workers: 分区计算线程数 (所有任务共用)
+        """
+        self.job_workers = job_workers
+        self.partition_workers = partition_workers
+        self._jobs = ThreadPoolExecutor(max_workers=job_workers, thread_name_prefix='job')
+        self._partitions = ThreadPoolExecutor(max_workers=partition_workers,
+                                              thread_name_prefix='job-partition')
+        self._lock = threading.Lock()
+        self.counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'partitions': 0
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        提交后台任务 (在任务线程中推入当前应用的上下文后执行)
+
+        Args:
+            fn: 任务函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            Future: 任务结果
+        """
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception:
+                    self._count('failed')
+                    raise
+                self._count('completed')
+                return result
+
+        self._count('submitted')
+        return self._jobs.submit(run)
+
+    def map(self, fn: Callable[[Any], Any], partitions: Iterable[Any]) -> List[Any]:
+        """
+        并发计算各分区，全部完成后按分区顺序返回结果 (任一分区失败时抛出其异常)
+
+        Args:
+            fn: 分区计算函数
+            partitions: 分区序列
+
+        Returns:
+            List[Any]: 各分区的结果
+        """
+        app = current_app._get_current_object()
+
+        def run(partition):
+            with app.app_context():
+                return fn(partition)
+
+        futures = [self._partitions.submit(run, partition) for partition in partitions]
+        self._count('partitions', len(futures))
+        try:
+            return [future.result() for future in futures]
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """提交/完成/失败的任务数与计算的分区数"""
+        with self._lock:
+            stats = dict(self.counters)
+        stats['job_workers'] = self.job_workers
+        stats['partition_workers'] = self.partition_workers
+        return stats
+
+    def shutdown(self) -> None:
+        """关闭线程池 (取消尚未开始的任务)"""
+        self._jobs.shutdown(wait=False, cancel_futures=True)
+        self._partitions.shutdown(wait=False, cancel_futures=True)
+
+
+def init_job_runner(app) -> None:
+    """
+    按配置创建后台任务线程池并注册到应用
+
+    Args:
+        app: Flask应用实例
+    """
+    job_workers = app.config.get('JOB_WORKERS', 2)
+    if not job_workers:
+        return
+
+    app.extensions['job_runner'] = JobRunner(
+        job_workers=job_workers,
+        partition_workers=app.config.get('JOB_PARTITION_WORKERS', 4)
+    )
+
+
+def get_job_runner() -> Optional[JobRunner]:
+    """获取当前应用的后台任务线程池 (未启用时返回None)"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('job_runner')
@@ -0,0 +1,193 @@
+"""
+统计查询并发执行 (有界线程池)
+Bounded Thread Pool for Independent Statistics Queries
+
+组合视图所需的多个相互独立的聚合查询提交到进程内共享的有界线程池并发执行
+(线程等待 MongoDB 时释放 GIL)，总耗时接近最慢的查询而不是各查询之和。
+
+每次提交带截止时间：
+- 截止时尚未开始的查询被取消
+- 已开始的查询在 pymongo.timeout 中执行，剩余时间作为 maxTimeMS 发送给服务器，
+  到期后由服务器终止查询
+- 任一查询失败时取消其余尚未开始的查询
+
+排队中的查询数有上限，超过时立即拒绝 (QueryPoolBusy)，避免请求在池中堆积。
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+import pymongo
+from flask import current_app, g, has_app_context
+
+
+class QueryDeadlineExceeded(TimeoutError):
+    """组合查询超过截止时间"""
+
+
+class QueryPoolBusy(RuntimeError):
+    """查询线程池排队已满"""
+
+
+class QueryPool:
+    """独立统计查询的有界线程池"""
+
+    def __init__(self, max_workers: int = 8, max_pending: int = 64, timeout: float = 10.0):
+        """
+        初始化线程池
+
+        Args:
+            max_workers: 最大线程数
+            max_pending: 已提交但未完成的查询数上限
+            timeout: 默认截止时间 (秒)
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='stats-query')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {
+            'submitted': 0,
+            'completed': 0,
+            'cancelled': 0,
+            'errors': 0,
+            'deadline_exceeded': 0,
+            'rejected': 0
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def run(self, tasks: Dict[str, Callable[[], Any]],
+            timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        并发执行一组相互独立的查询，全部完成后返回
+
+        在池内线程中调用时 (查询内部再次发起组合查询) 直接按顺序执行，避免占满线程池后互相等待。
+
+        Args:
+            tasks: {名称: 无参查询函数}
+            timeout: 截止时间 (秒，可选，默认使用初始化时的设置)
+
+        Returns:
+            Dict[str, Any]: {名称: 查询结果}
+
+        Raises:
+            QueryDeadlineExceeded: 超过截止时间
+            QueryPoolBusy: 排队已满
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        if getattr(self._local, 'in_pool', False):
+            return {name: self._call(fn, deadline) for name, fn in tasks.items()}
+
+        acquired = 0
+        try:
+            for _ in tasks:
+                if not self._slots.acquire(blocking=False):
+                    self._count('rejected')
+                    raise QueryPoolBusy(f"统计查询排队已满 ({self.max_pending})")
+                acquired += 1
+        except QueryPoolBusy:
+            for _ in range(acquired):
+                self._slots.release()
+            raise
+
+        app = current_app._get_current_object()
+        futures: Dict[str, Future] = {}
+        for name, fn in tasks.items():
+            future = self._executor.submit(self._run_in_pool, app, fn, deadline)
+            future.add_done_callback(lambda _: self._slots.release())
+            futures[name] = future
+        self._count('submitted', len(futures))
+
+        done, pending = wait(futures.values(), timeout=max(deadline - time.monotonic(), 0),
+                             return_when=FIRST_EXCEPTION)
+        failed = [future for future in done if future.exception() is not None]
+        if failed or pending:
+            for future in pending:
+                if future.cancel():
+                    self._count('cancelled')
+            if failed and time.monotonic() < deadline:
+                self._count('errors')
+                raise failed[0].exception()
+            self._count('deadline_exceeded')
+            names = [name for name, future in futures.items()
+                     if future in pending or future in failed]
+            raise QueryDeadlineExceeded(f"统计查询超过截止时间: {', '.join(names)}")
+
+        self._count('completed', len(futures))
+        results = {}
+        for name, future in futures.items():
+            results[name], tiers = future.result()
+            self._merge_tiers(tiers)
+        return results
+
+    def _run_in_pool(self, app, fn: Callable[[], Any], deadline: float):
+        """在池内线程中推入应用上下文后执行查询，返回 (结果, 查询记录的数据层级读取量)"""
+        self._local.in_pool = True
+        try:
+            with app.app_context():
+                return self._call(fn, deadline), g.pop('stats_tiers', None)
+        finally:
+            self._local.in_pool = False
+
+    @staticmethod
+    def _call(fn: Callable[[], Any], deadline: float) -> Any:
+        """在剩余时间内执行查询 (数据库操作的超时不超过剩余时间)"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise QueryDeadlineExceeded("统计查询超过截止时间")
+        with pymongo.timeout(remaining):
+            return fn()
+
+    @staticmethod
+    def _merge_tiers(tiers: Optional[Dict[str, int]]) -> None:
+        """将池内查询的数据层级读取量合并到调用方 (供调试响应头输出)"""
+        if not tiers:
+            return
+        stats_tiers = g.setdefault('stats_tiers', {})
+        for tier, count in tiers.items():
+            stats_tiers[tier] = stats_tiers.get(tier, 0) + count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """提交/完成/取消/超时/拒绝次数"""
+        with self._lock:
+            stats = dict(self.counters)
+        stats['max_workers'] = self.max_workers
+        stats['max_pending'] = self.max_pending
+        return stats
+
+    def shutdown(self) -> None:
+        """关闭线程池 (取消尚未开始的查询)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def init_query_pool(app) -> None:
+    """
+    按配置创建统计查询线程池并注册到应用
+
+    Args:
+        app: Flask应用实例
+    """
+    max_workers = app.config.get('STATS_QUERY_POOL_WORKERS', 8)
+    if not max_workers:
+        return
+
+    app.extensions['stats_query_pool'] = QueryPool(
+        max_workers=max_workers,
+        max_pending=app.config.get('STATS_QUERY_POOL_MAX_PENDING', 64),
+        timeout=app.config.get('STATS_QUERY_TIMEOUT', 10)
+    )
+
+
+def get_query_pool() -> Optional[QueryPool]:
+    """获取当前应用的统计查询线程池 (未启用时返回None)"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('stats_query_pool')
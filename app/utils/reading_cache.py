@@ -0,0 +1,459 @@
+"""
+最近读数缓存
+Recent Readings Cache
+
+每个进程为最近访问过的用户保存最近 READING_CACHE_HOURS 小时的读数 (所有设备合并，按时间升序)，
+用于最新读数、短时间范围读数与变化速率查询，命中时不访问数据库：
+- 读数保存在 array 环形缓冲中：时间戳 int64 (秒)、血糖值 float32、设备序号 uint16，每条14字节；
+  缓冲按需倍增，单个用户最多 READING_CACHE_MAX_POINTS 条，超出时丢弃最早的读数
+- 另外保存各设备 (及全部设备) 的最新完整记录，设备最后一次读数早于窗口时也可命中
+- 写入路径追加新读数；读取未命中时从数据库加载 (懒加载)，加载期间该用户有写入时不保存加载结果
+- 乱序到达的读数、修改与删除记录时丢弃该用户的缓存，下次读取时重新加载
+- 按用户数 (READING_CACHE_MAX_USERS) 与内存 (READING_CACHE_MAX_BYTES) 上限淘汰最久未访问的用户
+
+缓存只在本进程内有效。多进程部署时其他进程的写入不会追加到本进程的缓存中，
+需设置 READING_CACHE_TTL 使缓存的用户数据定期重新加载。
+"""
+
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+from app.utils.time_utils import to_utc_naive
+
+
+# 环形缓冲的初始容量 (条)
+INITIAL_POINTS = 64
+
+# 每个用户缓存条目除读数缓冲外的估计开销 (字节，用于内存上限)
+ENTRY_OVERHEAD_BYTES = 512
+
+# 每条读数的字节数 (int64 + float32 + uint16)
+POINT_BYTES = 14
+
+
+def _epoch(value: datetime) -> int:
+    """朴素UTC时间转换为时间戳 (秒)"""
+    return int(to_utc_naive(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _from_epoch(seconds: int) -> datetime:
+    """时间戳 (秒) 转换为朴素UTC时间"""
+    return datetime(1970, 1, 1) + timedelta(seconds=seconds)
+
+
+class ReadingRing:
+    """按时间升序保存读数的环形缓冲 (容量按需倍增至上限)"""
+
+    __slots__ = ('timestamps', 'values', 'devices', 'head', 'size', 'max_points')
+
+    def __init__(self, max_points: int):
+        """
+        初始化
+
+        Args:
+            max_points: 最大读数条数
+        """
+        capacity = min(INITIAL_POINTS, max_points)
+        self.timestamps = array('q', [0]) * capacity
+        self.values = array('f', [0.0]) * capacity
+        self.devices = array('H', [0]) * capacity
+        self.head = 0
+        self.size = 0
+        self.max_points = max_points
+
+    @property
+    def capacity(self) -> int:
+        """当前容量"""
+        return len(self.timestamps)
+
+    @property
+    def nbytes(self) -> int:
+        """缓冲占用的字节数"""
+        return self.capacity * POINT_BYTES
+
+    def _index(self, position: int) -> int:
+        """第 position 条 (0 为最早) 在数组中的下标"""
+        return (self.head + position) % self.capacity
+
+    def _grow(self) -> None:
+        """容量翻倍 (按时间顺序重新排列)"""
+        order = [self._index(position) for position in range(self.size)]
+        capacity = min(self.capacity * 2, self.max_points)
+        timestamps = array('q', (self.timestamps[index] for index in order))
+        values = array('f', (self.values[index] for index in order))
+        devices = array('H', (self.devices[index] for index in order))
+        padding = capacity - self.size
+        timestamps.extend(array('q', [0]) * padding)
+        values.extend(array('f', [0.0]) * padding)
+        devices.extend(array('H', [0]) * padding)
+        self.timestamps, self.values, self.devices = timestamps, values, devices
+        self.head = 0
+
+    def timestamp_at(self, position: int) -> int:
+        """第 position 条读数的时间戳"""
+        return self.timestamps[self._index(position)]
+
+    def newest(self) -> Optional[int]:
+        """最新读数的时间戳 (为空时为None)"""
+        return self.timestamp_at(self.size - 1) if self.size else None
+
+    def append(self, timestamp: int, value: float, device: int) -> Optional[int]:
+        """
+        追加一条读数 (时间戳不早于最新读数)
+
+        Returns:
+            Optional[int]: 容量已满时被丢弃的最早读数的时间戳
+        """
+        dropped = None
+        if self.size == self.capacity:
+            if self.capacity < self.max_points:
+                self._grow()
+            else:
+                dropped = self.timestamps[self.head]
+                self.head = (self.head + 1) % self.capacity
+                self.size -= 1
+        index = self._index(self.size)
+        self.timestamps[index] = timestamp
+        self.values[index] = value
+        self.devices[index] = device
+        self.size += 1
+        return dropped
+
+    def trim_before(self, cutoff: int) -> None:
+        """丢弃早于 cutoff 的读数"""
+        while self.size and self.timestamps[self.head] < cutoff:
+            self.head = (self.head + 1) % self.capacity
+            self.size -= 1
+
+    def since(self, start: int) -> List[Tuple[int, float, int]]:
+        """时间戳不早于 start 的读数 (时间戳, 血糖值, 设备序号)，按时间升序"""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp_at(middle) < start:
+                low = middle + 1
+            else:
+                high = middle
+        result = []
+        for position in range(low, self.size):
+            index = self._index(position)
+            result.append((self.timestamps[index], self.values[index], self.devices[index]))
+        return result
+
+
+class UserReadings:
+    """一位用户的缓存条目"""
+
+    __slots__ = ('ring', 'covered_from', 'device_ids', 'device_codes', 'latest', 'loaded_at')
+
+    def __init__(self, max_points: int):
+        self.ring = ReadingRing(max_points)
+        # 缓冲包含该时间戳 (秒) 之后的全部读数，None 表示尚未加载范围读数
+        self.covered_from: Optional[int] = None
+        self.device_ids: List[Optional[str]] = []
+        self.device_codes: Dict[Optional[str], int] = {}
+        # {设备ID (None 为全部设备): 最新完整记录 (None 表示没有记录)}
+        self.latest: Dict[Optional[str], Optional[Dict[str, Any]]] = {}
+        self.loaded_at = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        """估计占用的字节数"""
+        return self.ring.nbytes + ENTRY_OVERHEAD_BYTES
+
+    def device_code(self, device_id: Optional[str]) -> int:
+        """设备ID对应的序号"""
+        code = self.device_codes.get(device_id)
+        if code is None:
+            code = len(self.device_ids)
+            self.device_ids.append(device_id)
+            self.device_codes[device_id] = code
+        return code
+
+
+class ReadingCache:
+    """最近读数缓存"""
+
+    def __init__(self, window: timedelta = timedelta(hours=3), max_users: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024, max_points: int = 2048,
+                 ttl: Optional[float] = None):
+        """
+        初始化缓存
+
+        Args:
+            window: 每位用户缓存读数的时长
+            max_users: 最大用户数
+            max_bytes: 最大估计内存 (字节)
+            max_points: 每位用户最多缓存的读数条数
+            ttl: 用户数据加载后的有效时间 (秒，None 表示不过期，多进程部署时设置)
+        """
+        self.window = window
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.max_points = max_points
+        self.ttl = ttl
+        self._users: 'OrderedDict[str, UserReadings]' = OrderedDict()
+        self._bytes = 0
+        # 写入代数 (与统计结果缓存相同的做法)：加载前读取，保存时代数已变化说明加载期间有写入
+        self._generations: 'OrderedDict[str, int]' = OrderedDict()
+        self._generation_counter = 0
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'loads': 0, 'stale_loads': 0,
+                         'appends': 0, 'invalidations': 0, 'evictions': 0, 'expirations': 0}
+
+    def _entry(self, user_id: str) -> Optional[UserReadings]:
+        """读取用户条目并标记为最近使用，已过期时删除 (调用方持有锁)"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        if self.ttl is not None and time.monotonic() - entry.loaded_at > self.ttl:
+            self._remove(user_id)
+            self.counters['expirations'] += 1
+            return None
+        self._users.move_to_end(user_id)
+        return entry
+
+    def _remove(self, user_id: str) -> None:
+        """删除用户条目 (调用方持有锁)"""
+        entry = self._users.pop(user_id)
+        self._bytes -= entry.nbytes
+
+    def _resize(self, entry: UserReadings, previous_bytes: int) -> None:
+        """条目大小变化后更新内存计数并按上限淘汰最久未访问的用户 (调用方持有锁)"""
+        self._bytes += entry.nbytes - previous_bytes
+        while self._users and (len(self._users) > self.max_users or self._bytes > self.max_bytes):
+            oldest = next(iter(self._users))
+            self._remove(oldest)
+            self.counters['evictions'] += 1
+
+    def _bump(self, user_id: str) -> None:
+        """用户有写入，更新写入代数 (调用方持有锁)"""
+        self._generation_counter += 1
+        self._generations[user_id] = self._generation_counter
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > self.max_users:
+            self._generations.popitem(last=False)
+            self._generation_floor = self._generation_counter
+
+    def _writable(self, user_id: str, generation: int) -> Optional[UserReadings]:
+        """加载期间没有写入时返回 (必要时创建) 用户条目，否则返回None (调用方持有锁)"""
+        if self._generations.get(user_id, self._generation_floor) != generation:
+            self.counters['stale_loads'] += 1
+            return None
+        entry = self._entry(user_id)
+        if entry is None:
+            entry = UserReadings(self.max_points)
+            self._users[user_id] = entry
+            self._resize(entry, 0)
+        return entry
+
+    def generation(self, user_id: str) -> int:
+        """用户的写入代数 (从数据库加载前读取)"""
+        with self._lock:
+            return self._generations.get(user_id, self._generation_floor)
+
+    def get_latest(self, user_id: str,
+                   device_id: Optional[str] = None) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        读取最新记录
+
+        Args:
+            user_id: 用户ID
+            device_id: 设备ID (可选，None 表示全部设备)
+
+        Returns:
+            Tuple[bool, Optional[Dict]]: (是否命中, 记录)，命中且没有记录时记录为None
+        """
+        with self._lock:
+            entry = self._entry(user_id)
+            if entry is None or device_id not in entry.latest:
+                self.counters['misses'] += 1
+                return False, None
+            self.counters['hits'] += 1
+            record = entry.latest[device_id]
+            return True, dict(record) if record else None
+
+    def set_latest(self, user_id: str, device_id: Optional[str],
+                   record: Optional[Dict[str, Any]], generation: int) -> bool:
+        """
+        保存从数据库读取的最新记录
+
+        Args:
+            user_id: 用户ID
+            device_id: 设备ID (None 表示全部设备)
+            record: 最新记录 (没有记录时为None)
+            generation: 读取数据库前的写入代数
+
+        Returns:
+            bool: 是否保存 (读取期间有写入时为False)
+        """
+        with self._lock:
+            entry = self._writable(user_id, generation)
+            if entry is None:
+                return False
+            entry.latest[device_id] = dict(record) if record else None
+            return True
+
+    def get_since(self, user_id: str, start: datetime) -> Optional[List[Dict[str, Any]]]:
+        """
+        读取 start 之后的读数
+
+        Args:
+            user_id: 用户ID
+            start: 开始时间 (含)
+
+        Returns:
+            Optional[List[Dict]]: 按时间升序的读数 (timestamp/glucose_value/device_id)，
+                                  缓存未覆盖该范围时返回None
+        """
+        start_seconds = _epoch(start)
+        with self._lock:
+            entry = self._entry(user_id)
+            if entry is None or entry.covered_from is None or start_seconds < entry.covered_from:
+                self.counters['misses'] += 1
+                return None
+            self.counters['hits'] += 1
+            points = entry.ring.since(start_seconds)
+            device_ids = list(entry.device_ids)
+
+        return [
+            {
+                'timestamp': _from_epoch(timestamp),
+                # float32 约7位有效数字，四舍五入到4位小数还原写入的值
+                'glucose_value': round(value, 4),
+                'device_id': device_ids[device]
+            }
+            for timestamp, value, device in points
+        ]
+
+    def load(self, user_id: str, records: List[Dict[str, Any]], covered_from: datetime,
+             generation: int) -> bool:
+        """
+        保存从数据库加载的读数
+
+        Args:
+            user_id: 用户ID
+            records: covered_from 之后的全部读数 (按时间升序)
+            covered_from: 加载范围的开始时间
+            generation: 读取数据库前的写入代数
+
+        Returns:
+            bool: 是否保存 (读取期间有写入时为False)
+        """
+        with self._lock:
+            entry = self._writable(user_id, generation)
+            if entry is None:
+                return False
+            previous_bytes = entry.nbytes
+            entry.ring = ReadingRing(self.max_points)
+            entry.covered_from = _epoch(covered_from)
+            for record in records:
+                dropped = entry.ring.append(_epoch(record['timestamp']), record['glucose_value'],
+                                            entry.device_code(record.get('device_id')))
+                if dropped is not None:
+                    entry.covered_from = dropped + 1
+            entry.loaded_at = time.monotonic()
+            self.counters['loads'] += 1
+            self._resize(entry, previous_bytes)
+            return True
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """
+        写入路径追加一条新记录 (用户未缓存时只更新写入代数)
+
+        Args:
+            record: 完整记录 (timestamp 为朴素UTC时间)
+        """
+        user_id = record['user_id']
+        timestamp = _epoch(record['timestamp'])
+        with self._lock:
+            self._bump(user_id)
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+
+            newest = entry.ring.newest()
+            if newest is not None and timestamp < newest:
+                # 乱序到达：丢弃条目，下次读取时重新加载
+                self._remove(user_id)
+                self.counters['invalidations'] += 1
+                return
+
+            previous_bytes = entry.nbytes
+            if entry.covered_from is not None and timestamp >= entry.covered_from:
+                dropped = entry.ring.append(timestamp, record['glucose_value'],
+                                            entry.device_code(record.get('device_id')))
+                if dropped is not None:
+                    entry.covered_from = dropped + 1
+                cutoff = timestamp - int(self.window.total_seconds())
+                entry.ring.trim_before(cutoff)
+                entry.covered_from = max(entry.covered_from, cutoff)
+            for device_id in (None, record.get('device_id')):
+                if device_id in entry.latest:
+                    latest = entry.latest[device_id]
+                    if latest is None or _epoch(latest['timestamp']) <= timestamp:
+                        entry.latest[device_id] = dict(record)
+            self.counters['appends'] += 1
+            self._resize(entry, previous_bytes)
+
+    def invalidate(self, user_id: str) -> None:
+        """丢弃用户的缓存 (修改或删除记录后调用)"""
+        with self._lock:
+            self._bump(user_id)
+            if user_id in self._users:
+                self._remove(user_id)
+                self.counters['invalidations'] += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._users.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中/未命中/加载/淘汰等统计"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['users'] = len(self._users)
+            stats['bytes'] = self._bytes
+            stats['points'] = sum(entry.ring.size for entry in self._users.values())
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['max_users'] = self.max_users
+        stats['max_bytes'] = self.max_bytes
+        stats['window_hours'] = self.window.total_seconds() / 3600
+        return stats
+
+
+def init_reading_cache(app) -> None:
+    """
+    按配置创建最近读数缓存并注册到应用 (READING_CACHE_MAX_USERS 为0时不启用)
+
+    Args:
+        app: Flask应用实例
+    """
+    max_users = app.config.get('READING_CACHE_MAX_USERS', 10000)
+    if not max_users:
+        return
+    app.extensions['reading_cache'] = ReadingCache(
+        window=timedelta(hours=app.config.get('READING_CACHE_HOURS', 3)),
+        max_users=max_users,
+        max_bytes=app.config.get('READING_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+        max_points=app.config.get('READING_CACHE_MAX_POINTS', 2048),
+        ttl=app.config.get('READING_CACHE_TTL')
+    )
+
+
+def get_reading_cache() -> Optional[ReadingCache]:
+    """获取当前应用的最近读数缓存 (未启用时返回None)"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('reading_cache')
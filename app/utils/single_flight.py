@@ -0,0 +1,133 @@
+"""
+相同查询请求合并 (single-flight)
+Request Coalescing for Identical Concurrent Queries
+
+同一进程内，相同键的并发调用只执行一次：第一个调用方执行计算，
+其余调用方等待并获得同一结果 (或同一异常)。等待超过超时时间的调用方
+收到 SingleFlightTimeout，正在执行的计算不受影响。
+"""
+
+import copy
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from flask import current_app, has_app_context
+
+
+class SingleFlightTimeout(TimeoutError):
+    """等待相同查询的计算结果超时"""
+
+
+class _Call:
+    """进行中的一次计算"""
+
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """相同键的并发调用合并器"""
+
+    def __init__(self, timeout: float = 30.0):
+        """
+        初始化合并器
+
+        Args:
+            timeout: 默认等待超时时间 (秒)
+        """
+        self.timeout = timeout
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            'executions': 0,
+            'shared': 0,
+            'errors': 0,
+            'timeouts': 0
+        }
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        执行或加入相同键的计算
+
+        Args:
+            key: 调用键
+            fn: 计算函数
+            timeout: 等待超时时间 (秒，可选，默认使用初始化时的设置)
+
+        Returns:
+            Any: 计算结果 (等待方获得结果的副本)
+
+        Raises:
+            SingleFlightTimeout: 等待超时
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                    self.counters['executions'] += 1
+                    if call.error is not None:
+                        self.counters['errors'] += 1
+                call.event.set()
+
+        if not call.event.wait(self.timeout if timeout is None else timeout):
+            with self._lock:
+                self.counters['timeouts'] += 1
+            raise SingleFlightTimeout(f"等待相同查询的计算结果超时: {key}")
+
+        if call.error is not None:
+            raise call.error
+
+        with self._lock:
+            self.counters['shared'] += 1
+        return copy.deepcopy(call.result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """执行/共享次数统计，shared 即节省的执行次数"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['in_flight'] = len(self._calls)
+
+        calls = stats['executions'] + stats['shared']
+        stats['saved_ratio'] = round(stats['shared'] / calls, 4) if calls else 0.0
+        return stats
+
+
+def init_single_flight(app) -> None:
+    """
+    按配置创建请求合并器并注册到应用
+
+    Args:
+        app: Flask应用实例
+    """
+    if not app.config.get('STATS_SINGLE_FLIGHT_ENABLED', True):
+        return
+
+    app.extensions['stats_single_flight'] = SingleFlight(
+        timeout=app.config.get('STATS_SINGLE_FLIGHT_TIMEOUT', 30)
+    )
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """获取当前应用的请求合并器 (未启用时返回None)"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('stats_single_flight')
@@ -0,0 +1,160 @@
+"""
+时间处理工具函数
+Time Utility Functions
+"""
+
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """
+    转换为不带时区信息的UTC时间 (与MongoDB返回的时间格式一致)
+
+    Args:
+        value: 时间 (可带时区)
+
+    Returns:
+        datetime: 朴素UTC时间
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def floor_hour(value: datetime) -> datetime:
+    """向下取整到小时"""
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(value: datetime) -> datetime:
+    """向上取整到小时"""
+    hour = floor_hour(value)
+    return hour if hour == value else hour + timedelta(hours=1)
+
+
+def floor_day(value: datetime) -> datetime:
+    """向下取整到天"""
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_day(value: datetime) -> datetime:
+    """向上取整到天"""
+    day = floor_day(value)
+    return day if day == value else day + timedelta(days=1)
+
+
+def floor_month(value: datetime) -> datetime:
+    """向下取整到月"""
+    return floor_day(value).replace(day=1)
+
+
+def ceil_month(value: datetime) -> datetime:
+    """向上取整到月"""
+    month = floor_month(value)
+    return month if month == value else add_months(month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """增加月份 (value 应为月初)"""
+    month_index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+
+def parse_timezone(name: Optional[str]) -> tzinfo:
+    """
+    解析IANA时区名称
+
+    Args:
+        name: 时区名称 (如 Asia/Shanghai，为空时返回UTC)
+
+    Returns:
+        tzinfo: 时区
+
+    Raises:
+        ValueError: 未知时区
+    """
+    if not name or name == 'UTC':
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"未知时区: {name}")
+
+
+def to_local(value: datetime, tz: tzinfo) -> datetime:
+    """朴素UTC时间转换为时区本地时间 (朴素)"""
+    return value.replace(tzinfo=timezone.utc).astimezone(tz).replace(tzinfo=None)
+
+
+def from_local(value: datetime, tz: tzinfo) -> datetime:
+    """时区本地时间 (朴素) 转换为朴素UTC时间"""
+    return value.replace(tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def timezone_name(tz: tzinfo) -> str:
+    """时区名称 (parse_timezone 的逆运算)"""
+    return getattr(tz, 'key', 'UTC')
+
+
+# 按整天计算的统计窗口 (AGP、变异性指标、设备完整性) 天数
+WINDOW_DEFAULT_DAYS = 14
+WINDOW_MAX_DAYS = 90
+
+
+def parse_day_window(end_date: Optional[str], days,
+                     tz: Optional[tzinfo] = None) -> Tuple[datetime, datetime]:
+    """
+    解析统计窗口：以 end_date 所在日 (含) 结束的 days 个整天，日界为 tz 的本地午夜
+
+    Args:
+        end_date: 结束日期字符串 (可选，默认 tz 的今天；不带时区的日期按本地日期解释)
+        days: 天数 (可选)
+        tz: 时区 (可选，默认UTC)
+
+    Returns:
+        Tuple[datetime, datetime]: (窗口开始, 窗口结束 (不含))，均为朴素UTC时间
+
+    Raises:
+        ValueError: 参数格式错误或超出范围
+    """
+    tz = tz or timezone.utc
+    if end_date:
+        end_day = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+        if end_day.tzinfo is not None:
+            end_day = end_day.astimezone(tz).replace(tzinfo=None)
+    else:
+        end_day = to_local(datetime.utcnow(), tz)
+    end_day = floor_day(end_day)
+
+    days = int(days) if days is not None else WINDOW_DEFAULT_DAYS
+    if days < 1 or days > WINDOW_MAX_DAYS:
+        raise ValueError(f"days 应在 1-{WINDOW_MAX_DAYS} 之间")
+
+    window_end = end_day + timedelta(days=1)
+    return from_local(window_end - timedelta(days=days), tz), from_local(window_end, tz)
+
+
+def has_whole_hour_offsets(tz: tzinfo, start: datetime, end: datetime) -> bool:
+    """
+    时间范围内时区的UTC偏移是否均为整小时 (此时每个UTC小时恰好对应一个本地小时)
+
+    按月检查，覆盖夏令时的两种偏移
+
+    Args:
+        tz: 时区
+        start: 开始时间 (朴素UTC)
+        end: 结束时间 (朴素UTC)
+
+    Returns:
+        bool: 是否均为整小时
+    """
+    moment = start
+    while True:
+        offset = moment.replace(tzinfo=timezone.utc).astimezone(tz).utcoffset()
+        if offset.total_seconds() % 3600:
+            return False
+        if moment >= end:
+            return True
+        moment = min(moment + timedelta(days=30), end)
@@ -0,0 +1,85 @@
+"""
+血糖告警评估基准测试
+Glucose Alert Evaluation Benchmark
+
+测量写入血糖记录时告警评估 (AlertService.evaluate，只读写进程内的规则索引与评估状态) 的单条读数耗时：
+- 没有告警规则的用户 (大多数用户)
+- 有阈值、持续阈值与速率规则的用户，读数在目标范围内 (没有需要写入数据库的动作)
+
+规则直接加载到索引中，不访问数据库；触发、重复通知检查与解除时的数据库写入未计入。
+
+用法: python scripts/benchmark_alert_engine.py [--users 1000] [--readings 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app  # noqa: E402
+from app.services.alert_service import AlertService, compile_rule  # noqa: E402
+from app.utils.alert_index import AlertRuleIndex  # noqa: E402
+
+RULES = [
+    {'name': 'urgent low', 'rule_type': 'threshold', 'condition': 'below', 'value': 3.1},
+    {'name': 'low', 'rule_type': 'threshold', 'condition': 'below', 'value': 3.9,
+     'duration_minutes': 15},
+    {'name': 'high', 'rule_type': 'threshold', 'condition': 'above', 'value': 13.9,
+     'duration_minutes': 30},
+    {'name': 'fast fall', 'rule_type': 'rate', 'condition': 'falling', 'value': 0.11}
+]
+
+
+def run(service, index, user_ids, readings, rng):
+    """每位用户按5分钟间隔写入 readings 条读数，返回单条读数的平均评估耗时 (微秒)"""
+    start = datetime.utcnow() - timedelta(minutes=5 * readings)
+    records = [
+        {'user_id': user_id, 'device_id': 'cgm-1', 'glucose_value': round(rng.uniform(4.5, 9.0), 1),
+         'timestamp': start + timedelta(minutes=5 * step)}
+        for step in range(readings) for user_id in user_ids
+    ]
+    now = start + timedelta(minutes=5 * readings)
+    begin = time.perf_counter()
+    for record in records:
+        service.evaluate(record, now, index)
+    return (time.perf_counter() - begin) / len(records) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='血糖告警评估基准测试')
+    parser.add_argument('--users', type=int, default=1000, help='用户数')
+    parser.add_argument('--readings', type=int, default=50, help='每位用户的读数条数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    rng = random.Random(args.seed)
+    with app.app_context():
+        app.config['ALERT_MAX_DELAY_MINUTES'] = 5 * args.readings + 5
+        service = AlertService()
+        index = AlertRuleIndex()
+        without_rules = [f'plain{number:05d}' for number in range(args.users)]
+        with_rules = [f'alert{number:05d}' for number in range(args.users)]
+        for user_id in without_rules:
+            index.load(user_id, (), index.generation(user_id))
+        for user_id in with_rules:
+            rules = tuple(compile_rule({**rule, '_id': f'{user_id}-{number}'})
+                          for number, rule in enumerate(RULES))
+            index.load(user_id, rules, index.generation(user_id))
+
+        plain_us = run(service, index, without_rules, args.readings, rng)
+        rules_us = run(service, index, with_rules, args.readings, rng)
+
+    print(f"用户: {args.users}  每用户读数: {args.readings}")
+    print(f"没有规则的用户: {plain_us:.1f} µs/条")
+    print(f"{len(RULES)} 条规则 (含速率规则) 的用户: {rules_us:.1f} µs/条 "
+          f"({rules_us / len(RULES):.1f} µs/规则)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+血糖分析计算核心基准测试
+Glucose Analytics Core Benchmark
+
+比较统计摘要与分布计算的两种实现 (不含数据库访问，游标以文档迭代模拟)：
+- 原实现：文档列表 + statistics 模块 + 逐条循环分类
+- 计算核心：读入 NumPy 数组 + 向量化计算
+
+并校验两者输出一致。另外给出读入含时间戳的序列 (GlucoseSeries) 的耗时。
+
+用法: python scripts/benchmark_analytics_core.py [--sizes 1000,100000,1000000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.analytics_core import (  # noqa: E402
+    GlucoseSeries, range_counts, summarize, values_from_documents
+)
+from app.services.rollup_service import DISTRIBUTION_RANGES  # noqa: E402
+
+
+def generate_documents(count, seed):
+    """生成5分钟间隔的模拟血糖文档"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            'user_id': 'benchmark',
+            'timestamp': start + timedelta(minutes=5 * i),
+            'glucose_value': round(min(max(rng.gauss(7.2, 2.4), 2.0), 25.0), 1),
+            'unit': 'mmol/L',
+            'device_id': 'cgm-1'
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_metrics(documents):
+    """原实现：文档列表 + statistics 模块"""
+    records = list(documents)
+    glucose_values = [record['glucose_value'] for record in records]
+
+    summary = {
+        'avg_glucose': round(statistics.mean(glucose_values), 2),
+        'max_glucose': max(glucose_values),
+        'min_glucose': min(glucose_values),
+        'std_glucose': round(statistics.stdev(glucose_values), 2),
+        'low_count': 0,
+        'normal_count': 0,
+        'high_count': 0
+    }
+    for value in glucose_values:
+        if value < 3.9:
+            summary['low_count'] += 1
+        elif value > 7.8:
+            summary['high_count'] += 1
+        else:
+            summary['normal_count'] += 1
+
+    distribution = [
+        sum(1 for record in records if r['min'] <= record['glucose_value'] < r['max'])
+        for r in DISTRIBUTION_RANGES
+    ]
+    return summary, distribution
+
+
+def core_metrics(documents):
+    """计算核心：数组 + 向量化"""
+    values = values_from_documents(documents)
+    result = summarize(values)
+
+    summary = {
+        'avg_glucose': round(result['mean'], 2),
+        'max_glucose': result['max'],
+        'min_glucose': result['min'],
+        'std_glucose': round(result['std'], 2),
+        'low_count': result['low_count'],
+        'normal_count': result['normal_count'],
+        'high_count': result['high_count']
+    }
+    return summary, range_counts(values, DISTRIBUTION_RANGES)
+
+
+def timed(function, documents, repeat):
+    """返回 (最短耗时毫秒, 结果)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(iter(documents))
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='血糖分析计算核心基准测试')
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='读数数量，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数 (取最短耗时)')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    print(f"{'读数':>10} {'原实现(ms)':>12} {'计算核心(ms)':>14} {'加速比':>8} "
+          f"{'读入序列(ms)':>14}  输出一致")
+    all_equal = True
+    for size in (int(s) for s in args.sizes.split(',')):
+        documents = generate_documents(size, args.seed)
+        legacy_ms, legacy_result = timed(legacy_metrics, documents, args.repeat)
+        core_ms, core_result = timed(core_metrics, documents, args.repeat)
+        series_ms, _ = timed(GlucoseSeries.from_documents, documents, args.repeat)
+        equal = legacy_result == core_result
+        all_equal = all_equal and equal
+        print(f"{size:>10} {legacy_ms:>12.1f} {core_ms:>14.1f} {legacy_ms / core_ms:>7.1f}x "
+              f"{series_ms:>14.1f}  {equal}")
+
+    return 0 if all_equal else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
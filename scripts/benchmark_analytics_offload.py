@@ -0,0 +1,120 @@
+"""
+分析计算进程池基准测试
+Analytics Process Pool Benchmark
+
+模拟 threaded=True 的服务进程：后台线程持续计算多位用户的变异性指标 (批量患者视图)，
+同时前台线程反复处理一个简单请求 (序列化一个小响应)，给出：
+- 简单请求的 p50/p99 延迟：无后台计算 / 后台计算在请求线程中执行 / 后台计算提交到进程池
+- 后台批量计算的单次耗时
+
+用法: python scripts/benchmark_analytics_offload.py [--days 14] [--users 50] [--seconds 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.glycemic_variability import grouped_variability_indices  # noqa: E402
+from app.utils.analytics_executor import AnalyticsExecutor  # noqa: E402
+
+INTERVAL = 300
+MAX_GAP = 900
+
+
+def simulate_batch(users, days, rng):
+    """模拟多位用户的CGM读数 (按用户分组序号)"""
+    points = days * 288
+    timestamps = np.tile(1_700_000_000 + np.arange(points, dtype=np.int64) * INTERVAL, users)
+    timestamps += rng.integers(-20, 20, len(timestamps))
+    hours = (timestamps % 86400) / 3600
+    values = 6.5 + 1.2 * np.sin((hours - 6) / 24 * 2 * np.pi) + rng.normal(0, 0.8, len(timestamps))
+    codes = np.repeat(np.arange(users, dtype=np.int64), points)
+    return {'values': np.round(np.clip(values, 2.2, 22.2), 1), 'timestamps': timestamps,
+            'codes': codes}
+
+
+def cheap_request():
+    """简单请求：构造并序列化一个小响应"""
+    payload = {'success': True, 'data': {'status': 'ok', 'items': list(range(50))}}
+    return json.dumps(payload)
+
+
+def measure(seconds, heavy=None):
+    """在 seconds 秒内反复执行简单请求，返回 (延迟列表 (毫秒), 后台计算次数与耗时)"""
+    stop = threading.Event()
+    heavy_times = []
+
+    def background():
+        while not stop.is_set():
+            start = time.perf_counter()
+            heavy()
+            heavy_times.append(time.perf_counter() - start)
+
+    worker = threading.Thread(target=background) if heavy else None
+    if worker:
+        worker.start()
+        time.sleep(0.2)
+
+    latencies = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        # 请求间隔 2 ms 到达；延迟包含唤醒后重新获取 GIL 的等待
+        start = time.perf_counter() + 0.002
+        time.sleep(0.002)
+        cheap_request()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    stop.set()
+    if worker:
+        worker.join()
+    return latencies, heavy_times
+
+
+def report(label, latencies, heavy_times):
+    p50, p99 = np.percentile(latencies, [50, 99])
+    line = f"{label:<16} p50 {p50:7.3f} ms  p99 {p99:7.3f} ms  max {max(latencies):7.1f} ms"
+    if heavy_times:
+        line += f"  后台计算 {len(heavy_times)} 次, {np.mean(heavy_times) * 1000:.0f} ms/次"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分析计算进程池基准测试')
+    parser.add_argument('--days', type=int, default=14, help='每位用户的模拟天数')
+    parser.add_argument('--users', type=int, default=50, help='批量计算的用户数')
+    parser.add_argument('--seconds', type=float, default=5, help='每种情况的测量时长 (秒)')
+    parser.add_argument('--workers', type=int, default=2, help='进程池子进程数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    arrays = simulate_batch(args.users, args.days, np.random.default_rng(args.seed))
+    params = {'group_count': args.users, 'interval': INTERVAL, 'max_gap': MAX_GAP,
+              'conga_hours': 1}
+
+    executor = AnalyticsExecutor(max_workers=args.workers, inline_max_points=0)
+    expected = grouped_variability_indices(**arrays, **params)
+    consistent = executor.run(grouped_variability_indices, arrays, **params) == expected
+
+    print(f"CPU: {os.cpu_count()}  用户: {args.users}  读数: {len(arrays['values'])} "
+          f"({args.days} 天)  子进程: {args.workers}")
+    report('无后台计算', *measure(args.seconds))
+    report('请求线程中计算',
+           *measure(args.seconds, lambda: grouped_variability_indices(**arrays, **params)))
+    report('进程池计算',
+           *measure(args.seconds,
+                    lambda: executor.run(grouped_variability_indices, arrays, **params)))
+    print(f"结果一致: {consistent}  进程池统计: {executor.get_stats()}")
+
+    executor.shutdown()
+    return 0 if consistent else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+短时血糖预测基准测试
+Short-Horizon Glucose Forecast Benchmark
+
+测量两种使用方式的耗时 (单进程):
+- 批量：每5分钟对所有活跃用户各预测一次，所有用户最近 FORECAST_HISTORY_MINUTES 分钟的读数拼接为一个数组，
+  一次 fit_windows 调用完成
+- 写入路径：有预测规则的用户写入读数时的告警评估 (AlertService.evaluate，规则直接加载到索引，不访问数据库)
+
+用法: python scripts/benchmark_forecast.py [--users 100000] [--interval 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app  # noqa: E402
+from app.services.alert_service import AlertService, compile_rule  # noqa: E402
+from app.services.glucose_forecast import (  # noqa: E402
+    DEFAULT_HISTORY_MINUTES,
+    fit_windows
+)
+from app.utils.alert_index import AlertRuleIndex  # noqa: E402
+
+FORECAST_RULE = {'name': 'predicted low', 'rule_type': 'forecast', 'condition': 'below',
+                 'value': 3.9}
+
+
+def batch(users, interval, rng):
+    """对 users 位用户各预测一次，返回 (耗时秒, 有预测值的用户数)"""
+    points = DEFAULT_HISTORY_MINUTES // interval + 1
+    steps = np.arange(points, dtype=np.float64) * interval * 60
+    timestamps = (np.arange(users, dtype=np.float64)[:, None] * 10 ** 10 + steps[None, :]).ravel()
+    values = (rng.uniform(4, 10, (users, 1))
+              + np.cumsum(rng.normal(0, 0.1, (users, points)), axis=1)).ravel()
+    right = np.arange(1, users + 1) * points
+    left = right - points
+
+    begin = time.perf_counter()
+    predicted, _ = fit_windows(timestamps, values, left, right, 30, 20, 4)
+    return time.perf_counter() - begin, int((~np.isnan(predicted)).sum())
+
+
+def ingest(users, readings, rng):
+    """每位用户按5分钟间隔写入 readings 条读数，返回单条读数的平均评估耗时 (微秒)"""
+    app = create_app('testing')
+    with app.app_context():
+        app.config['ALERT_MAX_DELAY_MINUTES'] = 5 * readings + 5
+        service = AlertService()
+        index = AlertRuleIndex()
+        user_ids = [f'forecast{number:05d}' for number in range(users)]
+        for user_id in user_ids:
+            index.load(user_id, (compile_rule({**FORECAST_RULE, '_id': user_id}),),
+                       index.generation(user_id))
+
+        start = datetime.utcnow() - timedelta(minutes=5 * readings)
+        records = [
+            {'user_id': user_id, 'device_id': 'cgm-1',
+             'glucose_value': round(rng.uniform(4.5, 9.0), 1),
+             'timestamp': start + timedelta(minutes=5 * step)}
+            for step in range(readings) for user_id in user_ids
+        ]
+        now = start + timedelta(minutes=5 * readings)
+        begin = time.perf_counter()
+        for record in records:
+            service.evaluate(record, now, index)
+        return (time.perf_counter() - begin) / len(records) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='短时血糖预测基准测试')
+    parser.add_argument('--users', type=int, default=100000, help='批量预测的活跃用户数')
+    parser.add_argument('--interval', type=int, default=5, help='读数间隔 (分钟)')
+    parser.add_argument('--ingest-users', type=int, default=1000, help='写入路径测试的用户数')
+    parser.add_argument('--readings', type=int, default=30, help='写入路径每位用户的读数条数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    seconds, forecasts = batch(args.users, args.interval, np.random.default_rng(args.seed))
+    ingest_us = ingest(args.ingest_users, args.readings, random.Random(args.seed))
+
+    print(f"批量: {args.users} 位用户 ({args.interval} 分钟间隔，{DEFAULT_HISTORY_MINUTES} 分钟历史) "
+          f"{seconds:.2f} 秒，{forecasts / seconds:,.0f} 次/秒")
+    print(f"写入路径 (1 条预测规则): {ingest_us:.1f} µs/条")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+血糖分位数草图基准测试
+Glucose Quantile Sketch Benchmark
+
+生成一年的5分钟间隔CGM模拟数据，比较：
+- 合并365个日草图 (从序列化形式读取) 计算分位数
+- 对全部原始值排序的精确计算
+
+用法: python scripts/benchmark_percentiles.py [--days 365] [--seed 42]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.utils.quantile_sketch import QuantileSketch  # noqa: E402
+
+PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+READINGS_PER_DAY = 288
+
+
+def simulate_day(rng):
+    """模拟一天的CGM读数 (昼夜节律 + 餐后峰 + 噪声)"""
+    values = []
+    for slot in range(READINGS_PER_DAY):
+        hour = slot / 12
+        value = 6.5 + 1.2 * math.sin((hour - 6) / 24 * 2 * math.pi)
+        for meal_hour in (7.5, 12.5, 18.5):
+            if 0 <= hour - meal_hour < 3:
+                value += 3.5 * math.exp(-((hour - meal_hour - 1) ** 2) / 0.5)
+        value += rng.gauss(0, 0.8)
+        values.append(round(min(max(value, 2.2), 22.2), 1))
+    return values
+
+
+def exact_percentiles(values, percentiles):
+    """排序后线性插值计算精确分位数"""
+    ordered = sorted(values)
+    results = []
+    for p in percentiles:
+        position = p / 100 * (len(ordered) - 1)
+        low, high = math.floor(position), math.ceil(position)
+        results.append(ordered[low] + (ordered[high] - ordered[low]) * (position - low))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='血糖分位数草图基准测试')
+    parser.add_argument('--days', type=int, default=365, help='模拟天数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    days = [simulate_day(rng) for _ in range(args.days)]
+    all_values = [value for day in days for value in day]
+    stored = [QuantileSketch.from_values(day).to_binary() for day in days]
+    sketch_bytes = sum(len(blob) for blob in stored)
+
+    print(f"读数: {len(all_values)}  日草图: {len(stored)}  "
+          f"草图总大小: {sketch_bytes / 1024:.1f} KB ({sketch_bytes / len(stored):.0f} B/天)")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        exact = exact_percentiles(all_values, PERCENTILES)
+    exact_ms = (time.perf_counter() - start) / args.repeat * 1000
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        merged = QuantileSketch()
+        for blob in stored:
+            merged.merge(QuantileSketch.from_binary(blob))
+        approx = merged.quantiles([p / 100 for p in PERCENTILES])
+    sketch_ms = (time.perf_counter() - start) / args.repeat * 1000
+
+    max_error = max(abs(a - e) for a, e in zip(approx, exact))
+    print(f"精确计算 (排序): {exact_ms:.1f} ms")
+    print(f"草图合并: {sketch_ms:.1f} ms")
+    print(f"最大绝对误差: {max_error:.4f} mmol/L (误差界 {QuantileSketch.ERROR_BOUND})")
+    for p, a, e in zip(PERCENTILES, approx, exact):
+        print(f"  P{p:<3} 草图 {a:6.2f}  精确 {e:6.2f}")
+
+    # 读取原始值的耗时 (数据库传输) 未计入，实际部署中精确计算需要传输全部原始记录
+    return 0 if max_error <= QuantileSketch.ERROR_BOUND + 1e-9 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
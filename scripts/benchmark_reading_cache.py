@@ -0,0 +1,77 @@
+"""
+最近读数缓存基准测试
+Recent Readings Cache Benchmark
+
+为若干用户加载最近3小时的5分钟间隔CGM模拟数据，测量：
+- 每个用户缓存条目的内存占用
+- 写入路径追加读数、最新记录与最近1小时读数查询的单次耗时
+
+数据库查询的耗时未计入，缓存未命中时的代价为一次按 (user_id, timestamp) 索引的范围查询。
+
+用法: python scripts/benchmark_reading_cache.py [--users 10000] [--interval 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.utils.reading_cache import ReadingCache  # noqa: E402
+
+WINDOW = timedelta(hours=3)
+
+
+def timed(operation, count):
+    """执行 count 次操作，返回单次平均耗时 (微秒)"""
+    start = time.perf_counter()
+    for index in range(count):
+        operation(index)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='最近读数缓存基准测试')
+    parser.add_argument('--users', type=int, default=10000, help='缓存的用户数')
+    parser.add_argument('--interval', type=int, default=5, help='读数间隔 (分钟)')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime(2025, 6, 15, 12, 0)
+    points = int(WINDOW.total_seconds() // 60 // args.interval)
+    cache = ReadingCache(window=WINDOW, max_users=args.users, max_bytes=1 << 40)
+    user_ids = [f'user{index:05d}' for index in range(args.users)]
+
+    for user_id in user_ids:
+        records = [{'_id': f'{user_id}-{point}', 'user_id': user_id, 'device_id': 'cgm-1',
+                    'timestamp': now - timedelta(minutes=(points - point) * args.interval),
+                    'glucose_value': round(rng.uniform(3.5, 12.0), 1)}
+                   for point in range(points)]
+        cache.set_latest(user_id, None, records[-1], cache.generation(user_id))
+        cache.load(user_id, records, now - WINDOW, cache.generation(user_id))
+
+    stats = cache.get_stats()
+    print(f"用户: {stats['users']}  每用户读数: {points}  "
+          f"缓存内存: {stats['bytes'] / 1024 / 1024:.1f} MB ({stats['bytes'] / stats['users']:.0f} B/用户)")
+
+    count = min(args.users, 10000)
+    since = now - timedelta(hours=1)
+    latest_us = timed(lambda index: cache.get_latest(user_ids[index]), count)
+    recent_us = timed(lambda index: cache.get_since(user_ids[index], since), count)
+    add_us = timed(lambda index: cache.add({
+        '_id': f'new-{index}', 'user_id': user_ids[index], 'device_id': 'cgm-1',
+        'timestamp': now + timedelta(minutes=1), 'glucose_value': 6.5
+    }), count)
+
+    print(f"最新记录查询: {latest_us:.1f} µs/次")
+    print(f"最近1小时读数查询: {recent_us:.1f} µs/次")
+    print(f"写入追加: {add_us:.1f} µs/次")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+血糖趋势时间桶基准测试
+Glucose Trend Bucketing Benchmark
+
+在独立的基准数据库中写入一年的5分钟间隔CGM模拟数据并重建汇总，
+对每种趋势粒度分别测量：
+- 原始记录按 $dateTrunc 分组 (ROLLUPS_ENABLED=False，默认分组方式)
+- 原始记录按本地日期分量分组 (ROLLUPS_ENABLED=False，MongoDB 5.0 以下的分组方式)
+- 默认数据来源 (长时间范围读取小时/日/月汇总，5/15分钟粒度仍读取原始记录)
+
+$dateTrunc 一列需要 MongoDB 5.0+，服务器不支持时该列显示为 "-"。基准数据库在结束时删除。
+
+用法: python scripts/benchmark_trends.py [--uri mongodb://localhost:27017/glucose_benchmark]
+      [--days 365] [--timezone Asia/Shanghai] [--repeat 3]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app, mongo  # noqa: E402
+from app.config import TestingConfig, config  # noqa: E402
+from app.services.rollup_service import RollupService  # noqa: E402
+from app.services.statistics_service import TREND_GRANULARITIES, StatisticsService  # noqa: E402
+
+USER_ID = 'benchmark'
+
+
+def generate_documents(days, seed):
+    """生成5分钟间隔的模拟血糖文档 (昼夜节律 + 噪声)"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    for i in range(days * 288):
+        hour = i / 12 % 24
+        value = 7.0 + 1.5 * math.sin((hour - 6) / 24 * 2 * math.pi) + rng.gauss(0, 1.2)
+        yield {
+            'user_id': USER_ID,
+            'device_id': 'cgm-1',
+            'timestamp': start + timedelta(minutes=5 * i),
+            'glucose_value': round(min(max(value, 2.2), 22.2), 1),
+            'unit': 'mmol/L'
+        }
+
+
+def measure(service, start, end, granularity, timezone, repeat):
+    """返回平均耗时 (毫秒) 与时间桶数"""
+    elapsed = 0.0
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        # 绕过结果缓存，测量实际计算
+        trends = service.get_glucose_trends.__wrapped__(
+            service, USER_ID, start, end, granularity=granularity, timezone=timezone
+        )
+        elapsed += time.perf_counter() - begin
+    return elapsed / repeat * 1000, len(trends)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='血糖趋势时间桶基准测试')
+    parser.add_argument('--uri', default='mongodb://localhost:27017/glucose_benchmark',
+                        help='基准数据库URI (运行结束时删除该数据库)')
+    parser.add_argument('--days', type=int, default=365, help='模拟天数')
+    parser.add_argument('--timezone', default='Asia/Shanghai', help='IANA时区名称')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    class BenchmarkConfig(TestingConfig):
+        MONGO_URI = args.uri
+        STATS_DEBUG_HEADERS = False
+
+    config['benchmark'] = BenchmarkConfig
+    app = create_app('benchmark')
+
+    with app.app_context():
+        mongo.db.glucose_records.create_index([('user_id', 1), ('timestamp', -1)])
+        batch = []
+        for document in generate_documents(args.days, args.seed):
+            batch.append(document)
+            if len(batch) >= 10000:
+                mongo.db.glucose_records.insert_many(batch)
+                batch = []
+        if batch:
+            mongo.db.glucose_records.insert_many(batch)
+        RollupService().rebuild(user_id=USER_ID)
+
+        service = StatisticsService()
+        start = datetime(2024, 1, 1)
+        end = start + timedelta(days=args.days) - timedelta(seconds=1)
+        print(f"读数: {args.days * 288}  时区: {args.timezone}")
+        print(f"{'粒度':<8}{'时间桶':>8}{'原始 $dateTrunc (ms)':>22}"
+              f"{'原始 日期分量 (ms)':>20}{'默认来源 (ms)':>16}")
+
+        try:
+            for granularity in TREND_GRANULARITIES:
+                app.config['ROLLUPS_ENABLED'] = False
+                service._date_trunc = False
+                parts_ms, bucket_count = measure(service, start, end, granularity,
+                                                 args.timezone, args.repeat)
+                service._date_trunc = None
+                if service._supports_date_trunc():
+                    trunc_ms, _ = measure(service, start, end, granularity,
+                                          args.timezone, args.repeat)
+                    trunc_column = f"{trunc_ms:>22.1f}"
+                else:
+                    trunc_column = f"{'-':>22}"
+                app.config['ROLLUPS_ENABLED'] = True
+                default_ms, _ = measure(service, start, end, granularity,
+                                        args.timezone, args.repeat)
+                print(f"{granularity:<8}{bucket_count:>8}{trunc_column}"
+                      f"{parts_ms:>20.1f}{default_ms:>16.1f}")
+        finally:
+            mongo.cx.drop_database(mongo.db.name)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+血糖变异性指标基准测试
+Glycemic Variability Indices Benchmark
+
+生成每位用户90天的5分钟间隔CGM模拟数据 (含传感器中断与时间抖动)，给出：
+- 向量化实现 (重采样 + MAGE/CONGA/MODD/LBGI/HBGI) 的单用户耗时
+- 在同一重采样序列上逐点循环的参考实现耗时，并校验两者结果一致
+
+用法: python scripts/benchmark_variability.py [--days 90] [--users 20]
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.analytics_core import GlucoseSeries  # noqa: E402
+from app.services.glycemic_variability import (  # noqa: E402
+    excursions, resample, variability_indices
+)
+
+INTERVAL = 300
+MAX_GAP = 900
+CONGA_HOURS = 1
+
+
+def simulate_user(days, rng):
+    """模拟一位用户的CGM读数 (昼夜节律 + 餐后峰 + 噪声 + 偶发传感器中断)"""
+    values, timestamps = [], []
+    start = 1_700_000_000
+    for slot in range(days * 288):
+        if rng.random() < 0.002:
+            continue
+        hour = (slot % 288) / 12
+        value = 6.5 + 1.2 * math.sin((hour - 6) / 24 * 2 * math.pi)
+        for meal_hour in (7.5, 12.5, 18.5):
+            if 0 <= hour - meal_hour < 3:
+                value += 3.5 * math.exp(-((hour - meal_hour - 1) ** 2) / 0.5)
+        value += rng.gauss(0, 0.8)
+        values.append(round(min(max(value, 2.2), 22.2), 1))
+        timestamps.append(start + slot * INTERVAL + rng.randint(-20, 20))
+    return GlucoseSeries(np.array(values), np.array(timestamps, dtype=np.int64))
+
+
+def reference_indices(series):
+    """参考实现：重采样后逐点循环计算"""
+    grid = resample(series, INTERVAL, MAX_GAP).tolist()
+    valid = [v for v in grid if not math.isnan(v)]
+    threshold = statistics.stdev(valid)
+
+    # MAGE：逐点检测拐点，按缺失数据分段
+    swings = []
+    segment = []
+    for value in grid + [math.nan]:
+        if not math.isnan(value):
+            if not segment or value != segment[-1]:
+                segment.append(value)
+            continue
+        if segment:
+            extrema = [segment[0]]
+            for i in range(1, len(segment) - 1):
+                if (segment[i] - segment[i - 1]) * (segment[i + 1] - segment[i]) < 0:
+                    extrema.append(segment[i])
+            if len(segment) > 1:
+                extrema.append(segment[-1])
+            swings.extend(excursions(extrema, threshold))
+        segment = []
+    counted = [abs(s) for s in swings if (s > 0) == (swings[0] > 0)]
+
+    def lagged(lag):
+        return [grid[i] - grid[i - lag] for i in range(lag, len(grid))
+                if not math.isnan(grid[i]) and not math.isnan(grid[i - lag])]
+
+    low_risk, high_risk = [], []
+    for value in valid:
+        f = 1.509 * (math.log(min(max(value * 18.018, 20.0), 600.0)) ** 1.084 - 5.381)
+        low_risk.append(10 * f * f if f < 0 else 0.0)
+        high_risk.append(10 * f * f if f > 0 else 0.0)
+
+    return {
+        'mage': sum(counted) / len(counted),
+        'conga': statistics.stdev(lagged(CONGA_HOURS * 12)),
+        'modd': statistics.mean(abs(d) for d in lagged(288)),
+        'lbgi': statistics.mean(low_risk),
+        'hbgi': statistics.mean(high_risk)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='血糖变异性指标基准测试')
+    parser.add_argument('--days', type=int, default=90, help='每位用户的模拟天数')
+    parser.add_argument('--users', type=int, default=20, help='用户数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    users = [simulate_user(args.days, rng) for _ in range(args.users)]
+
+    start = time.perf_counter()
+    results = [variability_indices(series, INTERVAL, MAX_GAP, CONGA_HOURS) for series in users]
+    vectorized_ms = (time.perf_counter() - start) / len(users) * 1000
+
+    start = time.perf_counter()
+    references = [reference_indices(series) for series in users]
+    reference_ms = (time.perf_counter() - start) / len(users) * 1000
+
+    all_equal = all(
+        math.isclose(result[name], reference[name], rel_tol=1e-9, abs_tol=1e-12)
+        for result, reference in zip(results, references)
+        for name in reference
+    )
+
+    print(f"用户: {len(users)}  每位用户读数: {len(users[0])} ({args.days} 天)")
+    print(f"向量化实现: {vectorized_ms:.1f} ms/用户")
+    print(f"逐点循环参考实现: {reference_ms:.1f} ms/用户 ({reference_ms / vectorized_ms:.1f}x)")
+    print(f"结果一致: {all_equal}")
+    sample = results[0]
+    print(f"示例: MAGE {sample['mage']:.2f} ({sample['mage_excursions']} 次波动)  "
+          f"CONGA-{CONGA_HOURS} {sample['conga']:.2f}  MODD {sample['modd']:.2f}  "
+          f"LBGI {sample['lbgi']:.2f}  HBGI {sample['hbgi']:.2f}")
+
+    return 0 if all_equal else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
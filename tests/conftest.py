@@ -36,6 +36,7 @@ def clean_db(app):
         mongo.db.users.delete_many({})
         mongo.db.devices.delete_many({})
         mongo.db.glucose_records.delete_many({})
+        mongo.db.glucose_rollups.delete_many({})
         
         yield
         
@@ -43,6 +44,7 @@ def clean_db(app):
         mongo.db.users.delete_many({})
         mongo.db.devices.delete_many({})
         mongo.db.glucose_records.delete_many({})
+        mongo.db.glucose_rollups.delete_many({})
 
 
 @pytest.fixture
@@ -0,0 +1,216 @@
+"""
+血糖告警测试
+Glucose Alert Tests
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+from marshmallow import ValidationError
+from pymongo.errors import DuplicateKeyError
+
+from app.models.alert import AlertRuleSchema
+from app.services.alert_service import (
+    ACTION_FIRE,
+    ACTION_RENOTIFY,
+    ACTION_RESOLVE,
+    AlertService,
+    advance,
+    compile_rule,
+    should_notify
+)
+from app.utils.alert_index import AlertRuleIndex, RuleState, UserAlerts
+
+NOW = datetime(2025, 6, 15, 12, 0)
+MAX_GAP = timedelta(minutes=15)
+RENOTIFY = timedelta(minutes=30)
+
+
+def rule(rule_id='r1', rule_type='threshold', condition='below', value=3.9, duration=0,
+         device_id=None):
+    """已编译的规则"""
+    return compile_rule({'_id': rule_id, 'name': rule_id, 'rule_type': rule_type,
+                         'condition': condition, 'value': value, 'duration_minutes': duration,
+                         'device_id': device_id})
+
+
+def replay(compiled, values, state=None, interval=5):
+    """按5分钟间隔依次评估读数 (最后一条在 NOW)，返回每条读数的动作"""
+    state = state or RuleState()
+    start = NOW - timedelta(minutes=interval * (len(values) - 1))
+    return [
+        advance(compiled, state, start + timedelta(minutes=interval * index), value, None,
+                MAX_GAP, RENOTIFY, start + timedelta(minutes=interval * index))
+        for index, value in enumerate(values)
+    ]
+
+
+class TestRuleEvaluation:
+    """规则评估测试类"""
+
+    def test_sustained_rule_fires_once_then_resolves(self):
+        """测试条件持续满足规定时长后触发一次，不满足时解除"""
+        actions = replay(rule(condition='above', value=13.9, duration=15),
+                         [12.0, 14.5, 15.0, 15.2, 15.5, 15.1, 12.0, 11.0])
+
+        assert actions == [ACTION_RESOLVE, None, None, None, ACTION_FIRE, None, ACTION_RESOLVE, None]
+
+    def test_gap_restarts_duration(self):
+        """测试读数间隔超过上限时持续时间重新计时"""
+        compiled = rule(duration=10)
+        state = RuleState()
+        replay(compiled, [3.5, 3.4], state)
+
+        late = NOW + timedelta(minutes=30)
+        assert advance(compiled, state, late, 3.3, None, MAX_GAP, RENOTIFY, late) is None
+        assert state.breach_start == late
+
+    def test_renotify_and_out_of_order(self):
+        """测试满足期间按间隔重复通知，乱序读数不改变状态"""
+        compiled = rule()
+        state = RuleState()
+        state.open = False
+        actions = replay(compiled, [3.5] * 8, state)
+
+        assert actions == [ACTION_FIRE] + [None] * 5 + [ACTION_RENOTIFY, None]
+        assert advance(compiled, state, NOW - timedelta(minutes=1), 5.0, None,
+                       MAX_GAP, RENOTIFY, NOW) is None
+        assert state.extreme == 3.5
+
+    def test_rate_rule_needs_rate(self):
+        """测试速率规则按变化速率判断，速率未知时不满足"""
+        falling = rule(rule_type='rate', condition='falling', value=0.1)
+
+        assert falling.breached(6.0, -0.12)
+        assert not falling.breached(6.0, -0.05)
+        assert not falling.breached(6.0, None)
+
+    def test_condition_must_match_rule_type(self):
+        """测试条件与规则类型不匹配时验证失败"""
+        with pytest.raises(ValidationError):
+            AlertRuleSchema().load({'name': 'x', 'rule_type': 'rate', 'condition': 'below',
+                                    'value': 0.1})
+
+
+class TestNotification:
+    """通知去重与暂停测试类"""
+
+    def test_should_notify(self):
+        """测试首次通知、重复通知间隔、确认与暂停"""
+        alert = {'notified_at': None, 'acknowledged_at': None, 'snoozed_until': None}
+
+        assert should_notify(alert, None, NOW, RENOTIFY)
+        assert not should_notify({**alert, 'notified_at': NOW - timedelta(minutes=10)},
+                                 None, NOW, RENOTIFY)
+        assert should_notify({**alert, 'notified_at': NOW - timedelta(minutes=30)},
+                             None, NOW, RENOTIFY)
+        assert not should_notify({**alert, 'acknowledged_at': NOW}, None, NOW, RENOTIFY)
+        assert not should_notify({**alert, 'snoozed_until': NOW + timedelta(minutes=1)},
+                                 None, NOW, RENOTIFY)
+        assert not should_notify(alert, NOW + timedelta(minutes=1), NOW, RENOTIFY)
+
+    def test_concurrent_fire_merges_into_existing_alert(self, app):
+        """测试其他进程同时创建告警时合并到已有告警，notified_at 条件更新保证只通知一次"""
+        service = AlertService()
+        service.collection = MagicMock()
+        existing = {'_id': 'a1', 'user_id': 'u1', 'rule_name': 'r1', 'severity': 'urgent',
+                    'value': 3.0, 'notified_at': None}
+        service.collection.find_one_and_update.side_effect = [DuplicateKeyError('dup'), existing]
+        service.collection.update_one.return_value = MagicMock(modified_count=0)
+        action = {'action': ACTION_FIRE, 'rule': rule(), 'user_id': 'u1', 'device_id': 'd1',
+                  'timestamp': NOW, 'value': 3.0, 'rate': None, 'forecast': None,
+                  'breach_start': NOW, 'extreme': 3.0}
+
+        assert service._touch(action, NOW, upsert=True) is False
+        assert service.collection.find_one_and_update.call_count == 2
+        assert service.collection.update_one.call_args[0][0] == {'_id': 'a1', 'notified_at': None}
+
+
+class TestRuleIndex:
+    """规则索引测试类"""
+
+    def test_rules_loaded_once_per_user(self, app):
+        """测试规则 (包括没有规则的用户) 只在第一次写入时加载，只评估匹配设备的规则"""
+        service = AlertService()
+        service.rules_collection = MagicMock()
+        service.rules_collection.find.side_effect = lambda query: (
+            [{'_id': 'r1', 'name': 'low', 'rule_type': 'threshold', 'condition': 'below',
+              'value': 3.9, 'device_id': 'd1'}] if query['user_id'] == 'u1' else []
+        )
+        index = AlertRuleIndex()
+
+        for minutes in (10, 5, 0):
+            for user_id, device_id in (('u1', 'd1'), ('u1', 'd2'), ('u2', 'd1')):
+                record = {'user_id': user_id, 'device_id': device_id, 'glucose_value': 3.0,
+                          'timestamp': NOW - timedelta(minutes=minutes)}
+                actions = service.evaluate(record, NOW, index)
+                if user_id == 'u1' and device_id == 'd1' and minutes == 10:
+                    assert [action['action'] for action in actions] == [ACTION_FIRE]
+                else:
+                    assert actions == []
+
+        assert service.rules_collection.find.call_count == 2
+        assert service.evaluate({'user_id': 'u1', 'device_id': 'd1', 'glucose_value': 3.0,
+                                 'timestamp': NOW - timedelta(hours=1)}, NOW, index) == []
+
+    def test_reload_keeps_state_of_unchanged_rules(self):
+        """测试重新加载时保留条件未变化的规则状态，丢弃被修改规则的状态，加载期间规则被修改时不保存"""
+        index = AlertRuleIndex()
+        entry = index.load('u1', (rule('r1'), rule('r2')), index.generation('u1'))
+        entry.state('r1', 'd1').open = True
+        entry.state('r2', 'd1').open = True
+
+        generation = index.generation('u1')
+        index.invalidate('u1')
+        assert index.get('u1') is None
+        assert index.load('u1', (rule('r1'),), generation) is None
+
+        entry = index.load('u1', (rule('r1'), rule('r2', value=3.0)), index.generation('u1'))
+        assert set(entry.states) == {('r1', 'd1')}
+        assert index.get('u1') is entry
+
+
+class TestRecentReadings:
+    """速率与预测规则的最近读数测试类"""
+
+    def test_out_of_order_reading_is_kept_in_order(self):
+        """测试乱序到达的读数插入到对应位置，只返回该读数及之前的读数，补齐后不再视为有间隔"""
+        entry = UserAlerts(())
+        window = timedelta(minutes=20)
+        times = [NOW + timedelta(minutes=5 * index) for index in range(5)]
+        for index in (0, 1, 3):
+            entry.recent('d1', times[index], 6.0 + index, window)
+        assert entry.has_gap('d1', times[4], window, timedelta(minutes=7))
+
+        late = entry.recent('d1', times[2], 8.0, window)
+
+        assert late == [(times[0], 6.0), (times[1], 7.0), (times[2], 8.0)]
+        assert [point[0] for point in entry.tails['d1']] == times[:4]
+        assert not entry.has_gap('d1', times[4], window, timedelta(minutes=7))
+
+    def test_forecast_reseeds_gaps_from_reading_cache(self, app):
+        """测试其他进程写入的读数造成间隔时从最近读数缓存补齐后预测"""
+        service = AlertService()
+        service.rules_collection = MagicMock()
+        service.rules_collection.find.return_value = [
+            {'_id': 'r1', 'name': 'predicted low', 'rule_type': 'forecast',
+             'condition': 'below', 'value': 3.9}
+        ]
+        index = AlertRuleIndex()
+        times = [NOW + timedelta(minutes=5 * step) for step in range(10)]
+        records = [{'user_id': 'u1', 'device_id': 'd1', 'timestamp': timestamp,
+                    'glucose_value': round(8.0 - 0.4 * step, 1)}
+                   for step, timestamp in enumerate(times)]
+
+        # 本进程只收到前3条与最后一条，其余写入了其他进程，本进程的缓存从数据库加载了全部读数
+        for record in records[:3]:
+            actions = service.evaluate(record, record['timestamp'], index)
+            assert ACTION_FIRE not in [action['action'] for action in actions]
+        cache = app.extensions['reading_cache']
+        cache.load('u1', records, NOW - timedelta(hours=1), cache.generation('u1'))
+        actions = service.evaluate(records[-1], times[-1], index)
+
+        assert [action['action'] for action in actions] == [ACTION_FIRE]
+        assert actions[0]['forecast'] == pytest.approx(2.0)
+        assert len(index.get('u1').tails['d1']) == 10
@@ -0,0 +1,144 @@
+"""
+血糖分析计算核心测试
+Glucose Analytics Core Tests
+"""
+
+import calendar
+import statistics
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.services.analytics_core import (
+    DEFAULT_GLUCOSE_TARGETS,
+    GlucoseSeries,
+    cgm_metrics,
+    exact_mean,
+    grouped_percentiles,
+    grouped_stats,
+    range_counts,
+    summarize,
+    tir_tiers
+)
+from app.models.user import GlucoseTargetsSchema
+from app.services.rollup_service import DISTRIBUTION_RANGES, classify_range
+
+
+class TestAnalyticsCore:
+    """分析计算核心测试类"""
+
+    def test_series_from_documents_in_batches(self):
+        """测试分批读入的数组与文档一致"""
+        start = datetime(2025, 6, 1, 23, 50)
+        documents = [
+            {'timestamp': start + timedelta(minutes=5 * i), 'glucose_value': 5.0 + i / 10}
+            for i in range(7)
+        ]
+
+        series = GlucoseSeries.from_documents(iter(documents), batch_size=3)
+
+        assert series.values.dtype == np.float64
+        assert series.timestamps.dtype == np.int64
+        assert series.values.tolist() == [d['glucose_value'] for d in documents]
+        assert series.timestamps[0] == calendar.timegm(start.utctimetuple())
+        assert series.hours_of_day().tolist() == [23, 23, 0, 0, 0, 0, 0]
+        assert series.minutes_of_day()[2] == 0
+
+    def test_summary_matches_statistics_module(self):
+        """测试统计量与 statistics 模块一致 (含 .xx5 舍入边界)"""
+        values = [14.25, 13.57, 13.01, 13.31, 13.31, 12.5]
+        result = summarize(np.array(values))
+
+        assert result['mean'] == statistics.mean(values)
+        assert round(result['mean'], 2) == round(statistics.mean(values), 2)
+        assert round(result['std'], 6) == round(statistics.stdev(values), 6)
+        assert result['high_count'] == 6
+        assert exact_mean(np.array([6.1, 6.1, 6.1, 6.2])) == statistics.mean([6.1, 6.1, 6.1, 6.2])
+
+    def test_range_counts_half_open(self):
+        """测试范围计数与 classify_range 的半开区间一致"""
+        values = np.array([2.8, 3.9, 7.8, 11.1, 50.0, 1.0, 7.79])
+        counts = range_counts(values, DISTRIBUTION_RANGES)
+
+        expected = [
+            sum(1 for v in values if classify_range(v) == r['key'])
+            for r in DISTRIBUTION_RANGES
+        ]
+        assert counts == expected
+
+    def test_grouped_stats(self):
+        """测试按键分组的计数/总和/最值"""
+        keys = np.array([3, 1, 3, 2, 1], dtype=np.int64)
+        values = np.array([5.0, 4.0, 7.0, 6.0, 8.0])
+
+        result = grouped_stats(keys, values)
+
+        assert result['keys'].tolist() == [1, 2, 3]
+        assert result['count'].tolist() == [2, 1, 2]
+        assert result['sum'].tolist() == [12.0, 6.0, 12.0]
+        assert result['min'].tolist() == [4.0, 6.0, 5.0]
+        assert result['max'].tolist() == [8.0, 6.0, 7.0]
+
+    def test_grouped_percentiles_match_numpy(self):
+        """测试分组百分位与 numpy.percentile 一致，空组为NaN"""
+        rng = np.random.default_rng(7)
+        keys = rng.integers(0, 96, 20000)
+        values = np.round(rng.uniform(2.0, 20.0, 20000), 1)
+        percentiles = [5, 25, 50, 75, 95]
+
+        counts, bands = grouped_percentiles(keys, values, percentiles, 100)
+
+        for key in (0, 37, 95):
+            expected = np.percentile(values[keys == key], percentiles)
+            assert np.allclose(bands[key], expected)
+            assert counts[key] == np.count_nonzero(keys == key)
+        assert counts[96:].tolist() == [0, 0, 0, 0]
+        assert np.isnan(bands[96:]).all()
+
+    def test_tir_tiers_boundaries(self):
+        """测试共识分层边界：3.0 属低、3.9 与 10.0 属目标范围、13.9 属高"""
+        values = np.array([2.9, 3.0, 3.8, 3.9, 10.0, 10.1, 13.9, 14.0])
+
+        tiers = tir_tiers(values, DEFAULT_GLUCOSE_TARGETS)
+
+        assert tiers.tolist() == [0, 1, 1, 2, 2, 3, 3, 4]
+
+    def test_cgm_metrics_time_weighted(self):
+        """测试时间加权：传感器中断期间的读数只计最大间隔，GMI按共识公式"""
+        start = datetime(2025, 6, 1)
+        # 3条目标范围内读数 (5分钟间隔)，中断2小时后 1条高值读数
+        offsets = [0, 5, 10, 130]
+        series = GlucoseSeries(
+            np.array([6.0, 7.0, 8.0, 12.0]),
+            np.array([calendar.timegm((start + timedelta(minutes=m)).utctimetuple())
+                      for m in offsets], dtype=np.int64)
+        )
+
+        metrics = cgm_metrics(series, 3 * 3600, DEFAULT_GLUCOSE_TARGETS,
+                              expected_interval=300, max_gap=900)
+
+        assert metrics['tier_counts']['in_range'] == 3
+        assert metrics['tier_counts']['high'] == 1
+        # 5 + 5 + 15 (截断) 分钟属目标范围，最后一条计 5 分钟
+        assert metrics['tier_seconds']['in_range'] == 25 * 60
+        assert metrics['tier_seconds']['high'] == 5 * 60
+        assert metrics['covered_seconds'] == 30 * 60
+        assert round(metrics['wear_percentage'], 2) == round(30 / 180 * 100, 2)
+        mean = statistics.mean([6.0, 7.0, 8.0, 12.0])
+        assert round(metrics['gmi'], 4) == round(3.31 + 0.02392 * mean * 18.018, 4)
+        assert round(metrics['cv'], 6) == round(statistics.stdev([6.0, 7.0, 8.0, 12.0]) / mean * 100, 6)
+
+
+class TestGlucoseTargetsSchema:
+    """个人血糖目标范围验证测试类"""
+
+    def test_partial_targets_are_checked_against_defaults(self):
+        """测试只提供部分阈值时与默认值合并后验证递增"""
+        schema = GlucoseTargetsSchema()
+
+        assert not schema.validate({'low': 4.4, 'high': 7.8})
+        # low 高于默认 high (10.0)
+        assert schema.validate({'low': 11})
+        # very_high 低于默认 high (10.0)
+        assert schema.validate({'very_high': 9.0})
+        assert not schema.validate({'high': 12.0, 'very_high': 16.0})
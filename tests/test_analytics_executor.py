@@ -0,0 +1,112 @@
+"""
+分析计算进程池测试
+Analytics Process Pool Tests
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.services.analytics_core import grouped_percentiles
+from app.services.glycemic_variability import grouped_variability_indices
+from app.utils.analytics_executor import AnalyticsExecutor
+from app.utils.query_pool import QueryDeadlineExceeded
+
+
+def slow_sum(values, seconds):
+    """耗时的计算 (子进程导入本模块执行)"""
+    time.sleep(seconds)
+    return float(values.sum())
+
+
+@pytest.fixture(scope='module')
+def executor():
+    """阈值很小的进程池 (测试数据都会提交到子进程)"""
+    pool = AnalyticsExecutor(max_workers=1, inline_max_points=100, timeout=60)
+    yield pool
+    pool.shutdown()
+
+
+class TestAnalyticsExecutor:
+    """分析计算进程池测试类"""
+
+    def test_offloaded_percentiles_match_inline(self, executor):
+        """测试子进程经共享内存计算的分组百分位与当前线程计算一致"""
+        rng = np.random.default_rng(7)
+        keys = rng.integers(0, 96, 5000)
+        values = rng.uniform(2.0, 15.0, 5000)
+
+        counts, bands = executor.run(grouped_percentiles, {'keys': keys, 'values': values},
+                                     percentiles=[5, 50, 95], group_count=96)
+        expected_counts, expected_bands = grouped_percentiles(keys, values, [5, 50, 95], 96)
+
+        np.testing.assert_array_equal(counts, expected_counts)
+        np.testing.assert_allclose(bands, expected_bands)
+        stats = executor.get_stats()
+        assert stats['offloaded'] == 1
+        assert stats['shared_bytes'] >= keys.nbytes + values.nbytes
+
+    def test_offloaded_variability_matches_inline(self, executor):
+        """测试按用户分组的变异性指标在子进程中计算结果不变"""
+        rng = np.random.default_rng(11)
+        timestamps = np.tile(np.arange(0, 3 * 86400, 300, dtype=np.int64), 2)
+        values = 7.0 + 3.0 * np.sin(timestamps / 7200.0) + rng.normal(0, 0.3, len(timestamps))
+        codes = np.repeat(np.arange(2, dtype=np.int64), len(timestamps) // 2)
+        arrays = {'values': values, 'timestamps': timestamps, 'codes': codes}
+        params = {'group_count': 2, 'interval': 300, 'max_gap': 900, 'conga_hours': 1}
+
+        assert executor.run(grouped_variability_indices, arrays, **params) == \
+            grouped_variability_indices(**arrays, **params)
+
+    def test_small_inputs_stay_inline(self, executor):
+        """测试数组元素总数不超过阈值时在当前线程计算"""
+        before = executor.get_stats()
+
+        counts, _ = executor.run(grouped_percentiles,
+                                 {'keys': np.zeros(10, dtype=np.int64), 'values': np.ones(10)},
+                                 percentiles=[50], group_count=1)
+
+        assert counts.tolist() == [10]
+        stats = executor.get_stats()
+        assert stats['inline'] == before['inline'] + 1
+        assert stats['offloaded'] == before['offloaded']
+
+
+class TestExecutorFailures:
+    """进程池超时与重建测试类"""
+
+    def test_timeout_raises_deadline_and_restarts_pool(self):
+        """测试等待超时抛出 QueryDeadlineExceeded，终止运行中的计算后新进程池可继续使用"""
+        pool = AnalyticsExecutor(max_workers=1, inline_max_points=10, timeout=5)
+        try:
+            assert pool.run(slow_sum, {'values': np.ones(100)}, seconds=0) == 100.0
+            old = pool._pool
+            pool.timeout = 0.5
+
+            with pytest.raises(QueryDeadlineExceeded):
+                pool.run(slow_sum, {'values': np.ones(100)}, seconds=30)
+
+            assert pool._pool is not old
+            pool.timeout = 60
+            assert pool.run(slow_sum, {'values': np.ones(100)}, seconds=0) == 100.0
+            stats = pool.get_stats()
+            assert stats['timeouts'] == 1
+            assert stats['pool_restarts'] == 1
+        finally:
+            pool.shutdown()
+
+    def test_concurrent_callers_replace_pool_once(self):
+        """测试多个调用方同时发现进程池损坏时只重建一次"""
+        pool = AnalyticsExecutor(max_workers=1)
+        old = pool._pool
+        threads = [threading.Thread(target=pool._replace_pool, args=(old,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert pool.get_stats()['pool_restarts'] == 1
+        old.shutdown()
+        pool.shutdown()
@@ -0,0 +1,166 @@
+"""
+统计结果缓存测试
+Statistics Result Cache Tests
+"""
+
+from datetime import datetime
+
+import pytest
+
+from app.utils.cache import (
+    MemoryCacheBackend,
+    RedisCacheBackend,
+    cached_statistics,
+    get_stats_cache
+)
+
+
+class CountingService:
+    """记录实际计算次数的统计服务"""
+
+    def __init__(self):
+        self.calls = 0
+
+    @cached_statistics('summary')
+    def get_summary(self, user_id, start_date, end_date, device_id=None):
+        self.calls += 1
+        return {'user_id': user_id, 'start': start_date, 'end': end_date}
+
+
+class TestMemoryCacheBackend:
+    """进程内缓存后端测试类"""
+
+    def test_lru_eviction_by_entries_and_bytes(self):
+        """测试超过条目数或内存上限时淘汰最久未使用的条目"""
+        backend = MemoryCacheBackend(max_entries=2, max_bytes=10)
+        backend.set('a', b'1111', 60, 'u1', 0, 100, 0)
+        backend.set('b', b'2222', 60, 'u1', 0, 100, 0)
+        assert backend.get('a') == b'1111'
+
+        backend.set('c', b'3333', 60, 'u1', 0, 100, 0)
+        assert backend.get('b') is None
+        assert backend.get('a') == b'1111'
+
+        backend.set('d', b'444444', 60, 'u1', 0, 100, 0)
+        assert backend.stats()['bytes'] <= 10
+        assert backend.evictions == 2
+
+    def test_ttl_expiration(self):
+        """测试过期条目不再返回"""
+        backend = MemoryCacheBackend()
+        backend.set('a', b'1', 0, 'u1', 0, 100, 0)
+
+        assert backend.get('a') is None
+        assert backend.expirations == 1
+
+    def test_invalidate_only_covering_ranges(self):
+        """测试仅失效时间范围覆盖记录时间的条目"""
+        backend = MemoryCacheBackend()
+        backend.set('jan', b'1', 60, 'u1', 0, 100, 0)
+        backend.set('feb', b'2', 60, 'u1', 200, 300, 0)
+        backend.set('other', b'3', 60, 'u2', 0, 100, 0)
+
+        assert backend.invalidate('u1', 50) == 1
+        assert backend.get('jan') is None
+        assert backend.get('feb') == b'2'
+        assert backend.get('other') == b'3'
+        assert backend.generation('u1') == 1
+
+    def test_set_skips_when_invalidated_during_compute(self):
+        """测试计算期间发生失效时不写入 (代数比较与写入在同一锁内)"""
+        backend = MemoryCacheBackend()
+        generation = backend.generation('u1')
+        backend.invalidate('u1', 50)
+
+        assert not backend.set('a', b'1', 60, 'u1', 0, 100, generation)
+        assert backend.get('a') is None
+        assert backend.set('a', b'1', 60, 'u1', 0, 100, backend.generation('u1'))
+
+    def test_generations_are_bounded_without_reuse(self):
+        """测试失效代数的用户数有上限，淘汰后代数不会回到之前读取的值"""
+        backend = MemoryCacheBackend(max_generations=2)
+        generation = backend.generation('u1')
+        backend.invalidate('u1', 0)
+        backend.invalidate('u2', 0)
+        backend.invalidate('u3', 0)
+
+        assert backend.stats()['generations'] == 2
+        assert backend.generation('u1') != generation
+        assert not backend.set('a', b'1', 60, 'u1', 0, 100, generation)
+
+
+class TestRedisCacheBackend:
+    """Redis 缓存后端测试类 (fakeredis 执行 Lua 脚本)"""
+
+    @pytest.fixture
+    def backend(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa')
+        return RedisCacheBackend(client=fakeredis.FakeRedis())
+
+    def test_stale_generation_rejected(self, backend):
+        """测试失效后以计算开始前读取的代数写入被拒绝"""
+        generation = backend.generation('u1')
+        assert backend.generation('u1') == generation
+        assert backend.set('k1', b'fresh', 60, 'u1', 0, 100, generation)
+
+        assert backend.invalidate('u1', 500) == 0
+        assert not backend.set('k2', b'stale', 60, 'u1', 0, 100, generation)
+        assert backend.get('k1') == b'fresh'
+        assert backend.get('k2') is None
+        assert backend.set('k2', b'fresh', 60, 'u1', 0, 100, backend.generation('u1'))
+
+    def test_invalidate_by_record_time(self, backend):
+        """测试只删除时间范围包含记录时间的缓存项并从用户索引中移除，不影响其他用户"""
+        generation = backend.generation('u1')
+        backend.set('k1', b'a', 60, 'u1', 0, 100, generation)
+        backend.set('k2', b'b', 60, 'u1', 200, 300, generation)
+        backend.set('k3', b'c', 60, 'u2', 200, 300, backend.generation('u2'))
+
+        assert backend.invalidate('u1', 250) == 1
+        assert backend.get('k1') == b'a'
+        assert backend.get('k2') is None
+        assert backend.get('k3') == b'c'
+        assert set(backend.client.hkeys(backend._index_key('u1'))) == {b'k1'}
+
+    def test_missing_generation_key_fails_closed(self, backend):
+        """测试代数键被删除 (淘汰) 后写入被拒绝，重新创建的代数与之前不同"""
+        generation = backend.generation('u1')
+        backend.client.delete(backend._generation_key('u1'))
+
+        assert not backend.set('k1', b'a', 60, 'u1', 0, 100, generation)
+        assert backend.generation('u1') != generation
+
+
+class TestCachedStatistics:
+    """统计结果缓存装饰器测试类"""
+
+    def test_quantized_ranges_share_entry(self, app):
+        """测试量化粒度内的相近查询共用缓存项"""
+        service = CountingService()
+        first = service.get_summary('u1', datetime(2025, 6, 1, 8, 0, 5), datetime(2025, 6, 30, 8, 0, 5))
+        second = service.get_summary('u1', datetime(2025, 6, 1, 8, 0, 40), datetime(2025, 6, 30, 8, 0, 40))
+
+        assert service.calls == 1
+        assert first == second
+        # 量化只用于缓存键，方法按原始范围计算
+        assert first['start'] == datetime(2025, 6, 1, 8, 0, 5)
+        assert first['end'] == datetime(2025, 6, 30, 8, 0, 5)
+
+        stats = get_stats_cache().get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+
+    def test_write_inside_range_invalidates(self, app):
+        """测试范围内的写入使缓存失效，范围外的写入不影响"""
+        service = CountingService()
+        start, end = datetime(2025, 6, 1), datetime(2025, 6, 30)
+        service.get_summary('u1', start, end, device_id='d1')
+
+        get_stats_cache().invalidate('u1', datetime(2025, 7, 15))
+        service.get_summary('u1', start, end, device_id='d1')
+        assert service.calls == 1
+
+        get_stats_cache().invalidate('u1', datetime(2025, 6, 15))
+        service.get_summary('u1', start, end, device_id='d1')
+        assert service.calls == 2
@@ -0,0 +1,113 @@
+"""
+研究队列统计测试
+Cohort Analytics Tests
+"""
+
+from unittest.mock import patch
+
+import pytest
+from flask import current_app
+from flask_jwt_extended import create_access_token
+
+from app.models.user import ROLE_PATIENT
+from app.services.cohort_service import CohortAccumulator, histogram, parse_cohort_definition
+from app.services.rollup_service import GlucoseAggregate
+from app.utils.job_runner import JobRunner
+
+
+def user_aggregates(values, hour):
+    """一位用户的合计与按小时聚合量 (读数都在同一小时)"""
+    total = GlucoseAggregate()
+    for value in values:
+        total.add(value)
+    return total, {hour: GlucoseAggregate().merge(total)}
+
+
+class TestCohortAccumulator:
+    """队列统计中间结果测试类"""
+
+    def test_partitions_merge_to_same_result(self):
+        """测试按用户分区累积后合并与一次累积的结果一致"""
+        users = [user_aggregates([5.0, 6.0, 9.0], 8), user_aggregates([3.0, 7.0], 8),
+                 user_aggregates([12.0, 13.0, 6.5], 20)]
+
+        whole = CohortAccumulator()
+        for total, by_hour in users:
+            whole.add_user(total, by_hour)
+        first, second = CohortAccumulator(), CohortAccumulator()
+        first.add_user(*users[0])
+        second.add_user(*users[1])
+        second.add_user(*users[2])
+
+        assert first.merge(second).result() == whole.result()
+        result = whole.result()
+        assert result['users_with_data'] == 3
+        assert [row['hour'] for row in result['hourly_patterns']] == [8, 20]
+        assert result['hourly_patterns'][0]['user_count'] == 2
+
+    def test_users_below_min_readings_are_excluded(self):
+        """测试读数不足的用户不计入群体统计"""
+        accumulator = CohortAccumulator(min_readings=3)
+        accumulator.add_user(*user_aggregates([5.0, 6.0], 0))
+        accumulator.add_user(*user_aggregates([5.0, 6.0, 7.0], 0))
+
+        result = accumulator.result()
+        assert result['users_with_data'] == 1
+        assert result['users_without_data'] == 1
+        assert result['total_records'] == 3
+
+    def test_histogram_open_ended_bins(self):
+        """测试直方图区间左闭右开，首尾区间不设下限/上限"""
+        bins = histogram([0.0, 10.0, 95.0, 100.0], [10, 50, 90])
+
+        assert [row['users'] for row in bins] == [1, 1, 0, 2]
+        assert bins[0]['min'] is None and bins[-1]['max'] is None
+        assert bins[-1]['percentage'] == 50.0
+
+
+class TestCohortDefinition:
+    """队列定义解析测试类"""
+
+    def test_attribute_and_id_definitions(self, app):
+        """测试属性条件与用户ID列表的解析"""
+        assert parse_cohort_definition({'age_min': '40', 'age_max': 49, 'gender': 'female'}) == \
+            {'age_min': 40, 'age_max': 49, 'gender': 'female'}
+        assert parse_cohort_definition({'user_ids': ['b', 'a', 'b']}) == {'user_ids': ['a', 'b']}
+
+    @pytest.mark.parametrize('definition', [
+        {},
+        {'age_min': 50, 'age_max': 40},
+        {'gender': 'unknown'},
+        {'user_ids': []},
+        {'user_ids': ['a'], 'gender': 'male'}
+    ])
+    def test_invalid_definitions(self, app, definition):
+        """测试空定义、年龄段颠倒、未知性别与条件混用报错"""
+        with pytest.raises(ValueError):
+            parse_cohort_definition(definition)
+
+    def test_patient_cannot_create_jobs(self, client):
+        """测试患者角色创建队列任务返回403"""
+        token = create_access_token(identity='6650f0c2a1b2c3d4e5f60718')
+        with patch('app.services.user_service.UserService.get_role', return_value=ROLE_PATIENT):
+            response = client.post('/api/cohorts/jobs', json={'cohort': {'gender': 'male'}},
+                                   headers={'Authorization': f'Bearer {token}'})
+
+        assert response.status_code == 403
+
+
+class TestJobRunner:
+    """后台任务线程池测试类"""
+
+    def test_map_keeps_order_with_app_context(self, app):
+        """测试分区并发计算按分区顺序返回，分区函数可访问应用上下文"""
+        runner = JobRunner(job_workers=1, partition_workers=3)
+
+        def square(value):
+            assert current_app.config['TESTING']
+            return value * value
+
+        assert runner.map(square, range(10)) == [value * value for value in range(10)]
+        assert runner.submit(runner.map, square, [2, 3]).result(timeout=5) == [4, 9]
+        assert runner.get_stats()['completed'] == 1
+        runner.shutdown()
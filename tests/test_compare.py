@@ -0,0 +1,56 @@
+"""
+时间段对比测试
+Period Comparison Tests
+"""
+
+from datetime import datetime
+
+from app.services.rollup_service import GlucoseAggregate
+from app.services.statistics_service import StatisticsService, comparison_deltas
+
+
+def period_result(values, tier_counts):
+    """由血糖值与分层读数构造时间段结果"""
+    service = StatisticsService.__new__(StatisticsService)
+    aggregate = GlucoseAggregate()
+    for value in values:
+        aggregate.add(value)
+    return {
+        'summary': service._statistics_from_aggregate(aggregate, datetime(2025, 6, 1),
+                                                      datetime(2025, 6, 15)),
+        'time_in_ranges': StatisticsService._tir_from_counts(tier_counts, aggregate.count),
+        'distribution': service._distribution_from_aggregate(aggregate)
+    }
+
+
+class TestComparisonDeltas:
+    """时间段对比差值测试类"""
+
+    def test_deltas_are_period_minus_baseline(self):
+        """测试差值为对比时间段减基准"""
+        baseline = period_result([5.0, 6.0, 12.0, 3.5],
+                                 {'very_low': 0, 'low': 1, 'in_range': 2, 'high': 1, 'very_high': 0})
+        period = period_result([5.0, 6.0],
+                               {'very_low': 0, 'low': 0, 'in_range': 2, 'high': 0, 'very_high': 0})
+
+        deltas = comparison_deltas(baseline, period)
+
+        assert deltas['total_records'] == -2
+        assert deltas['avg_glucose'] == round(5.5 - 6.625, 2)
+        assert deltas['tir'] == 50.0
+        assert deltas['tbr'] == -25.0
+        assert deltas['distribution']['normal'] == 50.0
+        assert deltas['distribution']['high'] == -25.0
+
+    def test_empty_period_has_no_deltas(self):
+        """测试无数据的时间段差值为None，读数差值照常计算"""
+        baseline = period_result([5.0], {'very_low': 0, 'low': 0, 'in_range': 1,
+                                         'high': 0, 'very_high': 0})
+        empty = period_result([], dict.fromkeys(['very_low', 'low', 'in_range', 'high', 'very_high'], 0))
+
+        deltas = comparison_deltas(baseline, empty)
+
+        assert deltas['total_records'] == -1
+        assert deltas['avg_glucose'] is None
+        assert deltas['tir'] is None
+        assert deltas['distribution']['normal'] is None
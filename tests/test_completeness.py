@@ -0,0 +1,66 @@
+"""
+设备数据完整性测试
+Device Data Completeness Tests
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from app.services.analytics_core import SECONDS_PER_DAY
+from app.services.completeness_service import analyze_day
+
+DAY_START = 1748736000  # 2025-06-01 00:00 UTC
+
+
+def timestamps(offsets):
+    """由当天偏移秒数生成时间戳数组"""
+    return DAY_START + np.array(offsets, dtype=np.int64)
+
+
+class TestAnalyzeDay:
+    """单日完整性分析测试类"""
+
+    def test_full_cgm_day(self):
+        """测试每5分钟一条读数的完整日"""
+        summary = analyze_day(
+            timestamps(np.arange(0, SECONDS_PER_DAY, 300)), DAY_START, DAY_START + SECONDS_PER_DAY,
+            expected_per_day=288, gap_seconds=1800, duplicate_seconds=30
+        )
+
+        assert summary['reading_count'] == 288
+        assert summary['completeness'] == 100.0
+        assert summary['gap_count'] == 0
+        assert summary['max_gap_minutes'] == 5.0
+        assert summary['duplicate_clusters'] == []
+
+    def test_gaps_include_day_edges_and_duplicates_count_once(self):
+        """测试缺口包含当天开始与结束处，重复簇只计一次有效读数"""
+        offsets = [3600, 3610, 3620, 3900, 4200, 4210, 43200]
+        summary = analyze_day(
+            timestamps(offsets), DAY_START, DAY_START + SECONDS_PER_DAY,
+            expected_per_day=288, gap_seconds=1800, duplicate_seconds=30
+        )
+
+        assert summary['reading_count'] == 7
+        assert summary['effective_count'] == 4
+        assert summary['duplicate_count'] == 3
+        assert summary['duplicate_clusters'] == [
+            {'timestamp': datetime(2025, 6, 1, 1, 0), 'count': 3},
+            {'timestamp': datetime(2025, 6, 1, 1, 10), 'count': 2}
+        ]
+        assert [(gap['start'].hour, gap['end'].hour) for gap in summary['gaps']] == [
+            (0, 1), (1, 12), (12, 0)
+        ]
+        assert summary['max_gap_minutes'] == 720.0
+
+    def test_partial_day_prorates_expected_and_meter_skips_gaps(self):
+        """测试当天按已观测时长折算预期读数，血糖仪不分析缺口"""
+        summary = analyze_day(
+            timestamps([8 * 3600, 12 * 3600]), DAY_START, DAY_START + SECONDS_PER_DAY // 2,
+            expected_per_day=4, gap_seconds=None, duplicate_seconds=30
+        )
+
+        assert summary['expected_count'] == 2.0
+        assert summary['completeness'] == 100.0
+        assert summary['gaps'] == [] and summary['max_gap_minutes'] == 0.0
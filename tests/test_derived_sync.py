@@ -0,0 +1,188 @@
+"""
+派生数据写入路径测试
+Derived Data Write Path Tests
+
+数据库集合以 unittest.mock 替换，验证写入原始记录后派生数据的更新操作
+"""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.models.glucose import GlucoseRecord
+from app.services.episode_detector import EVENT_HYPO, STATUS_CLOSED
+
+START = datetime(2025, 6, 1, 2, 0)
+
+
+def readings(values, start=START):
+    """5分钟间隔的读数文档"""
+    return [{'timestamp': start + timedelta(minutes=5 * i), 'glucose_value': value}
+            for i, value in enumerate(values)]
+
+
+@pytest.fixture
+def glucose_service(app):
+    """原始记录、汇总、完整性与快照均为mock的血糖服务 (事件检测使用真实逻辑)"""
+    from app.services.glucose_service import GlucoseService
+
+    service = GlucoseService()
+    service.collection = MagicMock()
+    service.rollup_service = MagicMock()
+    service.completeness_service = MagicMock()
+    service.snapshot_service = MagicMock()
+    service.alert_service = MagicMock()
+    service.local_time_service = MagicMock()
+    service.local_time_service.fields_for.return_value = {}
+    service.event_service.collection = MagicMock()
+    service.event_service.collection.find.return_value = []
+    service.event_service.glucose_collection = MagicMock()
+    return service
+
+
+class TestEventSync:
+    """写入记录后的事件检测测试类"""
+
+    def test_create_record_writes_episode(self, glucose_service):
+        """测试带时区的记录写入后在 glucose_events 中生成低血糖事件"""
+        stored = readings([5.0, 3.5, 3.4, 3.3, 3.6, 3.5, 4.5, 5.0, 5.2, 5.5, 5.6])
+        event_service = glucose_service.event_service
+        event_service.glucose_collection.find.return_value.sort.return_value = stored
+
+        timestamp = (START + timedelta(minutes=25)).replace(tzinfo=timezone.utc)
+        glucose_service.create_record(GlucoseRecord('u1', timestamp, 3.5, 'mmol/L', 'd1'))
+
+        operations = event_service.collection.bulk_write.call_args[0][0]
+        assert len(operations) == 1
+        event = operations[0]._doc['$set']
+        assert event['kind'] == EVENT_HYPO
+        assert event['start'] == START + timedelta(minutes=5)
+        assert event['end'] == START + timedelta(minutes=30)
+        assert event['status'] == STATUS_CLOSED
+        assert event['user_id'] == 'u1' and event['device_id'] == 'd1'
+
+        # 派生数据收到朴素UTC时间
+        synced = glucose_service.rollup_service.add_record.call_args[0][0]
+        assert synced['timestamp'] == START + timedelta(minutes=25)
+        assert synced['timestamp'].tzinfo is None
+
+    def test_sync_errors_raise_in_testing(self, glucose_service):
+        """测试环境中派生数据同步的异常不被日志掩盖"""
+        glucose_service.completeness_service.sync_records.side_effect = KeyError('device_type')
+        glucose_service.event_service.glucose_collection.find.return_value.sort.return_value = []
+
+        with pytest.raises(KeyError):
+            glucose_service.create_record(GlucoseRecord('u1', START, 5.0, 'mmol/L', 'd1'))
+
+
+@pytest.fixture
+def rollup_service(app):
+    """汇总集合为mock的汇总服务"""
+    from app.services.rollup_service import RollupService
+
+    service = RollupService()
+    service.collection = MagicMock()
+    service.collection.find_one.return_value = {'_id': 'day', 'sketch': None, 'sketch_version': 1}
+    service.glucose_collection = MagicMock()
+    return service
+
+
+class TestRollupSync:
+    """汇总增量维护测试类"""
+
+    def test_add_record_updates_hour_day_and_month(self, rollup_service):
+        """测试写入记录后小时/日/月汇总及日汇总的小时子文档均被更新"""
+        rollup_service.add_record({'user_id': 'u1', 'device_id': 'd1',
+                                   'timestamp': START + timedelta(minutes=25),
+                                   'glucose_value': 12.0})
+
+        operations = rollup_service.collection.bulk_write.call_args[0][0]
+        updates = {op._filter['granularity']: op for op in operations}
+        assert updates['hour']._filter['bucket_start'] == START
+        assert updates['day']._filter['bucket_start'] == datetime(2025, 6, 1)
+        assert updates['month']._filter['bucket_start'] == datetime(2025, 6, 1)
+
+        day_update = updates['day']._doc
+        assert day_update['$inc']['count'] == 1
+        assert day_update['$inc']['hours.2.count'] == 1
+        assert day_update['$inc']['level_counts.high'] == 1
+        assert day_update['$inc']['range_counts.high'] == 1
+        assert day_update['$max']['hours.2.max'] == 12.0
+
+        # 日汇总的分位数草图同步更新
+        sketch_update = rollup_service.collection.update_one.call_args[0][1]
+        assert sketch_update['$inc'] == {'sketch_version': 1}
+
+    def test_remove_record_recomputes_extremes(self, rollup_service):
+        """测试删除桶的最值后从更细一级数据重新计算，计数归零的桶被删除"""
+        after_update = {
+            'hour': {'_id': 'hour', 'count': 0},
+            'day': {'_id': 'day', 'count': 3, 'min': 4.0, 'max': 9.0,
+                    'hours': {'2': {'count': 1, 'min': 5.0, 'max': 6.0}}},
+            'month': {'_id': 'month', 'count': 50, 'min': 3.0, 'max': 15.0,
+                      'hours': {'2': {'count': 8, 'min': 4.0, 'max': 11.0}}}
+        }
+        rollup_service.collection.find_one_and_update.side_effect = (
+            lambda bucket_filter, *args, **kwargs: after_update[bucket_filter['granularity']]
+        )
+        rollup_service.collection.aggregate.return_value = [{'min': 4.0, 'max': 8.5}]
+
+        rollup_service.remove_record({'user_id': 'u1', 'device_id': 'd1',
+                                      'timestamp': START + timedelta(minutes=25),
+                                      'glucose_value': 9.0})
+
+        rollup_service.collection.delete_one.assert_called_once_with({'_id': 'hour', 'count': {'$lte': 0}})
+        extremes = {call[0][0]['_id']: call[0][1]
+                    for call in rollup_service.collection.update_one.call_args_list
+                    if '$set' in call[0][1] and 'sketch' not in call[0][1]['$set']}
+        # 日汇总：总体最值与小时子文档最值均重新计算
+        assert extremes['day']['$set'] == {'min': 4.0, 'max': 8.5,
+                                           'hours.2.min': 4.0, 'hours.2.max': 8.5}
+        # 月汇总：被删除的值不是最值，无需重新计算
+        assert 'month' not in extremes
+
+
+@pytest.fixture
+def completeness_service(app):
+    """集合为mock的设备完整性服务"""
+    from app.services.completeness_service import CompletenessService
+
+    service = CompletenessService()
+    service.collection = MagicMock()
+    service.glucose_collection = MagicMock()
+    service.devices_collection = MagicMock()
+    service.devices_collection.find_one.return_value = {'user_id': 'u1', 'device_type': 'cgm'}
+    return service
+
+
+class TestCompletenessSync:
+    """设备完整性日汇总增量维护测试类"""
+
+    def test_refresh_day_upserts_summary(self, completeness_service):
+        """测试按当天读数重新计算并写入日汇总 (含缺口与重复读数)"""
+        day = datetime(2025, 6, 1)
+        stored = [{'timestamp': day + timedelta(minutes=5 * i)} for i in range(144)]
+        stored.append({'timestamp': day + timedelta(minutes=5 * 143, seconds=10)})
+        completeness_service.glucose_collection.find.return_value.sort.return_value = stored
+
+        summary = completeness_service.refresh_day('d1', day + timedelta(hours=13))
+
+        key, update = completeness_service.collection.update_one.call_args[0]
+        assert key == {'device_id': 'd1', 'day': day}
+        assert update['$set']['reading_count'] == 145
+        assert update['$set']['duplicate_count'] == 1
+        assert update['$set']['expected_count'] == 288
+        assert update['$set']['gap_count'] == 1
+        assert update['$set']['device_type'] == 'cgm'
+        assert summary['completeness'] == 50.0
+
+    def test_refresh_day_without_readings_deletes_summary(self, completeness_service):
+        """测试当天读数全部删除后移除日汇总"""
+        completeness_service.glucose_collection.find.return_value.sort.return_value = []
+
+        assert completeness_service.refresh_day('d1', datetime(2025, 6, 1)) is None
+        completeness_service.collection.delete_one.assert_called_once_with(
+            {'device_id': 'd1', 'day': datetime(2025, 6, 1)}
+        )
+        completeness_service.collection.update_one.assert_not_called()
@@ -0,0 +1,70 @@
+"""
+低/高血糖事件检测测试
+Hypo/Hyperglycemia Episode Detection Tests
+"""
+
+from datetime import datetime, timedelta
+
+from app.services.episode_detector import (
+    EVENT_HYPER,
+    EVENT_HYPO,
+    STATUS_CLOSED,
+    STATUS_INTERRUPTED,
+    STATUS_ONGOING,
+    EpisodeDetector,
+    detect_episodes
+)
+
+START = datetime(2025, 6, 1, 8, 0)
+MAX_GAP = timedelta(minutes=15)
+
+
+def readings(values, step=5, start=START):
+    """按固定间隔生成 (时间, 血糖值) 序列"""
+    return [(start + timedelta(minutes=step * i), value) for i, value in enumerate(values)]
+
+
+class TestEpisodeDetector:
+    """事件检测状态机测试类"""
+
+    def test_short_dip_is_not_an_episode(self):
+        """测试低于阈值不足15分钟不构成事件"""
+        episodes = detect_episodes(readings([5.0, 3.5, 3.6, 3.7, 5.0, 5.2]), MAX_GAP)
+
+        assert episodes == []
+
+    def test_hypo_episode_with_level2_and_recovery(self):
+        """测试事件升级为2级，恢复持续15分钟后结束，结束时间为恢复时刻"""
+        values = [5.0, 3.5, 2.8, 2.7, 2.9, 2.8, 3.4, 4.5, 3.8, 4.6, 4.8, 5.0, 5.1]
+
+        episodes = detect_episodes(readings(values), MAX_GAP, kinds=[EVENT_HYPO])
+
+        assert len(episodes) == 1
+        episode = episodes[0]
+        assert episode['level'] == 2
+        assert episode['start'] == START + timedelta(minutes=5)
+        # 4.5 之后再次低于阈值，恢复从 4.6 开始计算
+        assert episode['end'] == START + timedelta(minutes=45)
+        assert episode['extreme_value'] == 2.7
+        assert episode['reading_count'] == 7
+        assert episode['status'] == STATUS_CLOSED
+
+    def test_gap_interrupts_and_data_end_leaves_ongoing(self):
+        """测试传感器中断结束事件，数据末尾的事件为进行中"""
+        detector = EpisodeDetector(EVENT_HYPER, MAX_GAP)
+        closed = []
+        for timestamp, value in readings([11.0, 11.5, 12.0, 12.5]):
+            closed.extend(detector.feed(timestamp, value))
+        closed.extend(detector.feed(START + timedelta(hours=2), 12.0))
+
+        assert len(closed) == 1
+        assert closed[0]['status'] == STATUS_INTERRUPTED
+        assert closed[0]['end'] == START + timedelta(minutes=15)
+        assert closed[0]['level'] == 1
+        assert detector.finish() is None
+
+        for timestamp, value in readings([14.5] * 4, start=START + timedelta(hours=2, minutes=5)):
+            detector.feed(timestamp, value)
+        ongoing = detector.finish()
+        assert ongoing['status'] == STATUS_ONGOING
+        assert ongoing['level'] == 2
@@ -0,0 +1,89 @@
+"""
+短时血糖预测测试
+Short-Horizon Glucose Forecast Tests
+"""
+
+import numpy as np
+
+from app.services.alert_service import compile_rule
+from app.services.forecast_service import ForecastService
+from app.services.glucose_forecast import evaluate_forecasts, forecast_latest, forecast_series
+
+
+def series(values, interval=300, start=0):
+    """按固定间隔 (秒) 排列的读数"""
+    return start + np.arange(len(values), dtype=np.float64) * interval, np.asarray(values, dtype=np.float64)
+
+
+class TestForecastModel:
+    """预测模型测试类"""
+
+    def test_linear_trend_extrapolated(self):
+        """测试线性变化的读数按斜率外推，读数不足时不预测"""
+        timestamps, values = series(8.0 - 0.05 * np.arange(24) * 5)
+        predicted, slopes = forecast_series(timestamps, values, horizon_minutes=30)
+
+        assert np.isnan(predicted[:3]).all()
+        assert np.allclose(slopes[3:], -0.05)
+        assert np.allclose(predicted[3:], values[3:] - 1.5)
+
+    def test_gap_restarts_window(self):
+        """测试传感器中断之前的读数不参与拟合"""
+        timestamps, values = series([9.0, 8.0, 7.0, 6.0, 6.0, 6.0, 6.0, 6.0])
+        timestamps[4:] += 3600
+        predicted, _ = forecast_series(timestamps, values, max_gap_minutes=15)
+
+        assert np.isnan(predicted[4:7]).all()
+        assert np.isclose(predicted[7], 6.0)
+        assert np.isclose(forecast_latest(list(zip(timestamps, values))), 6.0)
+
+    def test_latest_matches_series(self):
+        """测试写入路径的单点预测与历史回测结果一致"""
+        rng = np.random.default_rng(7)
+        timestamps, values = series(6 + np.cumsum(rng.normal(0, 0.1, 30)))
+        predicted, _ = forecast_series(timestamps, values)
+
+        window = timestamps >= timestamps[-1] - 3600
+        points = list(zip(timestamps[window], values[window]))
+        assert np.isclose(forecast_latest(points), predicted[-1])
+        assert forecast_latest(points[:3]) is None
+
+
+class TestForecastEvaluation:
+    """预测评估测试类"""
+
+    def test_forecasts_aligned_with_actual(self):
+        """测试预测值与30分钟后的实际读数对齐，只统计当前未低于阈值的预测点"""
+        timestamps, values = series([5.0, 4.5, 4.0, 3.5, 3.0, 2.5, 2.0, 2.0, 2.0])
+        predicted = np.array([np.nan, 4.0, 3.5, 3.0, np.nan, np.nan, np.nan, np.nan, np.nan])
+        result = evaluate_forecasts(timestamps, values, predicted, 30, 3.9)
+
+        assert result['actual'].tolist() == [2.0, 2.0]
+        assert result['predicted_low'].tolist() == [False, True]
+        assert result['actual_low'].tolist() == [True, True]
+
+    def test_forecast_rule_breached(self):
+        """测试预测规则按预测值判断，无预测值时不满足"""
+        compiled = compile_rule({'_id': 'r1', 'name': 'r1', 'rule_type': 'forecast',
+                                 'condition': 'below', 'value': 3.9})
+
+        assert compiled.breached(5.0, -0.1, 3.5)
+        assert not compiled.breached(5.0, -0.1, 4.2)
+        assert not compiled.breached(3.0, None, None)
+
+
+class TestBacktest:
+    """预测回测测试类"""
+
+    def test_partitions_are_not_mixed(self, app):
+        """测试多个设备分区拼接计算时窗口不跨越分区"""
+        totals = ForecastService._empty_totals()
+        rising, _ = series(np.zeros(12))
+        values = np.concatenate([5.0 + 0.02 * np.arange(12) * 5, 9.0 - 0.02 * np.arange(12) * 5])
+        timestamps = np.concatenate([rising + 10 ** 10, rising + 2 * 10 ** 10])
+        ForecastService._evaluate_batch(timestamps, values, ForecastService._parameters(None),
+                                        3.9, totals)
+
+        # 每个分区前3条读数不足以预测，第4-6条有30分钟后的实际读数
+        assert totals['forecasts'] == 6
+        assert np.isclose(totals['abs_error'], 0.0)
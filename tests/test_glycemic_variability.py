@@ -0,0 +1,80 @@
+"""
+血糖变异性指标测试
+Glycemic Variability Indices Tests
+"""
+
+import math
+
+import numpy as np
+
+from app.services.analytics_core import GlucoseSeries
+from app.services.glycemic_variability import (
+    conga,
+    excursions,
+    mage,
+    modd,
+    resample,
+    risk_indices,
+    turning_points
+)
+
+INTERVAL = 300
+
+
+def make_series(values, offsets):
+    """由血糖值与时间偏移 (秒) 构造序列"""
+    return GlucoseSeries(np.asarray(values, dtype=np.float64),
+                         np.asarray(offsets, dtype=np.int64) + 1_700_000_100)
+
+
+class TestGlycemicVariability:
+    """血糖变异性指标测试类"""
+
+    def test_resample_interpolates_and_marks_gaps(self):
+        """测试重采样：短间隔线性插值，超过上限的间隔为NaN"""
+        series = make_series([5.0, 6.0, 8.0], [0, 600, 3600])
+
+        grid = resample(series, INTERVAL, max_gap=900)
+
+        assert grid[:3].tolist() == [5.0, 5.5, 6.0]
+        assert np.isnan(grid[3:-1]).all()
+        assert grid[-1] == 8.0 and len(grid) == 13
+
+    def test_conga_and_modd_on_regular_grid(self):
+        """测试 CONGA-1 与 MODD 为固定位移的差值统计"""
+        # 两天数据：第二天每个时刻比第一天高 1.5
+        points = 2 * 288
+        values = np.tile(np.linspace(5.0, 10.0, 288), 2) + np.repeat([0.0, 1.5], 288)
+
+        assert math.isclose(modd(values, INTERVAL), 1.5)
+        differences = values[12:] - values[:-12]
+        assert math.isclose(conga(values, INTERVAL, 1), differences.std(ddof=1))
+        assert modd(values[:points // 2], INTERVAL) is None
+
+    def test_turning_points_and_excursions(self):
+        """测试拐点检测合并平台，小于阈值的波动并入大波动，首尾截断的波动不计入"""
+        values = np.array([6.0, 5.0, 4.0, 9.0, 8.5, 8.8, 8.8, 4.0, 10.0, 7.0])
+
+        extrema = turning_points(values)
+
+        assert extrema.tolist() == [6.0, 4.0, 9.0, 8.5, 8.8, 4.0, 10.0, 7.0]
+        assert excursions(extrema.tolist(), threshold=2.0) == [5.0, -5.0, 6.0]
+
+    def test_mage_of_sine_wave(self):
+        """测试正弦波的 MAGE 等于峰谷差"""
+        minutes = np.arange(0, 3 * 24 * 60, 5)
+        grid = 8.0 + 3.0 * np.sin(2 * np.pi * minutes / 240)
+
+        result = mage(grid)
+
+        assert result['excursions'] == 18
+        assert math.isclose(result['mage'], 6.0, abs_tol=0.01)
+
+    def test_risk_indices(self):
+        """测试风险指数：112.5 mg/dL 附近风险为0，低值只计入 LBGI"""
+        neutral = risk_indices(np.array([112.5 / 18.018]))
+        low = risk_indices(np.array([3.0, 3.0]))
+
+        assert neutral['lbgi'] < 0.01 and neutral['hbgi'] < 0.01
+        assert low['lbgi'] > 5 and low['hbgi'] == 0
+        assert risk_indices(np.empty(0)) == {'lbgi': None, 'hbgi': None}
@@ -0,0 +1,53 @@
+"""
+周×小时血糖热力图测试
+Day-of-Week × Hour Heatmap Tests
+"""
+
+from datetime import datetime
+
+import pytest
+
+from app.services.rollup_service import GlucoseAggregate
+from app.utils.time_utils import has_whole_hour_offsets, parse_timezone, to_local
+
+
+class TestTimezones:
+    """本地时间换算测试类"""
+
+    def test_whole_hour_offsets(self):
+        """测试整小时偏移判断 (含夏令时时区)"""
+        start, end = datetime(2025, 1, 1), datetime(2025, 12, 31)
+
+        assert has_whole_hour_offsets(parse_timezone('America/New_York'), start, end)
+        assert has_whole_hour_offsets(parse_timezone('UTC'), start, end)
+        assert not has_whole_hour_offsets(parse_timezone('Asia/Kolkata'), start, end)
+
+    def test_to_local_and_unknown_timezone(self):
+        """测试UTC转本地时间，未知时区报错"""
+        local = to_local(datetime(2025, 6, 1, 20, 0), parse_timezone('Asia/Shanghai'))
+
+        assert local == datetime(2025, 6, 2, 4, 0)
+        with pytest.raises(ValueError):
+            parse_timezone('Mars/Olympus_Mons')
+
+
+class TestHeatmapResult:
+    """热力图矩阵测试类"""
+
+    def test_matrix_layout_and_percentages(self, app):
+        """测试7×24矩阵按 (星期, 小时) 排列，无数据单元为None"""
+        from app.services.statistics_service import StatisticsService
+
+        aggregate = GlucoseAggregate()
+        for value in (3.5, 6.0, 6.5, 9.0):
+            aggregate.add(value)
+
+        result = StatisticsService._heatmap_result({(6, 23): aggregate})
+
+        assert len(result['avg_glucose']) == 7
+        assert all(len(row) == 24 for row in result['avg_glucose'])
+        assert result['avg_glucose'][6][23] == 6.25
+        assert result['normal_percentage'][6][23] == 50.0
+        assert result['low_percentage'][6][23] == 25.0
+        assert result['record_count'][0][0] is None
+        assert result['total_records'] == 4
@@ -0,0 +1,77 @@
+"""
+本地时间字段测试
+Local Time Fields Tests
+"""
+
+from datetime import datetime, timezone
+
+from app.models.user import UserRegistrationSchema
+from app.services.analytics_core import GlucoseSeries
+from app.services.local_time_service import local_fields
+from app.utils.time_utils import parse_day_window, parse_timezone
+
+
+class TestLocalFields:
+    """本地时间字段测试类"""
+
+    def test_fields_follow_user_timezone_and_dst(self):
+        """测试本地日期/小时/分钟数按时区 (含夏令时) 计算"""
+        shanghai = parse_timezone('Asia/Shanghai')
+        new_york = parse_timezone('America/New_York')
+
+        assert local_fields(datetime(2025, 6, 1, 18, 30), shanghai) == {
+            'local_date': '2025-06-02', 'local_hour': 2, 'minute_of_day': 150,
+            'local_tz': 'Asia/Shanghai'
+        }
+        # 夏令时 UTC-4，冬令时 UTC-5
+        assert local_fields(datetime(2025, 7, 1, 6, 0), new_york)['local_hour'] == 2
+        assert local_fields(datetime(2025, 1, 1, 6, 0), new_york)['local_hour'] == 1
+        # 带时区的时间先换算为UTC
+        aware = datetime(2025, 6, 1, 18, 30, tzinfo=timezone.utc)
+        assert local_fields(aware, shanghai)['local_date'] == '2025-06-02'
+
+    def test_day_window_uses_local_midnights(self):
+        """测试统计窗口按用户时区的本地午夜划分 (含夏令时切换)"""
+        shanghai = parse_timezone('Asia/Shanghai')
+        new_york = parse_timezone('America/New_York')
+
+        assert parse_day_window('2025-06-14', 14, shanghai) == (
+            datetime(2025, 5, 31, 16, 0), datetime(2025, 6, 14, 16, 0)
+        )
+        # 3月9日切换夏令时：窗口开始为 UTC-5 的午夜，结束为 UTC-4 的午夜
+        assert parse_day_window('2025-03-10', 3, new_york) == (
+            datetime(2025, 3, 8, 5, 0), datetime(2025, 3, 11, 4, 0)
+        )
+        # 未指定时区时按UTC
+        assert parse_day_window('2025-06-14', 1) == (
+            datetime(2025, 6, 14), datetime(2025, 6, 15)
+        )
+
+    def test_series_prefers_stored_local_minutes(self):
+        """测试序列使用写入时的本地分钟数，时区不一致的记录按当前时区换算"""
+        documents = [
+            {'timestamp': datetime(2025, 6, 1, 18, 30), 'glucose_value': 5.0,
+             'minute_of_day': 150, 'local_tz': 'Asia/Shanghai'},
+            # 时区修改后尚未重算的记录
+            {'timestamp': datetime(2025, 6, 1, 18, 45), 'glucose_value': 5.2,
+             'minute_of_day': 1125, 'local_tz': 'UTC'},
+            {'timestamp': datetime(2025, 6, 1, 19, 0), 'glucose_value': 5.4}
+        ]
+
+        series = GlucoseSeries.from_documents(
+            iter(documents), timezone_of=lambda document: 'Asia/Shanghai'
+        )
+
+        assert series.minutes_of_day().tolist() == [150, 165, 180]
+        # 未提供时区时按UTC时间计算
+        assert GlucoseSeries.from_documents(iter(documents)).minutes_of_day().tolist() == [
+            1110, 1125, 1140
+        ]
+
+    def test_registration_validates_timezone(self):
+        """测试注册时校验时区名称"""
+        schema = UserRegistrationSchema()
+        data = {'username': 'alice', 'email': 'alice@example.com', 'password': 'secret1'}
+
+        assert not schema.validate({**data, 'timezone': 'Asia/Shanghai'})
+        assert 'timezone' in schema.validate({**data, 'timezone': 'Asia/Atlantis'})
@@ -0,0 +1,83 @@
+"""
+血糖分位数草图测试
+Glucose Quantile Sketch Tests
+"""
+
+import math
+import random
+
+import numpy as np
+
+from app.utils.quantile_sketch import QuantileSketch
+
+
+def exact_percentile(values, q):
+    """精确分位数 (线性插值)"""
+    ordered = sorted(values)
+    position = q * (len(ordered) - 1)
+    low, high = math.floor(position), math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+class TestQuantileSketch:
+    """分位数草图测试类"""
+
+    def _values(self, count=2000, seed=7):
+        rng = random.Random(seed)
+        return [round(rng.uniform(2.0, 18.0), 1) for _ in range(count)]
+
+    def test_matches_exact_percentiles(self):
+        """测试按0.1精度记录的数据分位数与精确值一致"""
+        values = self._values()
+        qs = [0, 0.05, 0.25, 0.5, 0.75, 0.95, 1]
+
+        result = QuantileSketch.from_values(values).quantiles(qs)
+        expected = [exact_percentile(values, q) for q in qs]
+
+        for actual, exact in zip(result, expected):
+            assert abs(actual - exact) < 1e-6
+
+    def test_error_bound_for_unrounded_values(self):
+        """测试任意精度数据的误差不超过误差界"""
+        rng = random.Random(11)
+        values = [rng.uniform(2.0, 18.0) for _ in range(3000)]
+
+        result = QuantileSketch.from_values(values).quantiles([0.05, 0.5, 0.95])
+        expected = [exact_percentile(values, q) for q in (0.05, 0.5, 0.95)]
+
+        for actual, exact in zip(result, expected):
+            assert abs(actual - exact) <= QuantileSketch.ERROR_BOUND + 1e-9
+
+    def test_merge_equals_single_build(self):
+        """测试按天合并的草图与一次性构建相同"""
+        values = self._values()
+        merged = QuantileSketch()
+        for start in range(0, len(values), 288):
+            merged.merge(QuantileSketch.from_values(values[start:start + 288]))
+
+        assert merged.counts == QuantileSketch.from_values(values).counts
+
+    def test_binary_roundtrip_and_removal(self):
+        """测试序列化往返与扣除记录"""
+        sketch = QuantileSketch.from_values([5.5, 6.1, 6.1, 12.3])
+        restored = QuantileSketch.from_binary(sketch.to_binary())
+        assert restored.counts == sketch.counts
+
+        restored.add(6.1, -2)
+        assert restored.count == 2
+        assert restored.quantiles([0, 1]) == [5.5, 12.3]
+
+    def test_empty_sketch(self):
+        """测试空草图"""
+        assert QuantileSketch.from_binary(None).count == 0
+        assert QuantileSketch().quantile(0.5) is None
+
+    def test_add_array_matches_add(self):
+        """测试批量加入与逐条加入的分桶一致"""
+        rng = random.Random(3)
+        values = [rng.uniform(0.0, 60.0) for _ in range(2000)] + [0.05, 0.15, 6.25, 6.35]
+
+        sketch = QuantileSketch()
+        sketch.add_array(np.array(values))
+
+        assert sketch.counts == QuantileSketch.from_values(values).counts
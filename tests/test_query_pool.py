@@ -0,0 +1,86 @@
+"""
+统计查询线程池测试
+Statistics Query Pool Tests
+"""
+
+import threading
+import time
+
+import pytest
+from flask import g
+
+from app.utils.query_pool import QueryDeadlineExceeded, QueryPool, QueryPoolBusy
+
+
+class TestQueryPool:
+    """统计查询线程池测试类"""
+
+    def test_independent_queries_run_concurrently(self, app):
+        """测试独立查询并发执行，总耗时接近最慢的一项"""
+        pool = QueryPool(max_workers=4)
+        tasks = {name: (lambda name=name: time.sleep(0.2) or name) for name in 'abc'}
+
+        begin = time.perf_counter()
+        results = pool.run(tasks, timeout=5)
+
+        assert results == {'a': 'a', 'b': 'b', 'c': 'c'}
+        assert time.perf_counter() - begin < 0.5
+        pool.shutdown()
+
+    def test_deadline_cancels_queued_queries(self, app):
+        """测试超过截止时间时报错，尚未开始的查询被取消"""
+        pool = QueryPool(max_workers=1)
+        started = []
+        tasks = {
+            'slow': lambda: time.sleep(0.3),
+            'queued': lambda: started.append('queued')
+        }
+
+        with pytest.raises(QueryDeadlineExceeded):
+            pool.run(tasks, timeout=0.1)
+        time.sleep(0.4)
+
+        assert started == []
+        assert pool.get_stats()['cancelled'] == 1
+        assert pool.get_stats()['deadline_exceeded'] == 1
+        pool.shutdown()
+
+    def test_error_propagates_and_rejects_when_full(self, app):
+        """测试查询异常原样抛出；排队已满时立即拒绝"""
+        pool = QueryPool(max_workers=1, max_pending=2)
+
+        def fail():
+            raise ValueError('bad query')
+
+        with pytest.raises(ValueError):
+            pool.run({'fail': fail}, timeout=5)
+
+        release = threading.Event()
+
+        def occupy():
+            with app.app_context():
+                pool.run({'a': release.wait, 'b': release.wait}, timeout=5)
+
+        blocker = threading.Thread(target=occupy)
+        blocker.start()
+        time.sleep(0.1)
+        with pytest.raises(QueryPoolBusy):
+            pool.run({'c': lambda: None}, timeout=5)
+        release.set()
+        blocker.join()
+        assert pool.get_stats()['rejected'] == 1
+        pool.shutdown()
+
+    def test_nested_runs_inline_and_merges_tiers(self, app):
+        """测试池内再次提交时按顺序执行 (不占用线程)，查询记录的数据层级合并到调用方"""
+        pool = QueryPool(max_workers=1)
+
+        def outer():
+            g.stats_tiers = {'raw': 2}
+            return pool.run({'inner': lambda: threading.current_thread().name})
+
+        results = pool.run({'outer': outer}, timeout=5)
+
+        assert results['outer']['inner'].startswith('stats-query')
+        assert g.stats_tiers == {'raw': 2}
+        pool.shutdown()
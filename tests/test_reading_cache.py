@@ -0,0 +1,96 @@
+"""
+最近读数缓存测试
+Recent Readings Cache Tests
+"""
+
+from datetime import datetime, timedelta
+
+from app.utils.reading_cache import ReadingCache, ReadingRing
+
+NOW = datetime(2025, 6, 15, 12, 0)
+
+
+def record(minutes_ago, value, user_id='u1', device_id='d1'):
+    """一条血糖记录"""
+    return {'_id': f'{user_id}-{minutes_ago}', 'user_id': user_id, 'device_id': device_id,
+            'timestamp': NOW - timedelta(minutes=minutes_ago), 'glucose_value': value}
+
+
+def loaded_cache(**kwargs):
+    """已加载 u1 最近3小时读数 (5分钟间隔) 的缓存"""
+    cache = ReadingCache(window=timedelta(hours=3), **kwargs)
+    records = [record(minutes, 6.0) for minutes in range(180, 0, -5)]
+    assert cache.load('u1', records, NOW - timedelta(hours=3), cache.generation('u1'))
+    return cache
+
+
+class TestReadingRing:
+    """环形缓冲测试类"""
+
+    def test_grows_then_wraps_around(self):
+        """测试容量倍增至上限后覆盖最早的读数，范围查询按时间顺序返回"""
+        ring = ReadingRing(max_points=100)
+        dropped = [ring.append(timestamp, timestamp / 10, 0) for timestamp in range(150)]
+
+        assert ring.capacity == 100 and ring.size == 100
+        assert dropped[:100] == [None] * 100 and dropped[100:] == list(range(50))
+        assert [point[0] for point in ring.since(140)] == list(range(140, 150))
+        assert ring.since(0)[0][0] == 50
+
+    def test_trim_before(self):
+        """测试丢弃早于截止时间的读数"""
+        ring = ReadingRing(max_points=8)
+        for timestamp in range(10):
+            ring.append(timestamp, 5.0, 0)
+        ring.trim_before(7)
+
+        assert [point[0] for point in ring.since(0)] == [7, 8, 9]
+
+
+class TestReadingCache:
+    """最近读数缓存测试类"""
+
+    def test_ingest_appends_and_serves_ranges(self):
+        """测试写入的新读数追加到缓存，范围与最新记录查询命中"""
+        cache = loaded_cache()
+        cache.set_latest('u1', None, record(5, 6.0), cache.generation('u1'))
+        cache.add(record(0, 6.6))
+
+        readings = cache.get_since('u1', NOW - timedelta(minutes=10))
+        assert [(reading['timestamp'], reading['glucose_value']) for reading in readings] == [
+            (NOW - timedelta(minutes=10), 6.0), (NOW - timedelta(minutes=5), 6.0), (NOW, 6.6)
+        ]
+        assert cache.get_latest('u1') == (True, record(0, 6.6))
+        assert cache.get_latest('u1', 'd2') == (False, None)
+        assert cache.get_since('u1', NOW - timedelta(hours=4)) is None
+
+    def test_out_of_order_write_drops_user(self):
+        """测试乱序到达的读数使该用户的缓存失效"""
+        cache = loaded_cache()
+        cache.add(record(7, 3.0))
+
+        assert cache.get_since('u1', NOW - timedelta(minutes=30)) is None
+        assert cache.get_stats()['invalidations'] == 1
+
+    def test_load_discarded_after_concurrent_write(self):
+        """测试加载期间有写入时不保存加载结果"""
+        cache = ReadingCache()
+        generation = cache.generation('u1')
+        cache.add(record(0, 7.0))
+
+        assert not cache.load('u1', [record(5, 6.0)], NOW - timedelta(hours=3), generation)
+        assert cache.get_since('u1', NOW - timedelta(hours=1)) is None
+
+    def test_evicts_least_recently_used_users(self):
+        """测试超过用户数或内存上限时淘汰最久未访问的用户"""
+        cache = ReadingCache(max_users=2)
+        for user_id in ('u1', 'u2', 'u3'):
+            if user_id == 'u3':
+                cache.get_latest('u1')
+            cache.set_latest(user_id, None, record(0, 6.0, user_id), cache.generation(user_id))
+
+        assert cache.get_latest('u2') == (False, None)
+        assert cache.get_latest('u1')[0] and cache.get_latest('u3')[0]
+
+        small = loaded_cache(max_bytes=1000)
+        assert small.get_stats()['users'] == 0 and small.get_stats()['evictions'] == 1
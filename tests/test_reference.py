@@ -0,0 +1,81 @@
+"""
+人群参考分布测试
+Population Reference Distribution Tests
+"""
+
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.services.reference_service import (
+    ALL,
+    ReferenceHistogram,
+    ReferenceService,
+    age_band
+)
+
+
+def distribution(band, gender, users, tir_values):
+    """构造一个已加载的参考分布"""
+    return {
+        'age_band': band,
+        'gender': gender,
+        'users': users,
+        'window_days': 14,
+        'generated_at': datetime(2025, 6, 1),
+        'metrics': {
+            'tir': ReferenceHistogram.from_values(tir_values, 0.0, 100.0, 0.5),
+            'mean_glucose': ReferenceHistogram.from_values([7.0] * users, 2.0, 25.0, 0.1)
+        }
+    }
+
+
+class TestReferenceHistogram:
+    """累计直方图测试类"""
+
+    def test_percentile_rank_matches_exact_rank(self):
+        """测试百分位与精确结果 (低于该值的比例，同值计一半) 之差不超过一档"""
+        values = np.random.default_rng(5).uniform(0, 100, 2000)
+        histogram = ReferenceHistogram.from_values(values.tolist(), 0.0, 100.0, 0.5)
+
+        for value in (3.2, 41.75, 66.0, 99.9):
+            exact = (np.sum(values < value) + np.sum(values == value) / 2) / len(values) * 100
+            in_bin = np.sum(np.floor(values / 0.5) == np.floor(value / 0.5)) / len(values) * 100
+            assert abs(histogram.percentile_rank(value) - exact) <= in_bin / 2 + 0.1
+
+    def test_out_of_range_values_and_round_trip(self):
+        """测试超出范围的值计入首/末档，文档序列化后结果不变"""
+        histogram = ReferenceHistogram.from_values([1.0, 5.0, 30.0], 2.0, 25.0, 0.1)
+        restored = ReferenceHistogram.from_doc(histogram.to_doc())
+
+        assert restored.count == 3
+        assert restored.percentile_rank(0.5) == histogram.percentile_rank(0.5) == 16.7
+        assert restored.percentile_rank(100.0) == 83.3
+        assert ReferenceHistogram.from_values([], 0.0, 100.0, 0.5).percentile_rank(50) is None
+
+    def test_age_bands(self):
+        """测试年龄段划分"""
+        assert [age_band(age) for age in (None, 5, 18, 49, 70, 120)] == \
+            [None, '0-17', '18-29', '40-49', '70+', '70+']
+
+
+class TestReferenceLookup:
+    """参考百分位查询测试类"""
+
+    def test_falls_back_when_group_is_small(self, app):
+        """测试分组人数不足时回退到更粗的分组"""
+        app.config['REFERENCE_MIN_USERS'] = 20
+        service = ReferenceService()
+        service._cache = (time.monotonic(), {
+            ('40-49', 'female'): distribution('40-49', 'female', 5, [80.0] * 5),
+            ('40-49', ALL): distribution('40-49', ALL, 40, [20.0] * 20 + [80.0] * 20),
+            (ALL, ALL): distribution(ALL, ALL, 400, [50.0] * 400)
+        })
+
+        result = service.lookup(45, 'female', {'tir': 60.0, 'mean_glucose': None})
+
+        assert (result['age_band'], result['gender'], result['users']) == ('40-49', ALL, 40)
+        assert result['metrics']['tir'] == {'value': 60.0, 'percentile': 50.0}
+        assert result['metrics']['mean_glucose']['percentile'] is None
+        assert service.lookup(None, None, {'tir': 60.0})['users'] == 400
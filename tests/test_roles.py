@@ -0,0 +1,71 @@
+"""
+用户角色权限测试
+User Role Authorization Tests
+"""
+
+from unittest.mock import patch
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.models.user import ROLE_ADMIN, ROLE_CLINICIAN, ROLE_PATIENT, User
+
+
+@pytest.fixture
+def auth_headers(app):
+    """任意用户的访问令牌 (角色由 get_role 的mock决定)"""
+    token = create_access_token(identity='6650f0c2a1b2c3d4e5f60718')
+    return {'Authorization': f'Bearer {token}'}
+
+
+def post_as(client, headers, role, path, body):
+    """以指定角色发送请求"""
+    with patch('app.services.user_service.UserService.get_role', return_value=role):
+        return client.post(path, json=body, headers=headers)
+
+
+class TestRolesRequired:
+    """批量接口角色验证测试类"""
+
+    def test_patient_cannot_read_other_users(self, client, auth_headers):
+        """测试患者角色调用批量AGP接口返回403"""
+        response = post_as(client, auth_headers, ROLE_PATIENT, '/api/statistics/agp/batch',
+                           {'user_ids': ['someone-else']})
+
+        assert response.status_code == 403
+        assert response.get_json()['details']['required_roles'] == [ROLE_CLINICIAN, ROLE_ADMIN]
+
+    def test_inactive_or_missing_user_is_rejected(self, client, auth_headers):
+        """测试用户不存在或已停用时返回403"""
+        response = post_as(client, auth_headers, None, '/api/statistics/agp/batch',
+                           {'user_ids': ['someone-else']})
+
+        assert response.status_code == 403
+
+    def test_clinician_passes_role_check(self, client, auth_headers):
+        """测试医生角色通过权限验证 (随后进行参数校验)"""
+        response = post_as(client, auth_headers, ROLE_CLINICIAN, '/api/statistics/agp/batch',
+                           {'user_ids': []})
+
+        assert response.status_code == 400
+
+    def test_role_defaults_to_patient(self):
+        """测试旧用户文档缺少角色时视为患者"""
+        user = User.from_dict({'username': 'alice', 'email': 'alice@example.com',
+                               'password_hash': 'x'})
+
+        assert user.role == ROLE_PATIENT
+
+    def test_variability_batch_requires_role(self, client, auth_headers):
+        """测试患者角色调用批量变异性接口返回403"""
+        response = post_as(client, auth_headers, ROLE_PATIENT, '/api/statistics/variability/batch',
+                           {'user_ids': ['someone-else']})
+
+        assert response.status_code == 403
+
+    def test_fleet_completeness_requires_admin(self, client, auth_headers):
+        """测试全设备完整性排名仅限管理员"""
+        with patch('app.services.user_service.UserService.get_role', return_value=ROLE_CLINICIAN):
+            response = client.get('/api/devices/completeness', headers=auth_headers)
+
+        assert response.status_code == 403
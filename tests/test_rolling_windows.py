@@ -0,0 +1,93 @@
+"""
+滚动窗口血糖序列测试
+Rolling-Window Glucose Series Tests
+"""
+
+import math
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import numpy as np
+from flask_jwt_extended import create_access_token
+
+from app.services.analytics_core import GlucoseSeries
+from app.services.rolling_windows import (
+    compute_windows,
+    rolling_means,
+    trend_arrows,
+    window_pipeline,
+    window_slopes
+)
+
+
+class TestRollingWindows:
+    """滚动窗口测试类"""
+
+    def test_rolling_means_and_slopes_inclusive_windows(self):
+        """测试时间窗口 [t - 窗口, t] 两端均含，单点窗口斜率为NaN"""
+        timestamps = np.array([0, 600, 1200, 3600, 7200], dtype=np.int64)
+        values = np.array([4.0, 5.0, 6.0, 8.0, 10.0])
+
+        means = rolling_means(timestamps, values, 3600)
+        slopes = window_slopes(timestamps, values, 900)
+
+        assert means.tolist() == [4.0, 4.5, 5.0, 5.75, 9.0]
+        assert math.isnan(slopes[0]) and math.isnan(slopes[3])
+        assert slopes[1:3].tolist() == [0.1, 0.1]
+
+    def test_trend_arrows(self):
+        """测试变化率分级 (mmol/L/min)"""
+        rates = np.array([-0.2, -0.12, -0.07, 0.0, 0.07, 0.12, 0.2, np.nan])
+
+        assert trend_arrows(rates) == [
+            'double_down', 'single_down', 'forty_five_down', 'flat',
+            'forty_five_up', 'single_up', 'double_up', None
+        ]
+
+    def test_compute_windows_partitions_devices_and_drops_lookback(self):
+        """测试按设备分区计算，回看区间的读数参与窗口但不输出"""
+        series = GlucoseSeries(
+            np.array([5.0, 9.0, 7.0, 11.0]),
+            np.array([0, 100, 3000, 3100], dtype=np.int64)
+        )
+        codes = np.array([0, 1, 0, 1], dtype=np.int64)
+
+        columns = compute_windows(series, codes, start_timestamp=1000)
+
+        assert columns['timestamp'].tolist() == [3000, 3100]
+        assert columns['partition'].tolist() == [0, 1]
+        assert columns['mean_1h'].tolist() == [6.0, 10.0]
+
+    def test_window_pipeline_partitions_by_user_and_device(self):
+        """测试聚合管道：先窗口计算，再筛除回看区间"""
+        start = datetime(2025, 6, 2)
+        pipeline = window_pipeline({'user_id': 'u1'}, start)
+
+        window_stage = pipeline[1]['$setWindowFields']
+        assert window_stage['partitionBy'] == {'user_id': '$user_id', 'device_id': '$device_id'}
+        assert window_stage['sortBy'] == {'timestamp': 1}
+        assert window_stage['output']['mean_24h']['window'] == {
+            'range': [-86400, 0], 'unit': 'second'
+        }
+        assert pipeline[2] == {'$match': {'timestamp': {'$gte': start}}}
+
+
+class TestWindowedSeriesResource:
+    """滚动窗口序列接口测试类"""
+
+    def test_mixed_aware_and_default_dates(self, client):
+        """测试带 Z 后缀的开始时间与默认结束时间比较时不报错，传入服务的均为朴素UTC时间"""
+        token = create_access_token(identity='6650f0c2a1b2c3d4e5f60718')
+        start = (datetime.utcnow() - timedelta(hours=2)).replace(microsecond=0)
+
+        with patch('app.services.statistics_service.StatisticsService.get_windowed_series',
+                   return_value={'records': []}) as get_windowed_series:
+            response = client.get(
+                f"/api/statistics/windowed-series?start_date={start.isoformat()}Z",
+                headers={'Authorization': f'Bearer {token}'}
+            )
+
+        assert response.status_code == 200
+        kwargs = get_windowed_series.call_args.kwargs
+        assert kwargs['start_date'] == start
+        assert kwargs['end_date'].tzinfo is None
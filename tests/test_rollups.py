@@ -0,0 +1,163 @@
+"""
+血糖汇总测试
+Glucose Rollup Tests
+"""
+
+import statistics
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from app.services.rollup_service import (
+    GlucoseAggregate,
+    BucketedAggregates,
+    RollupService,
+    classify_level,
+    classify_range,
+    in_target_range
+)
+
+
+class TestGlucoseAggregate:
+    """可合并聚合量测试类"""
+
+    def test_merge_matches_direct_statistics(self):
+        """测试分片合并后的均值与标准差与直接计算一致"""
+        values = [3.2, 4.5, 5.1, 6.8, 7.8, 9.4, 12.0, 2.5]
+
+        left = GlucoseAggregate()
+        right = GlucoseAggregate()
+        for value in values[:3]:
+            left.add(value)
+        for value in values[3:]:
+            right.add(value)
+        merged = left.merge(right)
+
+        assert merged.count == len(values)
+        assert round(merged.mean, 6) == round(statistics.mean(values), 6)
+        assert round(merged.std, 6) == round(statistics.stdev(values), 6)
+        assert merged.min == 2.5
+        assert merged.max == 12.0
+
+    def test_level_and_range_boundaries(self):
+        """测试摘要分类与分布区间的边界"""
+        assert classify_level(3.8) == 'low'
+        assert classify_level(3.9) == 'normal'
+        assert classify_level(7.8) == 'normal'
+        assert classify_level(7.9) == 'high'
+
+        assert classify_range(7.8) == 'mild_high'
+        assert classify_range(2.8) == 'low'
+        assert classify_range(50.0) is None
+
+    def test_in_range_counts_consensus_target(self):
+        """测试目标范围内计数按共识范围 3.9-10.0 (两端均含) 统计并随合并累加"""
+        assert in_target_range(3.9)
+        assert in_target_range(10.0)
+        assert not in_target_range(3.8)
+        assert not in_target_range(10.1)
+
+        aggregate = GlucoseAggregate()
+        for value in (3.8, 3.9, 7.9, 10.0, 10.1):
+            aggregate.add(value)
+        merged = GlucoseAggregate.from_doc(aggregate.to_fields()).merge(aggregate)
+
+        assert aggregate.in_range == 3
+        assert aggregate.level_counts['normal'] == 1
+        assert merged.in_range == 6
+
+    def test_single_value_std_is_zero(self):
+        """测试单条记录的标准差为0"""
+        aggregate = GlucoseAggregate()
+        aggregate.add(6.5)
+
+        assert aggregate.std == 0
+
+
+class TestBucketedAggregates:
+    """按天/小时聚合结果测试类"""
+
+    def test_day_doc_and_raw_cells_combine(self):
+        """测试日汇总文档与原始小时单元合并"""
+        raw = GlucoseAggregate()
+        raw.add(5.0)
+
+        buckets = BucketedAggregates()
+        buckets.add_cell(datetime(2025, 6, 1, 23), raw)
+        buckets.add_rollup_doc({
+            'bucket_start': datetime(2025, 6, 2),
+            'count': 2, 'sum': 14.0, 'sum_sq': 100.0, 'min': 6.0, 'max': 8.0,
+            'range_counts': {'normal': 1, 'mild_high': 1},
+            'level_counts': {'normal': 1, 'high': 1},
+            'hours': {'8': {'count': 2, 'sum': 14.0, 'sum_sq': 100.0, 'min': 6.0, 'max': 8.0}}
+        })
+
+        total = buckets.total()
+        assert total.count == 3
+        assert total.min == 5.0
+        assert total.max == 8.0
+        assert total.range_counts['normal'] == 2
+        assert len(buckets.periods) == 2
+        assert buckets.hours_of_day[8].count == 2
+        assert buckets.hours_of_day[23].count == 1
+
+
+class TestRemoveRecord:
+    """扣除记录测试类"""
+
+    def test_bucket_kept_when_concurrent_add_wins(self, app):
+        """测试计数扣除到0后被并发写入重新加1时不删除该桶"""
+        service = RollupService()
+        service.collection = MagicMock()
+        emptied = {'_id': 'b1', 'count': 0, 'min': 4.0, 'max': 8.0}
+        service.collection.find_one_and_update.side_effect = [emptied] + [None] * 5
+        service.collection.delete_one.return_value = MagicMock(deleted_count=0)
+        service.collection.find_one.return_value = {'_id': 'b1', 'count': 1, 'min': 4.0, 'max': 8.0}
+
+        service.remove_record({'user_id': 'u1', 'device_id': 'd1', 'glucose_value': 5.0,
+                               'timestamp': datetime(2025, 6, 15, 8, 30)})
+
+        service.collection.delete_one.assert_called_once_with({'_id': 'b1', 'count': {'$lte': 0}})
+        service.collection.find_one.assert_called_once()
+
+
+class TestQueryPlanner:
+    """统计查询规划测试类"""
+
+    def test_plan_uses_raw_edges_day_and_month_tiers(self, app):
+        """测试长时间范围按 原始/日/月 分段"""
+        from app.services.statistics_service import StatisticsService
+
+        segments = StatisticsService()._plan_segments(
+            datetime(2024, 1, 15, 8, 30), datetime(2025, 3, 10, 12, 0)
+        )
+
+        assert [segment[0] for segment in segments] == ['raw', 'day', 'month', 'day', 'raw']
+        assert segments[1][1:] == (datetime(2024, 1, 16), datetime(2024, 2, 1))
+        assert segments[2][1:] == (datetime(2024, 2, 1), datetime(2025, 3, 1))
+        assert segments[4][1:] == (datetime(2025, 3, 10), datetime(2025, 3, 10, 12, 0))
+
+    def test_plan_without_month_tier(self, app):
+        """测试日粒度趋势不使用月汇总"""
+        from app.services.statistics_service import StatisticsService
+
+        segments = StatisticsService()._plan_segments(
+            datetime(2024, 1, 1), datetime(2024, 6, 1), max_tier='day'
+        )
+
+        assert [segment[0] for segment in segments] == ['day', 'raw']
+
+    def test_exclusive_end_excludes_boundary_reading(self, app):
+        """测试结束不含时最后一段原始记录使用 $lt (整天窗口不含结束当天零点的读数)"""
+        from app.services.statistics_service import StatisticsService
+
+        service = StatisticsService()
+        service._add_raw_cells = MagicMock(return_value=0)
+        service.rollup_service = MagicMock()
+        service.rollup_service.get_buckets.return_value = []
+
+        service._collect_buckets('u1', datetime(2025, 5, 1), datetime(2025, 6, 1), end_exclusive=True)
+        assert service._add_raw_cells.call_args[0][2] == {'$gte': datetime(2025, 6, 1),
+                                                          '$lt': datetime(2025, 6, 1)}
+
+        service._collect_buckets('u1', datetime(2025, 5, 1), datetime(2025, 6, 1))
+        assert '$lte' in service._add_raw_cells.call_args[0][2]
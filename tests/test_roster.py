@@ -0,0 +1,106 @@
+"""
+患者名单风险排序测试
+Clinic Roster Triage Tests
+"""
+
+import random
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.models.user import ROLE_PATIENT
+from app.services.roster_service import (
+    RISK_COMPONENTS,
+    RosterService,
+    parse_risk_weights,
+    risk_components,
+    risk_score,
+    top_ranked
+)
+
+
+NOW = datetime(2025, 6, 15, 12, 0)
+
+
+class TestRiskComponents:
+    """风险组成项测试类"""
+
+    def test_components_saturate_and_scale(self):
+        """测试各组成项按比例计分并在阈值处封顶"""
+        components = risk_components({
+            'readings': 1000, 'low': 50, 'in_range': 350,
+            'hypo_episodes': 3, 'severe_hypo_episodes': 1,
+            'latest_value': 3.5, 'last_sync': NOW - timedelta(hours=36)
+        }, NOW)
+
+        assert components == {
+            'tbr': 0.5,
+            'tir': 0.5,
+            'hypo_episodes': 1.0,
+            'latest_reading': 0.6,
+            'sync_gap': 0.5
+        }
+
+    def test_missing_data(self):
+        """测试没有读数与从未同步的患者只由同步间隔计分"""
+        components = risk_components({}, NOW)
+
+        assert components == {name: 0.0 for name in RISK_COMPONENTS if name != 'sync_gap'} | \
+            {'sync_gap': 1.0}
+
+    def test_weights_override_defaults(self, app):
+        """测试请求权重覆盖默认值，未知组成项与负权重报错"""
+        weights = parse_risk_weights({'sync_gap': 0})
+
+        assert weights['sync_gap'] == 0.0
+        assert weights['tbr'] == app.config['ROSTER_RISK_WEIGHTS']['tbr']
+        assert risk_score({name: 1.0 for name in RISK_COMPONENTS}, weights) == \
+            sum(weights.values())
+        for invalid in ({'unknown': 1}, {'tbr': -1}, {'tbr': 'high'}, [1, 2]):
+            with pytest.raises(ValueError):
+                parse_risk_weights(invalid)
+
+
+class TestRosterQueries:
+    """名单派生数据查询测试类"""
+
+    def test_latest_readings_from_snapshots(self, app):
+        """测试最新读数一次 $in 查询快照的 readings[0]，窗口之前的读数不计入"""
+        service = RosterService()
+        service.snapshot_collection = MagicMock()
+        service.snapshot_collection.find.return_value = [
+            {'_id': 'u1', 'readings': [{'glucose_value': 3.6, 'timestamp': NOW}]},
+            {'_id': 'u2', 'readings': [{'glucose_value': 6.0, 'timestamp': NOW - timedelta(days=30)}]},
+            {'_id': 'u3', 'readings': []}
+        ]
+
+        latest = service._latest_readings(['u1', 'u2', 'u3'], NOW - timedelta(days=14))
+
+        assert latest == {'u1': {'latest_value': 3.6, 'latest_timestamp': NOW}}
+        service.snapshot_collection.find.assert_called_once_with(
+            {'_id': {'$in': ['u1', 'u2', 'u3']}}, {'readings': {'$slice': 1}}
+        )
+
+
+class TestTopRanked:
+    """分页堆选测试类"""
+
+    def test_matches_full_sort(self):
+        """测试堆选的每一页与完整排序一致 (同分时保持输入顺序)"""
+        rng = random.Random(7)
+        scores = [(float(rng.randint(0, 20)), f'user{index:04d}') for index in range(1000)]
+        ordered = sorted(scores, key=lambda item: item[0], reverse=True)
+
+        for offset in (0, 20, 980, 995):
+            assert top_ranked(scores, 20, offset) == ordered[offset:offset + 20]
+
+    def test_patient_cannot_rank_roster(self, client):
+        """测试患者角色调用名单排序返回403"""
+        token = create_access_token(identity='6650f0c2a1b2c3d4e5f60718')
+        with patch('app.services.user_service.UserService.get_role', return_value=ROLE_PATIENT):
+            response = client.post('/api/cohorts/roster', json={'user_ids': ['a']},
+                                   headers={'Authorization': f'Bearer {token}'})
+
+        assert response.status_code == 403
@@ -0,0 +1,109 @@
+"""
+相同查询请求合并测试
+Single-flight Request Coalescing Tests
+"""
+
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from app.utils.cache import cached_statistics
+from app.utils.single_flight import SingleFlight, SingleFlightTimeout, get_single_flight
+
+
+def run_concurrently(count, target):
+    """并发执行并收集结果或异常"""
+    barrier = threading.Barrier(count)
+    outcomes = [None] * count
+
+    def worker(index):
+        barrier.wait()
+        try:
+            outcomes[index] = target()
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+class TestSingleFlight:
+    """请求合并测试类"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """测试相同键的并发调用只执行一次并共享结果"""
+        flight = SingleFlight()
+        executions = []
+
+        def compute():
+            executions.append(1)
+            time.sleep(0.2)
+            return {'avg_glucose': 6.5}
+
+        outcomes = run_concurrently(5, lambda: flight.do('summary', compute))
+
+        assert len(executions) == 1
+        assert all(outcome == {'avg_glucose': 6.5} for outcome in outcomes)
+        stats = flight.get_stats()
+        assert stats['executions'] == 1
+        assert stats['shared'] == 4
+        assert stats['in_flight'] == 0
+
+    def test_error_propagates_to_waiters(self):
+        """测试计算异常传递给所有等待方"""
+        flight = SingleFlight()
+
+        def compute():
+            time.sleep(0.2)
+            raise ValueError('数据库查询失败')
+
+        outcomes = run_concurrently(3, lambda: flight.do('summary', compute))
+
+        assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+        assert flight.get_stats()['errors'] == 1
+
+    def test_waiter_timeout(self):
+        """测试等待超时，后续调用重新执行"""
+        flight = SingleFlight(timeout=0.05)
+        release = threading.Event()
+        leader = threading.Thread(target=flight.do, args=('slow', release.wait))
+        leader.start()
+        time.sleep(0.05)
+
+        with pytest.raises(SingleFlightTimeout):
+            flight.do('slow', lambda: 'unused')
+
+        release.set()
+        leader.join()
+        assert flight.do('slow', lambda: 'fresh') == 'fresh'
+        assert flight.get_stats()['timeouts'] == 1
+
+    def test_statistics_methods_are_coalesced(self, app):
+        """测试缓存未命中的相同统计查询合并执行"""
+        executions = []
+
+        class SlowService:
+            @cached_statistics('summary')
+            def get_summary(self, user_id, start_date, end_date, device_id=None):
+                executions.append(1)
+                time.sleep(0.2)
+                return {'user_id': user_id}
+
+        service = SlowService()
+        start, end = datetime(2025, 6, 1), datetime(2025, 6, 30)
+
+        def call():
+            with app.app_context():
+                return service.get_summary('u1', start, end)
+
+        outcomes = run_concurrently(4, call)
+
+        assert len(executions) == 1
+        assert all(outcome == {'user_id': 'u1'} for outcome in outcomes)
+        assert get_single_flight().get_stats()['shared'] == 3
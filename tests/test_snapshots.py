@@ -0,0 +1,158 @@
+"""
+用户首页快照测试
+User Dashboard Snapshot Tests
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from app.services.snapshot_service import (
+    SnapshotService,
+    format_snapshot,
+    merge_devices,
+    merge_readings,
+    rate_of_change,
+    trend_arrow
+)
+
+NOW = datetime(2025, 6, 15, 12, 0)
+
+
+def entry(record_id, minutes_ago, value, device_id='d1'):
+    """快照中的一条读数"""
+    return {'record_id': record_id, 'glucose_value': value,
+            'timestamp': NOW - timedelta(minutes=minutes_ago), 'device_id': device_id}
+
+
+class TestSnapshotMerge:
+    """快照合并测试类"""
+
+    def test_out_of_order_readings_do_not_regress(self):
+        """测试较早的读数晚到时不替换最新读数，但可成为第二条"""
+        current = [entry('b', 0, 7.0), entry('a', 10, 6.0)]
+
+        assert merge_readings(current, [entry('old', 30, 3.0)], set()) == current
+        assert merge_readings(current, [entry('mid', 5, 6.5)], set()) == \
+            [entry('b', 0, 7.0), entry('mid', 5, 6.5)]
+
+    def test_updated_and_deleted_records(self):
+        """测试修改的记录替换原条目，删除的记录被移除"""
+        current = [entry('b', 0, 7.0), entry('a', 10, 6.0)]
+
+        assert merge_readings(current, [entry('b', 0, 7.4)], {'b'})[0]['glucose_value'] == 7.4
+        assert merge_readings(current, [], {'b'}) == [entry('a', 10, 6.0)]
+
+    def test_older_device_status_is_ignored(self):
+        """测试设备状态按 updated_at 合并"""
+        newer = {'device_id': 'd1', 'is_active': False, 'updated_at': NOW}
+        older = {'device_id': 'd1', 'is_active': True, 'updated_at': NOW - timedelta(seconds=1)}
+
+        assert merge_devices([newer], [older]) == [newer]
+        assert merge_devices([older], [newer]) == [newer]
+
+
+class TestSnapshotFormat:
+    """快照响应测试类"""
+
+    def test_trend_arrow(self):
+        """测试趋势箭头按变化速率分档，不同设备或间隔过大时不给出"""
+        assert trend_arrow([entry('b', 0, 7.0), entry('a', 5, 6.0)], 15) == \
+            {'direction': 'rising_fast', 'rate_per_minute': 0.2}
+        assert trend_arrow([entry('b', 0, 6.0), entry('a', 5, 6.1)], 15)['direction'] == 'steady'
+        assert trend_arrow([entry('b', 0, 5.4), entry('a', 5, 6.0)], 15)['direction'] == 'falling'
+        assert trend_arrow([entry('b', 0, 7.0), entry('a', 20, 6.0)], 15) is None
+        assert trend_arrow([entry('b', 0, 7.0), entry('a', 5, 6.0, 'd2')], 15) is None
+
+    def test_stale_day_hides_today(self):
+        """测试统计不是今天计算的时今天的读数与TIR为空"""
+        doc = {
+            '_id': 'u1', 'version': 3, 'readings': [entry('b', 0, 7.0)], 'devices': [],
+            'stats': {'day': datetime(2025, 6, 14), 'timezone': 'UTC', 'days': 7,
+                      'today_readings': 10, 'today_in_range': 8,
+                      'window_readings': 100, 'window_sum': 700.0},
+            'updated_at': NOW
+        }
+
+        result = format_snapshot(doc, NOW, 15)
+
+        assert result['today'] == {'date': '2025-06-15', 'readings': 0, 'tir_3_9_10': None}
+        assert result['average'] == {'days': 7, 'readings': 100, 'avg_glucose': 7.0}
+        assert result['latest_reading']['minutes_ago'] == 0.0
+
+
+    def test_today_follows_user_timezone(self):
+        """测试今天按统计所用的用户时区判定 (UTC 12:00 为上海的晚上8点)"""
+        doc = {
+            '_id': 'u1', 'readings': [], 'devices': [],
+            'stats': {'day': datetime(2025, 6, 15), 'timezone': 'Asia/Shanghai', 'days': 7,
+                      'today_readings': 10, 'today_in_range': 8,
+                      'window_readings': 100, 'window_sum': 700.0}
+        }
+
+        assert format_snapshot(doc, NOW, 15)['today'] == \
+            {'date': '2025-06-15', 'readings': 10, 'tir_3_9_10': 80.0}
+        assert format_snapshot(doc, NOW + timedelta(hours=4), 15)['today']['readings'] == 0
+
+
+class TestSnapshotStats:
+    """快照统计测试类"""
+
+    def test_local_day_reads_day_and_hour_rollups(self, app):
+        """测试本地日界内的整UTC天读取日汇总，其余部分读取小时汇总，今天从本地午夜开始"""
+        service = SnapshotService()
+        service.rollup_collection = MagicMock()
+        service.rollup_collection.find.side_effect = [
+            [{'bucket_start': datetime(2025, 6, 10), 'count': 200, 'sum': 1400.0, 'in_range': 150}],
+            [{'bucket_start': datetime(2025, 6, 14, 15), 'count': 12, 'sum': 120.0, 'in_range': 6},
+             {'bucket_start': datetime(2025, 6, 14, 16), 'count': 12, 'sum': 96.0, 'in_range': 12}]
+        ]
+
+        stats = service._window_stats('u1', NOW, 'Asia/Shanghai')
+
+        day_query, hour_query = [call[0][0] for call in service.rollup_collection.find.call_args_list]
+        assert day_query['$or'] == [{'bucket_start': {'$gte': datetime(2025, 6, 9),
+                                                      '$lt': datetime(2025, 6, 14)}}]
+        assert hour_query['$or'] == [
+            {'bucket_start': {'$gte': datetime(2025, 6, 8, 16), '$lt': datetime(2025, 6, 9)}},
+            {'bucket_start': {'$gte': datetime(2025, 6, 14), '$lt': datetime(2025, 6, 14, 16)}},
+            {'bucket_start': {'$gte': datetime(2025, 6, 14, 16), '$lt': datetime(2025, 6, 15, 16)}}
+        ]
+        assert stats['day'] == datetime(2025, 6, 15)
+        assert stats['timezone'] == 'Asia/Shanghai'
+        assert (stats['today_readings'], stats['today_in_range']) == (12, 12)
+        assert (stats['window_readings'], stats['window_sum']) == (224, 1616.0)
+
+
+class TestSnapshotWrite:
+    """快照乐观并发写入测试类"""
+
+    def test_retries_on_version_conflict(self, app):
+        """测试 version 冲突时重新读取文档并在新文档上重新计算"""
+        service = SnapshotService()
+        service.collection = MagicMock()
+        service.collection.find_one.side_effect = [
+            {'_id': 'u1', 'version': 1, 'readings': []},
+            {'_id': 'u1', 'version': 2, 'readings': [entry('b', 0, 7.0)]}
+        ]
+        service.collection.update_one.side_effect = [MagicMock(matched_count=0),
+                                                     MagicMock(matched_count=1)]
+
+        def mutate(doc):
+            readings = merge_readings(doc['readings'], [entry('a', 5, 6.0)], set())
+            return {'readings': readings}
+
+        result = service._apply('u1', mutate)
+
+        second_filter, second_update = service.collection.update_one.call_args[0]
+        assert second_filter == {'_id': 'u1', 'version': 2}
+        assert [reading['record_id'] for reading in second_update['$set']['readings']] == ['b', 'a']
+        assert result['version'] == 3
+
+    def test_rate_of_change_uses_latest_device(self):
+        """测试变化速率为最新读数所在设备读数的最小二乘斜率"""
+        readings = [entry('a', 15, 6.0), entry('x', 12, 9.0, 'd2'), entry('b', 10, 6.5),
+                    entry('c', 5, 7.0), entry('d', 0, 7.5)]
+
+        assert rate_of_change(readings) == {'direction': 'rising_slowly', 'rate_per_minute': 0.1,
+                                            'points': 4}
+        assert rate_of_change(readings[-1:]) is None
@@ -0,0 +1,93 @@
+"""
+趋势时间桶测试
+Trend Bucketing Tests
+"""
+
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from app.services.statistics_service import (
+    TREND_GRANULARITIES,
+    StatisticsService,
+    bucket_start_from_parts,
+    trend_bucket_parts,
+    trend_bucket_start,
+    trend_label
+)
+
+
+class TestTrendBuckets:
+    """趋势时间桶测试类"""
+
+    def test_bucket_start_matches_date_trunc(self):
+        """测试分钟/小时桶在一天内对齐，周以周一开始"""
+        local = datetime(2025, 6, 1, 14, 38, 27)  # 周日
+
+        assert trend_bucket_start(local, '5min') == datetime(2025, 6, 1, 14, 35)
+        assert trend_bucket_start(local, '15min') == datetime(2025, 6, 1, 14, 30)
+        assert trend_bucket_start(local, '4hour') == datetime(2025, 6, 1, 12, 0)
+        assert trend_bucket_start(local, 'week') == datetime(2025, 5, 26)
+        assert trend_bucket_start(local, 'month') == datetime(2025, 6, 1)
+
+    def test_labels_use_iso_weeks(self):
+        """测试周标签为ISO周 (跨年周归属下一年)"""
+        assert trend_label(datetime(2024, 12, 30), 'week') == '2025-W01'
+        assert trend_label(datetime(2025, 6, 2), 'week') == '2025-W23'
+        assert trend_label(datetime(2025, 6, 1, 14, 35), '5min') == '2025-06-01T14:35'
+        assert trend_label(datetime(2025, 6, 1), 'day') == '2025-06-01'
+
+    def test_date_parts_buckets_match_bucket_start(self):
+        """测试按本地日期分量分组的时间桶开始与 $dateTrunc 一致"""
+        local = datetime(2025, 6, 1, 14, 38, 27)  # 周日，ISO 2025-W22
+
+        assert set(trend_bucket_parts(TREND_GRANULARITIES['5min'], 'UTC')) == {
+            'year', 'month', 'day', 'hour', 'minute'
+        }
+        assert bucket_start_from_parts(
+            {'year': 2025, 'month': 6, 'day': 1, 'hour': 14, 'minute': 35}
+        ) == trend_bucket_start(local, '5min')
+        assert bucket_start_from_parts(
+            {'year': 2025, 'month': 6, 'day': 1, 'hour': 12}
+        ) == trend_bucket_start(local, '4hour')
+        assert bucket_start_from_parts({'iso_year': 2025, 'iso_week': 22}) == trend_bucket_start(local, 'week')
+        assert bucket_start_from_parts({'year': 2025, 'month': 6}) == trend_bucket_start(local, 'month')
+
+
+class TestTrendPipeline:
+    """原始记录趋势聚合管道测试类"""
+
+    def trends(self, date_trunc, results):
+        """以模拟的聚合结果查询一天的15分钟趋势 (上海时区)，返回 (趋势, 管道)"""
+        service = StatisticsService()
+        service._date_trunc = date_trunc
+        service.glucose_collection = MagicMock()
+        service.glucose_collection.aggregate.return_value = results
+        trends = StatisticsService.get_glucose_trends.__wrapped__(
+            service, 'u1', datetime(2025, 6, 1), datetime(2025, 6, 2), granularity='15min',
+            timezone='Asia/Shanghai'
+        )
+        return trends, service.glucose_collection.aggregate.call_args[0][0]
+
+    def test_date_trunc_grouped_and_sorted_in_pipeline(self, app):
+        """测试默认按 $dateTrunc 分组、在管道中排序，桶开始换算为本地时间"""
+        trends, pipeline = self.trends(True, [
+            {'_id': datetime(2025, 6, 1, 6, 30), 'avg_glucose': 6.0, 'max_glucose': 7.0,
+             'min_glucose': 5.0, 'record_count': 3}
+        ])
+
+        assert pipeline[1]['$group']['_id'] == {'$dateTrunc': {
+            'date': '$timestamp', 'unit': 'minute', 'binSize': 15, 'timezone': 'Asia/Shanghai'
+        }}
+        assert pipeline[-1] == {'$sort': {'_id': 1}}
+        assert trends[0]['date'] == '2025-06-01T14:30'
+
+    def test_date_parts_fallback_for_old_servers(self, app):
+        """测试服务器不支持 $dateTrunc 时按本地日期分量分组"""
+        trends, pipeline = self.trends(False, [
+            {'_id': {'year': 2025, 'month': 6, 'day': 1, 'hour': 14, 'minute': 30},
+             'avg_glucose': 6.0, 'max_glucose': 7.0, 'min_glucose': 5.0, 'record_count': 3}
+        ])
+
+        assert set(pipeline[1]['$group']['_id']) == {'year', 'month', 'day', 'hour', 'minute'}
+        assert pipeline[-1] == {'$sort': {'_id': 1}}
+        assert trends[0]['date'] == '2025-06-01T14:30'